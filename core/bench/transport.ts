@@ -0,0 +1,96 @@
+// Microbenchmark for the runtime -> CLI message transport.
+// Compares one HTTP POST per message (the fallback path) with batched binary
+// WebSocket messages, as sent once per frame by core/sim/transport.ts.
+//
+//   deno run -A bench/transport.ts [messages] [messagesPerFrame]
+
+import { decodeMessages, encodeMessages, type Message } from "../sim/protocol.ts";
+import * as print from "../src/print.ts";
+
+const MESSAGES = Number(Deno.args[0] ?? 20000);
+const PER_FRAME = Number(Deno.args[1] ?? 50);
+// Browsers keep at most 6 HTTP/1.1 connections per host
+const HTTP_CONCURRENCY = 6;
+
+let received = 0;
+let onReceived: (() => void) | undefined;
+
+function count(n: number): void {
+  received += n;
+  if (received >= MESSAGES) onReceived?.();
+}
+
+const decoder = new TextDecoder();
+const server = Deno.serve({ hostname: "127.0.0.1", port: 0, onListen() {} }, async (req) => {
+  const url = new URL(req.url);
+  if (url.pathname === "/ws") {
+    const { socket, response } = Deno.upgradeWebSocket(req);
+    socket.binaryType = "arraybuffer";
+    socket.onmessage = (event) => {
+      const messages = decodeMessages(new Uint8Array(event.data as ArrayBuffer));
+      for (const message of messages) decoder.decode(message.payload);
+      count(messages.length);
+    };
+    return response;
+  }
+  await req.text();
+  count(1);
+  return new Response("Logged", { status: 200 });
+});
+const base = `127.0.0.1:${server.addr.port}`;
+
+function waitForAll(): Promise<void> {
+  return new Promise((resolve) => {
+    if (received >= MESSAGES) resolve();
+    onReceived = resolve;
+  });
+}
+
+function logLine(i: number): string {
+  return JSON.stringify({ type: "test_pass", name: `message ${i}`, t: i / 60 });
+}
+
+async function benchHttp(): Promise<number> {
+  received = 0;
+  const start = performance.now();
+  let next = 0;
+  const workers = Array.from({ length: HTTP_CONCURRENCY }, async () => {
+    while (next < MESSAGES) {
+      const i = next++;
+      const res = await fetch(`http://${base}/log`, { method: "POST", body: logLine(i) });
+      await res.body?.cancel();
+    }
+  });
+  await Promise.all(workers);
+  await waitForAll();
+  return MESSAGES / ((performance.now() - start) / 1000);
+}
+
+async function benchWebSocket(): Promise<number> {
+  received = 0;
+  const socket = new WebSocket(`ws://${base}/ws`);
+  await new Promise((resolve) => (socket.onopen = resolve));
+
+  const encoder = new TextEncoder();
+  const start = performance.now();
+  for (let i = 0; i < MESSAGES; i += PER_FRAME) {
+    const frame: Message[] = [];
+    for (let j = i; j < Math.min(i + PER_FRAME, MESSAGES); j++) {
+      frame.push({ route: "/log", payload: encoder.encode(logLine(j)) });
+    }
+    socket.send(encodeMessages(frame));
+  }
+  await waitForAll();
+  const rate = MESSAGES / ((performance.now() - start) / 1000);
+  socket.close();
+  return rate;
+}
+
+const http = await benchHttp();
+const ws = await benchWebSocket();
+
+print.raw(`messages: ${MESSAGES}, per frame: ${PER_FRAME}`);
+print.raw(`http POST per message: ${Math.round(http)} msg/s`);
+print.raw(`batched websocket:     ${Math.round(ws)} msg/s (${(ws / http).toFixed(1)}x)`);
+
+await server.shutdown();
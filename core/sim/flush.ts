@@ -9,6 +9,7 @@ import {
   quadBuffer,
   showCanvas2D,
 } from './webgl.ts';
+import { uploadCanvas } from './shader_pipeline.ts';
 import {
   frameState,
   flushComplete,
@@ -35,15 +36,7 @@ export function flushFrame(): void {
   } else {
     // WebGL mode: shaders are active
     if (frameState.needsFlush && !frameState.anyShaderRun) {
-      gl.bindTexture(gl.TEXTURE_2D, readTexture);
-      gl.texImage2D(
-        gl.TEXTURE_2D,
-        0,
-        gl.RGBA,
-        gl.RGBA,
-        gl.UNSIGNED_BYTE,
-        hiddenCanvas,
-      );
+      uploadCanvas();
     }
   }
 
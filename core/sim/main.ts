@@ -11,15 +11,19 @@ import {
 import { flushFrame, resetFrameState } from "./flush.ts";
 import { showErrorOverlay, showFinishOverlay } from "./overlays.ts";
 import { setupUI, startPinging, waitForNext } from "./ui.ts";
-import { fixCanvasDisplay, hiddenCanvas, hiddenCtx, is2DMode } from "./webgl.ts";
+import { fixCanvasDisplay, hiddenCtx } from "./webgl.ts";
 import { __profiling } from "./profiling.ts";
+import { connectTransport, flushTransport, send } from "./transport.ts";
+import { captureFrame } from "./recorder.ts";
 import {
   frameCountState,
   getHasError,
   getIsStopped,
   getRunResolve,
   incrementFrameCount,
+  isRenderFrame,
   markNeedsFlush,
+  resetCullingState,
   resetFrameCountState,
   resetShaderIds,
   setFpsTimer,
@@ -30,6 +34,10 @@ import {
   updateLastFrameTime,
 } from "./state.ts";
 
+// How long a compute-only run may step before handing control back to the
+// browser, so pings, logs and timers keep flowing
+const COMPUTE_YIELD_INTERVAL_MS = 8;
+
 export function setFinished(val: boolean): void {
   setIsFinished(val);
 }
@@ -48,6 +56,7 @@ export function runSimulation(onUpdate: () => unknown): Promise<void> {
   return new Promise((resolve) => {
     setRunResolve(resolve);
     resetFrameCountState();
+    resetCullingState();
     resetShaderIds();
     frameCountState.framesThisSecond = 0;
     frameCountState.currentFPS = 0;
@@ -71,53 +80,50 @@ export function runSimulation(onUpdate: () => unknown): Promise<void> {
           typeof (globalThis as any).MAX_TIME !== "undefined" &&
           frameCountState.frameCount / 60 > (globalThis as any).MAX_TIME
         ) {
-          fetch("/terminate_requirement", {
-            method: "POST",
-            body: JSON.stringify({
+          __profiling.flush();
+          send(
+            "/terminate_requirement",
+            JSON.stringify({
               message: `In-simulation time limit exceeded (${(globalThis as any).MAX_TIME}s)`,
             }),
-            headers: { "Content-Type": "application/json" },
-          }).catch(() => {});
+            true,
+          );
           setHasError(true);
           stopSimulation();
           return;
         }
 
-        markNeedsFlush();
-        resetFrameState();
+        const render = isRenderFrame();
+        if (render) {
+          markNeedsFlush();
+          resetFrameState();
+        }
         const result = onUpdate();
         if (result instanceof Promise) {
           await result.catch(errorHandler);
         }
-        flushFrame();
+        if (render) {
+          flushFrame();
+        }
       } catch (err) {
         errorHandler(err);
       }
 
+      // Everything the frame sent to the server goes out as a single batch
+      flushTransport();
+
       if (
         typeof (globalThis as any).SHOULD_RECORD !== "undefined" &&
-        (globalThis as any).SHOULD_RECORD
+        (globalThis as any).SHOULD_RECORD &&
+        isRenderFrame()
       ) {
-        await new Promise<void>((resolveBlob) => {
-          // In 2D mode, capture from the 2D canvas; in WebGL mode, capture from the WebGL canvas
-          const captureCanvas = is2DMode()
-            ? hiddenCanvas
-            : (document.getElementById("sim") as HTMLCanvasElement);
-          captureCanvas.toBlob(async (blob) => {
-            if (blob) {
-              try {
-                await fetch("/frame", { method: "POST", body: blob });
-              } catch {
-                //
-              }
-            }
-            resolveBlob();
-          }, "image/png");
-        });
+        await captureFrame();
       }
     };
 
+    const computeOnly = (globalThis as any).COMPUTE_ONLY === true;
     let nextFrameTime = performance.now();
+    let lastYieldTime = nextFrameTime;
 
     const runLoop = async () => {
       while (running) {
@@ -125,11 +131,19 @@ export function runSimulation(onUpdate: () => unknown): Promise<void> {
         updateLastFrameTime(frameStart);
 
         await runFrame();
+        __profiling.recordFrame(
+          frameCountState.frameCount,
+          frameStart,
+          performance.now() - frameStart,
+        );
 
-        sendYield();
-        await waitForYield();
+        if (!computeOnly || frameStart - lastYieldTime >= COMPUTE_YIELD_INTERVAL_MS) {
+          sendYield();
+          await waitForYield();
+          lastYieldTime = performance.now();
+        }
 
-        if ((globalThis as any).NO_THROTTLE !== true && running) {
+        if (!computeOnly && (globalThis as any).NO_THROTTLE !== true && running) {
           const targetFrameTime = 1000 / 60;
           nextFrameTime += targetFrameTime;
           const sleepTime = nextFrameTime - performance.now();
@@ -151,14 +165,15 @@ function errorHandler(err: unknown): void {
   console.error(err);
   showErrorOverlay(err);
 
-  fetch("/err", {
-    method: "POST",
-    body: JSON.stringify({
+  __profiling.flush();
+  send(
+    "/err",
+    JSON.stringify({
       message: err instanceof Error ? err.message : String(err),
       stack: err instanceof Error ? err.stack : "",
     }),
-    headers: { "Content-Type": "application/json" },
-  }).catch(() => {});
+    true,
+  );
 
   stopSimulation();
   waitForNext();
@@ -170,6 +185,7 @@ sim.ctx = hiddenCtx;
 
 async function main(): Promise<void> {
   initYieldChannel();
+  connectTransport();
   fixCanvasDisplay();
   window.addEventListener("resize", fixCanvasDisplay);
 
@@ -194,11 +210,8 @@ async function main(): Promise<void> {
   ) {
     const time = (frameCountState.frameCount / 60).toFixed(2);
     const message = `Simulation finished before required time: ${time}s < ${(globalThis as any).MIN_FINISH_TIME}s`;
-    fetch("/terminate_requirement", {
-      method: "POST",
-      body: JSON.stringify({ message }),
-      headers: { "Content-Type": "application/json" },
-    }).catch(() => {});
+    __profiling.flush();
+    send("/terminate_requirement", JSON.stringify({ message }), true);
     setHasError(true);
     showErrorOverlay(new Error(message));
     stopSimulation();
@@ -207,10 +220,8 @@ async function main(): Promise<void> {
   }
 
   setIsFinished(true);
-  fetch("/finish", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-  }).catch(() => {});
+  __profiling.flush();
+  send("/finish", "", true);
   stopSimulation();
   showFinishOverlay();
   waitForNext();
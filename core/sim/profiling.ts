@@ -1,3 +1,5 @@
+import { send } from "./transport.ts";
+
 interface ProfilingFrame {
   name: string;
   fullName: string;
@@ -13,11 +15,55 @@ interface ProfilingStat {
   displayName: string;
 }
 
+// Samples on the main thread, measured between enter and exit
+const TRACK_MAIN = 0;
+// Samples measured elsewhere and recorded later, such as GPU time
+const TRACK_ASYNC = 1;
+
+// Samples and frame times are kept here until they are sent to the server. When more
+// arrive between two sends than fit, the oldest are overwritten and counted as dropped.
+const SAMPLE_CAPACITY = 1 << 16;
+const FRAME_CAPACITY = 1 << 12;
+
+// What the server receives on /profile. Times are in milliseconds. `names` are the
+// region names first seen since the last chunk, continuing the ids of earlier chunks.
+export interface ProfileChunk {
+  names: string[];
+  // [nameId, track, start, duration] per sample
+  samples: number[];
+  // [frame, start, duration] per frame
+  frames: number[];
+  dropped: number;
+}
+
+function roundMicros(ms: number): number {
+  return Math.round(ms * 1000) / 1000;
+}
+
 class ProfilingSystem {
   enabled: boolean;
   stack: ProfilingFrame[];
   stats: Map<string, ProfilingStat>;
 
+  private nameIds = new Map<string, number>();
+  private names: string[] = [];
+  private sentNames = 0;
+
+  private sampleName = new Uint32Array(SAMPLE_CAPACITY);
+  private sampleTrack = new Uint8Array(SAMPLE_CAPACITY);
+  private sampleStart = new Float64Array(SAMPLE_CAPACITY);
+  private sampleDuration = new Float64Array(SAMPLE_CAPACITY);
+  private sampleHead = 0;
+  private sampleCount = 0;
+
+  private frameNumber = new Uint32Array(FRAME_CAPACITY);
+  private frameStart = new Float64Array(FRAME_CAPACITY);
+  private frameDuration = new Float64Array(FRAME_CAPACITY);
+  private frameHead = 0;
+  private frameCount = 0;
+
+  private dropped = 0;
+
   constructor() {
     this.enabled = typeof globalThis.PROFILING !== 'undefined' && globalThis.PROFILING;
     this.stack = [];
@@ -39,9 +85,22 @@ class ProfilingSystem {
       );
     }
     const frame = this.stack.pop()!;
-    const duration = performance.now() - frame.start;
+    this.record(frame.fullName, frame.name, performance.now() - frame.start, frame.start);
+  }
+
+  // Adds a sample. Without a start, it was measured outside of enter/exit, such as GPU
+  // time that is only known some frames after the work was submitted, and is placed on
+  // its own track ending now.
+  record(fullName: string, name: string, duration: number, start?: number): void {
+    if (!this.enabled) return;
+    this.pushSample(
+      fullName,
+      start === undefined ? TRACK_ASYNC : TRACK_MAIN,
+      start ?? performance.now() - duration,
+      duration,
+    );
 
-    let stat = this.stats.get(frame.fullName);
+    let stat = this.stats.get(fullName);
     if (!stat) {
       stat = {
         total: 0,
@@ -49,9 +108,9 @@ class ProfilingSystem {
         min: Infinity,
         max: 0,
         last: 0,
-        displayName: frame.name,
+        displayName: name,
       };
-      this.stats.set(frame.fullName, stat);
+      this.stats.set(fullName, stat);
     }
     stat.total += duration;
     stat.calls++;
@@ -74,9 +133,99 @@ class ProfilingSystem {
     return result.sort((a, b) => b.total - a.total);
   }
 
+  // Adds the time one frame took, from the start of its update to the end of drawing it
+  recordFrame(frame: number, start: number, duration: number): void {
+    if (!this.enabled) return;
+    const i = this.frameHead;
+    this.frameNumber[i] = frame;
+    this.frameStart[i] = start;
+    this.frameDuration[i] = duration;
+    this.frameHead = (i + 1) % FRAME_CAPACITY;
+    if (this.frameCount === FRAME_CAPACITY) {
+      this.dropped++;
+    } else {
+      this.frameCount++;
+    }
+  }
+
+  private pushSample(fullName: string, track: number, start: number, duration: number): void {
+    let id = this.nameIds.get(fullName);
+    if (id === undefined) {
+      id = this.names.length;
+      this.names.push(fullName);
+      this.nameIds.set(fullName, id);
+    }
+    const i = this.sampleHead;
+    this.sampleName[i] = id;
+    this.sampleTrack[i] = track;
+    this.sampleStart[i] = start;
+    this.sampleDuration[i] = duration;
+    this.sampleHead = (i + 1) % SAMPLE_CAPACITY;
+    if (this.sampleCount === SAMPLE_CAPACITY) {
+      this.dropped++;
+    } else {
+      this.sampleCount++;
+    }
+  }
+
+  // Takes everything recorded since the last call, oldest first
+  drain(): ProfileChunk | null {
+    if (this.sampleCount === 0 && this.frameCount === 0 && this.dropped === 0) {
+      return null;
+    }
+
+    const samples: number[] = [];
+    let i = (this.sampleHead - this.sampleCount + SAMPLE_CAPACITY) % SAMPLE_CAPACITY;
+    for (let n = 0; n < this.sampleCount; n++) {
+      samples.push(
+        this.sampleName[i]!,
+        this.sampleTrack[i]!,
+        roundMicros(this.sampleStart[i]!),
+        roundMicros(this.sampleDuration[i]!),
+      );
+      i = (i + 1) % SAMPLE_CAPACITY;
+    }
+
+    const frames: number[] = [];
+    i = (this.frameHead - this.frameCount + FRAME_CAPACITY) % FRAME_CAPACITY;
+    for (let n = 0; n < this.frameCount; n++) {
+      frames.push(
+        this.frameNumber[i]!,
+        roundMicros(this.frameStart[i]!),
+        roundMicros(this.frameDuration[i]!),
+      );
+      i = (i + 1) % FRAME_CAPACITY;
+    }
+
+    const chunk = {
+      names: this.names.slice(this.sentNames),
+      samples,
+      frames,
+      dropped: this.dropped,
+    };
+    this.sentNames = this.names.length;
+    this.sampleCount = 0;
+    this.frameCount = 0;
+    this.dropped = 0;
+    return chunk;
+  }
+
+  // Sends everything recorded since the last flush to the server. Called periodically
+  // while running, and before the runtime reports that the run ended.
+  flush(): void {
+    if (!this.enabled) return;
+    const chunk = this.drain();
+    if (chunk) {
+      send("/profile", JSON.stringify(chunk), true);
+    }
+  }
+
   reset(): void {
     this.stats.clear();
     this.stack = [];
+    this.sampleCount = 0;
+    this.frameCount = 0;
+    this.dropped = 0;
   }
 }
 
@@ -0,0 +1,88 @@
+// Wire format shared by the runtime (transport.ts) and the CLI server (serve.ts).
+// A batch is a sequence of messages, each a 1 byte route index, a 4 byte
+// little endian payload length and the payload, which is the exact body the
+// message would have had as an HTTP request to that route.
+
+export const ROUTES = [
+  "/log",
+  "/err",
+  "/terminate_requirement",
+  "/finish",
+  "/frame",
+  "/ping",
+  "/playSound",
+  "/profile",
+] as const;
+
+export type Route = typeof ROUTES[number];
+
+export type Message = {
+  route: Route;
+  payload: Uint8Array;
+};
+
+const HEADER_SIZE = 5;
+
+export function encodeMessages(messages: Message[]): Uint8Array {
+  let size = 0;
+  for (const message of messages) {
+    size += HEADER_SIZE + message.payload.byteLength;
+  }
+
+  const data = new Uint8Array(size);
+  const view = new DataView(data.buffer);
+  let offset = 0;
+  for (const message of messages) {
+    view.setUint8(offset, ROUTES.indexOf(message.route));
+    view.setUint32(offset + 1, message.payload.byteLength, true);
+    data.set(message.payload, offset + HEADER_SIZE);
+    offset += HEADER_SIZE + message.payload.byteLength;
+  }
+  return data;
+}
+
+export function decodeMessages(data: Uint8Array): Message[] {
+  const view = new DataView(data.buffer, data.byteOffset, data.byteLength);
+  const messages: Message[] = [];
+  let offset = 0;
+  while (offset + HEADER_SIZE <= data.byteLength) {
+    const route = ROUTES[view.getUint8(offset)];
+    const length = view.getUint32(offset + 1, true);
+    const start = offset + HEADER_SIZE;
+    if (route === undefined || start + length > data.byteLength) {
+      break;
+    }
+    messages.push({ route, payload: data.subarray(start, start + length) });
+    offset = start + length;
+  }
+  return messages;
+}
+
+// A recorded frame is raw RGBA pixels behind a 12 byte header: width and height
+// as little endian uint32s and a flag set when rows are stored bottom up (WebGL).
+export const FRAME_HEADER_SIZE = 12;
+
+export type FrameHeader = {
+  width: number;
+  height: number;
+  flipped: boolean;
+};
+
+export function writeFrameHeader(data: Uint8Array, header: FrameHeader): void {
+  const view = new DataView(data.buffer, data.byteOffset, FRAME_HEADER_SIZE);
+  view.setUint32(0, header.width, true);
+  view.setUint32(4, header.height, true);
+  view.setUint8(8, header.flipped ? 1 : 0);
+}
+
+export function readFrameHeader(data: Uint8Array): FrameHeader {
+  const view = new DataView(data.buffer, data.byteOffset, FRAME_HEADER_SIZE);
+  return {
+    width: view.getUint32(0, true),
+    height: view.getUint32(4, true),
+    flipped: view.getUint8(8) === 1,
+  };
+}
+
+// Sent by the server over the channel once a frame has been handed to the encoder
+export const FRAME_ACK = "frame";
@@ -0,0 +1,53 @@
+import { FRAME_HEADER_SIZE, writeFrameHeader } from "./protocol.ts";
+import { onFrameAck, send } from "./transport.ts";
+import { canvas, gl, hiddenCanvas, hiddenCtx, is2DMode } from "./webgl.ts";
+
+// Frames the server hasn't passed on to ffmpeg yet. Capturing the next frame
+// only waits once this many are queued, so encoding overlaps the simulation.
+const MAX_IN_FLIGHT = 4;
+
+let inFlight = 0;
+let ackWaiters: (() => void)[] = [];
+let buffer = new Uint8Array(0);
+
+onFrameAck(() => {
+  inFlight = Math.max(0, inFlight - 1);
+  const waiters = ackWaiters;
+  ackWaiters = [];
+  waiters.forEach((resolve) => resolve());
+});
+
+async function waitForSlot(): Promise<void> {
+  while (inFlight >= MAX_IN_FLIGHT) {
+    await new Promise<void>((resolve) => ackWaiters.push(resolve));
+  }
+}
+
+/**
+ * Sends the frame that was just drawn to the server as raw RGBA. Reads straight
+ * from whichever canvas is being displayed, reusing one buffer between frames.
+ */
+export async function captureFrame(): Promise<void> {
+  await waitForSlot();
+
+  const twoD = is2DMode();
+  const width = twoD ? hiddenCanvas.width : canvas.width;
+  const height = twoD ? hiddenCanvas.height : canvas.height;
+  const size = FRAME_HEADER_SIZE + width * height * 4;
+  if (buffer.byteLength !== size) {
+    buffer = new Uint8Array(size);
+  }
+
+  const pixels = buffer.subarray(FRAME_HEADER_SIZE);
+  if (twoD) {
+    pixels.set(hiddenCtx.getImageData(0, 0, width, height).data);
+  } else {
+    gl.bindFramebuffer(gl.FRAMEBUFFER, null);
+    gl.readPixels(0, 0, width, height, gl.RGBA, gl.UNSIGNED_BYTE, pixels);
+  }
+  writeFrameHeader(buffer, { width, height, flipped: !twoD });
+
+  inFlight++;
+  // The transport copies the payload when sending, so the buffer can be reused
+  send("/frame", buffer, true);
+}
@@ -0,0 +1,227 @@
+import { __profiling } from "./profiling.ts";
+import {
+  defaultProgram,
+  getProgramLocations,
+  gl,
+  hiddenCanvas,
+  isPingPongComplete,
+  type ProgramLocations,
+  programs,
+  quadBuffer,
+  readTexture,
+  type Shader,
+  shaders,
+  showCanvasWebGL,
+  swapPingPong,
+  writeFramebuffer,
+} from "./webgl.ts";
+import {
+  activateShaderMode,
+  frameState,
+  isRenderFrame,
+  isShaderModeActive,
+  markShaderRun,
+} from "./state.ts";
+
+// The 2D canvas is uploaded into the read texture once per frame, then every pass reads
+// the read texture and renders into the write texture before the two are swapped. The
+// result stays on the GPU until flushFrame copies it to the screen.
+
+// Copies the 2D canvas into the read texture. The texture already has the size of the
+// canvas, so its storage is updated in place instead of being reallocated.
+export function uploadCanvas(): void {
+  gl.bindTexture(gl.TEXTURE_2D, readTexture);
+  gl.texSubImage2D(
+    gl.TEXTURE_2D,
+    0,
+    0,
+    0,
+    gl.RGBA,
+    gl.UNSIGNED_BYTE,
+    hiddenCanvas,
+  );
+}
+
+// The shader whose uniforms were last uploaded to each program. Uniform values belong to
+// the program, so they only need uploading again when another shader used the program or
+// the values changed.
+const uniformsUploadedFrom = new Map<WebGLProgram, Shader>();
+
+function uploadUniforms(program: WebGLProgram, shader: Shader): void {
+  if (uniformsUploadedFrom.get(program) === shader && !shader.uniformsDirty) {
+    return;
+  }
+  uniformsUploadedFrom.set(program, shader);
+  shader.uniformsDirty = false;
+
+  for (const [name, location] of shader.uniformLocations) {
+    const def = shader.uniforms[name];
+    if (!def) continue;
+
+    const value = def.value;
+
+    if (def.type === "float") gl.uniform1f(location, value as number);
+    else if (def.type === "vec2") {
+      gl.uniform2fv(location, value as Float32Array);
+    } else if (def.type === "vec3") {
+      gl.uniform3fv(location, value as Float32Array);
+    } else if (def.type === "vec4") {
+      gl.uniform4fv(location, value as Float32Array);
+    } else if (def.type === "int") gl.uniform1i(location, value as number);
+    else if (def.type === "bool") gl.uniform1i(location, value ? 1 : 0);
+    else if (def.type === "sampler2D") gl.uniform1i(location, 0);
+  }
+}
+
+function setBlend(blend: string): void {
+  if (blend === "alpha") {
+    gl.enable(gl.BLEND);
+    gl.blendFunc(gl.SRC_ALPHA, gl.ONE_MINUS_SRC_ALPHA);
+  } else if (blend === "add") {
+    gl.enable(gl.BLEND);
+    gl.blendFunc(gl.ONE, gl.ONE);
+  } else if (blend === "multiply") {
+    gl.enable(gl.BLEND);
+    gl.blendFunc(gl.DST_COLOR, gl.ZERO);
+  } else if (blend === "screen") {
+    gl.enable(gl.BLEND);
+    gl.blendFunc(gl.ONE, gl.ONE_MINUS_SRC_COLOR);
+  } else {
+    gl.disable(gl.BLEND);
+  }
+}
+
+// GPU timing in profiling mode, through EXT_disjoint_timer_query. Query results arrive a
+// few frames after the pass ran, so finished queries are collected at the start of each
+// chain and recorded under "GPU".
+interface TimerQueryExt {
+  TIME_ELAPSED_EXT: number;
+  QUERY_RESULT_EXT: number;
+  QUERY_RESULT_AVAILABLE_EXT: number;
+  GPU_DISJOINT_EXT: number;
+  createQueryEXT(): unknown;
+  deleteQueryEXT(query: unknown): void;
+  beginQueryEXT(target: number, query: unknown): void;
+  endQueryEXT(target: number): void;
+  getQueryObjectEXT(query: unknown, pname: number): unknown;
+}
+
+interface PendingQuery {
+  query: unknown;
+  name: string;
+}
+
+// Queries are dropped instead of queued once this many are waiting for results
+const MAX_PENDING_QUERIES = 64;
+
+const timerExt = __profiling.enabled
+  ? (gl.getExtension("EXT_disjoint_timer_query") as TimerQueryExt | null)
+  : null;
+const pendingQueries: PendingQuery[] = [];
+
+function collectGpuTimings(ext: TimerQueryExt): void {
+  if (pendingQueries.length === 0) return;
+
+  // A disjoint event (such as a GPU frequency change) makes every pending result useless
+  const disjoint = gl.getParameter(ext.GPU_DISJOINT_EXT) as boolean;
+  let done = 0;
+  for (; done < pendingQueries.length; done++) {
+    const { query, name } = pendingQueries[done];
+    if (!disjoint) {
+      if (!ext.getQueryObjectEXT(query, ext.QUERY_RESULT_AVAILABLE_EXT)) break;
+      const nanoseconds = ext.getQueryObjectEXT(query, ext.QUERY_RESULT_EXT) as number;
+      __profiling.record(`GPU > ${name}`, name, nanoseconds / 1e6);
+    }
+    ext.deleteQueryEXT(query);
+  }
+  pendingQueries.splice(0, done);
+}
+
+function runPass(shaderId: number, boundLocs: ProgramLocations | null): ProgramLocations {
+  const shader = shaders.get(shaderId);
+  const program = (shader && programs.get(shader.programId)) || defaultProgram;
+
+  gl.bindFramebuffer(gl.FRAMEBUFFER, writeFramebuffer);
+  gl.bindTexture(gl.TEXTURE_2D, readTexture);
+
+  // Consecutive passes with the same program keep its bindings
+  const locs = getProgramLocations(program);
+  if (locs !== boundLocs) {
+    gl.useProgram(program);
+    if (locs.uImage !== null) {
+      gl.uniform1i(locs.uImage, 0);
+    }
+    if (
+      !boundLocs ||
+      locs.position !== boundLocs.position ||
+      locs.texCoord !== boundLocs.texCoord
+    ) {
+      if (locs.position !== -1) {
+        gl.enableVertexAttribArray(locs.position);
+        gl.vertexAttribPointer(locs.position, 2, gl.FLOAT, false, 16, 0);
+      }
+      if (locs.texCoord !== -1) {
+        gl.enableVertexAttribArray(locs.texCoord);
+        gl.vertexAttribPointer(locs.texCoord, 2, gl.FLOAT, false, 16, 8);
+      }
+    }
+  }
+
+  if (shader) {
+    uploadUniforms(program, shader);
+  }
+  setBlend(shader ? shader.blend : "alpha");
+
+  const query = timerExt && pendingQueries.length < MAX_PENDING_QUERIES
+    ? timerExt.createQueryEXT()
+    : null;
+  if (query) {
+    timerExt!.beginQueryEXT(timerExt!.TIME_ELAPSED_EXT, query);
+  }
+
+  gl.drawArrays(gl.TRIANGLES, 0, 6);
+
+  if (query) {
+    timerExt!.endQueryEXT(timerExt!.TIME_ELAPSED_EXT);
+    pendingQueries.push({ query, name: `Shader ${shaderId}` });
+  }
+
+  swapPingPong();
+  return locs;
+}
+
+// Runs a chain of shader passes over the frame drawn so far
+export function applyShaderPasses(shaderIds: readonly number[]): void {
+  if (!isRenderFrame() || shaderIds.length === 0) {
+    return;
+  }
+
+  // Transition from 2D mode to WebGL mode on first shader use
+  if (!isShaderModeActive()) {
+    activateShaderMode();
+    showCanvasWebGL();
+  }
+
+  if (frameState.firstShaderInFrame) {
+    uploadCanvas();
+  }
+  markShaderRun();
+
+  if (!isPingPongComplete()) {
+    return;
+  }
+
+  if (timerExt) {
+    collectGpuTimings(timerExt);
+  }
+
+  gl.activeTexture(gl.TEXTURE0);
+  gl.bindBuffer(gl.ARRAY_BUFFER, quadBuffer);
+
+  let boundLocs: ProgramLocations | null = null;
+  for (const shaderId of shaderIds) {
+    boundLocs = runPass(shaderId, boundLocs);
+  }
+
+  gl.bindFramebuffer(gl.FRAMEBUFFER, null);
+}
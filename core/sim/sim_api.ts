@@ -1,41 +1,38 @@
 import { __profiling } from "./profiling.ts";
+import { send } from "./transport.ts";
+import { applyShaderPasses } from "./shader_pipeline.ts";
 import {
   canvas,
   createProgram,
-  defaultProgram,
   defaultVertexShader,
   fixCanvasDisplay,
-  getProgramLocations,
   gl,
   hiddenCanvas,
   hiddenCtx,
   programs,
-  quadBuffer,
-  readTexture,
   setupPingPongTextures,
   type ShaderConfig,
   shaders,
-  showCanvasWebGL,
-  swapPingPong,
-  writeFramebuffer,
 } from "./webgl.ts";
 import {
-  activateShaderMode,
   frameCountState,
-  frameState,
   getFpsTimer,
   getNextProgramId,
   getNextShaderId,
   getPingInterval,
   getRunResolve,
+  isRenderFrame,
   isShaderModeActive,
-  markShaderRun,
   setClearColor,
+  setCullingStats,
   setFpsTimer,
   setPingInterval,
   setRunResolve,
 } from "./state.ts";
 
+// Reused by applyShader so a single pass does not allocate an array
+const singlePass = [0];
+
 let yieldChannel: MessageChannel;
 let yieldResolve: (() => void) | null = null;
 
@@ -94,7 +91,8 @@ export const sim: {
   clear: (color?: string) => void;
   resizeCanvas: (width: number, height: number) => void;
   addSound: (soundProps: unknown) => Promise<number>;
-  playSound: (sound: number) => void;
+  addSounds: (soundProps: unknown[]) => Promise<number[]>;
+  playSound: (sound: number, volume?: number) => void;
   addFetchAsset: (path: string, fetchAddr: string) => Promise<void>;
   __PROFILE_ENTER: (name: string) => void;
   __PROFILE_EXIT: () => void;
@@ -105,19 +103,21 @@ export const sim: {
     newUniforms: Record<string, { type: string; value: unknown }>,
   ) => void;
   applyShader: (shaderId: number) => void;
+  applyShaders: (shaderIds: readonly number[]) => void;
+  isRenderFrame: () => boolean;
+  reportCulling: (drawn: number, culled: number) => void;
   run: (onUpdate: () => unknown) => Promise<void>;
+  params: Readonly<Record<string, unknown>>;
   _stopRunning?: () => void;
 } = {
   log: (...args: unknown[]) => {
     writeToTerminal(args.join("\t"));
-    fetch("/log", {
-      method: "POST",
-      keepalive: true,
-      body: args
+    send(
+      "/log",
+      args
         .map((arg) => (typeof arg === "string" ? arg : JSON.stringify(arg)))
         .join("\t"),
-      headers: { "Content-Type": "application/json" },
-    }).catch(() => {});
+    );
   },
   finish: () => {
     stopSimulation();
@@ -190,12 +190,23 @@ export const sim: {
       return -1;
     }
   },
-  playSound: (sound: number) => {
-    fetch("/playSound", {
-      method: "POST",
-      body: JSON.stringify({ sound, frame: frameCountState.frameCount }),
-      headers: { "Content-Type": "application/json" },
-    }).catch(() => {});
+  addSounds: async (soundProps: unknown[]) => {
+    try {
+      const res = await fetch("/addSounds", {
+        method: "POST",
+        body: JSON.stringify(soundProps),
+        headers: { "Content-Type": "application/json" },
+      });
+      if (!res.ok) {
+        return soundProps.map(() => -1);
+      }
+      return (await res.json()) as number[];
+    } catch {
+      return soundProps.map(() => -1);
+    }
+  },
+  playSound: (sound: number, volume?: number) => {
+    send("/playSound", JSON.stringify({ sound, frame: frameCountState.frameCount, volume }));
   },
   addFetchAsset: async (path: string, fetchAddr: string) => {
     try {
@@ -239,6 +250,7 @@ export const sim: {
       uniforms: { ...uniforms },
       uniformLocations,
       blend: config.blend || "alpha",
+      uniformsDirty: true,
     });
     return id;
   },
@@ -255,6 +267,7 @@ export const sim: {
 
     for (const name in newUniforms) {
       shader.uniforms[name] = newUniforms[name];
+      shader.uniformsDirty = true;
       // Only query location if not already cached
       if (!shader.uniformLocations.has(name)) {
         shader.uniformLocations.set(
@@ -265,112 +278,17 @@ export const sim: {
     }
   },
 
-  applyShader: (_shaderId: number) => {
-    const shader = shaders.get(_shaderId);
-    const programId = shader ? shader.programId : null;
-    const program = programId ? programs.get(programId) : defaultProgram;
-
-    const uniformLocations = shader
-      ? shader.uniformLocations
-      : new Map<string, WebGLUniformLocation | null>();
-    const uniforms = shader ? shader.uniforms : {};
-    const blend = shader ? shader.blend : "alpha";
-
-    // Transition from 2D mode to WebGL mode on first shader use
-    if (!isShaderModeActive()) {
-      activateShaderMode();
-      showCanvasWebGL();
-    }
-
-    if (frameState.firstShaderInFrame) {
-      gl.bindTexture(gl.TEXTURE_2D, readTexture);
-      gl.texImage2D(
-        gl.TEXTURE_2D,
-        0,
-        gl.RGBA,
-        gl.RGBA,
-        gl.UNSIGNED_BYTE,
-        hiddenCanvas,
-      );
-      frameState.firstShaderInFrame = false;
-    }
-
-    frameState.anyShaderRun = true;
-    markShaderRun();
-
-    gl.bindFramebuffer(gl.FRAMEBUFFER, writeFramebuffer);
-
-    const fbStatus = gl.checkFramebufferStatus(gl.FRAMEBUFFER);
-    if (fbStatus !== gl.FRAMEBUFFER_COMPLETE) {
-      console.error("Framebuffer incomplete:", fbStatus);
-      return;
-    }
-
-    gl.useProgram(program);
-
-    gl.activeTexture(gl.TEXTURE0);
-    gl.bindTexture(gl.TEXTURE_2D, readTexture);
-
-    // Use cached locations instead of querying every frame
-    const locs = getProgramLocations(program);
-    if (locs.uImage !== null) {
-      gl.uniform1i(locs.uImage, 0);
-    }
-
-    gl.bindBuffer(gl.ARRAY_BUFFER, quadBuffer);
-
-    if (locs.position !== -1) {
-      gl.enableVertexAttribArray(locs.position);
-      gl.vertexAttribPointer(locs.position, 2, gl.FLOAT, false, 16, 0);
-    }
-
-    if (locs.texCoord !== -1) {
-      gl.enableVertexAttribArray(locs.texCoord);
-      gl.vertexAttribPointer(locs.texCoord, 2, gl.FLOAT, false, 16, 8);
-    }
-
-    for (const [name, location] of uniformLocations) {
-      const def = uniforms[name];
-      if (!def) continue;
-
-      const value = def.value;
-
-      if (def.type === "float") gl.uniform1f(location, value as number);
-      else if (def.type === "vec2") {
-        gl.uniform2fv(location, value as Float32Array);
-      } else if (def.type === "vec3") {
-        gl.uniform3fv(location, value as Float32Array);
-      } else if (def.type === "vec4") {
-        gl.uniform4fv(location, value as Float32Array);
-      } else if (def.type === "int") gl.uniform1i(location, value as number);
-      else if (def.type === "bool") gl.uniform1i(location, value ? 1 : 0);
-      else if (def.type === "sampler2D") gl.uniform1i(location, 0);
-    }
-
-    if (blend === "alpha") {
-      gl.enable(gl.BLEND);
-      gl.blendFunc(gl.SRC_ALPHA, gl.ONE_MINUS_SRC_ALPHA);
-    } else if (blend === "add") {
-      gl.enable(gl.BLEND);
-      gl.blendFunc(gl.ONE, gl.ONE);
-    } else if (blend === "multiply") {
-      gl.enable(gl.BLEND);
-      gl.blendFunc(gl.DST_COLOR, gl.ZERO);
-    } else if (blend === "screen") {
-      gl.enable(gl.BLEND);
-      gl.blendFunc(gl.ONE, gl.ONE_MINUS_SRC_COLOR);
-    } else {
-      gl.disable(gl.BLEND);
-    }
-
-    gl.drawArrays(gl.TRIANGLES, 0, 6);
-
-    gl.bindFramebuffer(gl.FRAMEBUFFER, null);
-
-    swapPingPong();
+  applyShader: (shaderId: number) => {
+    singlePass[0] = shaderId;
+    applyShaderPasses(singlePass);
   },
+  applyShaders: applyShaderPasses,
+  isRenderFrame,
+  reportCulling: setCullingStats,
   ctx: null! as unknown as CanvasRenderingContext2D,
   run: null! as unknown as (onUpdate: () => unknown) => Promise<void>,
+  // Set by the page before this module runs, from `physim run --params`
+  params: Object.freeze((globalThis as any).PARAMS ?? {}),
 };
 
 let writeToTerminalFn: (text: string) => void = (_text: string) => {
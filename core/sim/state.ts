@@ -31,6 +31,18 @@ export const frameCountState: FrameCountState = {
   lastFrameTime: 0,
 };
 
+export interface CullingState {
+  reported: boolean;
+  drawn: number;
+  culled: number;
+}
+
+export const cullingState: CullingState = {
+  reported: false,
+  drawn: 0,
+  culled: 0,
+};
+
 export const shaderIds: ShaderIds = {
   nextProgramId: 1,
   nextShaderId: 1,
@@ -114,6 +126,18 @@ export function setRunResolve(val: (() => void) | null): void {
   runResolve = val;
 }
 
+/**
+ * Whether the current frame is drawn. Compute-only runs draw every DRAW_EVERY
+ * frames, or never when it is 0, and skip all canvas work in between.
+ */
+export function isRenderFrame(): boolean {
+  const drawEvery = (globalThis as any).DRAW_EVERY;
+  if (typeof drawEvery !== "number" || drawEvery === 1) {
+    return true;
+  }
+  return drawEvery > 0 && frameCountState.frameCount % drawEvery === 0;
+}
+
 export function resetFrameCountState(): void {
   frameCountState.frameCount = 0;
   frameCountState.framesThisSecond = 0;
@@ -122,6 +146,18 @@ export function resetFrameCountState(): void {
   frameCountState.lastFrameTime = 0;
 }
 
+export function setCullingStats(drawn: number, culled: number): void {
+  cullingState.reported = true;
+  cullingState.drawn = drawn;
+  cullingState.culled = culled;
+}
+
+export function resetCullingState(): void {
+  cullingState.reported = false;
+  cullingState.drawn = 0;
+  cullingState.culled = 0;
+}
+
 export function incrementFrameCount(): void {
   frameCountState.frameCount++;
   frameCountState.framesThisSecond++;
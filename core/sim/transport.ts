@@ -0,0 +1,135 @@
+import { encodeMessages, FRAME_ACK, type Message, type Route } from "./protocol.ts";
+
+// Messages to the server are queued and sent as one binary WebSocket batch per
+// frame. Until the socket is open they are held back, and if it can't be opened
+// (or closes) they fall back to one HTTP POST each, like before.
+
+type State = "connecting" | "open" | "http";
+
+let socket: WebSocket | null = null;
+let state: State = "connecting";
+let queue: Message[] = [];
+let flushTimer: ReturnType<typeof setTimeout> | null = null;
+let frameAckHandler: () => void = () => {};
+
+const encoder = new TextEncoder();
+const decoder = new TextDecoder();
+
+const HTTP_HEADERS: Partial<Record<Route, Record<string, string>>> = {
+  "/log": { "Content-Type": "application/json" },
+  "/err": { "Content-Type": "application/json" },
+  "/terminate_requirement": { "Content-Type": "application/json" },
+  "/finish": { "Content-Type": "application/json" },
+  "/playSound": { "Content-Type": "application/json" },
+  "/profile": { "Content-Type": "application/json" },
+};
+
+function postHttp(message: Message): void {
+  const body = message.route === "/frame"
+    ? message.payload
+    : decoder.decode(message.payload);
+  fetch(message.route, {
+    method: message.route === "/ping" ? "GET" : "POST",
+    keepalive: message.route === "/log",
+    body: message.route === "/ping" ? undefined : body,
+    headers: HTTP_HEADERS[message.route],
+  })
+    .catch(() => {})
+    .finally(() => {
+      if (message.route === "/frame") frameAckHandler();
+    });
+}
+
+/** Called whenever the server has taken a recorded frame off our hands. */
+export function onFrameAck(handler: () => void): void {
+  frameAckHandler = handler;
+}
+
+function fallBackToHttp(): void {
+  state = "http";
+  socket = null;
+  const pending = queue;
+  queue = [];
+  pending.forEach(postHttp);
+}
+
+export function connectTransport(): void {
+  if (typeof WebSocket === "undefined") {
+    fallBackToHttp();
+    return;
+  }
+
+  try {
+    socket = new WebSocket(`ws://${location.host}/ws`);
+  } catch {
+    fallBackToHttp();
+    return;
+  }
+  socket.binaryType = "arraybuffer";
+
+  socket.onopen = () => {
+    state = "open";
+    flushTransport();
+  };
+  socket.onmessage = (event) => {
+    if (event.data === FRAME_ACK) frameAckHandler();
+  };
+  socket.onclose = () => {
+    if (state !== "http") {
+      fallBackToHttp();
+    }
+  };
+  socket.onerror = () => {
+    socket?.close();
+  };
+}
+
+export function isTransportOpen(): boolean {
+  return state === "open";
+}
+
+/**
+ * Queues a message for the server. It goes out with the next flush, which happens
+ * at the end of every frame, right away when `immediate` is set, or on a timer for
+ * messages sent outside of the simulation loop.
+ */
+export function send(route: Route, body: string | Uint8Array = "", immediate = false): void {
+  // Callers may reuse their buffers, so keep a copy of anything not sent right away
+  const sentNow = state === "http" || (immediate && state === "open");
+  const payload = typeof body === "string"
+    ? encoder.encode(body)
+    : sentNow
+    ? body
+    : body.slice();
+
+  if (state === "http") {
+    postHttp({ route, payload });
+    return;
+  }
+
+  queue.push({ route, payload });
+  if (immediate) {
+    flushTransport();
+  } else if (flushTimer === null) {
+    flushTimer = setTimeout(flushTransport, 0);
+  }
+}
+
+export function flushTransport(): void {
+  if (flushTimer !== null) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  if (state !== "open" || queue.length === 0) {
+    return;
+  }
+
+  const pending = queue;
+  queue = [];
+  try {
+    socket!.send(encodeMessages(pending));
+  } catch {
+    queue = pending.concat(queue);
+    fallBackToHttp();
+  }
+}
@@ -1,7 +1,8 @@
 import { __profiling } from "./profiling.ts";
-import { frameCountState, getIsFinished, setIsStopped } from "./state.ts";
+import { cullingState, frameCountState, getIsFinished, setIsStopped } from "./state.ts";
 import { setDebugUpdateFn, stopSimulation } from "./sim_api.ts";
 import { showStoppedOverlay } from "./overlays.ts";
+import { isTransportOpen, send } from "./transport.ts";
 
 export function setupUI(writeTerminalFn: (text: string) => void): void {
   const navbar = document.getElementById("navbar")!;
@@ -53,6 +54,14 @@ export function setupUI(writeTerminalFn: (text: string) => void): void {
       }
     }
 
+    const cullingItem = document.getElementById("debugCullingItem");
+    const debugCulling = document.getElementById("debugCulling");
+    if (cullingItem && debugCulling) {
+      cullingItem.style.display = cullingState.reported ? "block" : "none";
+      debugCulling.textContent =
+        `${cullingState.drawn} drawn, ${cullingState.culled} culled`;
+    }
+
     const profilingSection = document.getElementById("debugProfilingSection");
     const profilingContainer = document.getElementById("debugProfiling");
     if (profilingSection && profilingContainer && __profiling.enabled) {
@@ -93,10 +102,8 @@ export function setupUI(writeTerminalFn: (text: string) => void): void {
 
   function handleStop() {
     setIsStopped(true);
-    fetch("/finish", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-    }).catch(() => {});
+    __profiling.flush();
+    send("/finish", "", true);
     stopSimulation();
     showStoppedOverlay();
     waitForNext();
@@ -131,6 +138,13 @@ export function startPinging(): ReturnType<typeof setInterval> {
   let consecutiveFailures = 0;
   const MAX_CONSECUTIVE_FAILURES = 30;
   return setInterval(() => {
+    __profiling.flush();
+    if (isTransportOpen()) {
+      // The frame count lets the CLI report progress while the simulation runs
+      send("/ping", String(frameCountState.frameCount), true);
+      consecutiveFailures = 0;
+      return;
+    }
     fetch("/ping")
       .then((res) => {
         if (!res.ok && !getIsFinished()) {
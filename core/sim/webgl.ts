@@ -8,6 +8,8 @@ export interface Shader {
   uniforms: Record<string, { type: string; value: unknown }>;
   uniformLocations: Map<string, WebGLUniformLocation | null>;
   blend: string;
+  // Set when uniforms change, so a pass knows the program's uniforms need uploading
+  uniformsDirty: boolean;
 }
 
 export const canvas = document.getElementById("sim") as HTMLCanvasElement;
@@ -164,6 +166,14 @@ export let writeTexture = gl.createTexture();
 export let readFramebuffer = gl.createFramebuffer();
 export let writeFramebuffer = gl.createFramebuffer();
 
+// Completeness only changes when the attachments do, so it is checked here instead of
+// before every shader pass
+let pingPongComplete = false;
+
+export function isPingPongComplete(): boolean {
+  return pingPongComplete;
+}
+
 export function setupPingPongTextures(): void {
   const width = canvas.width;
   const height = canvas.height;
@@ -204,8 +214,18 @@ export function setupPingPongTextures(): void {
     writeTexture,
     0,
   );
+  const writeStatus = gl.checkFramebufferStatus(gl.FRAMEBUFFER);
+
+  gl.bindFramebuffer(gl.FRAMEBUFFER, readFramebuffer);
+  const readStatus = gl.checkFramebufferStatus(gl.FRAMEBUFFER);
 
   gl.bindFramebuffer(gl.FRAMEBUFFER, null);
+
+  pingPongComplete = writeStatus === gl.FRAMEBUFFER_COMPLETE &&
+    readStatus === gl.FRAMEBUFFER_COMPLETE;
+  if (!pingPongComplete) {
+    console.error("Framebuffer incomplete:", writeStatus, readStatus);
+  }
 }
 setupPingPongTextures();
 
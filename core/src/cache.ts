@@ -2,166 +2,376 @@ import { ensureDir } from "@std/fs";
 import { join } from "@std/path";
 import * as print from "./print.ts";
 import { CACHE_DIR } from "./paths.ts";
+import { hashBytes } from "./hash.ts";
+import { fail, InputFailureTag, Result, SystemFailureTag } from "./err.ts";
 
-interface CacheMetadata {
-  url: string;
-  timestamp: number;
+// Fetched resources are stored by the SHA-256 of their contents, so binary files are kept
+// byte for byte and identical files fetched from different URLs are stored once. Which URL
+// maps to which blob, and when it was last used, is recorded in an append-only log of JSON
+// lines, so a fetch appends a line instead of rewriting the whole index.
+
+const RESOURCE_CACHE_DIR = join(CACHE_DIR, "resources");
+const BLOB_DIR = join(RESOURCE_CACHE_DIR, "blobs");
+const INDEX_PATH = join(RESOURCE_CACHE_DIR, "index.jsonl");
+const MAX_CACHE_SIZE = 200 * 1024 * 1024;
+
+// Before blobs, every resource was a JSON file next to this index
+const LEGACY_METADATA_FILE = join(CACHE_DIR, "metadata.json");
+
+const MAX_CONCURRENT_FETCHES = 6;
+
+interface ResourceEntry {
+  hash: string;
   size: number;
+  lastAccess: number;
 }
 
-const METADATA_FILE = join(CACHE_DIR, "metadata.json");
-const MAX_CACHE_SIZE = 200 * 1024 * 1024;
+type IndexRecord =
+  | { op: "put"; url: string; hash: string; size: number; time: number }
+  | { op: "access"; url: string; time: number }
+  | { op: "delete"; url: string };
 
-async function loadMetadata(): Promise<Map<string, CacheMetadata>> {
+interface ResourceIndex {
+  entries: Map<string, ResourceEntry>;
+  // Lines in the log, which grows past the number of entries as resources are used
+  lines: number;
+  // Bytes of the log read so far, and the inode of the file they were read from, which
+  // changes when another run compacts it
+  offset: number;
+  inode: number | null;
+}
+
+let offline = false;
+let loadedIndex: Promise<ResourceIndex> | undefined;
+const inFlight = new Map<string, Promise<Result<string>>>();
+
+let activeFetches = 0;
+const waitingFetches: (() => void)[] = [];
+
+/** Serves fetched resources only from the cache, failing for those that aren't in it. */
+export function enableOfflineMode(): void {
+  offline = true;
+}
+
+function blobPath(hash: string): string {
+  return join(BLOB_DIR, hash);
+}
+
+function applyRecord(entries: Map<string, ResourceEntry>, record: IndexRecord): void {
+  if (record.op === "put") {
+    entries.set(record.url, { hash: record.hash, size: record.size, lastAccess: record.time });
+  } else if (record.op === "access") {
+    const entry = entries.get(record.url);
+    if (entry) {
+      entry.lastAccess = Math.max(entry.lastAccess, record.time);
+    }
+  } else if (record.op === "delete") {
+    entries.delete(record.url);
+  }
+}
+
+function resetIndex(index: ResourceIndex, inode: number | null): void {
+  index.entries.clear();
+  index.lines = 0;
+  index.offset = 0;
+  index.inode = inode;
+}
+
+// Applies the lines appended to the log since it was last read, including those of other
+// runs. Applying a record twice changes nothing, so the lines this run appended itself are
+// read back too.
+async function tailIndex(index: ResourceIndex): Promise<void> {
+  let file: Deno.FsFile;
   try {
-    const data = await Deno.readTextFile(METADATA_FILE);
-    const entries = JSON.parse(data);
-    return new Map(Object.entries(entries));
+    file = await Deno.open(INDEX_PATH);
   } catch {
-    return new Map();
+    // Not created yet, or removed by `physim cache clean`
+    resetIndex(index, null);
+    return;
+  }
+  try {
+    const info = await file.stat();
+    if (info.ino !== index.inode || info.size < index.offset) {
+      // Compacted or recreated by another run, so it is read again from the start
+      resetIndex(index, info.ino);
+    }
+    if (info.size === index.offset) {
+      return;
+    }
+
+    await file.seek(index.offset, Deno.SeekMode.Start);
+    const bytes = new Uint8Array(info.size - index.offset);
+    let read = 0;
+    while (read < bytes.length) {
+      const n = await file.read(bytes.subarray(read));
+      if (n === null) break;
+      read += n;
+    }
+    // Only whole lines, since the last one may still be being appended
+    const end = bytes.subarray(0, read).lastIndexOf(0x0a) + 1;
+    index.offset += end;
+    for (const line of new TextDecoder().decode(bytes.subarray(0, end)).split("\n")) {
+      if (!line) continue;
+      index.lines++;
+      try {
+        applyRecord(index.entries, JSON.parse(line));
+      } catch {
+        // A line cut short by a crash
+      }
+    }
+  } catch {
+    // Read on the next load
+  } finally {
+    file.close();
   }
 }
 
-async function saveMetadata(
-  metadata: Map<string, CacheMetadata>,
-): Promise<void> {
-  await ensureDir(CACHE_DIR);
-  const obj = Object.fromEntries(metadata);
-  await Deno.writeTextFile(METADATA_FILE, JSON.stringify(obj, null, 2));
+async function readIndex(): Promise<ResourceIndex> {
+  const index: ResourceIndex = { entries: new Map(), lines: 0, offset: 0, inode: null };
+  await tailIndex(index);
+  if (index.lines > index.entries.size * 4 + 256) {
+    await compactIndex(index);
+  }
+  return index;
 }
 
-function getCacheKey(url: string): string {
-  return btoa(url).replace(/[/+=]/g, "_");
+// Rewrites the log with one line per entry
+async function compactIndex(index: ResourceIndex): Promise<void> {
+  const lines = [...index.entries].map(([url, entry]) =>
+    JSON.stringify({ op: "put", url, hash: entry.hash, size: entry.size, time: entry.lastAccess })
+  );
+  // Write then rename, so concurrent runs never read a half written index
+  const tmp = `${INDEX_PATH}.${crypto.randomUUID()}.tmp`;
+  try {
+    await Deno.writeTextFile(tmp, lines.map((line) => line + "\n").join(""));
+    await Deno.rename(tmp, INDEX_PATH);
+    index.lines = lines.length;
+  } catch {
+    await Deno.remove(tmp).catch(() => {});
+  }
 }
 
-function getCachePath(key: string): string {
-  return `${CACHE_DIR}/${key}.cache`;
+// The index, up to date with the records other runs appended since it was last loaded
+function loadIndex(): Promise<ResourceIndex> {
+  if (!loadedIndex) {
+    loadedIndex = readIndex();
+  } else {
+    // Chained, so concurrent loads never read the same lines at once
+    loadedIndex = loadedIndex.then(async (index) => {
+      await tailIndex(index);
+      return index;
+    });
+  }
+  return loadedIndex;
 }
 
-async function evictOldest(
-  metadata: Map<string, CacheMetadata>,
-): Promise<void> {
-  const totalSize = Array.from(metadata.values()).reduce(
-    (sum, m) => sum + m.size,
-    0,
+async function appendRecords(index: ResourceIndex, records: IndexRecord[]): Promise<void> {
+  for (const record of records) {
+    applyRecord(index.entries, record);
+  }
+  await ensureDir(RESOURCE_CACHE_DIR);
+  // Appends of a few lines are atomic, so concurrent runs don't interleave within a line
+  await Deno.writeTextFile(
+    INDEX_PATH,
+    records.map((record) => JSON.stringify(record) + "\n").join(""),
+    { append: true },
   );
+}
 
+async function exists(path: string): Promise<boolean> {
+  try {
+    await Deno.stat(path);
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+// Removes the least recently used resources until the cache fits, keeping `keep`
+async function evict(index: ResourceIndex, keep: string): Promise<void> {
+  const sizes = new Map<string, number>();
+  for (const entry of index.entries.values()) {
+    sizes.set(entry.hash, entry.size);
+  }
+  let totalSize = [...sizes.values()].reduce((sum, size) => sum + size, 0);
   if (totalSize <= MAX_CACHE_SIZE) {
     return;
   }
 
-  const sorted = Array.from(metadata.entries()).sort(
-    (a, b) => a[1].timestamp - b[1].timestamp,
-  );
-
-  let currentSize = totalSize;
-  for (const [key, meta] of sorted) {
-    if (currentSize <= MAX_CACHE_SIZE) {
-      break;
-    }
-
-    try {
-      await Deno.remove(getCachePath(key));
-      metadata.delete(key);
-      currentSize -= meta.size;
-    } catch {
-      metadata.delete(key);
+  const deleted: IndexRecord[] = [];
+  const sorted = [...index.entries].sort((a, b) => a[1].lastAccess - b[1].lastAccess);
+  const references = new Map<string, number>();
+  for (const [, entry] of sorted) {
+    references.set(entry.hash, (references.get(entry.hash) ?? 0) + 1);
+  }
+  for (const [url, entry] of sorted) {
+    if (totalSize <= MAX_CACHE_SIZE) break;
+    if (url === keep) continue;
+    deleted.push({ op: "delete", url });
+    const remaining = references.get(entry.hash)! - 1;
+    references.set(entry.hash, remaining);
+    if (remaining === 0) {
+      await Deno.remove(blobPath(entry.hash)).catch(() => {});
+      totalSize -= entry.size;
     }
   }
+  await appendRecords(index, deleted);
+}
 
-  await saveMetadata(metadata);
+async function acquireFetchSlot(): Promise<void> {
+  if (activeFetches < MAX_CONCURRENT_FETCHES) {
+    activeFetches++;
+    return;
+  }
+  await new Promise<void>((resolve) => waitingFetches.push(resolve));
 }
 
-export async function fetchWithCache(
-  url: string,
-  options?: RequestInit,
-): Promise<Response> {
-  print.info(`Fetching: ${url}`);
-  await ensureDir(CACHE_DIR);
-  const metadata = await loadMetadata();
-  const key = getCacheKey(url);
-  const cachePath = getCachePath(key);
+function releaseFetchSlot(): void {
+  const next = waitingFetches.shift();
+  if (next) {
+    // The slot passes straight to the next fetch
+    next();
+  } else {
+    activeFetches--;
+  }
+}
 
-  const cached = metadata.get(key);
-  if (cached) {
+async function download(url: string): Promise<Result<Uint8Array>> {
+  await acquireFetchSlot();
+  try {
+    print.info(`Fetching: ${url}`);
+    let response: Response;
     try {
-      const data = await Deno.readFile(cachePath);
-      const decoded = new TextDecoder().decode(data);
-      const parsed = JSON.parse(decoded);
-
-      print.info(`Served from cache: ${url}`);
-      return new Response(parsed.body, {
-        status: parsed.status,
-        statusText: parsed.statusText,
-        headers: new Headers(parsed.headers),
-      });
-    } catch {
-      metadata.delete(key);
+      response = await globalThis.fetch(url);
+    } catch (err) {
+      return fail(
+        SystemFailureTag.NetworkFailure,
+        `Network error while fetching asset from ${url}: ${err}`,
+      );
     }
+    if (!response.ok) {
+      await response.body?.cancel();
+      return fail(
+        InputFailureTag.AssetFetchFailure,
+        `Failed to download ${url}: ${response.status} ${response.statusText}`,
+      );
+    }
+    try {
+      return new Uint8Array(await response.arrayBuffer());
+    } catch (err) {
+      return fail(
+        SystemFailureTag.NetworkFailure,
+        `Network error while downloading ${url}: ${err}`,
+      );
+    }
+  } finally {
+    releaseFetchSlot();
   }
+}
 
-  const response = await globalThis.fetch(url, options);
-
-  if (response.ok) {
-    const body = await response.text();
-    const headers = Object.fromEntries(response.headers.entries());
+async function fetchIntoCache(url: string): Promise<Result<string>> {
+  const index = await loadIndex();
+  const cached = index.entries.get(url);
+  if (cached && (await exists(blobPath(cached.hash)))) {
+    await appendRecords(index, [{ op: "access", url, time: Date.now() }]);
+    print.info(`Served from cache: ${url}`);
+    return blobPath(cached.hash);
+  }
 
-    const cacheData = {
-      body,
-      status: response.status,
-      statusText: response.statusText,
-      headers,
-    };
+  if (offline) {
+    return fail(
+      SystemFailureTag.NetworkFailure,
+      `${url} is not in the resource cache, and resources are not fetched in offline mode`,
+    );
+  }
 
-    const serialized = JSON.stringify(cacheData);
-    const size = new TextEncoder().encode(serialized).length;
+  const data = await download(url);
+  if (!(data instanceof Uint8Array)) {
+    return data;
+  }
 
-    await Deno.writeTextFile(cachePath, serialized);
+  const hash = await hashBytes(data);
+  const path = blobPath(hash);
+  if (!(await exists(path))) {
+    await ensureDir(BLOB_DIR);
+    const tmp = `${path}.${crypto.randomUUID()}.tmp`;
+    await Deno.writeFile(tmp, data);
+    await Deno.rename(tmp, path);
+  }
+  await appendRecords(index, [{ op: "put", url, hash, size: data.length, time: Date.now() }]);
+  // Other runs may have cached resources since the index was loaded, which count too
+  await evict(await loadIndex(), url);
 
-    metadata.set(key, {
-      url,
-      timestamp: Date.now(),
-      size,
-    });
+  print.info(`Fetched and cached: ${url}`);
+  return path;
+}
 
-    await saveMetadata(metadata);
-    await evictOldest(metadata);
+/**
+ * Returns the path of the cached contents of `url`, downloading them first if they aren't
+ * cached. The file must not be modified, and may be evicted by later fetches, so callers
+ * copy it. Concurrent calls for the same URL share one download, and at most
+ * `MAX_CONCURRENT_FETCHES` downloads run at once. Never rejects: network and file system
+ * errors are returned as failures.
+ */
+export function fetchCached(url: string): Promise<Result<string>> {
+  let pending = inFlight.get(url);
+  if (!pending) {
+    // Errors writing the cache are returned too, since a prefetch nobody waits on must not
+    // reject
+    pending = fetchIntoCache(url)
+      .catch((err): Result<string> =>
+        fail(
+          SystemFailureTag.CantOpenFileFailure,
+          `Can't store ${url} in the resource cache: ${String(err)}`,
+        )
+      )
+      .finally(() => inFlight.delete(url));
+    inFlight.set(url, pending);
+  }
+  return pending;
+}
 
-    print.info(`Fetched and cached: ${url}`);
-    return new Response(body, {
-      status: response.status,
-      statusText: response.statusText,
-      headers: response.headers,
-    });
+async function removeLegacyCache(): Promise<void> {
+  try {
+    for await (const entry of Deno.readDir(CACHE_DIR)) {
+      if (entry.isFile && entry.name.endsWith(".cache")) {
+        await Deno.remove(join(CACHE_DIR, entry.name)).catch(() => {});
+      }
+    }
+  } catch {
+    //
   }
+  await Deno.remove(LEGACY_METADATA_FILE).catch(() => {});
+}
 
-  return response;
+export async function cleanResourceCache(): Promise<void> {
+  try {
+    await Deno.remove(RESOURCE_CACHE_DIR, { recursive: true });
+  } catch {
+    //
+  }
+  loadedIndex = undefined;
+  await removeLegacyCache();
 }
 
 export async function printCacheStats(): Promise<void> {
-  const metadata = await loadMetadata();
-  const entries = Array.from(metadata.values());
+  const index = await loadIndex();
+  const entries = [...index.entries.values()];
 
-  const totalSize = entries.reduce((sum, m) => sum + m.size, 0);
-  const count = entries.length;
+  const sizes = new Map(entries.map((entry) => [entry.hash, entry.size]));
+  const totalSize = [...sizes.values()].reduce((sum, size) => sum + size, 0);
 
   const sizeMB = (totalSize / (1024 * 1024)).toFixed(2);
   const maxMB = (MAX_CACHE_SIZE / (1024 * 1024)).toFixed(0);
 
-  print.raw(`Cache Stats:`);
-  print.raw(`  Entries: ${count}`);
+  print.raw(`Resource Cache:`);
+  print.raw(`  Entries: ${entries.length}`);
   print.raw(`  Total Size: ${sizeMB} MB / ${maxMB} MB`);
-  print.raw(`  Cache Directory: ${CACHE_DIR}`);
+  print.raw(`  Cache Directory: ${RESOURCE_CACHE_DIR}`);
 
   if (entries.length > 0) {
-    const oldest = entries.reduce((min, m) =>
-      m.timestamp < min.timestamp ? m : min,
-    );
-    const newest = entries.reduce((max, m) =>
-      m.timestamp > max.timestamp ? m : max,
-    );
-
-    print.raw(`  Oldest Entry: ${new Date(oldest.timestamp).toISOString()}`);
-    print.raw(`  Newest Entry: ${new Date(newest.timestamp).toISOString()}`);
+    const accesses = entries.map((entry) => entry.lastAccess);
+    print.raw(`  Least Recently Used: ${new Date(Math.min(...accesses)).toISOString()}`);
+    print.raw(`  Most Recently Used: ${new Date(Math.max(...accesses)).toISOString()}`);
   }
 }
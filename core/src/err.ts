@@ -1,4 +1,4 @@
-import { isRawModeEnabled } from "./print.ts";
+import { event, isRawModeEnabled, isStreamModeEnabled } from "./print.ts";
 import { TraceMap, originalPositionFor } from "@jridgewell/trace-mapping";
 import { relative, resolve } from "@std/path";
 
@@ -7,6 +7,9 @@ const EX_SOFTWARE = 70;
 const EX_DATAERR = 65;
 
 function error(tag: string, err: string, code: number) {
+  if (isStreamModeEnabled()) {
+    event({ event: "error", tag, reason: err });
+  }
   if (isRawModeEnabled()) {
     console.error(`[${tag}] ${err}`);
   } else {
@@ -39,6 +42,8 @@ export enum InputFailureTag {
   AssetFetchFailure = "ASSET_FETCH_FAILURE",
   SoundFailure = "SOUND_FAILURE",
   RestrictionFailure = "RESTRICTION_FAILURE",
+  BenchRegressionFailure = "BENCH_REGRESSION_FAILURE",
+  ParamsFailure = "PARAMS_FAILURE",
 }
 
 export enum SystemFailureTag {
@@ -68,25 +73,26 @@ export function fail(
 
 export type Result<T> = T | Failure;
 
-export function unwrap<T>(result: Result<T>): T {
-  if (typeof result === "object" && result !== null && "_isFailure" in result) {
-    const isInputFailure = Object.values(InputFailureTag).includes(
-      result.tag as InputFailureTag,
-    );
-    const isSystemFailure = Object.values(SystemFailureTag).includes(
-      result.tag as SystemFailureTag,
-    );
+export function exitCode(failure: Failure): number {
+  const isInputFailure = Object.values(InputFailureTag).includes(
+    failure.tag as InputFailureTag,
+  );
+  const isSystemFailure = Object.values(SystemFailureTag).includes(
+    failure.tag as SystemFailureTag,
+  );
 
-    let code;
-    if (isInputFailure) {
-      code = EX_DATAERR;
-    } else if (isSystemFailure) {
-      code = EX_UNAVAILABLE;
-    } else {
-      throw Error("bruh wtf");
-    }
+  if (isInputFailure) {
+    return EX_DATAERR;
+  } else if (isSystemFailure) {
+    return EX_UNAVAILABLE;
+  } else {
+    throw Error("bruh wtf");
+  }
+}
 
-    error(result.tag, result.reason, code);
+export function unwrap<T>(result: Result<T>): T {
+  if (typeof result === "object" && result !== null && "_isFailure" in result) {
+    error(result.tag, result.reason, exitCode(result));
   }
 
   return result as T;
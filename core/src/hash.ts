@@ -0,0 +1,18 @@
+export async function hashBytes(data: BufferSource): Promise<string> {
+  const hashBuffer = await crypto.subtle.digest("SHA-256", data);
+  const hashArray = Array.from(new Uint8Array(hashBuffer));
+  return hashArray.map((b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+export function hashString(data: string): Promise<string> {
+  return hashBytes(new TextEncoder().encode(data));
+}
+
+/** Hashes a file's contents, or returns undefined if it can't be read. */
+export async function hashFile(path: string): Promise<string | undefined> {
+  try {
+    return await hashBytes(await Deno.readFile(path));
+  } catch {
+    return undefined;
+  }
+}
@@ -1,13 +1,21 @@
 import { Command } from "@cliffy/command";
 import { init } from "./init.ts";
 import { fail, setGlobalErrorHandler, SystemFailureTag, unwrap } from "./err.ts";
-import { run } from "./run/mod.ts";
+import { parseParams, run } from "./run/mod.ts";
+import { host } from "./run/host.ts";
+import { bench } from "./run/bench.ts";
 import { dirname, fromFileUrl, join } from "@std/path";
 import { genDocs } from "./docs.ts";
 import * as print from "./print.ts";
-import { enableRawMode as enablePrintRawMode } from "./print.ts";
+import {
+  enableRawMode as enablePrintRawMode,
+  enableStreamMode as enablePrintStreamMode,
+} from "./print.ts";
 import { checkAllDependencies, manageDependenciesTUI } from "./deps.ts";
-import { printCacheStats } from "./cache.ts";
+import { cleanResourceCache, enableOfflineMode, printCacheStats } from "./cache.ts";
+import { cleanBuildCache, printBuildCacheStats } from "./run/build_cache.ts";
+import { cleanSimCache, printSimCacheStats } from "./run/build_sim.ts";
+import { cleanSoundCache, printSoundCacheStats } from "./run/audio/sound_cache.ts";
 
 setGlobalErrorHandler();
 
@@ -29,28 +37,87 @@ const cmd = new Command()
   })
   .command("run <entrypoint>", "Runs a simulation from a JS/TS file")
   .option("--raw", "Only prints raw logs if the simulation finishes")
+  .option(
+    "--stream",
+    "Print logs, frame progress and errors as JSON lines while the simulation runs. Implies --raw.",
+  )
   .option(
     "-r --record <outfile>",
     "Record the simulation and save it as an mp4 in outfile.",
   )
+  .option("--record-preset <preset:string>", "x264 preset used when recording, e.g. ultrafast or medium.")
+  .option("--record-threads <n:number>", "Number of threads ffmpeg uses to encode the recording.")
   .option("-w --webview", "Run the simulation in a webview window.")
   .option("--headless", "Run the simulation in a headless browser (Playwright).")
   .option("--no-audio", "Disables audio playback.")
+  .option("--offline", "Only use fetched assets that are already cached, never download them.")
   .option("--profiling", "Enable performance profiling with live stats in debug panel.")
+  .option(
+    "--profile-out <file:string>",
+    "Write a Chrome trace of the profiled regions and frame times to file. Implies --profiling.",
+  )
   .option("--no-throttle", "Disable FPS throttling, runs at maximum speed.")
+  .option(
+    "--compute-only",
+    "Step the simulation headless as fast as possible without drawing. Implies --headless and --no-throttle.",
+  )
+  .option("--draw-every <n:number>", "Only draw every nth frame. With --compute-only, 0 (the default) never draws.")
   .option(
     "--max-traceback <n:number>",
     "Maximum number of traceback frames to show in runtime errors.",
     { default: 10 },
   )
+  .option(
+    "--params <json:string>",
+    "A JSON object the simulation reads as sim.params. Runs with different params share one build.",
+  )
   .option("--_error-on-time <n:number>", "Throw an error if the simulation time exceeds this value.")
   .option("--_error-on-frame-time <n:number>", "Throw an error if the time to run a frame exceeds this value.")
   .option("--_error-on-finish-before <n:number>", "Throw an error if the simulation finishes before this in-simulation time has passed.")
-  .action(async ({ raw, record, webview, headless, audio, profiling, throttle, maxTraceback, errorOnTime, errorOnFrameTime, errorOnFinishBefore }, entrypoint) => {
-    if (raw) {
+  .option("--_profile-summary-out <file:string>", "Write the profile summary as JSON to file. Needs --profiling.")
+  .action(async ({ raw, stream, record, recordPreset, recordThreads, webview, headless, audio, offline, profiling, profileOut, profileSummaryOut, throttle, computeOnly, drawEvery, maxTraceback, params, errorOnTime, errorOnFrameTime, errorOnFinishBefore }, entrypoint) => {
+    if (stream) {
+      enablePrintStreamMode();
+    } else if (raw) {
       enablePrintRawMode();
     }
-    unwrap(await run(entrypoint, record, !!headless || !!webview, !!headless, !audio, !!profiling, throttle === false, maxTraceback, errorOnTime, errorOnFrameTime, errorOnFinishBefore));
+    if (offline) {
+      enableOfflineMode();
+    }
+    const simParams = params === undefined ? undefined : unwrap(parseParams(params));
+    unwrap(await run(entrypoint, record, { preset: recordPreset, threads: recordThreads }, !!headless || !!webview || !!computeOnly, !!headless || !!computeOnly, !audio, !!profiling || profileOut !== undefined, { out: profileOut, summaryOut: profileSummaryOut }, throttle === false, !!computeOnly, drawEvery, maxTraceback, errorOnTime, errorOnFrameTime, errorOnFinishBefore, simParams));
+    Deno.exit(0);
+  })
+  .command("bench", "Runs the benchmark scenarios in std/bench and reports frame times")
+  .option("--only <scenarios:string[]>", "Only run these scenarios, e.g. gravity,draw.")
+  .option("--json", "Print the results as JSON.")
+  .option("-o --out <file:string>", "Write the results as JSON to file, to compare with later.")
+  .option(
+    "--compare <baseline:string>",
+    "Compare with the results in a file written by --out, and fail if any case regressed.",
+  )
+  .option(
+    "--threshold <n:number>",
+    "How much slower a frame time percentile may get before it is a regression.",
+    { default: 0.1 },
+  )
+  .action(async ({ only, json, out, compare, threshold }) => {
+    // Simulation output would get in the way of the results
+    enablePrintRawMode();
+    unwrap(await bench(only, out, compare, threshold, !!json));
+    Deno.exit(0);
+  })
+  .command(
+    "host",
+    "Keeps a headless browser warm and runs simulations sent over a local socket",
+  )
+  .option("--port <n:number>", "Port to listen on, 0 picks a free one.", { default: 0 })
+  .option("--pages <n:number>", "Maximum number of simulations running at once.", {
+    default: 1,
+  })
+  .action(async ({ port, pages }) => {
+    enablePrintRawMode();
+    unwrap(await host(port, pages));
     Deno.exit(0);
   })
   .command("init", "Adds typescript configuration to the current directory")
@@ -97,9 +164,32 @@ const cmd = new Command()
   .action(async () => {
     await manageDependenciesTUI();
   })
-  .command("cache", "Prints information about the resource cache")
-  .action(() => {
-    printCacheStats();
-  });
+  .command(
+    "cache",
+    new Command()
+      .description("Inspects or clears the resource, build, sound and runtime caches")
+      .action(async () => {
+        await printAllCacheStats();
+      })
+      .command("stats", "Prints information about the caches")
+      .action(async () => {
+        await printAllCacheStats();
+      })
+      .command("clean", "Removes every cached resource, build and sound")
+      .action(async () => {
+        await cleanResourceCache();
+        await cleanBuildCache();
+        await cleanSoundCache();
+        await cleanSimCache();
+        print.raw("Cleared the resource, build, sound and runtime caches");
+      }),
+  );
+
+async function printAllCacheStats(): Promise<void> {
+  await printCacheStats();
+  await printBuildCacheStats();
+  await printSoundCacheStats();
+  await printSimCacheStats();
+}
 
 await cmd.parse(Deno.args);
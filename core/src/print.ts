@@ -1,4 +1,5 @@
 let rawMode = false;
+let streamMode = false;
 
 export function enableRawMode() {
   rawMode = true;
@@ -8,6 +9,20 @@ export function isRawModeEnabled(): boolean {
   return rawMode;
 }
 
+// Stream mode implies raw mode, so stdout only carries the JSON lines written by `event`
+export function enableStreamMode() {
+  rawMode = true;
+  streamMode = true;
+}
+
+export function isStreamModeEnabled(): boolean {
+  return streamMode;
+}
+
+export function event(data: object) {
+  console.info(JSON.stringify(data));
+}
+
 export function raw(str: string) {
   console.info(str);
 }
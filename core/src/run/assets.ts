@@ -6,47 +6,80 @@ import {
   Result,
   SystemFailureTag,
 } from "../err.ts";
-import * as print from "../print.ts";
-import { fetchWithCache } from "../cache.ts";
+import { fetchCached } from "../cache.ts";
+
+// A call of fetchAsset from std/src/base/assets.ts with a literal URL. The bundler may
+// append a number to the name.
+const FETCH_ASSET_CALL = /\bfetchAsset\d*\(\s*(["'`])(https?:\/\/[^"'`\s]+)\1\s*\)/g;
+
+/**
+ * The URLs of the fetch assets a bundle creates with a literal URL, which can be fetched
+ * before the simulation asks for them.
+ */
+export function findFetchAssets(code: string): string[] {
+  const urls = new Set<string>();
+  for (const match of code.matchAll(FETCH_ASSET_CALL)) {
+    urls.add(match[2]!);
+  }
+  return [...urls];
+}
 
 export class AssetManager {
   simDir: string;
   tempDir: string;
   redirects: Map<string, string> = new Map();
   id: number = 0;
+  private downloads: Map<string, Promise<Result<string>>> = new Map();
 
   constructor(simDir: string, tempDir: string) {
     this.simDir = simDir;
     this.tempDir = tempDir;
   }
 
+  private download(url: string): Promise<Result<string>> {
+    let download = this.downloads.get(url);
+    if (!download) {
+      download = fetchCached(url);
+      this.downloads.set(url, download);
+    }
+    return download;
+  }
+
+  /**
+   * Starts fetching assets into the cache without waiting for them. Failures are reported
+   * when the simulation adds the asset, so assets it never uses can't fail the run.
+   */
+  prefetch(urls: string[]): void {
+    for (const url of urls) {
+      this.download(url);
+    }
+  }
+
   async addFetchAsset(
     path: string,
     fetchAddr: string,
   ): Promise<Result<undefined>> {
-    let res;
-    try {
-      res = await fetchWithCache(fetchAddr);
-    } catch (e) {
-      return fail(
-        SystemFailureTag.NetworkFailure,
-        `Network error while fetching asset from ${fetchAddr}: ${e}`,
-      );
+    const cached = await this.download(fetchAddr);
+    if (failed(cached)) {
+      return cached as Result<undefined>;
     }
 
-    if (!res.ok || !res.body) {
+    let extension = "";
+    try {
+      extension = extname(new URL(fetchAddr).pathname);
+    } catch {
+      extension = extname(fetchAddr);
+    }
+    const savePath = join(this.tempDir, `asset_${this.id++}${extension}`);
+    // A copy, since later fetches may evict the cached file while the simulation runs
+    try {
+      await Deno.copyFile(cached as string, savePath);
+    } catch (err) {
       return fail(
-        InputFailureTag.AssetFetchFailure,
-        "Failed to download file.",
+        SystemFailureTag.CantOpenFileFailure,
+        `Can't copy the cached asset from ${fetchAddr}: ${String(err)}`,
       );
     }
-
-    const data = new Uint8Array(await res.arrayBuffer());
-    const savePath = join(
-      this.tempDir,
-      `asset_${this.id}${extname(fetchAddr)}`,
-    );
-    await Deno.writeFile(savePath, data);
     this.redirects.set(path, savePath);
   }
 
@@ -3,14 +3,21 @@ import { SoundProps } from "../../../../sound.ts";
 import { addAudioToMp4 } from "./mp4.ts";
 import { synthMidi } from "./midi.ts";
 import { synthSox } from "./sox.ts";
+import { midiCacheKey, renderSound, soxCacheKey } from "./sound_cache.ts";
 import { join } from "@std/path";
 import {
   fail,
   failed,
   InputFailureTag,
   Result,
+  SystemFailureTag,
 } from "../../err.ts";
-import { playAudio } from "../../rust.ts";
+import {
+  playAudio,
+  playRegisteredSound,
+  registerSound,
+  unregisterSound,
+} from "../../rust.ts";
 
 type Sound = string;
 
@@ -18,7 +25,9 @@ export class AudioPlayer {
   playLoud: boolean;
   enabled: boolean;
   sounds: Sound[] = [];
-  soundLog: [number, Sound][] = [];
+  soundLog: [number, Sound, number][] = [];
+  // Ids of the sounds in the native audio core, when they are played live
+  nativeIds: (number | undefined)[] = [];
   tmpDir: string;
   assetManager: AssetManager;
   currentFrame: number = 0;
@@ -51,6 +60,8 @@ export class AudioPlayer {
       if (r) {
         return r;
       }
+      this.sounds[id] = fileName;
+      return this.registerNative(id);
     } else if ("midi" in props.src) {
       let midi = props.src.midi;
       if (typeof midi === "string") {
@@ -64,22 +75,86 @@ export class AudioPlayer {
       if (failed(fontPath)) {
         return fontPath as Result<number>;
       }
-      const r = await synthMidi(midi, fontPath as string, fileName);
-      if (r) {
-        return r;
+      const midiSrc = midi;
+      const key = await midiCacheKey(midiSrc, fontPath as string);
+      const path = await renderSound(
+        key,
+        fileName,
+        (out) => synthMidi(midiSrc, fontPath as string, out),
+      );
+      if (failed(path)) {
+        return path as Result<number>;
       }
+      return this.addRendered(id, path as string, fileName);
     } else if ("args" in props.src) {
-      const r = await synthSox(props.src.args, fileName);
-      if (r) {
-        return r;
+      const args = props.src.args;
+      const path = await renderSound(
+        await soxCacheKey(args),
+        fileName,
+        (out) => synthSox(args, out),
+      );
+      if (failed(path)) {
+        return path as Result<number>;
       }
+      return this.addRendered(id, path as string, fileName);
     }
 
+    return id;
+  }
+
+  // Links (or copies, across file systems) a render from the shared sound cache into
+  // tmpDir, since other runs may evict the cached file while this one still plays it
+  private async addRendered(
+    id: number,
+    path: string,
+    fileName: string,
+  ): Promise<Result<number>> {
+    if (path !== fileName) {
+      try {
+        await Deno.link(path, fileName);
+      } catch {
+        try {
+          await Deno.copyFile(path, fileName);
+        } catch (err) {
+          return fail(
+            SystemFailureTag.CantOpenFileFailure,
+            `Can't copy the cached sound ${path}: ${String(err)}`,
+          );
+        }
+      }
+    }
     this.sounds[id] = fileName;
+    return this.registerNative(id);
+  }
+
+  // Decodes the sound into the native audio core once, so playing it only sends its id
+  private registerNative(id: number): Result<number> {
+    if (!this.playLoud) {
+      return id;
+    }
+    const nativeId = registerSound(this.sounds[id]!);
+    if (failed(nativeId)) {
+      return nativeId;
+    }
+    this.nativeIds[id] = nativeId as number;
     return id;
   }
 
-  playSound(id: number, frame: number): Result<undefined> {
+  /**
+   * Registers several sounds at once. Their ids are assigned in order, and sounds that
+   * need synthesizing are rendered concurrently.
+   */
+  async addSounds(props: SoundProps[]): Promise<Result<number[]>> {
+    const ids = await Promise.all(props.map((p) => this.addSound(p)));
+    for (const id of ids) {
+      if (failed(id)) {
+        return id as Result<number[]>;
+      }
+    }
+    return ids as number[];
+  }
+
+  playSound(id: number, frame: number, volume: number = 1): Result<undefined> {
     if (!this.enabled) {
       return;
     }
@@ -102,17 +177,33 @@ export class AudioPlayer {
 
     this.playedThisFrame.add(id);
 
-    const sound = this.sounds[id];
-    this.soundLog.push([frame, sound]);
+    const sound = this.sounds[id]!;
+    this.soundLog.push([frame, sound, volume]);
 
     if (this.playLoud) {
-      const r = playAudio(sound);
+      const nativeId = this.nativeIds[id];
+      const r = nativeId !== undefined
+        ? playRegisteredSound(nativeId, volume)
+        : playAudio(sound);
       if (failed(r)) {
         return r;
       }
     }
   }
 
+  /**
+   * Frees the sounds decoded into the native audio core, which otherwise stay in memory
+   * for as long as the process runs. Call it once the simulation has ended.
+   */
+  releaseSounds(): void {
+    for (const nativeId of this.nativeIds) {
+      if (nativeId !== undefined) {
+        unregisterSound(nativeId);
+      }
+    }
+    this.nativeIds = [];
+  }
+
   addAudioToVideo(videoPath: string): Promise<Result<undefined>> {
     if (!this.enabled || this.soundLog.length === 0) {
       return Promise.resolve(undefined as unknown as Result<undefined>);
@@ -1,25 +1,149 @@
+import { join } from "@std/path";
 import { fail, Result, SystemFailureTag } from "../../err.ts";
 
+const SAMPLE_RATE = 48000;
+const CHANNELS = 2;
+// Samples per channel mixed at a time, one second of audio
+const BLOCK_FRAMES = SAMPLE_RATE;
+
+// The sound log is mixed here instead of in an ffmpeg filter graph. Every clip is decoded
+// once to raw PCM, every trigger is added into the output at its offset, and the mix is
+// streamed into a single ffmpeg process that muxes it into the video. The cost grows with
+// the length of the audio rather than the size of a filter graph, so long recordings with
+// many thousands of triggers stay cheap.
+
+interface Trigger {
+  // Offset of the first sample, in samples per channel
+  start: number;
+  clip: Float32Array;
+  volume: number;
+}
+
+async function decodeClip(path: string): Promise<Result<Float32Array>> {
+  try {
+    const ff = new Deno.Command("ffmpeg", {
+      args: [
+        "-v",
+        "error",
+        "-i",
+        path,
+        "-f",
+        "f32le",
+        "-ac",
+        String(CHANNELS),
+        "-ar",
+        String(SAMPLE_RATE),
+        "pipe:1",
+      ],
+      stdout: "piped",
+      stderr: "null",
+    });
+    const { code, stdout } = await ff.output();
+    if (code !== 0) {
+      return fail(
+        SystemFailureTag.FfmpegFailure,
+        `ffmpeg could not decode ${path} (exit code ${code})`,
+      );
+    }
+    // Float32Array needs an aligned offset, which a fresh copy always has
+    const bytes = stdout.byteOffset % 4 === 0 ? stdout : stdout.slice();
+    return new Float32Array(bytes.buffer, bytes.byteOffset, Math.floor(bytes.byteLength / 4));
+  } catch (err) {
+    return fail(
+      SystemFailureTag.FfmpegFailure,
+      `Failed to run ffmpeg: ${String(err)}`,
+    );
+  }
+}
+
+async function mp4HasAudio(path: string): Promise<boolean> {
+  const probe = new Deno.Command("ffprobe", {
+    args: [
+      "-v",
+      "error",
+      "-select_streams",
+      "a",
+      "-show_entries",
+      "stream=index",
+      "-of",
+      "csv=p=0",
+      path,
+    ],
+    stdout: "piped",
+    stderr: "null",
+  });
+  const { code, stdout } = await probe.output();
+  if (code !== 0) {
+    return false;
+  }
+  const txt = new TextDecoder().decode(stdout).trim();
+  return txt.length > 0;
+}
+
+/**
+ * Sums the triggers overlapping the block starting at `blockStart` into `block`.
+ * Triggers must be sorted by start. `state.next` is the first trigger not yet started
+ * and `state.active` the ones still playing; both advance as blocks are mixed in order.
+ */
+function mixBlock(
+  triggers: Trigger[],
+  state: { next: number; active: Trigger[] },
+  block: Float32Array,
+  blockStart: number,
+  blockFrames: number,
+): void {
+  block.fill(0, 0, blockFrames * CHANNELS);
+  const blockEnd = blockStart + blockFrames;
+
+  while (state.next < triggers.length && triggers[state.next]!.start < blockEnd) {
+    state.active.push(triggers[state.next]!);
+    state.next++;
+  }
+
+  let kept = 0;
+  for (const trigger of state.active) {
+    const clipFrames = trigger.clip.length / CHANNELS;
+    const from = Math.max(blockStart, trigger.start);
+    const to = Math.min(blockEnd, trigger.start + clipFrames);
+    const clip = trigger.clip;
+    let src = (from - trigger.start) * CHANNELS;
+    const srcEnd = (to - trigger.start) * CHANNELS;
+    const volume = trigger.volume;
+    for (let dst = (from - blockStart) * CHANNELS; src < srcEnd; src++, dst++) {
+      block[dst]! += clip[src]! * volume;
+    }
+    if (trigger.start + clipFrames > blockEnd) {
+      state.active[kept++] = trigger;
+    }
+  }
+  state.active.length = kept;
+}
+
 export async function addAudioToMp4(
-  clips: [number, string][],
+  clips: [number, string, number?][],
   mp4Path: string,
   framerate: number,
 ): Promise<Result<undefined>> {
-  const validClips: { frame: number; path: string }[] = [];
+  const validClips: { frame: number; path: string; volume: number }[] = [];
+  const checkedPaths = new Set<string>();
   for (const item of clips) {
     if (!Array.isArray(item) || item.length < 2) continue;
     const frame = Number(item[0]);
     const path = String(item[1]);
-    if (!Number.isFinite(frame) || frame < 0) continue;
-    try {
-      await Deno.stat(path);
-    } catch {
-      return fail(
-        SystemFailureTag.FfmpegFailure,
-        `Clip file not found: ${path}`,
-      );
+    const volume = Number(item[2] ?? 1);
+    if (!Number.isFinite(frame) || frame < 0 || !Number.isFinite(volume)) continue;
+    if (!checkedPaths.has(path)) {
+      try {
+        await Deno.stat(path);
+      } catch {
+        return fail(
+          SystemFailureTag.FfmpegFailure,
+          `Clip file not found: ${path}`,
+        );
+      }
+      checkedPaths.add(path);
     }
-    validClips.push({ frame, path });
+    validClips.push({ frame, path, volume });
   }
 
   if (validClips.length === 0) {
@@ -35,161 +159,144 @@ export async function addAudioToMp4(
     );
   }
 
-  async function mp4HasAudio(path: string): Promise<boolean> {
-    const probe = new Deno.Command("ffprobe", {
-      args: [
-        "-v",
-        "error",
-        "-select_streams",
-        "a",
-        "-show_entries",
-        "stream=index",
-        "-of",
-        "csv=p=0",
-        path,
-      ],
-      stdout: "piped",
-      stderr: "null",
-    });
-    const { code, stdout } = await probe.output();
-    if (code !== 0) {
-      return false;
+  const paths = [...checkedPaths];
+  const decoded = new Map<string, Float32Array>();
+  const results = await Promise.all(paths.map((path) => decodeClip(path)));
+  for (let i = 0; i < paths.length; i++) {
+    const samples = results[i]!;
+    if (!(samples instanceof Float32Array)) {
+      return samples;
     }
-    const txt = new TextDecoder().decode(stdout).trim();
-    return txt.length > 0;
+    decoded.set(paths[i]!, samples);
   }
 
-  const hasAudio = await mp4HasAudio(mp4Path);
-
-  const uniquePaths = [...new Set(validClips.map(c => c.path))];
+  const triggers: Trigger[] = validClips.map((c) => ({
+    start: Math.round((c.frame / framerate) * SAMPLE_RATE),
+    clip: decoded.get(c.path)!,
+    volume: c.volume,
+  }));
+  triggers.sort((a, b) => a.start - b.start);
 
-  const intermediateFiles: string[] = [];
-  const cleanupIntermediates = async () => {
-    for (const f of intermediateFiles) {
-      try {
-        await Deno.remove(f);
-      } catch {
-      }
-    }
-  };
-
-  for (let pathIdx = 0; pathIdx < uniquePaths.length; pathIdx++) {
-    const path = uniquePaths[pathIdx]!;
-    const clipsForPath = validClips.filter(c => c.path === path);
-
-    if (clipsForPath.length === 0) continue;
+  let totalFrames = 0;
+  for (const trigger of triggers) {
+    totalFrames = Math.max(totalFrames, trigger.start + trigger.clip.length / CHANNELS);
+  }
 
-    const args: string[] = ["-y", "-i", path];
+  const block = new Float32Array(BLOCK_FRAMES * CHANNELS);
 
-    const filterParts: string[] = [];
-    const delayedLabels: string[] = [];
-    for (let i = 0; i < clipsForPath.length; i++) {
-      const clip = clipsForPath[i]!;
-      const startMs = Math.round((clip.frame / framerate) * 1000);
-      const label = `a${i}`;
-      filterParts.push(`[0:a]adelay=${startMs}:all=1[${label}]`);
-      delayedLabels.push(`[${label}]`);
+  // The first pass only finds the peak, so the mix can be scaled down when overlapping
+  // triggers would clip, without holding the whole mix in memory
+  let peak = 0;
+  const scan = { next: 0, active: [] as Trigger[] };
+  for (let start = 0; start < totalFrames; start += BLOCK_FRAMES) {
+    const frames = Math.min(BLOCK_FRAMES, totalFrames - start);
+    mixBlock(triggers, scan, block, start, frames);
+    for (let i = 0; i < frames * CHANNELS; i++) {
+      const v = Math.abs(block[i]!);
+      if (v > peak) peak = v;
     }
+  }
+  const gain = peak > 1 ? 1 / peak : 1;
 
-    const filterComplex = filterParts.join(";") + ";" + delayedLabels.join("") + `amix=inputs=${clipsForPath.length}:duration=longest[out${pathIdx}]`;
-    const filterScriptPath = `/tmp/physim_audio_filter_${pathIdx}.txt`;
-    await Deno.writeTextFile(filterScriptPath, filterComplex);
-
-    const outputPath = `/tmp/physim_audio_intermediate_${pathIdx}.wav`;
-    intermediateFiles.push(outputPath);
-
-    args.push("-filter_complex_script", filterScriptPath);
-    args.push("-map", `[out${pathIdx}]`);
-    args.push("-c:a", "pcm_s16le", outputPath);
+  const hasAudio = await mp4HasAudio(mp4Path);
+  const workDir = await Deno.makeTempDir({ prefix: "physim_audio_" });
+  const outputPath = join(workDir, "out.mp4");
 
-    const ff = new Deno.Command("ffmpeg", { args });
-    const { code } = await ff.output();
+  try {
+    const args = [
+      "-y",
+      "-v",
+      "error",
+      "-i",
+      mp4Path,
+      "-f",
+      "f32le",
+      "-ar",
+      String(SAMPLE_RATE),
+      "-ac",
+      String(CHANNELS),
+      "-i",
+      "pipe:0",
+    ];
+    if (hasAudio) {
+      args.push(
+        "-filter_complex",
+        "[0:a][1:a]amix=inputs=2:duration=longest:normalize=0[aout]",
+        "-map",
+        "0:v",
+        "-map",
+        "[aout]",
+      );
+    } else {
+      args.push("-map", "0:v", "-map", "1:a");
+    }
+    args.push("-c:v", "copy", "-c:a", "aac", "-b:a", "192k", outputPath);
 
+    let code: number;
     try {
-      await Deno.remove(filterScriptPath);
-    } catch {
-    }
+      const ff = new Deno.Command("ffmpeg", {
+        args,
+        stdin: "piped",
+        stdout: "null",
+        stderr: "null",
+      }).spawn();
 
-    if (code !== 0) {
-      await cleanupIntermediates();
+      const writer = ff.stdin.getWriter();
+      const mix = { next: 0, active: [] as Trigger[] };
+      try {
+        for (let start = 0; start < totalFrames; start += BLOCK_FRAMES) {
+          const frames = Math.min(BLOCK_FRAMES, totalFrames - start);
+          mixBlock(triggers, mix, block, start, frames);
+          if (gain !== 1) {
+            for (let i = 0; i < frames * CHANNELS; i++) {
+              block[i]! *= gain;
+            }
+          }
+          // The block is reused, so ffmpeg gets a copy
+          await writer.write(new Uint8Array(block.buffer.slice(0, frames * CHANNELS * 4)));
+        }
+        await writer.close();
+      } catch {
+        // ffmpeg exited early, its exit code says why
+      }
+      code = (await ff.status).code;
+    } catch (err) {
       return fail(
         SystemFailureTag.FfmpegFailure,
-        `ffmpeg intermediate mix ${pathIdx} exited with code ${code}`,
+        `Failed to run ffmpeg: ${String(err)}`,
       );
     }
-  }
-
-  const finalArgs: string[] = ["-y", "-i", mp4Path];
-  for (let i = 0; i < intermediateFiles.length; i++) {
-    finalArgs.push("-i", intermediateFiles[i]!);
-  }
-
-  const audioInputs: string[] = [];
-  for (let i = 0; i < intermediateFiles.length; i++) {
-    audioInputs.push(`[${i + 1}:a]`);
-  }
-
-  if (hasAudio) {
-    audioInputs.unshift("[0:a]");
-  }
 
-  const finalFilterComplex = `${audioInputs.join("")}amix=inputs=${audioInputs.length}:duration=longest[aout]`;
-  const finalFilterScriptPath = "/tmp/physim_audio_final_filter.txt";
-  await Deno.writeTextFile(finalFilterScriptPath, finalFilterComplex);
-
-  finalArgs.push("-filter_complex_script", finalFilterScriptPath);
-  finalArgs.push("-map", "0:v");
-  finalArgs.push("-map", "[aout]");
-  finalArgs.push("-c:v", "copy", "-c:a", "aac", "-b:a", "192k", "/tmp/physim_audio_final.mp4");
-
-  const ff2 = new Deno.Command("ffmpeg", { args: finalArgs });
-  const { code: code2 } = await ff2.output();
-
-  try {
-    await Deno.remove(finalFilterScriptPath);
-  } catch {
-  }
-
-  if (code2 !== 0) {
-    try {
-      await Deno.remove("/tmp/physim_audio_final.mp4");
-    } catch {
+    if (code !== 0) {
+      return fail(
+        SystemFailureTag.FfmpegFailure,
+        `ffmpeg final mix exited with code ${code}`,
+      );
     }
-    await cleanupIntermediates();
-    return fail(
-      SystemFailureTag.FfmpegFailure,
-      `ffmpeg final mix exited with code ${code2}`,
-    );
-  }
 
-  const backupPath = `${mp4Path}.bak.${Date.now()}`;
-  try {
-    await Deno.rename(mp4Path, backupPath);
-    // Use copyFile + remove instead of rename to handle cross-device moves
-    // (e.g., /tmp and the target directory may be on different filesystems)
-    await Deno.copyFile("/tmp/physim_audio_final.mp4", mp4Path);
-    await Deno.remove("/tmp/physim_audio_final.mp4").catch(() => {});
-    await Deno.remove(backupPath);
-  } catch (err) {
+    const backupPath = `${mp4Path}.bak.${Date.now()}`;
     try {
-      const statBackup = await Deno.stat(backupPath).catch(() => null);
-      if (statBackup) {
-        try {
-          await Deno.remove("/tmp/physim_audio_final.mp4").catch(() => {});
-        } catch {
+      await Deno.rename(mp4Path, backupPath);
+      // Use copyFile instead of rename to handle cross-device moves
+      // (e.g., the temp directory and the target directory may be on different filesystems)
+      await Deno.copyFile(outputPath, mp4Path);
+      await Deno.remove(backupPath);
+    } catch (err) {
+      try {
+        const statBackup = await Deno.stat(backupPath).catch(() => null);
+        if (statBackup) {
+          await Deno.rename(backupPath, mp4Path);
         }
-        await Deno.rename(backupPath, mp4Path);
+      } catch {
       }
-    } catch {
+      return fail(
+        SystemFailureTag.FfmpegFailure,
+        `Failed to replace MP4: ${String(err)}`,
+      );
     }
-    await cleanupIntermediates();
-    return fail(
-      SystemFailureTag.FfmpegFailure,
-      `Failed to replace MP4: ${String(err)}`,
-    );
+  } finally {
+    await Deno.remove(workDir, { recursive: true }).catch(() => {});
   }
 
-  await cleanupIntermediates();
-
   return undefined as unknown as Result<undefined>;
 }
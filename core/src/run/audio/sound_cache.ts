@@ -0,0 +1,199 @@
+import { join } from "@std/path";
+import { ensureDir } from "@std/fs";
+import { CACHE_DIR } from "../../paths.ts";
+import { hashFile, hashString } from "../../hash.ts";
+import { failed, Result } from "../../err.ts";
+import { NoteEvent } from "../../../../sound.ts";
+import * as print from "../../print.ts";
+
+// Bump when the way sounds are synthesized changes, so old renders stop matching
+const SOUND_CACHE_VERSION = 1;
+
+const SOUND_CACHE_DIR = join(CACHE_DIR, "sounds");
+const MAX_SOUND_CACHE_SIZE = 256 * 1024 * 1024;
+
+// Synthesis runs in separate processes, so there is no point in starting more than
+// there are cores to run them on
+const MAX_CONCURRENT_RENDERS = navigator.hardwareConcurrency || 4;
+
+let activeRenders = 0;
+const waitingRenders: (() => void)[] = [];
+
+async function acquireRenderSlot(): Promise<void> {
+  if (activeRenders < MAX_CONCURRENT_RENDERS) {
+    activeRenders++;
+    return;
+  }
+  await new Promise<void>((resolve) => waitingRenders.push(resolve));
+}
+
+function releaseRenderSlot(): void {
+  const next = waitingRenders.shift();
+  if (next) {
+    // The slot passes straight to the next render
+    next();
+  } else {
+    activeRenders--;
+  }
+}
+
+// Renders that are still running, so identical sounds requested together are only
+// synthesized once
+const inFlight = new Map<string, Promise<Result<string>>>();
+
+/** The cache key of a sound synthesized by sox from `args`. */
+export function soxCacheKey(args: string[]): Promise<string> {
+  return hashString(JSON.stringify({ version: SOUND_CACHE_VERSION, sox: args }));
+}
+
+/**
+ * The cache key of a sound synthesized by fluidsynth, derived from the contents of the
+ * MIDI file (or the note events) and of the soundfont. Returns undefined if one of the
+ * files can't be read, in which case the sound is synthesized without caching.
+ */
+export async function midiCacheKey(
+  midi: string | NoteEvent[],
+  soundfont: string,
+): Promise<string | undefined> {
+  const midiHash = typeof midi === "string" ? await hashFile(midi) : JSON.stringify(midi);
+  const fontHash = await hashFile(soundfont);
+  if (midiHash === undefined || fontHash === undefined) {
+    return undefined;
+  }
+  return await hashString(
+    JSON.stringify({ version: SOUND_CACHE_VERSION, midi: midiHash, soundfont: fontHash }),
+  );
+}
+
+async function exists(path: string): Promise<boolean> {
+  try {
+    await Deno.stat(path);
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+async function renderLimited(
+  render: (outputFile: string) => Promise<Result<undefined>>,
+  outputFile: string,
+): Promise<Result<undefined>> {
+  await acquireRenderSlot();
+  try {
+    return await render(outputFile);
+  } finally {
+    releaseRenderSlot();
+  }
+}
+
+async function renderIntoCache(
+  key: string,
+  render: (outputFile: string) => Promise<Result<undefined>>,
+): Promise<Result<string>> {
+  const path = join(SOUND_CACHE_DIR, `${key}.wav`);
+  if (await exists(path)) {
+    // The modification time doubles as the last access time for eviction
+    const now = new Date();
+    await Deno.utime(path, now, now).catch(() => {});
+    return path;
+  }
+
+  await ensureDir(SOUND_CACHE_DIR);
+  // Render then rename, so concurrent runs never read a half written file. The
+  // extension stays last, since sox picks the output format from it.
+  const tmp = join(SOUND_CACHE_DIR, `${key}.${crypto.randomUUID()}.tmp.wav`);
+  const r = await renderLimited(render, tmp);
+  if (failed(r)) {
+    await Deno.remove(tmp).catch(() => {});
+    return r as Result<string>;
+  }
+  await Deno.rename(tmp, path);
+  await evictSounds();
+  return path;
+}
+
+/**
+ * Returns the path of the cached render for `key`, calling `render` to synthesize it
+ * first if it isn't cached. Without a key the sound is rendered to `fallbackFile` and
+ * not cached. At most one render per core runs at a time.
+ */
+export function renderSound(
+  key: string | undefined,
+  fallbackFile: string,
+  render: (outputFile: string) => Promise<Result<undefined>>,
+): Promise<Result<string>> {
+  if (key === undefined) {
+    return renderLimited(render, fallbackFile).then((r) =>
+      failed(r) ? (r as Result<string>) : fallbackFile
+    );
+  }
+
+  let pending = inFlight.get(key);
+  if (!pending) {
+    pending = renderIntoCache(key, render).finally(() => inFlight.delete(key));
+    inFlight.set(key, pending);
+  }
+  return pending;
+}
+
+interface CachedSound {
+  path: string;
+  size: number;
+  mtime: number;
+}
+
+async function listSounds(): Promise<CachedSound[]> {
+  const sounds: CachedSound[] = [];
+  try {
+    for await (const entry of Deno.readDir(SOUND_CACHE_DIR)) {
+      if (!entry.isFile || entry.name.endsWith(".tmp.wav")) continue;
+      const path = join(SOUND_CACHE_DIR, entry.name);
+      try {
+        const stat = await Deno.stat(path);
+        sounds.push({ path, size: stat.size, mtime: stat.mtime?.getTime() ?? 0 });
+      } catch {
+        // Removed by another run
+      }
+    }
+  } catch {
+    //
+  }
+  return sounds;
+}
+
+async function evictSounds(): Promise<void> {
+  const sounds = await listSounds();
+  let totalSize = sounds.reduce((sum, s) => sum + s.size, 0);
+  if (totalSize <= MAX_SOUND_CACHE_SIZE) {
+    return;
+  }
+
+  sounds.sort((a, b) => a.mtime - b.mtime);
+  for (const sound of sounds) {
+    if (totalSize <= MAX_SOUND_CACHE_SIZE) {
+      break;
+    }
+    await Deno.remove(sound.path).catch(() => {});
+    totalSize -= sound.size;
+  }
+}
+
+export async function printSoundCacheStats(): Promise<void> {
+  const sounds = await listSounds();
+  const totalSize = sounds.reduce((sum, s) => sum + s.size, 0);
+
+  const sizeMB = (totalSize / (1024 * 1024)).toFixed(2);
+  const maxMB = (MAX_SOUND_CACHE_SIZE / (1024 * 1024)).toFixed(0);
+
+  print.raw(`Synthesized Sounds:`);
+  print.raw(`  Entries: ${sounds.length}`);
+  print.raw(`  Total Size: ${sizeMB} MB / ${maxMB} MB`);
+}
+
+export async function cleanSoundCache(): Promise<void> {
+  try {
+    await Deno.remove(SOUND_CACHE_DIR, { recursive: true });
+  } catch {
+    //
+  }
+}
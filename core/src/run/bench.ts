@@ -0,0 +1,292 @@
+import { dirname, fromFileUrl, join } from "@std/path";
+import { fail, Failure, failed, InputFailureTag, Result, SystemFailureTag } from "../err.ts";
+import * as print from "../print.ts";
+import { BrowserPool } from "./browser.ts";
+import { buildSimIfNeeded } from "./build_sim.ts";
+import { run } from "./mod.ts";
+
+const benchDir = join(dirname(fromFileUrl(import.meta.url)), "..", "..", "..", "std", "bench");
+
+// Bump when the meaning of the results changes, so old baselines aren't compared
+const BENCH_FORMAT_VERSION = 1;
+
+// Scenarios that measure recording, and are run with --record
+const RECORDED_SCENARIOS = new Set(["record"]);
+
+// Slowdowns smaller than this are noise, however large they are relative to the baseline
+const MIN_REGRESSION_MS = 0.05;
+
+/** One measured case, as logged by `bench` in std/bench.ts. */
+export type BenchResult = {
+  scenario: string;
+  name: string;
+  params: Record<string, number | string>;
+  frames: number;
+  frame_ms: { mean: number; p50: number; p95: number; p99: number; max: number };
+  heap_bytes: number | null;
+  startup_ms: number;
+};
+
+export type BenchRegression = {
+  case: string;
+  metric: "p50" | "p95";
+  baseline_ms: number;
+  current_ms: number;
+  change: number;
+};
+
+/** Everything `physim bench` measured. The keys are snake case for the Python package. */
+export type BenchReport = {
+  version: number;
+  date: string;
+  results: BenchResult[];
+  // Wall time of each scenario, including building and starting it
+  scenarios: Record<string, { wall_ms: number; error?: string }>;
+  regressions?: BenchRegression[];
+};
+
+function caseKey(result: BenchResult): string {
+  const params = Object.keys(result.params)
+    .sort()
+    .map((key) => `${key}=${result.params[key]}`)
+    .join(" ");
+  return params ? `${result.name} ${params}` : result.name;
+}
+
+async function listScenarios(): Promise<string[]> {
+  const names: string[] = [];
+  for await (const entry of Deno.readDir(benchDir)) {
+    if (entry.isFile && entry.name.endsWith(".ts")) {
+      names.push(entry.name.slice(0, -3));
+    }
+  }
+  return names.sort();
+}
+
+async function readBaseline(path: string): Promise<Result<Map<string, BenchResult>>> {
+  let report: BenchReport;
+  try {
+    report = JSON.parse(await Deno.readTextFile(path));
+  } catch (err) {
+    return fail(
+      SystemFailureTag.CantOpenFileFailure,
+      `Can't read benchmark baseline ${path}: ${String(err)}`,
+    );
+  }
+  if (report.version !== BENCH_FORMAT_VERSION || !Array.isArray(report.results)) {
+    return fail(
+      SystemFailureTag.CantOpenFileFailure,
+      `${path} is not a baseline written by this version of physim bench`,
+    );
+  }
+  return new Map(report.results.map((result) => [caseKey(result), result]));
+}
+
+function findRegressions(
+  results: BenchResult[],
+  baseline: Map<string, BenchResult>,
+  threshold: number,
+): BenchRegression[] {
+  const regressions: BenchRegression[] = [];
+  for (const result of results) {
+    const key = caseKey(result);
+    const before = baseline.get(key);
+    if (!before) continue;
+    for (const metric of ["p50", "p95"] as const) {
+      const baselineMs = before.frame_ms[metric];
+      const currentMs = result.frame_ms[metric];
+      if (
+        currentMs - baselineMs > MIN_REGRESSION_MS &&
+        currentMs > baselineMs * (1 + threshold)
+      ) {
+        regressions.push({
+          case: key,
+          metric,
+          baseline_ms: baselineMs,
+          current_ms: currentMs,
+          change: currentMs / Math.max(baselineMs, 0.001) - 1,
+        });
+      }
+    }
+  }
+  return regressions;
+}
+
+// Other logs of a scenario, such as the draw counts of the draw scenario, are ignored
+function parseBenchLog(log: string): BenchResult | undefined {
+  try {
+    const data = JSON.parse(log);
+    if (typeof data === "object" && data !== null && data.type === "bench") {
+      delete data.type;
+      return data;
+    }
+  } catch {
+    // Not JSON
+  }
+  return undefined;
+}
+
+async function runScenario(
+  scenario: string,
+  pool: BrowserPool,
+  results: BenchResult[],
+): Promise<Result<undefined>> {
+  const tempDir = RECORDED_SCENARIOS.has(scenario) ? await Deno.makeTempDir() : undefined;
+  try {
+    return await run(
+      join(benchDir, `${scenario}.ts`),
+      tempDir ? join(tempDir, "bench.mp4") : undefined,
+      {},
+      true,
+      true,
+      true,
+      false,
+      {},
+      true,
+      false,
+      undefined,
+      10,
+      undefined,
+      undefined,
+      undefined,
+      undefined,
+      {
+        pool,
+        onLog: (log) => {
+          const result = parseBenchLog(log);
+          if (result) {
+            results.push({ ...result, scenario });
+          }
+        },
+      },
+    );
+  } finally {
+    if (tempDir) {
+      await Deno.remove(tempDir, { recursive: true }).catch(() => {});
+    }
+  }
+}
+
+function formatMs(ms: number): string {
+  return `${ms.toFixed(2)} ms`;
+}
+
+function printReport(report: BenchReport): void {
+  const regressed = new Map<string, BenchRegression[]>();
+  for (const regression of report.regressions ?? []) {
+    regressed.set(regression.case, [...(regressed.get(regression.case) ?? []), regression]);
+  }
+
+  const keys = report.results.map(caseKey);
+  const width = Math.max(0, ...keys.map((key) => key.length));
+  report.results.forEach((result, i) => {
+    const time = result.frame_ms;
+    let line = `${keys[i]!.padEnd(width)}  p50 ${formatMs(time.p50).padStart(11)}  p95 ${
+      formatMs(time.p95).padStart(11)
+    }  p99 ${formatMs(time.p99).padStart(11)}`;
+    if (result.heap_bytes !== null) {
+      line += `  heap ${(result.heap_bytes / (1024 * 1024)).toFixed(1).padStart(7)} MB`;
+    }
+    for (const regression of regressed.get(keys[i]!) ?? []) {
+      line += `  REGRESSED ${regression.metric} +${(regression.change * 100).toFixed(0)}%`;
+    }
+    print.raw(line);
+  });
+
+  print.raw("");
+  for (const [scenario, { wall_ms, error }] of Object.entries(report.scenarios)) {
+    const status = error ? `failed: ${error.split("\n")[0]}` : "ok";
+    print.raw(`${scenario}: ${(wall_ms / 1000).toFixed(1)}s, ${status}`);
+  }
+}
+
+/**
+ * Runs the benchmark scenarios in std/bench one at a time on a headless browser without
+ * throttling, and reports the frame time percentiles, heap size and startup time of every
+ * case. With a baseline, cases whose p50 or p95 frame time grew by more than `threshold`
+ * are reported as regressions, which fails the run.
+ */
+export async function bench(
+  only: string[] | undefined,
+  out: string | undefined,
+  compare: string | undefined,
+  threshold: number,
+  json: boolean,
+): Promise<Result<undefined>> {
+  const available = await listScenarios();
+  for (const name of only ?? []) {
+    if (!available.includes(name)) {
+      return fail(
+        InputFailureTag.EntryPointNotFoundFailure,
+        `Unknown benchmark scenario: ${name}. Available: ${available.join(", ")}`,
+      );
+    }
+  }
+  const scenarios = only ?? available;
+
+  let baseline: Map<string, BenchResult> | undefined;
+  if (compare !== undefined) {
+    const r = await readBaseline(compare);
+    if (failed(r)) {
+      return r as Failure;
+    }
+    baseline = r as Map<string, BenchResult>;
+  }
+
+  await buildSimIfNeeded({});
+
+  const report: BenchReport = {
+    version: BENCH_FORMAT_VERSION,
+    date: new Date().toISOString(),
+    results: [],
+    scenarios: {},
+  };
+  let firstFailure: Failure | undefined;
+
+  // One page at a time, so scenarios never compete for the CPU
+  const pool = new BrowserPool(1);
+  try {
+    for (const scenario of scenarios) {
+      if (!json) {
+        print.raw(`Running ${scenario}...`);
+      }
+      const start = performance.now();
+      const r = await runScenario(scenario, pool, report.results);
+      report.scenarios[scenario] = { wall_ms: Math.round(performance.now() - start) };
+      if (failed(r)) {
+        const failure = r as Failure;
+        report.scenarios[scenario]!.error = `[${failure.tag}] ${failure.reason}`;
+        firstFailure ??= failure;
+      }
+    }
+  } finally {
+    await pool.close();
+  }
+
+  if (baseline) {
+    report.regressions = findRegressions(report.results, baseline, threshold);
+  }
+
+  if (out !== undefined) {
+    await Deno.writeTextFile(out, JSON.stringify(report, null, 2) + "\n");
+  }
+  if (json) {
+    print.raw(JSON.stringify(report, null, 2));
+  } else {
+    print.raw("");
+    printReport(report);
+  }
+
+  if (firstFailure) {
+    return firstFailure;
+  }
+  if (report.regressions && report.regressions.length > 0) {
+    return fail(
+      InputFailureTag.BenchRegressionFailure,
+      `${report.regressions.length} benchmark result(s) regressed by more than ${
+        (threshold * 100).toFixed(0)
+      }% against ${compare}`,
+    );
+  }
+  return undefined as unknown as Result<undefined>;
+}
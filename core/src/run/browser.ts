@@ -0,0 +1,160 @@
+import { fail, failed, Result, SystemFailureTag } from "../err.ts";
+import * as print from "../print.ts";
+
+const MAX_LAUNCH_RETRIES = 3;
+const LAUNCH_BASE_DELAY_MS = 1000;
+
+/**
+ * A shared headless Chromium instance handing out up to `size` pages at once.
+ * Every page lives in its own browser context, so concurrent simulations
+ * don't share storage, caches or service workers.
+ */
+export class BrowserPool {
+  private browser: any | undefined;
+  private launching: Promise<Result<any>> | undefined;
+  private idle: any[] = [];
+  private waiting: ((page: Result<any>) => void)[] = [];
+  private open = 0;
+  private closed = false;
+
+  constructor(private size: number) {}
+
+  private async launch(attempt = 1): Promise<Result<any>> {
+    try {
+      // @ts-ignore: Playwright might not be in the type system but is available via npm:
+      const { chromium } = await import("npm:playwright");
+      const browser = await chromium.launch({ headless: true });
+      browser.on("disconnected", () => {
+        if (this.browser === browser) {
+          this.browser = undefined;
+          this.open -= this.idle.length;
+          this.idle = [];
+        }
+      });
+      return browser;
+    } catch (err) {
+      if (attempt >= MAX_LAUNCH_RETRIES) {
+        return fail(
+          SystemFailureTag.OpenFailure,
+          `Failed to launch headless browser after ${MAX_LAUNCH_RETRIES} attempts (Playwright): ${
+            String(err)
+          }`,
+        );
+      }
+      const delay = LAUNCH_BASE_DELAY_MS * Math.pow(2, attempt - 1);
+      if (!print.isRawModeEnabled()) {
+        print.warn(`Browser launch attempt ${attempt} failed: ${String(err)}`);
+        print.warn(`Retrying in ${delay}ms (attempt ${attempt + 1}/${MAX_LAUNCH_RETRIES})...`);
+      }
+      await new Promise((resolve) => setTimeout(resolve, delay));
+      return this.launch(attempt + 1);
+    }
+  }
+
+  private async getBrowser(): Promise<Result<any>> {
+    if (this.browser) return this.browser;
+    if (!this.launching) {
+      this.launching = this.launch().then((r) => {
+        this.launching = undefined;
+        if (!failed(r)) {
+          this.browser = r;
+        }
+        return r;
+      });
+    }
+    return await this.launching;
+  }
+
+  private async newPage(): Promise<Result<any>> {
+    const browser = await this.getBrowser();
+    if (failed(browser)) return browser;
+
+    try {
+      const context = await browser.newContext();
+      const page = await context.newPage();
+
+      page.on("console", (msg: any) => {
+        if (!print.isRawModeEnabled()) {
+          console.log(`[Browser Console] ${msg.text()}`);
+        }
+      });
+
+      page.on("pageerror", (err: any) => {
+        if (!print.isRawModeEnabled()) {
+          console.error(`[Browser Error] ${err.message}`);
+        }
+      });
+
+      return page;
+    } catch (err) {
+      return fail(SystemFailureTag.OpenFailure, `Failed to open browser page: ${String(err)}`);
+    }
+  }
+
+  /** Waits for a free page, opening a new one while the pool is below its size. */
+  async acquire(): Promise<Result<any>> {
+    const page = this.idle.pop();
+    if (page) return page;
+
+    if (this.open >= this.size) {
+      return await new Promise((resolve) => this.waiting.push(resolve));
+    }
+
+    this.open++;
+    const r = await this.newPage();
+    if (failed(r)) {
+      this.open--;
+    }
+    return r;
+  }
+
+  /** Hands a page back to the pool after navigating it away from the simulation. */
+  async release(page: any): Promise<void> {
+    try {
+      await page.goto("about:blank");
+    } catch {
+      await this.discard(page);
+      return;
+    }
+
+    const next = this.waiting.shift();
+    if (next) {
+      next(page);
+    } else {
+      this.idle.push(page);
+    }
+  }
+
+  /** Closes a broken page and frees its slot for the next waiter. */
+  async discard(page: any): Promise<void> {
+    try {
+      await page.context().close();
+    } catch {}
+    this.open--;
+
+    const next = this.waiting.shift();
+    if (next) {
+      this.open++;
+      const r = await this.newPage();
+      if (failed(r)) {
+        this.open--;
+      }
+      next(r);
+    }
+  }
+
+  async close(): Promise<void> {
+    if (this.closed) return;
+    this.closed = true;
+    this.idle = [];
+    if (this.launching) {
+      await this.launching;
+    }
+    if (this.browser) {
+      try {
+        await this.browser.close();
+      } catch {}
+      this.browser = undefined;
+    }
+  }
+}
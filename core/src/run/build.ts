@@ -1,7 +1,9 @@
 import esbuild from "esbuild";
-import { dirname, fromFileUrl, join } from "@std/path";
-import { typeCheck } from "./tsc.ts";
-import { fail, failed, InputFailureTag, Result } from "../err.ts";
+import { dirname, fromFileUrl, join, resolve } from "@std/path";
+import { listTypeCheckFiles, typeCheck } from "./tsc.ts";
+import { Failure, failed, Result } from "../err.ts";
+import { createStagingDir, hashInputs, lookupBuild, storeBuild } from "./build_cache.ts";
+import { hashBytes } from "../hash.ts";
 const scriptDir = dirname(fromFileUrl(import.meta.url));
 
 const aliasPlugin = {
@@ -25,12 +27,15 @@ const aliasPlugin = {
   },
 };
 
-function createProfilingPlugin(profiling: boolean) {
+// Also records the hash of every source as it was read, which is what the bundle is built from
+function createProfilingPlugin(profiling: boolean, loaded: Map<string, string>) {
   return {
     name: "profiling-transform",
     setup(build: any) {
       build.onLoad({ filter: /\.[jt]sx?$/ }, async (args: any) => {
-        let contents = await Deno.readTextFile(args.path);
+        const bytes = await Deno.readFile(args.path);
+        loaded.set(resolve(args.path), await hashBytes(bytes));
+        let contents = new TextDecoder().decode(bytes);
         contents = transformProfilingComments(contents, profiling);
         return { contents, loader: args.path.endsWith(".ts") ? "ts" : "js" };
       });
@@ -38,27 +43,77 @@ function createProfilingPlugin(profiling: boolean) {
   };
 }
 
-export async function buildSimulation(
+// Builds in progress, so concurrent runs of one simulation in a host build it once
+const inFlight = new Map<string, Promise<Result<string>>>();
+
+/**
+ * Type checks and bundles a simulation, returning the path of the bundle.
+ * Both steps are skipped when a cached build of the same sources exists, and concurrent
+ * calls for the same simulation share one build.
+ */
+export function buildSimulation(
   entrypoint: string,
-  outfile: string,
   profiling: boolean,
-): Promise<Result<undefined>> {
-  const check = await typeCheck(entrypoint);
+): Promise<Result<string>> {
+  const resolved = resolve(entrypoint);
+  const key = `${resolved}\0${profiling}`;
+  let pending = inFlight.get(key);
+  if (!pending) {
+    pending = build(resolved, profiling).finally(() => inFlight.delete(key));
+    inFlight.set(key, pending);
+  }
+  return pending;
+}
+
+async function build(resolved: string, profiling: boolean): Promise<Result<string>> {
+  const cached = await lookupBuild(resolved, profiling);
+  if (cached) {
+    return cached;
+  }
+
+  // Hashed before checking and bundling, so a file edited in the meantime misses the cache
+  // on the next run instead of being recorded as built. The files come from tsc, as esbuild
+  // never reads type-only imports and declaration files.
+  const checked = await listTypeCheckFiles(resolved) ?? [];
+  const inputs = await hashInputs([...checked, join(dirname(resolved), "tsconfig.json")]);
+
+  const check = await typeCheck(resolved);
   if (failed(check)) {
-    return check;
+    return check as Failure;
+  }
+
+  const stagingDir = await createStagingDir();
+  const loaded = new Map<string, string>();
+  let bundled: string[];
+  try {
+    const result = await esbuild.build({
+      entryPoints: [resolved],
+      bundle: true,
+      outfile: join(stagingDir, "out.js"),
+      platform: "browser",
+      format: "esm",
+      sourcemap: true,
+      treeShaking: true,
+      minify: false,
+      metafile: true,
+      plugins: [aliasPlugin, createProfilingPlugin(profiling, loaded)],
+    });
+    bundled = Object.keys(result.metafile?.inputs ?? {})
+      .filter((path) => !path.includes(":"))
+      .map((path) => resolve(path));
+  } catch (err) {
+    await Deno.remove(stagingDir, { recursive: true }).catch(() => {});
+    throw err;
+  }
+
+  // Files only esbuild read, such as plain JavaScript, are keyed by what it bundled
+  for (const [path, hash] of loaded) {
+    inputs[path] ??= hash;
   }
+  const unhashed = bundled.filter((path) => !(path in inputs));
+  Object.assign(inputs, await hashInputs(unhashed));
 
-  await esbuild.build({
-    entryPoints: [entrypoint],
-    bundle: true,
-    outfile,
-    platform: "browser",
-    format: "esm",
-    sourcemap: true,
-    treeShaking: true,
-    minify: false,
-    plugins: [aliasPlugin, createProfilingPlugin(profiling)],
-  });
+  return await storeBuild(resolved, profiling, stagingDir, inputs);
 }
 
 function transformProfilingComments(code: string, enabled: boolean): string {
@@ -0,0 +1,207 @@
+import { join } from "@std/path";
+import { ensureDir } from "@std/fs";
+import { CACHE_DIR } from "../paths.ts";
+import { hashFile, hashString } from "../hash.ts";
+import * as print from "../print.ts";
+
+// Bump when the way bundles are produced changes, so old entries stop matching
+const BUILD_CACHE_VERSION = 2;
+
+const BUILD_CACHE_DIR = join(CACHE_DIR, "builds");
+const INDEX_PATH = join(BUILD_CACHE_DIR, "index.json");
+const MAX_BUILD_CACHE_SIZE = 100 * 1024 * 1024;
+
+interface BuildEntry {
+  size: number;
+  lastAccess: number;
+}
+
+interface EntrypointRecord {
+  key: string;
+  inputs: Record<string, string>;
+}
+
+interface BuildIndex {
+  builds: Record<string, BuildEntry>;
+  entrypoints: Record<string, EntrypointRecord>;
+}
+
+function entrypointKey(entrypoint: string, profiling: boolean): string {
+  return `${entrypoint}|${profiling ? "profiling" : "plain"}`;
+}
+
+function buildDir(key: string): string {
+  return join(BUILD_CACHE_DIR, key);
+}
+
+async function loadBuildIndex(): Promise<BuildIndex> {
+  try {
+    const index = JSON.parse(await Deno.readTextFile(INDEX_PATH));
+    return { builds: index.builds ?? {}, entrypoints: index.entrypoints ?? {} };
+  } catch {
+    return { builds: {}, entrypoints: {} };
+  }
+}
+
+async function saveBuildIndex(index: BuildIndex): Promise<void> {
+  await ensureDir(BUILD_CACHE_DIR);
+  // Write then rename, so concurrent runs never read a half written index
+  const tmp = `${INDEX_PATH}.${crypto.randomUUID()}.tmp`;
+  await Deno.writeTextFile(tmp, JSON.stringify(index));
+  await Deno.rename(tmp, INDEX_PATH);
+}
+
+async function exists(path: string): Promise<boolean> {
+  try {
+    await Deno.stat(path);
+    return true;
+  } catch {
+    return false;
+  }
+}
+
+/**
+ * Returns the cached bundle for an entrypoint if none of the files it was built from
+ * changed since, meaning it was type checked and bundled from the exact same sources.
+ */
+export async function lookupBuild(
+  entrypoint: string,
+  profiling: boolean,
+): Promise<string | undefined> {
+  const index = await loadBuildIndex();
+  const record = index.entrypoints[entrypointKey(entrypoint, profiling)];
+  if (!record || !index.builds[record.key]) {
+    return undefined;
+  }
+
+  const hashes = await Promise.all(Object.keys(record.inputs).map((path) => hashFile(path)));
+  const unchanged = Object.values(record.inputs).every((hash, i) => hashes[i] === hash);
+  if (!unchanged) {
+    return undefined;
+  }
+
+  const bundle = join(buildDir(record.key), "out.js");
+  if (!(await exists(bundle)) || !(await exists(bundle + ".map"))) {
+    return undefined;
+  }
+
+  index.builds[record.key]!.lastAccess = Date.now();
+  await saveBuildIndex(index);
+  return bundle;
+}
+
+/** Creates a directory next to the cached builds for esbuild to write into. */
+export async function createStagingDir(): Promise<string> {
+  await ensureDir(BUILD_CACHE_DIR);
+  return await Deno.makeTempDir({ dir: BUILD_CACHE_DIR, prefix: "staging-" });
+}
+
+/** Hashes the contents of files, leaving out those that can't be read. */
+export async function hashInputs(paths: string[]): Promise<Record<string, string>> {
+  const unique = [...new Set(paths)];
+  const hashes = await Promise.all(unique.map((path) => hashFile(path)));
+  const inputs: Record<string, string> = {};
+  unique.forEach((path, i) => {
+    if (hashes[i] !== undefined) {
+      inputs[path] = hashes[i]!;
+    }
+  });
+  return inputs;
+}
+
+/**
+ * Moves a finished build into the cache under a key derived from the hashes of its
+ * inputs, taken before it was built, and returns the path of the cached bundle. The
+ * staging directory sits at the same depth as the cached builds, so relative source
+ * map paths stay valid.
+ */
+export async function storeBuild(
+  entrypoint: string,
+  profiling: boolean,
+  stagingDir: string,
+  inputHashes: Record<string, string>,
+): Promise<string> {
+  const inputs: Record<string, string> = {};
+  for (const path of Object.keys(inputHashes).sort()) {
+    inputs[path] = inputHashes[path]!;
+  }
+
+  const key = await hashString(
+    JSON.stringify({ version: BUILD_CACHE_VERSION, profiling, inputs }),
+  );
+  const dir = buildDir(key);
+
+  if (await exists(dir)) {
+    await Deno.remove(stagingDir, { recursive: true });
+  } else {
+    try {
+      await Deno.rename(stagingDir, dir);
+    } catch {
+      // Another run stored the same build first
+      await Deno.remove(stagingDir, { recursive: true }).catch(() => {});
+    }
+  }
+
+  let size = 0;
+  for await (const entry of Deno.readDir(dir)) {
+    if (entry.isFile) {
+      size += (await Deno.stat(join(dir, entry.name))).size;
+    }
+  }
+
+  const index = await loadBuildIndex();
+  index.builds[key] = { size, lastAccess: Date.now() };
+  index.entrypoints[entrypointKey(entrypoint, profiling)] = { key, inputs };
+  await evictBuilds(index);
+  await saveBuildIndex(index);
+
+  return join(dir, "out.js");
+}
+
+async function evictBuilds(index: BuildIndex): Promise<void> {
+  let totalSize = Object.values(index.builds).reduce((sum, b) => sum + b.size, 0);
+  if (totalSize <= MAX_BUILD_CACHE_SIZE) {
+    return;
+  }
+
+  const sorted = Object.entries(index.builds).sort(
+    (a, b) => a[1].lastAccess - b[1].lastAccess,
+  );
+
+  for (const [key, build] of sorted) {
+    if (totalSize <= MAX_BUILD_CACHE_SIZE) {
+      break;
+    }
+    await Deno.remove(buildDir(key), { recursive: true }).catch(() => {});
+    delete index.builds[key];
+    totalSize -= build.size;
+  }
+
+  for (const [name, record] of Object.entries(index.entrypoints)) {
+    if (!index.builds[record.key]) {
+      delete index.entrypoints[name];
+    }
+  }
+}
+
+export async function printBuildCacheStats(): Promise<void> {
+  const index = await loadBuildIndex();
+  const builds = Object.values(index.builds);
+  const totalSize = builds.reduce((sum, b) => sum + b.size, 0);
+
+  const sizeMB = (totalSize / (1024 * 1024)).toFixed(2);
+  const maxMB = (MAX_BUILD_CACHE_SIZE / (1024 * 1024)).toFixed(0);
+
+  print.raw(`Simulation Builds:`);
+  print.raw(`  Entries: ${builds.length}`);
+  print.raw(`  Entrypoints: ${Object.keys(index.entrypoints).length}`);
+  print.raw(`  Total Size: ${sizeMB} MB / ${maxMB} MB`);
+}
+
+export async function cleanBuildCache(): Promise<void> {
+  try {
+    await Deno.remove(BUILD_CACHE_DIR, { recursive: true });
+  } catch {
+    //
+  }
+}
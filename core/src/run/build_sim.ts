@@ -1,21 +1,18 @@
 import esbuild from "esbuild";
-import { dirname, fromFileUrl, join } from "@std/path";
+import { dirname, fromFileUrl, join, resolve } from "@std/path";
 import { ensureDir } from "@std/fs";
 import { CACHE_DIR } from "../paths.ts";
+import { hashBytes, hashFile, hashString } from "../hash.ts";
+import * as print from "../print.ts";
 
 const OUT_FILE = join(CACHE_DIR, "sim.js");
 
 interface CacheManifest {
-  hash: string;
-  sources: Record<string, number>;
+  optionsHash: string;
+  inputs: Record<string, string>;
   timestamp: number;
 }
 
-interface SourceInfo {
-  path: string;
-  mtimeMs: number;
-}
-
 interface BuildOptions {
   profiling?: boolean;
   record?: boolean;
@@ -31,45 +28,14 @@ function getManifestPath(): string {
   return join(CACHE_DIR, "sim_build_manifest.json");
 }
 
-async function getSourceFiles(): Promise<SourceInfo[]> {
-  const simDir = getSimDir();
-  const sources: SourceInfo[] = [];
-
-  for await (const entry of Deno.readDir(simDir)) {
-    if (
-      entry.isFile &&
-      (entry.name.endsWith(".ts") || entry.name.endsWith(".js"))
-    ) {
-      const fullPath = join(simDir, entry.name);
-      const stat = await Deno.stat(fullPath);
-      sources.push({
-        path: fullPath,
-        mtimeMs: stat.mtime?.getSeconds() ?? 0,
-      });
-    }
-  }
-
-  return sources;
-}
-
-async function computeHash(
-  sources: SourceInfo[],
-  options: BuildOptions,
-): Promise<string> {
-  const data =
-    sources.map((s) => `${s.path}:${s.mtimeMs}`).join("|") +
-    "|" +
-    JSON.stringify(options);
-  const encoded = new TextEncoder().encode(data);
-  const hashBuffer = await crypto.subtle.digest("SHA-256", encoded);
-  const hashArray = Array.from(new Uint8Array(hashBuffer));
-  return hashArray.map((b) => b.toString(16).padStart(2, "0")).join("");
-}
-
 async function loadCacheManifest(): Promise<CacheManifest | null> {
   try {
     const data = await Deno.readTextFile(getManifestPath());
-    return JSON.parse(data) as CacheManifest;
+    const manifest = JSON.parse(data);
+    if (typeof manifest.optionsHash !== "string" || typeof manifest.inputs !== "object") {
+      return null;
+    }
+    return manifest as CacheManifest;
   } catch {
     return null;
   }
@@ -82,11 +48,49 @@ async function saveCacheManifest(manifest: CacheManifest): Promise<void> {
   );
 }
 
-async function buildSimBundle(_options: BuildOptions): Promise<void> {
+async function isUpToDate(manifest: CacheManifest, optionsHash: string): Promise<boolean> {
+  if (manifest.optionsHash !== optionsHash) {
+    return false;
+  }
+  try {
+    await Deno.stat(OUT_FILE);
+  } catch {
+    return false;
+  }
+
+  const paths = Object.keys(manifest.inputs);
+  if (paths.length === 0) {
+    return false;
+  }
+  const hashes = await Promise.all(paths.map((path) => hashFile(path)));
+  return paths.every((path, i) => hashes[i] === manifest.inputs[path]);
+}
+
+// Hashes every source as esbuild reads it, so the manifest records exactly what was bundled
+// even if a file is edited while the build runs
+function createInputHashPlugin(inputs: Record<string, string>) {
+  return {
+    name: "input-hash",
+    setup(build: any) {
+      build.onLoad({ filter: /\.[jt]sx?$/ }, async (args: any) => {
+        const bytes = await Deno.readFile(args.path);
+        inputs[resolve(args.path)] = await hashBytes(bytes);
+        return {
+          contents: new TextDecoder().decode(bytes),
+          loader: args.path.endsWith(".ts") ? "ts" : "js",
+        };
+      });
+    },
+  };
+}
+
+// Returns the hashes of every file that ended up in the bundle, as they were bundled
+async function buildSimBundle(_options: BuildOptions): Promise<Record<string, string>> {
   const simDir = getSimDir();
   const mainPath = join(simDir, "main.ts");
+  const inputs: Record<string, string> = {};
 
-  await esbuild.build({
+  const result = await esbuild.build({
     entryPoints: [mainPath],
     bundle: true,
     outfile: OUT_FILE,
@@ -94,34 +98,42 @@ async function buildSimBundle(_options: BuildOptions): Promise<void> {
     format: "esm",
     sourcemap: true,
     minify: false,
+    metafile: true,
     logLevel: "silent",
+    plugins: [createInputHashPlugin(inputs)],
   });
+
+  // Anything not loaded by the plugin is hashed now
+  const paths = Object.keys(result.metafile?.inputs ?? {})
+    .filter((path) => !path.includes(":"))
+    .map((path) => resolve(path));
+  for (const path of paths) {
+    if (!(path in inputs)) {
+      const hash = await hashFile(path);
+      if (hash !== undefined) {
+        inputs[path] = hash;
+      }
+    }
+  }
+  return inputs;
 }
 
 export async function buildSimIfNeeded(
   options: BuildOptions = {},
 ): Promise<boolean> {
   await ensureDir(CACHE_DIR);
-  const sources = await getSourceFiles();
-
-  if (sources.length === 0) {
-    return false;
-  }
-
-  const hash = await computeHash(sources, options);
+  const optionsHash = await hashString(JSON.stringify(options));
   const cache = await loadCacheManifest();
 
-  const sourceMap = Object.fromEntries(sources.map((s) => [s.path, s.mtimeMs]));
-
-  if (cache && cache.hash === hash) {
+  if (cache && (await isUpToDate(cache, optionsHash))) {
     return false;
   }
 
-  await buildSimBundle(options);
+  const inputs = await buildSimBundle(options);
 
   const manifest: CacheManifest = {
-    hash,
-    sources: sourceMap,
+    optionsHash,
+    inputs,
     timestamp: Date.now(),
   };
   await saveCacheManifest(manifest);
@@ -129,6 +141,25 @@ export async function buildSimIfNeeded(
   return true;
 }
 
+export async function printSimCacheStats(): Promise<void> {
+  const manifest = await loadCacheManifest();
+  let size = 0;
+  try {
+    size = (await Deno.stat(OUT_FILE)).size + (await Deno.stat(OUT_FILE + ".map")).size;
+  } catch {
+    //
+  }
+
+  print.raw(`Runtime Bundle:`);
+  if (!manifest || size === 0) {
+    print.raw(`  Not built`);
+    return;
+  }
+  print.raw(`  Sources: ${Object.keys(manifest.inputs).length}`);
+  print.raw(`  Size: ${(size / (1024 * 1024)).toFixed(2)} MB`);
+  print.raw(`  Built: ${new Date(manifest.timestamp).toISOString()}`);
+}
+
 export async function cleanSimCache(): Promise<void> {
   try {
     await Deno.remove(OUT_FILE);
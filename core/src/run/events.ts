@@ -0,0 +1,12 @@
+import { ProfileSummary } from "./profile.ts";
+
+/**
+ * Something that happened during a run. With `physim run --stream`, and for host
+ * requests with `stream` set, every event is written as one line of JSON as soon as it
+ * happens instead of the logs being collected until the run ends.
+ */
+export type RunEvent =
+  | { event: "log"; text: string }
+  | { event: "frame"; frame: number }
+  | { event: "error"; tag: string; reason: string }
+  | { event: "profile"; summary: ProfileSummary };
@@ -0,0 +1,227 @@
+import { resolve } from "@std/path";
+import { exitCode, Failure, failed, Result } from "../err.ts";
+import * as print from "../print.ts";
+import { BrowserPool } from "./browser.ts";
+import { buildSimIfNeeded } from "./build_sim.ts";
+import { RunEvent } from "./events.ts";
+import { run } from "./mod.ts";
+
+/** One simulation run, sent by a client as a single line of JSON. */
+export type HostRequest = {
+  entrypoint: string;
+  raw?: boolean;
+  record?: string;
+  recordPreset?: string;
+  recordThreads?: number;
+  noAudio?: boolean;
+  profiling?: boolean;
+  profileOut?: string;
+  profileSummaryOut?: string;
+  noThrottle?: boolean;
+  computeOnly?: boolean;
+  drawEvery?: number;
+  maxTraceback?: number;
+  errorOnTime?: number;
+  errorOnFrameTime?: number;
+  errorOnFinishBefore?: number;
+  /** Read by the simulation as `sim.params`. */
+  params?: Record<string, unknown>;
+  /**
+   * Write every event to the connection as a line of JSON while the simulation runs,
+   * before the response. Logs are then not collected into the response's stdout.
+   */
+  stream?: boolean;
+};
+
+/** Mirrors what `physim run` would have exited and printed for the same request. */
+export type HostResponse = {
+  exit_code: number;
+  stdout: string;
+  stderr: string;
+};
+
+const EX_SOFTWARE = 70;
+
+// Events waiting to be written to a streaming client, past which frame events are
+// coalesced
+const MAX_QUEUED_EVENTS = 256;
+
+async function readLine(conn: Deno.Conn): Promise<string | undefined> {
+  const decoder = new TextDecoder();
+  const buf = new Uint8Array(4096);
+  let line = "";
+
+  while (true) {
+    const n = await conn.read(buf);
+    if (n === null) {
+      return line.length > 0 ? line : undefined;
+    }
+    line += decoder.decode(buf.subarray(0, n), { stream: true });
+    const newline = line.indexOf("\n");
+    if (newline !== -1) {
+      return line.slice(0, newline);
+    }
+  }
+}
+
+async function writeLine(conn: Deno.Conn, data: object): Promise<void> {
+  const bytes = new TextEncoder().encode(JSON.stringify(data) + "\n");
+  let written = 0;
+  while (written < bytes.length) {
+    written += await conn.write(bytes.subarray(written));
+  }
+}
+
+async function runRequest(
+  request: HostRequest,
+  pool: BrowserPool,
+  onEvent?: (event: RunEvent) => void,
+): Promise<HostResponse> {
+  const logs: string[] = [];
+  let result: Result<undefined>;
+
+  try {
+    result = await run(
+      resolve(request.entrypoint),
+      request.record,
+      { preset: request.recordPreset, threads: request.recordThreads },
+      true,
+      true,
+      request.noAudio ?? false,
+      (request.profiling ?? false) || request.profileOut !== undefined,
+      { out: request.profileOut, summaryOut: request.profileSummaryOut },
+      request.noThrottle ?? false,
+      request.computeOnly ?? false,
+      request.drawEvery,
+      request.maxTraceback ?? 10,
+      request.errorOnTime,
+      request.errorOnFrameTime,
+      request.errorOnFinishBefore,
+      request.params,
+      {
+        pool,
+        onLog: (log) => {
+          if (!onEvent) logs.push(request.raw ? log : `[LOG] ${log}`);
+        },
+        onEvent,
+      },
+    );
+  } catch (err) {
+    const reason = err instanceof Error ? err.message : String(err);
+    onEvent?.({ event: "error", tag: "UNEXPECTED", reason });
+    return {
+      exit_code: EX_SOFTWARE,
+      stdout: "",
+      stderr: `[UNEXPECTED] ${reason}\n`,
+    };
+  }
+
+  const stdout = logs.map((log) => `${log}\n`).join("");
+  if (failed(result)) {
+    const failure = result as Failure;
+    onEvent?.({ event: "error", tag: failure.tag, reason: failure.reason });
+    return {
+      exit_code: exitCode(failure),
+      stdout,
+      stderr: `[${failure.tag}] ${failure.reason}\n`,
+    };
+  }
+  return { exit_code: 0, stdout, stderr: "" };
+}
+
+async function handleConnection(conn: Deno.Conn, pool: BrowserPool): Promise<void> {
+  try {
+    const line = await readLine(conn);
+    if (line === undefined) return;
+
+    // Events are written strictly in order, and all of them before the response. A
+    // failed write means the client went away, so the rest are dropped.
+    const queue: RunEvent[] = [];
+    let writing: Promise<void> | undefined;
+    let clientGone = false;
+    const drain = async () => {
+      while (queue.length > 0 && !clientGone) {
+        try {
+          await writeLine(conn, queue.shift()!);
+        } catch {
+          clientGone = true;
+        }
+      }
+      queue.length = 0;
+      writing = undefined;
+    };
+    const onEvent = (event: RunEvent) => {
+      if (clientGone) return;
+      if (queue.length >= MAX_QUEUED_EVENTS && event.event === "frame") {
+        // The client reads slower than the simulation runs. Only the newest frame
+        // matters to it, while logs and errors are kept since they are its output.
+        if (queue[queue.length - 1]?.event === "frame") {
+          queue[queue.length - 1] = event;
+        }
+        return;
+      }
+      queue.push(event);
+      writing ??= drain();
+    };
+
+    let response: HostResponse;
+    try {
+      const request: HostRequest = JSON.parse(line);
+      response = await runRequest(request, pool, request.stream ? onEvent : undefined);
+    } catch (err) {
+      response = {
+        exit_code: EX_SOFTWARE,
+        stdout: "",
+        stderr: `[UNEXPECTED] Invalid host request: ${String(err)}\n`,
+      };
+    }
+
+    await writing;
+    if (clientGone) return;
+    await writeLine(conn, response);
+  } catch {
+    // The client went away, nothing left to report to
+  } finally {
+    try {
+      conn.close();
+    } catch {}
+  }
+}
+
+/**
+ * Keeps one headless browser warm and runs simulations sent over a local TCP socket,
+ * so callers don't pay for Deno startup and a browser launch on every run.
+ * Prints `{"port": n}` once listening and shuts down when stdin is closed.
+ */
+export async function host(port: number, pages: number): Promise<Result<undefined>> {
+  await buildSimIfNeeded({});
+
+  const pool = new BrowserPool(pages);
+  const listener = Deno.listen({ hostname: "127.0.0.1", port });
+  print.raw(JSON.stringify({ port: (listener.addr as Deno.NetAddr).port }));
+
+  (async () => {
+    const buf = new Uint8Array(1024);
+    while (true) {
+      try {
+        if ((await Deno.stdin.read(buf)) === null) break;
+      } catch {
+        break;
+      }
+    }
+    try {
+      listener.close();
+    } catch {}
+  })();
+
+  try {
+    for await (const conn of listener) {
+      handleConnection(conn, pool);
+    }
+  } catch {
+    // Listener closed
+  }
+
+  await pool.close();
+  return undefined as unknown as Result<undefined>;
+}
@@ -2,25 +2,57 @@ import { dirname } from '@std/path';
 import { buildSimulation } from './build.ts';
 import { buildSimIfNeeded } from './build_sim.ts';
 import { failed, Failure, Result } from '../err.ts';
-import { runServer } from './serve.ts';
-import { AssetManager } from './assets.ts';
+import { HostContext, RecordOptions, runServer } from './serve.ts';
+import { ProfileOptions } from './profile.ts';
+import { AssetManager, findFetchAssets } from './assets.ts';
 import { AudioPlayer } from './audio/mod.ts';
 import { fail, InputFailureTag } from '../err.ts';
 import * as print from '../print.ts';
 
+/** What a run passes to the simulation as `sim.params`. */
+export type SimParams = Record<string, unknown>;
+
+function isSimParams(value: unknown): value is SimParams {
+  return typeof value === 'object' && value !== null && !Array.isArray(value);
+}
+
+/** Parses the JSON given to `physim run --params`. */
+export function parseParams(json: string): Result<SimParams> {
+  let params: unknown;
+  try {
+    params = JSON.parse(json);
+  } catch (err) {
+    return fail(InputFailureTag.ParamsFailure, `Params are not valid JSON: ${String(err)}`);
+  }
+  if (!isSimParams(params)) {
+    return fail(InputFailureTag.ParamsFailure, `Params must be a JSON object, got: ${json}`);
+  }
+  return params;
+}
+
 export async function run(
   entrypoint: string,
   record: string | undefined,
+  recordOptions: RecordOptions,
   useClient: boolean,
   headless: boolean,
   noAudio: boolean,
   profiling: boolean,
+  profileOptions: ProfileOptions,
   noThrottle: boolean,
+  computeOnly: boolean,
+  drawEvery: number | undefined,
   maxTraceback: number,
   errorOnTime: number | undefined,
   errorOnFrameTime: number | undefined,
   errorOnFinishBefore: number | undefined,
+  params: SimParams | undefined,
+  hostContext?: HostContext,
 ): Promise<Result<undefined>> {
+  if (params !== undefined && !isSimParams(params)) {
+    return fail(InputFailureTag.ParamsFailure, 'Params must be an object');
+  }
+
   try {
     if (!(await Deno.stat(entrypoint)).isFile) {
       return fail(
@@ -37,16 +69,16 @@ export async function run(
 
   await buildSimIfNeeded({});
 
-  const tempDirName = await Deno.makeTempDir();
-  const outfile = `${tempDirName}/out.js`;
-
-  const r = await buildSimulation(entrypoint, outfile, profiling);
-  if (r) {
-    Deno.remove(tempDirName, { recursive: true });
-    return r;
+  const bundle = await buildSimulation(entrypoint, profiling);
+  if (failed(bundle)) {
+    return bundle as Failure;
   }
 
+  const tempDirName = await Deno.makeTempDir();
+
   const assetManager = new AssetManager(dirname(entrypoint), tempDirName);
+  // Downloads run while the browser starts, instead of one at a time as the simulation asks
+  assetManager.prefetch(findFetchAssets(await Deno.readTextFile(bundle as string)));
   const playAudio = !noAudio;
   const audioEnabled = playAudio || record !== undefined;
   const audioPlayer = new AudioPlayer(
@@ -57,20 +89,28 @@ export async function run(
   );
 
   const runResult = await runServer(
-    outfile,
+    bundle as string,
     record,
+    recordOptions,
     assetManager,
     audioPlayer,
     useClient,
     headless,
     profiling,
+    profileOptions,
     noThrottle,
+    computeOnly,
+    drawEvery,
     maxTraceback,
     dirname(entrypoint),
     errorOnTime,
     errorOnFrameTime,
     errorOnFinishBefore,
+    params,
+    hostContext,
   );
+  // The host process runs many simulations, so their decoded sounds must not pile up
+  audioPlayer.releaseSounds();
 
   if (failed(runResult)) {
     Deno.remove(tempDirName, { recursive: true });
@@ -0,0 +1,219 @@
+import { fail, Result, SystemFailureTag } from "../err.ts";
+
+/** Where a profiled run writes its results. */
+export type ProfileOptions = {
+  /** Path of a Chrome trace of every sample, viewable in Perfetto or speedscope. */
+  out?: string;
+  /** Path of a JSON file with the summary of the run. */
+  summaryOut?: string;
+};
+
+export type RegionSummary = {
+  calls: number;
+  total_ms: number;
+  mean_ms: number;
+  max_ms: number;
+};
+
+/**
+ * Frame time percentiles and per region totals of a profiled run. The keys are snake
+ * case, since the summary is read by the Python package.
+ */
+export type ProfileSummary = {
+  frames: number;
+  frame_time_ms: { mean: number; p50: number; p95: number; p99: number; max: number };
+  regions: Record<string, RegionSummary>;
+  // Samples and frames the runtime overwrote before it could send them
+  dropped_samples: number;
+  trace_path: string | null;
+};
+
+// Matches ProfileChunk in core/sim/profiling.ts
+type ProfileChunk = {
+  names: string[];
+  samples: number[];
+  frames: number[];
+  dropped: number;
+};
+
+const PID = 1;
+const TID_FRAMES = 1;
+const TID_MAIN = 2;
+const TID_ASYNC = 3;
+
+const encoder = new TextEncoder();
+
+function writeAllSync(file: Deno.FsFile, text: string): void {
+  const data = encoder.encode(text);
+  let written = 0;
+  while (written < data.length) {
+    written += file.writeSync(data.subarray(written));
+  }
+}
+
+function percentile(sorted: Float64Array, p: number): number {
+  if (sorted.length === 0) return 0;
+  const rank = Math.ceil((p / 100) * sorted.length) - 1;
+  return sorted[Math.min(sorted.length - 1, Math.max(0, rank))]!;
+}
+
+function round(ms: number): number {
+  return Math.round(ms * 1000) / 1000;
+}
+
+function threadName(tid: number, name: string): string {
+  return JSON.stringify({ name: "thread_name", ph: "M", pid: PID, tid, args: { name } });
+}
+
+/**
+ * Collects the profiling samples a run sends on /profile. Samples are appended to the
+ * trace file as they arrive, so only the frame times and per region totals are kept in
+ * memory.
+ */
+export class ProfileRecorder {
+  private names: string[] = [];
+  private regions = new Map<string, RegionSummary>();
+  private frameTimes = new Float64Array(1024);
+  private frameCount = 0;
+  private dropped = 0;
+
+  private constructor(private trace: Deno.FsFile | undefined, private tracePath?: string) {}
+
+  static create(tracePath: string | undefined): Result<ProfileRecorder> {
+    if (tracePath === undefined) {
+      return new ProfileRecorder(undefined);
+    }
+    let trace: Deno.FsFile;
+    try {
+      trace = Deno.openSync(tracePath, { write: true, create: true, truncate: true });
+    } catch (err) {
+      return fail(
+        SystemFailureTag.CantOpenFileFailure,
+        `Can't open profile output ${tracePath}: ${String(err)}`,
+      );
+    }
+    writeAllSync(
+      trace,
+      `{"traceEvents":[\n${threadName(TID_FRAMES, "Frames")},\n${
+        threadName(TID_MAIN, "Main")
+      },\n${threadName(TID_ASYNC, "GPU")}`,
+    );
+    return new ProfileRecorder(trace, tracePath);
+  }
+
+  add(chunk: ProfileChunk): void {
+    this.names.push(...chunk.names);
+    this.dropped += chunk.dropped;
+
+    let events = "";
+
+    for (let i = 0; i + 2 < chunk.frames.length; i += 3) {
+      const frame = chunk.frames[i]!;
+      const start = chunk.frames[i + 1]!;
+      const duration = chunk.frames[i + 2]!;
+      if (this.frameCount === this.frameTimes.length) {
+        const grown = new Float64Array(this.frameTimes.length * 2);
+        grown.set(this.frameTimes);
+        this.frameTimes = grown;
+      }
+      this.frameTimes[this.frameCount++] = duration;
+      if (this.trace) {
+        events += `,\n${
+          JSON.stringify({
+            name: "Frame",
+            ph: "X",
+            pid: PID,
+            tid: TID_FRAMES,
+            ts: start * 1000,
+            dur: duration * 1000,
+            args: { frame },
+          })
+        }`;
+      }
+    }
+
+    for (let i = 0; i + 3 < chunk.samples.length; i += 4) {
+      const fullName = this.names[chunk.samples[i]!] ?? "unknown";
+      const track = chunk.samples[i + 1]!;
+      const start = chunk.samples[i + 2]!;
+      const duration = chunk.samples[i + 3]!;
+
+      let region = this.regions.get(fullName);
+      if (!region) {
+        region = { calls: 0, total_ms: 0, mean_ms: 0, max_ms: 0 };
+        this.regions.set(fullName, region);
+      }
+      region.calls++;
+      region.total_ms += duration;
+      region.max_ms = Math.max(region.max_ms, duration);
+
+      if (this.trace) {
+        // Nesting is shown by the timeline, so events are named by their last part
+        const separator = fullName.lastIndexOf(" > ");
+        events += `,\n${
+          JSON.stringify({
+            name: separator === -1 ? fullName : fullName.slice(separator + 3),
+            ph: "X",
+            pid: PID,
+            tid: track === 0 ? TID_MAIN : TID_ASYNC,
+            ts: start * 1000,
+            dur: duration * 1000,
+            args: { region: fullName },
+          })
+        }`;
+      }
+    }
+
+    if (this.trace && events) {
+      writeAllSync(this.trace, events);
+    }
+  }
+
+  /** Closes the trace, with the summary as its metadata, and returns the summary. */
+  finish(): ProfileSummary {
+    const frameTimes = this.frameTimes.slice(0, this.frameCount).sort();
+    let totalFrameTime = 0;
+    for (const time of frameTimes) {
+      totalFrameTime += time;
+    }
+
+    const regions: Record<string, RegionSummary> = {};
+    for (const [name, region] of this.regions) {
+      regions[name] = {
+        calls: region.calls,
+        total_ms: round(region.total_ms),
+        mean_ms: round(region.total_ms / region.calls),
+        max_ms: round(region.max_ms),
+      };
+    }
+
+    const summary: ProfileSummary = {
+      frames: this.frameCount,
+      frame_time_ms: {
+        mean: round(this.frameCount > 0 ? totalFrameTime / this.frameCount : 0),
+        p50: round(percentile(frameTimes, 50)),
+        p95: round(percentile(frameTimes, 95)),
+        p99: round(percentile(frameTimes, 99)),
+        max: round(this.frameCount > 0 ? frameTimes[this.frameCount - 1]! : 0),
+      },
+      regions,
+      dropped_samples: this.dropped,
+      trace_path: this.tracePath ?? null,
+    };
+
+    if (this.trace) {
+      try {
+        writeAllSync(
+          this.trace,
+          `\n],"displayTimeUnit":"ms","otherData":${JSON.stringify(summary)}}\n`,
+        );
+        this.trace.close();
+      } catch {
+        // The trace is incomplete, but the viewers still read it
+      }
+      this.trace = undefined;
+    }
+
+    return summary;
+  }
+}
@@ -16,6 +16,17 @@ import * as print from "../print.ts";
 import { openWebview } from "./webview.ts";
 import { TraceMap } from "@jridgewell/trace-mapping";
 import { CACHE_DIR } from "../paths.ts";
+import { BrowserPool } from "./browser.ts";
+import { RunEvent } from "./events.ts";
+import { ProfileOptions, ProfileRecorder } from "./profile.ts";
+import {
+  decodeMessages,
+  FRAME_ACK,
+  FRAME_HEADER_SIZE,
+  readFrameHeader,
+  Route,
+  ROUTES,
+} from "../../sim/protocol.ts";
 
 const MAX_LAUNCH_RETRIES = 3;
 const LAUNCH_BASE_DELAY_MS = 1000;
@@ -24,32 +35,67 @@ const RECONNECT_MAX_ATTEMPTS = 3;
 const RECONNECT_DELAY_MS = 2000;
 const SETUP_PING_TIMEOUT_MS = 15000;
 
+// Makes the page cross-origin isolated, which SharedArrayBuffer and so the physics worker of
+// std need. "credentialless" rather than "require-corp" keeps cross-origin assets loading.
+const ISOLATION_HEADERS = {
+  "Cross-Origin-Opener-Policy": "same-origin",
+  "Cross-Origin-Embedder-Policy": "credentialless",
+};
+
 const coreDir = join(dirname(fromFileUrl(import.meta.url)), "..", "..");
 const htmlPath = join(coreDir, "sim.html");
 const cssPath = join(coreDir, "sim.css");
 
+/**
+ * Lets a long-lived process (see host.ts) run simulations on its own warm browser
+ * and collect their logs instead of printing them.
+ */
+export type HostContext = {
+  pool: BrowserPool;
+  onLog: (log: string) => void;
+  onEvent?: (event: RunEvent) => void;
+};
+
+/** Encoder settings for --record, passed on to ffmpeg's libx264. */
+export type RecordOptions = {
+  preset?: string;
+  threads?: number;
+};
+
 export async function runServer(
   bundle: string,
   record: string | undefined,
+  recordOptions: RecordOptions,
   assetManager: AssetManager,
   audioPlayer: AudioPlayer,
   useClient: boolean,
   headless: boolean,
   profiling: boolean,
+  profileOptions: ProfileOptions,
   noThrottle: boolean,
+  computeOnly: boolean,
+  drawEvery: number | undefined,
   maxTraceback: number,
   baseDir: string,
   errorOnTime: number | undefined,
   errorOnFrameTime: number | undefined,
   errorOnFinishBefore: number | undefined,
+  params: Record<string, unknown> | undefined,
+  hostContext?: HostContext,
 ): Promise<Result<string | undefined>> {
   const bundleDir = dirname(bundle);
   let server: Deno.HttpServer<Deno.NetAddr>;
   let webviewProcess: Deno.ChildProcess | undefined;
   let ffmpegProcess: Deno.ChildProcess | undefined;
   let ffmpegWriter: WritableStreamDefaultWriter<Uint8Array> | undefined;
+  let recordSize: { width: number; height: number } | undefined;
+  let recordStart = 0;
+  let recordedFrames = 0;
+  let flipBuffer = new Uint8Array(0);
+  let warnedResize = false;
 
-  let browser: any | undefined;
+  const pool = hostContext?.pool ?? (headless ? new BrowserPool(1) : undefined);
+  const ownsPool = hostContext === undefined;
 
   let started = false;
   let pingNexted = false;
@@ -61,6 +107,24 @@ export async function runServer(
   let frame = 0;
   const logs: string[] = [];
 
+  let profile: ProfileRecorder | undefined;
+  if (profiling) {
+    const recorder = ProfileRecorder.create(profileOptions.out);
+    if (failed(recorder)) {
+      return recorder as Failure;
+    }
+    profile = recorder as ProfileRecorder;
+  }
+
+  // Forwards an event to the host, or prints it when streaming
+  function emit(event: RunEvent): void {
+    if (hostContext) {
+      hostContext.onEvent?.(event);
+    } else if (print.isStreamModeEnabled()) {
+      print.event(event);
+    }
+  }
+
   function warn(msg: string): void {
     if (!print.isRawModeEnabled()) {
       print.warn(msg);
@@ -112,6 +176,14 @@ export async function runServer(
     htmlContent = htmlContent.replace(/window\.NO_THROTTLE = true/g, 'window.NO_THROTTLE = false');
   }
 
+  if (computeOnly) {
+    htmlContent = htmlContent.replace(/window\.COMPUTE_ONLY = false/g, 'window.COMPUTE_ONLY = true');
+  }
+
+  // Compute-only runs don't draw unless asked to
+  const drawInterval = drawEvery ?? (computeOnly ? 0 : 1);
+  htmlContent = htmlContent.replace(/window\.DRAW_EVERY = 1/g, `window.DRAW_EVERY = ${drawInterval}`);
+
   if (errorOnTime !== undefined) {
     htmlContent = htmlContent.replace(/window\.MAX_TIME = undefined/g, `window.MAX_TIME = ${errorOnTime}`);
   }
@@ -120,6 +192,13 @@ export async function runServer(
     htmlContent = htmlContent.replace(/window\.MIN_FINISH_TIME = undefined/g, `window.MIN_FINISH_TIME = ${errorOnFinishBefore}`);
   }
 
+  if (params !== undefined) {
+    // Escaped so no string in the params can close the script tag. A function replacement,
+    // since a string one would expand any "$&" in them.
+    const json = JSON.stringify(params).replace(/</g, '\\u003c');
+    htmlContent = htmlContent.replace(/window\.PARAMS = undefined/g, () => `window.PARAMS = ${json}`);
+  }
+
   let ret: Result<string | undefined>;
   let isFinished = false;
 
@@ -132,8 +211,9 @@ export async function runServer(
     if (isFinished) return;
     isFinished = true;
 
-    // In raw mode, dump all accumulated simulation logs to stdout
-    if (print.isRawModeEnabled()) {
+    // In raw mode, dump all accumulated simulation logs to stdout. Streamed logs were
+    // already printed and never accumulated.
+    if (print.isRawModeEnabled() && !print.isStreamModeEnabled() && !hostContext) {
       logs.forEach((log) => {
         print.raw(log);
       });
@@ -141,6 +221,11 @@ export async function runServer(
 
     ret = failure;
 
+    if (profile) {
+      await finishProfile(profile);
+      profile = undefined;
+    }
+
     if (frameTimeInterval !== undefined) {
       clearInterval(frameTimeInterval);
     }
@@ -154,10 +239,16 @@ export async function runServer(
       clearTimeout(setupPingTimeout);
     }
 
-    if (browser) {
-      try {
-        await browser.close();
-      } catch {}
+    if (page) {
+      const finishedPage = page;
+      page = undefined;
+      if (ownsPool) {
+        await pool?.close();
+      } else {
+        await pool?.release(finishedPage);
+      }
+    } else if (ownsPool) {
+      await pool?.close();
     }
 
     webviewProcess?.kill();
@@ -169,19 +260,171 @@ export async function runServer(
       try {
         await ffmpegProcess?.status;
       } catch {}
+      if (recordedFrames > 0) {
+        const seconds = (performance.now() - recordStart) / 1000;
+        info(
+          `Recorded ${recordedFrames} frames in ${seconds.toFixed(1)}s (${
+            (recordedFrames / seconds).toFixed(1)
+          } fps)`,
+        );
+      }
     } else {
       ffmpegProcess?.kill();
     }
 
+    for (const socket of sockets) {
+      try {
+        socket.close();
+      } catch {}
+    }
+
     try {
       await server.shutdown();
     } catch {}
   }
 
+  async function finishProfile(recorder: ProfileRecorder): Promise<void> {
+    const summary = recorder.finish();
+    if (profileOptions.summaryOut) {
+      try {
+        await Deno.writeTextFile(profileOptions.summaryOut, JSON.stringify(summary));
+      } catch (err) {
+        warn(`Failed to write the profile summary: ${String(err)}`);
+      }
+    }
+    emit({ event: "profile", summary });
+
+    const time = summary.frame_time_ms;
+    info(
+      `Frame time over ${summary.frames} frames: p50 ${time.p50.toFixed(2)}ms, p95 ${
+        time.p95.toFixed(2)
+      }ms, p99 ${time.p99.toFixed(2)}ms, max ${time.max.toFixed(2)}ms`,
+    );
+    if (summary.trace_path) {
+      info(`Wrote the profile trace to ${summary.trace_path}`);
+    }
+  }
+
   let servePort: number;
 
+  const decoder = new TextDecoder();
+  const sockets = new Set<WebSocket>();
+
+  function isRoute(path: string): path is Route {
+    return (ROUTES as readonly string[]).includes(path);
+  }
+
+  // Handles the messages the runtime sends, whether they arrive as an HTTP
+  // request or batched over the WebSocket channel
+  async function handleMessage(route: Route, payload: Uint8Array): Promise<void> {
+    if (route === "/log") {
+      const text = decoder.decode(payload);
+      if (hostContext) {
+        hostContext.onLog(text);
+      } else if (!print.isStreamModeEnabled()) {
+        logs.push(text);
+        print.log(text);
+      }
+      emit({ event: "log", text });
+    } else if (route === "/err") {
+      const body = payload.byteLength > 0 ? decoder.decode(payload) : "Unknown error";
+      let formattedError: string;
+      let tag: InputFailureTag = InputFailureTag.RuntimeFailure;
+      try {
+        const parsed = JSON.parse(body);
+        const message = parsed.message ?? "Unknown error";
+        const stack = parsed.stack ?? "";
+        const trace = stack
+          ? formatStackTrace(stack, traceMap, maxTraceback, baseDir, bundleDir)
+          : "";
+        formattedError = trace ? `${message}\n${trace}` : message;
+        if (parsed.tag && Object.values(InputFailureTag).includes(parsed.tag)) {
+          tag = parsed.tag;
+        }
+      } catch {
+        formattedError = body;
+      }
+      endAndFail(
+        fail(
+          tag,
+          formattedError,
+        ),
+      );
+    } else if (route === "/terminate_requirement") {
+      const body = JSON.parse(decoder.decode(payload));
+      endAndFail(fail(InputFailureTag.RestrictionFailure, body.message));
+    } else if (route === "/finish") {
+      setTimeout(async () => {
+        print.info("Simulation finished");
+        await endAndFail(undefined);
+      }, 100);
+    } else if (route === "/frame") {
+      frame++;
+      if (record) {
+        await writeFrame(payload);
+      }
+    } else if (route === "/ping") {
+      // Pings carry the frame count, which is reported as progress
+      if (payload.byteLength > 0) {
+        emit({ event: "frame", frame: Number(decoder.decode(payload)) });
+      }
+    } else if (route === "/profile") {
+      profile?.add(JSON.parse(decoder.decode(payload)));
+    } else if (route === "/playSound") {
+      const data = JSON.parse(decoder.decode(payload));
+      const id = Number(data.sound);
+      const frm = Number(data.frame ?? frame);
+      const volume = Number(data.volume ?? 1);
+      const r = audioPlayer.playSound(id, frm, volume);
+      if (r) {
+        endAndFail(r);
+      }
+    }
+  }
+
+  // Upgrades to the multiplexed channel the runtime batches its messages over
+  function openChannel(req: Request): Response {
+    if (req.headers.get("upgrade")?.toLowerCase() !== "websocket") {
+      return new Response("Expected a WebSocket upgrade", { status: 400 });
+    }
+
+    const { socket, response } = Deno.upgradeWebSocket(req);
+    socket.binaryType = "arraybuffer";
+    sockets.add(socket);
+
+    // Batches are handled strictly in order, like the runtime sent them
+    let pending = Promise.resolve();
+    socket.onmessage = (event) => {
+      lastPingTime = Date.now();
+      if (!(event.data instanceof ArrayBuffer)) return;
+      const messages = decodeMessages(new Uint8Array(event.data));
+
+      pending = pending.then(async () => {
+        for (const message of messages) {
+          if (isFinished) return;
+          if (!started) {
+            if (message.route === "/ping" && setupPingTimeout !== undefined) {
+              clearTimeout(setupPingTimeout);
+              setupPingTimeout = undefined;
+            }
+            continue;
+          }
+          await handleMessage(message.route, message.payload);
+          if (message.route === "/frame") {
+            socket.send(FRAME_ACK);
+          }
+        }
+      }).catch(() => {});
+    };
+    socket.onclose = () => {
+      sockets.delete(socket);
+    };
+
+    return response;
+  }
+
   // Monitor stdin for EOF (Ctrl+D)
-  if (Deno.stdin.isTerminal()) {
+  if (!hostContext && Deno.stdin.isTerminal()) {
     (async () => {
       const buf = new Uint8Array(1024);
       while (!isFinished) {
@@ -201,23 +444,34 @@ export async function runServer(
     })();
   }
 
-  // Start FFmpeg process if recording is enabled
-  if (record) {
+  // Frames arrive as raw RGBA, so the encoder is started once the first frame
+  // tells us the canvas size
+  function startEncoder(width: number, height: number): void {
+    const args = [
+      "-y",
+      "-f",
+      "rawvideo",
+      "-pix_fmt",
+      "rgba",
+      "-s",
+      `${width}x${height}`,
+      "-framerate",
+      "60",
+      "-i",
+      "pipe:0",
+      "-c:v",
+      "libx264",
+    ];
+    if (recordOptions.preset !== undefined) {
+      args.push("-preset", recordOptions.preset);
+    }
+    if (recordOptions.threads !== undefined) {
+      args.push("-threads", String(recordOptions.threads));
+    }
+    args.push("-pix_fmt", "yuv420p", record!);
+
     ffmpegProcess = new Deno.Command("ffmpeg", {
-      args: [
-        "-y",
-        "-f",
-        "image2pipe",
-        "-framerate",
-        "60",
-        "-i",
-        "pipe:0",
-        "-c:v",
-        "libx264",
-        "-pix_fmt",
-        "yuv420p",
-        record,
-      ],
+      args,
       stdin: "piped",
       stdout: "null",
       stderr: "null",
@@ -227,50 +481,84 @@ export async function runServer(
       },
     }).spawn();
     ffmpegWriter = ffmpegProcess.stdin.getWriter();
+    recordSize = { width, height };
+    recordStart = performance.now();
   }
 
-  // Launch browser with retry logic
-  async function launchBrowserWithRetry(url: string, attempt = 1): Promise<boolean> {
-    try {
-      // @ts-ignore: Playwright might not be in the type system but is available via npm:
-      const { chromium } = await import("npm:playwright");
-      browser = await chromium.launch({ headless: true });
+  async function writeFrame(payload: Uint8Array): Promise<void> {
+    const { width, height, flipped } = readFrameHeader(payload);
+    let pixels = payload.subarray(FRAME_HEADER_SIZE);
+    if (pixels.byteLength !== width * height * 4) {
+      return;
+    }
 
-      page = await browser.newPage();
+    if (!recordSize) {
+      startEncoder(width, height);
+    } else if (recordSize.width !== width || recordSize.height !== height) {
+      if (!warnedResize) {
+        warn(`Canvas was resized to ${width}x${height} while recording, skipping those frames`);
+        warnedResize = true;
+      }
+      return;
+    }
 
-      // Log browser console messages for debugging
-      page.on("console", (msg: any) => {
-        if (!print.isRawModeEnabled()) {
-          console.log(`[Browser Console] ${msg.text()}`);
-        }
-      });
+    // WebGL reads pixels bottom up
+    if (flipped) {
+      if (flipBuffer.byteLength !== pixels.byteLength) {
+        flipBuffer = new Uint8Array(pixels.byteLength);
+      }
+      const rowSize = width * 4;
+      for (let y = 0; y < height; y++) {
+        const from = (height - 1 - y) * rowSize;
+        flipBuffer.set(pixels.subarray(from, from + rowSize), y * rowSize);
+      }
+      pixels = flipBuffer;
+    }
 
-      page.on("pageerror", (err: any) => {
-        if (!print.isRawModeEnabled()) {
-          console.error(`[Browser Error] ${err.message}`);
-        }
-      });
+    try {
+      await ffmpegWriter!.write(pixels);
+      recordedFrames++;
+    } catch {
+      endAndFail(fail(SystemFailureTag.FfmpegFailure, "ffmpeg stopped accepting frames"));
+    }
+  }
+
+  // Open the simulation in a pooled page, retrying with a fresh page on failure
+  async function openPageWithRetry(url: string, attempt = 1): Promise<Result<undefined>> {
+    const acquired = await pool!.acquire();
+    if (failed(acquired)) {
+      return acquired;
+    }
+    if (isFinished) {
+      if (ownsPool) {
+        await pool!.close();
+      } else {
+        await pool!.release(acquired);
+      }
+      return undefined;
+    }
+    page = acquired;
 
+    try {
       await page.goto(url, { timeout: PAGE_GOTO_TIMEOUT_MS });
-      return true;
+      return undefined;
     } catch (err) {
+      const brokenPage = page;
+      page = undefined;
+      await pool!.discard(brokenPage);
+
       if (attempt < MAX_LAUNCH_RETRIES) {
         const delay = LAUNCH_BASE_DELAY_MS * Math.pow(2, attempt - 1);
         warn(`Browser launch attempt ${attempt} failed: ${String(err)}`);
         warn(`Retrying in ${delay}ms (attempt ${attempt + 1}/${MAX_LAUNCH_RETRIES})...`);
 
-        // Close browser if partially launched
-        if (browser) {
-          try {
-            await browser.close();
-          } catch {}
-          browser = undefined;
-        }
-
         await new Promise((resolve) => setTimeout(resolve, delay));
-        return launchBrowserWithRetry(url, attempt + 1);
+        return openPageWithRetry(url, attempt + 1);
       }
-      return false;
+      return fail(
+        SystemFailureTag.OpenFailure,
+        `Failed to launch headless browser after ${MAX_LAUNCH_RETRIES} attempts (Playwright)`,
+      );
     }
   }
 
@@ -291,9 +579,9 @@ export async function runServer(
     try {
       // Close existing page if any
       if (page) {
-        try {
-          await page.close();
-        } catch {}
+        const lostPage = page;
+        page = undefined;
+        await pool!.discard(lostPage);
       }
 
       // Reset connection state so the re-loaded page's /begin request
@@ -302,20 +590,11 @@ export async function runServer(
       pingNexted = false;
 
       // Create new page
-      page = await browser.newPage();
-
-      // Log browser console messages for debugging
-      page.on("console", (msg: any) => {
-        if (!print.isRawModeEnabled()) {
-          console.log(`[Browser Console] ${msg.text()}`);
-        }
-      });
-
-      page.on("pageerror", (err: any) => {
-        if (!print.isRawModeEnabled()) {
-          console.error(`[Browser Error] ${err.message}`);
-        }
-      });
+      const acquired = await pool!.acquire();
+      if (failed(acquired)) {
+        throw new Error(acquired.reason);
+      }
+      page = acquired;
 
       await page.goto(url, { timeout: PAGE_GOTO_TIMEOUT_MS });
       warn("Reconnection successful");
@@ -333,15 +612,10 @@ export async function runServer(
   setTimeout(async () => {
     if (!started) {
       const url = `http://127.0.0.1:${servePort}/`;
-      if (headless) {
-        const success = await launchBrowserWithRetry(url);
-        if (!success) {
-          endAndFail(
-            fail(
-              SystemFailureTag.OpenFailure,
-              `Failed to launch headless browser after ${MAX_LAUNCH_RETRIES} attempts (Playwright)`,
-            ),
-          );
+      if (pool) {
+        const opened = await openPageWithRetry(url);
+        if (failed(opened)) {
+          endAndFail(opened as Failure);
         } else {
           // Set up timeout for initial connection (before 'started' is true)
           setupPingTimeout = setTimeout(() => {
@@ -385,7 +659,7 @@ export async function runServer(
         }
       }
     }
-  }, 2000);
+  }, hostContext ? 0 : 2000);
 
   server = Deno.serve(
     {
@@ -403,11 +677,11 @@ export async function runServer(
 
       if (url.pathname === "/") {
         return new Response(htmlContent, {
-          headers: { "Content-Type": "text/html" },
+          headers: { "Content-Type": "text/html", ...ISOLATION_HEADERS },
         });
       } else if (url.pathname === "/bundle.js") {
         return new Response(simCode, {
-          headers: { "Content-Type": "text/javascript" },
+          headers: { "Content-Type": "text/javascript", ...ISOLATION_HEADERS },
         });
       } else if (url.pathname === "/out.js.map") {
         return new Response(await Deno.readFile(bundle + ".map"), {
@@ -415,6 +689,10 @@ export async function runServer(
         });
       }
 
+      if (url.pathname === "/ws") {
+        return openChannel(req);
+      }
+
       if (!started) {
         if (url.pathname === "/begin" || url.pathname === "/ping") {
           // Clear the setup ping timeout since we got a response
@@ -443,59 +721,9 @@ export async function runServer(
           ),
         );
         return new Response(null, { status: 200 });
-      } else if (url.pathname === "/log") {
-        if (req.body) {
-          const text = await req.text();
-          logs.push(text);
-          print.log(text);
-        }
-        return new Response("Logged", { status: 200 });
-      } else if (url.pathname === "/err") {
-        const body = req.body ? await req.text() : "Unknown error";
-        let formattedError: string;
-        let tag: InputFailureTag = InputFailureTag.RuntimeFailure;
-        try {
-          const parsed = JSON.parse(body);
-          const message = parsed.message ?? "Unknown error";
-          const stack = parsed.stack ?? "";
-          const trace = stack
-            ? formatStackTrace(stack, traceMap, maxTraceback, baseDir, bundleDir)
-            : "";
-          formattedError = trace ? `${message}\n${trace}` : message;
-          if (parsed.tag && Object.values(InputFailureTag).includes(parsed.tag)) {
-            tag = parsed.tag;
-          }
-        } catch {
-          formattedError = body;
-        }
-        endAndFail(
-          fail(
-            tag,
-            formattedError,
-          ),
-        );
-        return new Response(null, { status: 200 });
-      } else if (url.pathname === "/terminate_requirement") {
-        const body = await req.json();
-        endAndFail(fail(InputFailureTag.RestrictionFailure, body.message));
-        return new Response(null, { status: 200 });
-      } else if (url.pathname === "/finish") {
-        setTimeout(async () => {
-          print.info("Simulation finished");
-          await endAndFail(undefined);
-        }, 100);
-
-        return new Response(null, { status: 200 });
-      } else if (url.pathname === "/frame") {
-        frame++;
-        if (ffmpegWriter) {
-          const body = await req.arrayBuffer();
-          await ffmpegWriter.write(new Uint8Array(body));
-        }
-
-        return new Response(null, { status: 200 });
-      } else if (url.pathname === "/ping") {
-        return new Response(null, { status: 200 });
+      } else if (isRoute(url.pathname)) {
+        await handleMessage(url.pathname, new Uint8Array(await req.arrayBuffer()));
+        return new Response(url.pathname === "/log" ? "Logged" : null, { status: 200 });
       } else if (url.pathname === "/addSound") {
         const sound = await req.json();
         const id = await audioPlayer.addSound(sound);
@@ -503,15 +731,14 @@ export async function runServer(
           endAndFail(id as Failure);
         }
         return new Response(id.toString(), { status: 200 });
-      } else if (url.pathname === "/playSound") {
-        const data = await req.json();
-        const id = Number(data.sound);
-        const frm = Number(data.frame ?? frame);
-        const r = audioPlayer.playSound(id, frm);
-        if (r) {
-          endAndFail(r);
+      } else if (url.pathname === "/addSounds") {
+        const sounds = await req.json();
+        const ids = await audioPlayer.addSounds(sounds);
+        if (failed(ids)) {
+          endAndFail(ids as Failure);
+          return new Response(null, { status: 500 });
         }
-        return new Response(null, { status: 200 });
+        return new Response(JSON.stringify(ids), { status: 200 });
       } else if (url.pathname === "/addFetchAsset") {
         const data = await req.json();
         const r = await assetManager.addFetchAsset(data.path, data.fetchAddr);
@@ -537,7 +764,7 @@ export async function runServer(
     if (started && Date.now() - lastPingTime > 10000) {
       // Reset ping timer so we don't keep re-triggering during reconnect delay
       lastPingTime = Date.now();
-      if (headless && reconnectAttempts < RECONNECT_MAX_ATTEMPTS) {
+      if (pool && reconnectAttempts < RECONNECT_MAX_ATTEMPTS) {
         const url = `http://127.0.0.1:${servePort}/`;
         if (reconnectTimeout !== undefined) {
           clearTimeout(reconnectTimeout);
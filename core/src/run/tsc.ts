@@ -47,3 +47,21 @@ export async function typeCheck(
     stderr: result.stderr,
   };
 }
+
+/**
+ * Returns every file `tsc` reads to type check the project of an entrypoint, including
+ * type-only imports and declaration files that never reach the bundle, or undefined if
+ * the project can't be listed.
+ */
+export async function listTypeCheckFiles(entrypoint: string): Promise<string[] | undefined> {
+  const entryDir = dirname(resolve(Deno.cwd(), entrypoint));
+  const result = await run("tsc", ["--listFilesOnly"], entryDir);
+  if (!result.success) {
+    return undefined;
+  }
+  return result.stdout
+    .split("\n")
+    .map((line) => line.trim())
+    .filter((line) => line.length > 0)
+    .map((path) => resolve(entryDir, path));
+}
@@ -20,6 +20,9 @@ const libPath = new URL(
 
 const dylib = Deno.dlopen(libPath, {
   play_audio: { parameters: ["pointer"], result: "i32" },
+  register_sound: { parameters: ["pointer"], result: "i32" },
+  play_sound: { parameters: ["i32", "f32"], result: "i32" },
+  unregister_sound: { parameters: ["i32"], result: "i32" },
 });
 
 // helper: create a null-terminated Uint8Array for the C string
@@ -47,3 +50,50 @@ export function playAudio(path: string): Result<undefined> {
 
   return undefined;
 }
+
+/**
+ * Decodes a sound file into memory in the native audio core, returning the id to play
+ * it with `playRegisteredSound`.
+ */
+export function registerSound(path: string): Result<number> {
+  const buf = cstrBytes(path);
+  const ptr = Deno.UnsafePointer.of(buf);
+  const id = dylib.symbols.register_sound(ptr);
+
+  if (id === -1) {
+    return fail(SystemFailureTag.AudioPlaybackFailure, "Invalid audio path");
+  } else if (id < 0) {
+    return fail(
+      SystemFailureTag.AudioPlaybackFailure,
+      `Failed to decode audio file: ${path}`,
+    );
+  }
+
+  return id;
+}
+
+/** Plays a sound registered with `registerSound`, without touching the disk. */
+export function playRegisteredSound(id: number, volume: number): Result<undefined> {
+  const status = dylib.symbols.play_sound(id, volume);
+
+  if (status === 1) {
+    return fail(SystemFailureTag.AudioPlaybackFailure, `Unknown native sound id: ${id}`);
+  }
+  // Status 2 means no audio device, which is not fatal, like in playAudio
+
+  return undefined;
+}
+
+/**
+ * Frees a sound registered with `registerSound`. Its id may be reused by the next
+ * registered sound.
+ */
+export function unregisterSound(id: number): Result<undefined> {
+  const status = dylib.symbols.unregister_sound(id);
+
+  if (status === 1) {
+    return fail(SystemFailureTag.AudioPlaybackFailure, `Unknown native sound id: ${id}`);
+  }
+
+  return undefined;
+}
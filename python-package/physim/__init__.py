@@ -2,14 +2,26 @@
 Python wrapper for physim.
 """
 
-from .run import PhysimResult, run_script, Restrictions
+from .run import PhysimResult, PhysimStream, run_script, stream_script, Restrictions
+from .host import Host, run_many
+from .bench import BenchReport, bench
+from .sweep import SweepReport, SweepRun, sweep
 from .docs import generate_markdown_docs, get_docs_path
 from ._internal import _run_physim_command
 
 __all__ = [
     "PhysimResult",
     "run_script",
+    "PhysimStream",
+    "stream_script",
     "Restrictions",
+    "Host",
+    "run_many",
+    "BenchReport",
+    "bench",
+    "SweepReport",
+    "SweepRun",
+    "sweep",
     "generate_markdown_docs",
     "get_docs_path",
     "init_project",
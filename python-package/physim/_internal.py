@@ -14,3 +14,8 @@ def _run_physim_command(args: list[str], cwd: str | None = None) -> tuple[int, s
         )
     except Exception as e:
         return (-1, "", f"Unexpected error running physim: {e}")
+
+
+def _start_physim_command(args: list[str], stderr) -> subprocess.Popen:
+    """Start physim with stdout piped as text. Raises FileNotFoundError if not installed."""
+    return subprocess.Popen(["physim"] + args, stdout=subprocess.PIPE, stderr=stderr, text=True)
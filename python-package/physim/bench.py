@@ -0,0 +1,75 @@
+"""
+Python wrapper for the physim benchmarks.
+"""
+
+import json
+from dataclasses import dataclass
+
+from ._internal import _run_physim_command
+
+
+@dataclass
+class BenchReport:
+    """Results of running the physim benchmark scenarios."""
+
+    exit_code: int
+    results: list[dict]
+    """
+    One dict per measured case, with its "scenario", "name" and "params", the
+    "frame_ms" percentiles ("mean", "p50", "p95", "p99" and "max"), "heap_bytes"
+    and "startup_ms".
+    """
+    regressions: list[dict]
+    """The cases that got slower than the baseline, if one was compared against."""
+    scenarios: dict
+    """The "wall_ms" of every scenario, and its "error" if it failed."""
+    stderr: str
+
+    @property
+    def success(self) -> bool:
+        """Check if every scenario ran and nothing regressed."""
+        return self.exit_code == 0
+
+
+def bench(
+    scenarios: list[str] | None = None,
+    baseline_path: str | None = None,
+    threshold: float = 0.1,
+    output_path: str | None = None,
+) -> BenchReport:
+    """
+    Run the benchmark scenarios in std/bench, headless and without throttling.
+
+    Args:
+        scenarios: Names of the scenarios to run, e.g. ["gravity", "draw"]. Runs all by
+            default.
+        baseline_path: Optional results of an earlier run, written with `output_path`,
+            to look for regressions against.
+        threshold: How much slower a frame time percentile may get before it counts as a
+            regression, 0.1 being 10%.
+        output_path: Optional path to save the results at, for use as a baseline.
+
+    Returns:
+        BenchReport with the results. Its exit code is 65 if anything regressed.
+    """
+    args = ["bench", "--json", "--threshold", str(threshold)]
+    if scenarios:
+        args.extend(["--only", ",".join(scenarios)])
+    if baseline_path:
+        args.extend(["--compare", baseline_path])
+    if output_path:
+        args.extend(["--out", output_path])
+
+    exit_code, stdout, stderr = _run_physim_command(args)
+    try:
+        report = json.loads(stdout)
+    except ValueError:
+        # physim failed before running anything, stderr says why
+        report = {}
+    return BenchReport(
+        exit_code=exit_code,
+        results=report.get("results", []),
+        regressions=report.get("regressions", []),
+        scenarios=report.get("scenarios", {}),
+        stderr=stderr,
+    )
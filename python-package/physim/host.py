@@ -0,0 +1,417 @@
+"""
+Python wrapper for a persistent physim host.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from .run import PhysimResult, PhysimStream, Restrictions, _read_profile_summary
+
+
+def _host_request(
+    filepath: str,
+    raw: bool,
+    video_output_path: str | None,
+    record_preset: str | None,
+    record_threads: int | None,
+    no_audio: bool,
+    no_throttle: bool,
+    compute_only: bool,
+    draw_every: int | None,
+    max_traceback: int,
+    restrictions: Restrictions | None,
+    profiling: bool,
+    profile_output_path: str | None,
+    profile_summary_path: str | None,
+    params: dict | None = None,
+) -> dict:
+    request = {
+        "entrypoint": os.path.abspath(filepath),
+        "raw": raw,
+        "noAudio": no_audio,
+        "noThrottle": no_throttle,
+        "computeOnly": compute_only,
+        "maxTraceback": max_traceback,
+        "profiling": profiling,
+    }
+    if profiling and profile_output_path:
+        request["profileOut"] = os.path.abspath(profile_output_path)
+    if profiling and profile_summary_path:
+        request["profileSummaryOut"] = profile_summary_path
+    if video_output_path:
+        request["record"] = os.path.abspath(video_output_path)
+    if draw_every is not None:
+        request["drawEvery"] = draw_every
+    if record_preset is not None:
+        request["recordPreset"] = record_preset
+    if record_threads is not None:
+        request["recordThreads"] = record_threads
+    if restrictions and restrictions.error_on_time is not None:
+        request["errorOnTime"] = restrictions.error_on_time
+    if restrictions and restrictions.error_on_frame_time is not None:
+        request["errorOnFrameTime"] = restrictions.error_on_frame_time
+    if restrictions and restrictions.error_on_finish_before is not None:
+        request["errorOnFinishBefore"] = restrictions.error_on_finish_before
+    if params is not None:
+        request["params"] = params
+    return request
+
+
+class Host:
+    """
+    A long-running physim process that keeps a headless browser warm between runs.
+
+    Starting physim and launching a browser dominates the cost of short simulations,
+    so a host pays for it once and then runs scripts sent over a local socket. Runs
+    may be submitted from several threads at once; at most `pages` of them execute
+    concurrently and the rest wait for a free page.
+
+    Example:
+        with Host() as host:
+            for path in paths:
+                result = host.run_script(path, raw=True)
+    """
+
+    def __init__(self, pages: int = 1) -> None:
+        """
+        Args:
+            pages: Maximum number of simulations running at the same time.
+        """
+        self.pages = pages
+        self._process: subprocess.Popen | None = None
+        self._stderr = None
+        self._port: int | None = None
+
+    def __enter__(self) -> "Host":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """
+        Start the host process and wait until it accepts runs.
+
+        Raises:
+            RuntimeError: If the host could not be started.
+        """
+        if self._process is not None:
+            return
+
+        self._stderr = tempfile.TemporaryFile()
+        try:
+            self._process = subprocess.Popen(
+                ["physim", "host", "--pages", str(self.pages)],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=self._stderr,
+                text=True,
+            )
+        except FileNotFoundError:
+            raise RuntimeError("physim command not found. Is it installed and in PATH?")
+
+        line = self._process.stdout.readline()
+        try:
+            self._port = int(json.loads(line)["port"])
+        except (ValueError, KeyError, TypeError):
+            self._process.wait()
+            self._stderr.seek(0)
+            stderr = self._stderr.read().decode(errors="replace")
+            self._cleanup()
+            raise RuntimeError(
+                f"Failed to start physim host.\nStdout: {line}\nStderr: {stderr}"
+            )
+
+        # Keep the pipe drained so the host can never block on a full stdout
+        threading.Thread(target=self._process.stdout.read, daemon=True).start()
+
+    def close(self) -> None:
+        """Shut down the host process and its browser."""
+        if self._process is None:
+            return
+
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._process.terminate()
+            self._process.wait()
+        self._cleanup()
+
+    def _cleanup(self) -> None:
+        if self._stderr is not None:
+            self._stderr.close()
+        self._process = None
+        self._stderr = None
+        self._port = None
+
+    def run_script(
+        self,
+        filepath: str,
+        raw: bool = False,
+        video_output_path: str | None = None,
+        record_preset: str | None = None,
+        record_threads: int | None = None,
+        no_audio: bool = False,
+        no_throttle: bool = False,
+        compute_only: bool = False,
+        draw_every: int | None = None,
+        max_traceback: int = 10,
+        restrictions: Restrictions | None = None,
+        profiling: bool = False,
+        profile_output_path: str | None = None,
+        params: dict | None = None,
+    ) -> PhysimResult:
+        """
+        Run a physim script on the warm browser and capture its output.
+
+        Takes the same options as `run_script`, minus the ones choosing where the
+        simulation is displayed, since a host always runs headless.
+
+        Args:
+            filepath: Path to the TypeScript file to run
+            raw: Whether stdout should contain the raw logs only
+            video_output_path: Optional path to save a video of the simulation.
+            record_preset: x264 preset for the recording, e.g. "ultrafast" or "medium".
+            record_threads: Number of threads ffmpeg uses to encode the recording.
+            no_audio: Whether to disable audio playback.
+            no_throttle: Whether to disable FPS throttling (run at maximum speed).
+            compute_only: Whether to step the simulation as fast as possible without
+                drawing. Restrictions and logs still apply.
+            draw_every: Only draw every nth frame. With compute_only, None never draws.
+            max_traceback: Maximum number of traceback frames to show in runtime errors.
+            restrictions: Optional restrictions for the simulation.
+            profiling: Whether to profile the `@profile` regions and frame times. The
+                summary is returned as `PhysimResult.profile`.
+            profile_output_path: Optional path to save a Chrome trace of every profiled
+                region and frame. Needs profiling.
+            params: Optional JSON serializable dict the simulation reads as `sim.params`.
+
+        Returns:
+            PhysimResult containing exit code and output, with the same exit codes
+            `physim run` would have returned.
+
+        Raises:
+            RuntimeError: If the host has not been started.
+        """
+        if self._port is None:
+            raise RuntimeError("The physim host is not running. Call start() first.")
+
+        profile_dir = tempfile.TemporaryDirectory(prefix="physim_profile_") if profiling else None
+        with profile_dir or nullcontext() as tmp:
+            summary_path = os.path.join(tmp, "summary.json") if tmp else None
+            request = _host_request(
+                filepath,
+                raw=raw,
+                video_output_path=video_output_path,
+                record_preset=record_preset,
+                record_threads=record_threads,
+                no_audio=no_audio,
+                no_throttle=no_throttle,
+                compute_only=compute_only,
+                draw_every=draw_every,
+                max_traceback=max_traceback,
+                restrictions=restrictions,
+                profiling=profiling,
+                profile_output_path=profile_output_path,
+                profile_summary_path=summary_path,
+                params=params,
+            )
+
+            try:
+                with socket.create_connection(("127.0.0.1", self._port)) as conn:
+                    conn.sendall((json.dumps(request) + "\n").encode())
+                    response = conn.makefile("r", encoding="utf-8").readline()
+                data = json.loads(response)
+            except (OSError, ValueError) as e:
+                return PhysimResult(
+                    exit_code=-1,
+                    stdout="",
+                    stderr=f"Lost connection to the physim host: {e}",
+                    filepath=filepath,
+                )
+            profile = _read_profile_summary(summary_path) if summary_path else None
+
+        return PhysimResult(
+            exit_code=data["exit_code"],
+            stdout=data["stdout"],
+            stderr=data["stderr"],
+            filepath=filepath,
+            profile=profile,
+        )
+
+    def stream_script(
+        self,
+        filepath: str,
+        video_output_path: str | None = None,
+        record_preset: str | None = None,
+        record_threads: int | None = None,
+        no_audio: bool = False,
+        no_throttle: bool = False,
+        compute_only: bool = False,
+        draw_every: int | None = None,
+        max_traceback: int = 10,
+        restrictions: Restrictions | None = None,
+        profiling: bool = False,
+        profile_output_path: str | None = None,
+        max_log_lines: int = 1000,
+        params: dict | None = None,
+    ) -> PhysimStream:
+        """
+        Run a physim script on the warm browser and stream its events while it runs.
+
+        Takes the same options as `run_script`, and yields the same events as
+        `physim.stream_script`. Closing the stream stops reading the events, but the run
+        itself still finishes on the host.
+
+        Args:
+            filepath: Path to the TypeScript file to run
+            max_log_lines: How many of the last log lines the final result keeps in stdout.
+
+        Returns:
+            A PhysimStream yielding the events of the run.
+
+        Raises:
+            RuntimeError: If the host has not been started.
+        """
+        if self._port is None:
+            raise RuntimeError("The physim host is not running. Call start() first.")
+
+        request = _host_request(
+            filepath,
+            raw=True,
+            video_output_path=video_output_path,
+            record_preset=record_preset,
+            record_threads=record_threads,
+            no_audio=no_audio,
+            no_throttle=no_throttle,
+            compute_only=compute_only,
+            draw_every=draw_every,
+            max_traceback=max_traceback,
+            restrictions=restrictions,
+            profiling=profiling,
+            profile_output_path=profile_output_path,
+            profile_summary_path=None,
+            params=params,
+        )
+        request["stream"] = True
+
+        # Every line is an event, except the last which is the response
+        response: dict = {}
+        error: list[str] = []
+        conn: socket.socket | None = None
+        try:
+            conn = socket.create_connection(("127.0.0.1", self._port))
+            conn.sendall((json.dumps(request) + "\n").encode())
+            lines = conn.makefile("r", encoding="utf-8")
+        except OSError as e:
+            if conn is not None:
+                conn.close()
+            conn = None
+            lines = iter(())
+            error.append(str(e))
+
+        def events() -> Iterator[dict]:
+            try:
+                for line in lines:
+                    data = json.loads(line)
+                    if "event" not in data:
+                        response.update(data)
+                        return
+                    yield data
+            except (OSError, ValueError) as e:
+                error.append(str(e))
+
+        def finish(stop: bool) -> tuple[int, str]:
+            if conn is not None:
+                conn.close()
+            if "exit_code" in response:
+                return response["exit_code"], response["stderr"]
+            if stop:
+                return -1, "The stream was closed before the run ended"
+            reason = error[0] if error else "connection closed"
+            return -1, f"Lost connection to the physim host: {reason}"
+
+        return PhysimStream(events(), finish, filepath=filepath, max_log_lines=max_log_lines)
+
+
+def run_many(
+    paths: Iterable[str],
+    *,
+    max_workers: int | None = None,
+    restrictions: Restrictions | None = None,
+    raw: bool = False,
+    no_audio: bool = False,
+    no_throttle: bool = False,
+    compute_only: bool = False,
+    max_traceback: int = 10,
+    on_event: Callable[[str, dict], None] | None = None,
+) -> Iterator[PhysimResult]:
+    """
+    Run many physim scripts on one shared headless browser.
+
+    A single `Host` is started for the whole batch, so there is one Deno process and
+    one Chromium no matter how many scripts are run, and at most `max_workers`
+    isolated pages exist at a time. Time limits are set per run through
+    `restrictions`.
+
+    Args:
+        paths: Paths to the TypeScript files to run
+        max_workers: Maximum number of scripts running at once. Defaults to the CPU count.
+        restrictions: Optional restrictions applied to every run.
+        raw: Whether stdout should contain the raw logs only
+        no_audio: Whether to disable audio playback.
+        no_throttle: Whether to disable FPS throttling (run at maximum speed).
+        compute_only: Whether to step the simulations without drawing.
+        max_traceback: Maximum number of traceback frames to show in runtime errors.
+        on_event: Called with the path and the event for every event of every run as it
+            happens, see `PhysimStream`. It is called from worker threads. When given,
+            stdout holds only the raw logs, like with `raw`.
+
+    Yields:
+        A PhysimResult per script, in the order the runs complete. Its `filepath`
+        tells which script it belongs to.
+
+    Raises:
+        RuntimeError: If the host could not be started.
+    """
+    paths = list(paths)
+    if not paths:
+        return
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(paths)))
+
+    options = dict(
+        no_audio=no_audio,
+        no_throttle=no_throttle,
+        compute_only=compute_only,
+        max_traceback=max_traceback,
+        restrictions=restrictions,
+    )
+
+    def run(host: Host, path: str) -> PhysimResult:
+        if on_event is None:
+            return host.run_script(path, raw=raw, **options)
+        with host.stream_script(path, **options) as stream:
+            for event in stream:
+                on_event(path, event)
+            return stream.result
+
+    with Host(pages=workers) as host:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(run, host, path) for path in paths]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
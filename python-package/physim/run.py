@@ -2,9 +2,15 @@
 Python wrapper for running physim scripts.
 """
 
+import json
+import os
+import tempfile
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import nullcontext
 from dataclasses import dataclass
 
-from ._internal import _run_physim_command
+from ._internal import _run_physim_command, _start_physim_command
 
 
 @dataclass
@@ -23,6 +29,14 @@ class PhysimResult:
     exit_code: int
     stdout: str
     stderr: str
+    filepath: str | None = None
+    profile: dict | None = None
+    """
+    With profiling, the frame time percentiles ("frame_time_ms" with "mean", "p50",
+    "p95", "p99" and "max"), the "frames" measured, per region "calls", "total_ms",
+    "mean_ms" and "max_ms" under "regions", and the "trace_path" of the Chrome trace
+    if one was written.
+    """
 
     @property
     def is_system_failure(self) -> bool:
@@ -35,16 +49,91 @@ class PhysimResult:
         return self.exit_code == 0
 
 
+def _run_args(
+    filepath: str,
+    raw: bool,
+    video_output_path: str | None,
+    record_preset: str | None,
+    record_threads: int | None,
+    webview: bool,
+    headless: bool,
+    no_audio: bool,
+    no_throttle: bool,
+    compute_only: bool,
+    draw_every: int | None,
+    max_traceback: int,
+    restrictions: Restrictions | None,
+    profiling: bool,
+    profile_output_path: str | None,
+    profile_summary_path: str | None,
+    params: dict | None = None,
+) -> list[str]:
+    args = ["run"]
+    if raw:
+        args.append("--raw")
+    if video_output_path:
+        args.extend(["--record", video_output_path])
+    if record_preset is not None:
+        args.extend(["--record-preset", record_preset])
+    if record_threads is not None:
+        args.extend(["--record-threads", str(record_threads)])
+    if headless:
+        args.append("--headless")
+    elif webview:
+        args.append("--webview")
+    if no_audio:
+        args.append("--no-audio")
+    if no_throttle:
+        args.append("--no-throttle")
+    if profiling:
+        args.append("--profiling")
+    if profiling and profile_output_path:
+        args.extend(["--profile-out", profile_output_path])
+    if profiling and profile_summary_path:
+        args.extend(["--_profile-summary-out", profile_summary_path])
+    if compute_only:
+        args.append("--compute-only")
+    if draw_every is not None:
+        args.extend(["--draw-every", str(draw_every)])
+    if restrictions and restrictions.error_on_time is not None:
+        args.extend(["--_error-on-time", str(restrictions.error_on_time)])
+    if restrictions and restrictions.error_on_frame_time is not None:
+        args.extend(["--_error-on-frame-time", str(restrictions.error_on_frame_time)])
+    if restrictions and restrictions.error_on_finish_before is not None:
+        args.extend(["--_error-on-finish-before", str(restrictions.error_on_finish_before)])
+    if params is not None:
+        args.extend(["--params", json.dumps(params)])
+    args.extend(["--max-traceback", str(max_traceback)])
+    args.append(filepath)
+    return args
+
+
+def _read_profile_summary(path: str) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # The run failed before the profile was written
+        return None
+
+
 def run_script(
     filepath: str,
     raw: bool = False,
     video_output_path: str | None = None,
+    record_preset: str | None = None,
+    record_threads: int | None = None,
     webview: bool = False,
     headless: bool = False,
     no_audio: bool = False,
     no_throttle: bool = False,
+    compute_only: bool = False,
+    draw_every: int | None = None,
     max_traceback: int = 10,
     restrictions: Restrictions | None = None,
+    profiling: bool = False,
+    profile_output_path: str | None = None,
+    params: dict | None = None,
 ) -> PhysimResult:
     """
     Run a physim script and capture its output.
@@ -53,36 +142,256 @@ def run_script(
         filepath: Path to the TypeScript file to run
         raw: Whether to use --raw flag for machine-parsable output
         video_output_path: Optional path to save a video of the simulation.
+        record_preset: x264 preset for the recording, e.g. "ultrafast" or "medium".
+        record_threads: Number of threads ffmpeg uses to encode the recording.
         webview: Whether to run the simulation in a webview window.
         headless: Whether to run the simulation in a headless browser (Playwright).
         no_audio: Whether to disable audio playback.
         no_throttle: Whether to disable FPS throttling (run at maximum speed).
+        compute_only: Whether to step the simulation headless as fast as possible
+            without drawing. Restrictions and logs still apply.
+        draw_every: Only draw every nth frame. With compute_only, None never draws.
         max_traceback: Maximum number of traceback frames to show in runtime errors.
         restrictions: Optional restrictions for the simulation.
+        profiling: Whether to profile the `@profile` regions and frame times. The
+            summary is returned as `PhysimResult.profile`.
+        profile_output_path: Optional path to save a Chrome trace of every profiled
+            region and frame, viewable in Perfetto or speedscope. Needs profiling.
+        params: Optional JSON serializable dict the simulation reads as `sim.params`.
+            Runs that only differ in params reuse one type checked and bundled build.
 
     Returns:
         PhysimResult containing exit code and output
     """
-    args = ["run"]
-    if raw:
-        args.append("--raw")
-    if video_output_path:
-        args.extend(["--record", video_output_path])
-    if headless:
-        args.append("--headless")
-    elif webview:
-        args.append("--webview")
-    if no_audio:
-        args.append("--no-audio")
-    if no_throttle:
-        args.append("--no-throttle")
-    if restrictions and restrictions.error_on_time is not None:
-        args.extend(["--_error-on-time", str(restrictions.error_on_time)])
-    if restrictions and restrictions.error_on_frame_time is not None:
-        args.extend(["--_error-on-frame-time", str(restrictions.error_on_frame_time)])
-    if restrictions and restrictions.error_on_finish_before is not None:
-        args.extend(["--_error-on-finish-before", str(restrictions.error_on_finish_before)])
-    args.extend(["--max-traceback", str(max_traceback)])
-    args.append(filepath)
-    exit_code, stdout, stderr = _run_physim_command(args)
-    return PhysimResult(exit_code=exit_code, stdout=stdout, stderr=stderr)
+    # The summary is written to a file, since stdout holds the logs
+    profile_dir = tempfile.TemporaryDirectory(prefix="physim_profile_") if profiling else None
+    with profile_dir or nullcontext() as tmp:
+        summary_path = os.path.join(tmp, "summary.json") if tmp else None
+        args = _run_args(
+            filepath,
+            raw=raw,
+            video_output_path=video_output_path,
+            record_preset=record_preset,
+            record_threads=record_threads,
+            webview=webview,
+            headless=headless,
+            no_audio=no_audio,
+            no_throttle=no_throttle,
+            compute_only=compute_only,
+            draw_every=draw_every,
+            max_traceback=max_traceback,
+            restrictions=restrictions,
+            profiling=profiling,
+            profile_output_path=profile_output_path,
+            profile_summary_path=summary_path,
+            params=params,
+        )
+        exit_code, stdout, stderr = _run_physim_command(args)
+        profile = _read_profile_summary(summary_path) if summary_path else None
+    return PhysimResult(
+        exit_code=exit_code, stdout=stdout, stderr=stderr, filepath=filepath, profile=profile
+    )
+
+
+class PhysimStream:
+    """
+    The events of a running physim script, in the order they happen.
+
+    Iterating yields one dict per event, each with an "event" key:
+
+    - ``{"event": "log", "text": ...}`` for every line the simulation logs
+    - ``{"event": "frame", "frame": n}`` a few times per second as the simulation runs
+    - ``{"event": "error", "tag": ..., "reason": ...}`` if the run fails
+    - ``{"event": "profile", "summary": ...}`` at the end of a profiled run, with the
+      summary that also becomes `PhysimResult.profile`
+    - for logged lines that are JSON objects with a "type", such as the results the
+      test helpers print, ``{"event": <type>, ...}`` with the rest of the object,
+      e.g. ``{"event": "test_pass", "name": ...}``
+
+    Only the last `max_log_lines` log lines are kept, so memory stays bounded no matter
+    how long the simulation runs. `result` waits for the run to end and returns its
+    `PhysimResult`, whose stdout holds those kept lines.
+
+    Example:
+        with stream_script("sim.ts", headless=True) as stream:
+            for event in stream:
+                print(event)
+            print(stream.result.success)
+    """
+
+    def __init__(
+        self,
+        events: Iterator[dict],
+        finish: Callable[[bool], tuple[int, str]],
+        filepath: str | None = None,
+        max_log_lines: int = 1000,
+    ) -> None:
+        """
+        Args:
+            events: The raw events sent by physim.
+            finish: Called once, when the events are exhausted or the stream is closed.
+                Stops the run first if passed True, releases its resources and returns
+                the exit code and stderr.
+            filepath: The script being run.
+            max_log_lines: How many of the last log lines to keep for the result.
+        """
+        self.filepath = filepath
+        self._events = events
+        self._finish = finish
+        self._logs: deque[str] = deque(maxlen=max_log_lines)
+        self._result: PhysimResult | None = None
+        self._profile: dict | None = None
+        # Set once every event was read, when the run has ended on its own
+        self._exhausted = False
+
+    def __iter__(self) -> "PhysimStream":
+        return self
+
+    def __next__(self) -> dict:
+        if self._result is not None:
+            raise StopIteration
+        try:
+            event = next(self._events)
+        except StopIteration:
+            self._exhausted = True
+            raise
+        if event.get("event") == "profile":
+            self._profile = event.get("summary")
+        if event.get("event") != "log":
+            return event
+
+        text = str(event.get("text", ""))
+        self._logs.append(text)
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return event
+        if isinstance(data, dict) and isinstance(data.get("type"), str):
+            data = dict(data)
+            return {"event": data.pop("type"), **data}
+        return event
+
+    def __enter__(self) -> "PhysimStream":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def result(self) -> PhysimResult:
+        """Wait for the run to end, skipping any events not yet iterated, and return its result."""
+        if self._result is None:
+            for _ in self:
+                pass
+            self._end(stop=False)
+        return self._result
+
+    def close(self) -> None:
+        """Stop the run if it hasn't ended yet. `result` then reports the stopped run."""
+        if self._result is None:
+            self._end(stop=not self._exhausted)
+
+    def _end(self, stop: bool) -> None:
+        exit_code, stderr = self._finish(stop)
+        stdout = "".join(f"{line}\n" for line in self._logs)
+        self._result = PhysimResult(
+            exit_code=exit_code,
+            stdout=stdout,
+            stderr=stderr,
+            filepath=self.filepath,
+            profile=self._profile,
+        )
+
+
+def _parse_event_lines(lines: Iterator[str]) -> Iterator[dict]:
+    for line in lines:
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(data, dict) and "event" in data:
+            yield data
+
+
+def stream_script(
+    filepath: str,
+    video_output_path: str | None = None,
+    record_preset: str | None = None,
+    record_threads: int | None = None,
+    webview: bool = False,
+    headless: bool = False,
+    no_audio: bool = False,
+    no_throttle: bool = False,
+    compute_only: bool = False,
+    draw_every: int | None = None,
+    max_traceback: int = 10,
+    restrictions: Restrictions | None = None,
+    profiling: bool = False,
+    profile_output_path: str | None = None,
+    max_log_lines: int = 1000,
+    params: dict | None = None,
+) -> PhysimStream:
+    """
+    Run a physim script and stream its events while it runs.
+
+    Takes the same options as `run_script`. Logs are always raw, since every line
+    arrives as its own event.
+
+    Args:
+        filepath: Path to the TypeScript file to run
+        max_log_lines: How many of the last log lines the final result keeps in stdout.
+
+    Returns:
+        A PhysimStream yielding the events of the run. Close it, or use it as a context
+        manager, to stop the run early.
+    """
+    args = _run_args(
+        filepath,
+        raw=False,
+        video_output_path=video_output_path,
+        record_preset=record_preset,
+        record_threads=record_threads,
+        webview=webview,
+        headless=headless,
+        no_audio=no_audio,
+        no_throttle=no_throttle,
+        compute_only=compute_only,
+        draw_every=draw_every,
+        max_traceback=max_traceback,
+        restrictions=restrictions,
+        profiling=profiling,
+        profile_output_path=profile_output_path,
+        profile_summary_path=None,
+        params=params,
+    )
+    args.insert(1, "--stream")
+
+    # stderr goes to a file, so the process can't block on a pipe nobody reads
+    stderr_file = tempfile.TemporaryFile()
+    try:
+        process = _start_physim_command(args, stderr_file)
+    except FileNotFoundError:
+        stderr_file.close()
+        return PhysimStream(
+            iter(()),
+            lambda stop: (-1, "physim command not found. Is it installed and in PATH?"),
+            filepath=filepath,
+            max_log_lines=max_log_lines,
+        )
+
+    def finish(stop: bool) -> tuple[int, str]:
+        if stop and process.poll() is None:
+            process.terminate()
+        exit_code = process.wait()
+        process.stdout.close()
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode(errors="replace")
+        stderr_file.close()
+        return exit_code, stderr
+
+    return PhysimStream(
+        _parse_event_lines(process.stdout),
+        finish,
+        filepath=filepath,
+        max_log_lines=max_log_lines,
+    )
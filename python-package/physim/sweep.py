@@ -0,0 +1,166 @@
+"""
+Python wrapper for running a physim script over a grid of parameters.
+"""
+
+import itertools
+import json
+import os
+from collections.abc import Iterable, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from .host import Host
+from .run import PhysimResult, Restrictions
+
+# Failures of building the script, which every other point of the sweep would repeat
+_BUILD_FAILURE_TAGS = (
+    "ENTRY_POINT_NOT_FOUND_FAILURE",
+    "TS_CONFIG_MISSING_FAILURE",
+    "TYPE_CHECK_FAILURE",
+    "BUILD_FAILURE",
+)
+
+
+@dataclass
+class SweepRun:
+    """One point of a sweep."""
+
+    params: dict
+    """The params the script was run with, as `sim.params`."""
+    reported: dict
+    """The values the script reported with `report` from "physim/logging"."""
+    result: PhysimResult
+
+    @property
+    def success(self) -> bool:
+        """Check if the script ran successfully with these params."""
+        return self.result.success
+
+
+@dataclass
+class SweepReport:
+    """Results of running a physim script over a grid of parameters."""
+
+    runs: list[SweepRun]
+    """One run per point, in the order of the grid."""
+
+    @property
+    def success(self) -> bool:
+        """Check if every point ran successfully."""
+        return all(run.success for run in self.runs)
+
+    @property
+    def rows(self) -> list[dict]:
+        """
+        The runs as a table, one dict per run with its params, its reported values, its
+        "exit_code" and its "error", which is None if it succeeded. Reported values
+        named like a param replace it. Can be passed straight to `pandas.DataFrame`.
+        """
+        return [
+            {
+                **run.params,
+                **run.reported,
+                "exit_code": run.result.exit_code,
+                "error": None if run.success else run.result.stderr.strip(),
+            }
+            for run in self.runs
+        ]
+
+
+def _expand_grid(param_grid: Mapping[str, Iterable] | Iterable[Mapping]) -> list[dict]:
+    if isinstance(param_grid, Mapping):
+        names = list(param_grid)
+        values = [list(param_grid[name]) for name in names]
+        return [dict(zip(names, point)) for point in itertools.product(*values)]
+    return [dict(point) for point in param_grid]
+
+
+def _reported_values(stdout: str) -> dict:
+    reported: dict = {}
+    for line in stdout.splitlines():
+        try:
+            data = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(data, dict) and data.get("type") == "report":
+            reported.update(data.get("values") or {})
+    return reported
+
+
+def _is_build_failure(result: PhysimResult) -> bool:
+    return result.stderr.startswith(tuple(f"[{tag}]" for tag in _BUILD_FAILURE_TAGS))
+
+
+def sweep(
+    filepath: str,
+    param_grid: Mapping[str, Iterable] | Iterable[Mapping],
+    *,
+    max_workers: int | None = None,
+    restrictions: Restrictions | None = None,
+    no_audio: bool = False,
+    no_throttle: bool = False,
+    compute_only: bool = False,
+    draw_every: int | None = None,
+    max_traceback: int = 10,
+) -> SweepReport:
+    """
+    Run one physim script once per point of a parameter grid.
+
+    The script reads the point it is run with as `sim.params`, and reports its results
+    with `report` from "physim/logging". It is type checked and bundled once for the
+    whole sweep, and every point runs on the same `Host`, so a sweep of many points
+    costs one build and one browser launch.
+
+    Example:
+        report = sweep("orbit.ts", {"G": [0.5, 1, 2], "bodies": [10, 100]}, max_workers=4)
+        for row in report.rows:
+            print(row["G"], row["bodies"], row["energy"])
+
+    Args:
+        filepath: Path to the TypeScript file to run
+        param_grid: Either a dict of lists of values per param, which is run for every
+            combination of them, or the points to run as a list of dicts. Values must be
+            JSON serializable.
+        max_workers: Maximum number of points running at once. Defaults to the CPU count.
+        restrictions: Optional restrictions applied to every run.
+        no_audio: Whether to disable audio playback.
+        no_throttle: Whether to disable FPS throttling (run at maximum speed).
+        compute_only: Whether to step the simulations without drawing.
+        draw_every: Only draw every nth frame. With compute_only, None never draws.
+        max_traceback: Maximum number of traceback frames to show in runtime errors.
+
+    Returns:
+        SweepReport with a run per point. If the script fails to build, every point
+        fails with that error without running.
+
+    Raises:
+        RuntimeError: If the host could not be started.
+    """
+    points = _expand_grid(param_grid)
+    if not points:
+        return SweepReport(runs=[])
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(points)))
+
+    options = dict(
+        raw=True,
+        no_audio=no_audio,
+        no_throttle=no_throttle,
+        compute_only=compute_only,
+        draw_every=draw_every,
+        max_traceback=max_traceback,
+        restrictions=restrictions,
+    )
+
+    def run(host: Host, params: dict) -> SweepRun:
+        result = host.run_script(filepath, params=params, **options)
+        return SweepRun(params=params, reported=_reported_values(result.stdout), result=result)
+
+    with Host(pages=workers) as host:
+        # The first point builds the script, which the rest then reuse
+        first = run(host, points[0])
+        if _is_build_failure(first.result):
+            skipped = [SweepRun(params=p, reported={}, result=first.result) for p in points[1:]]
+            return SweepReport(runs=[first] + skipped)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            rest = list(executor.map(lambda params: run(host, params), points[1:]))
+    return SweepReport(runs=[first] + rest)
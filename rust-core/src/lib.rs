@@ -1,20 +1,104 @@
 use once_cell::sync::OnceCell;
-use rodio::{Decoder, DeviceSinkBuilder, MixerDeviceSink, source::Source};
+use rodio::{
+    ChannelCount, Decoder, DeviceSinkBuilder, MixerDeviceSink, Sample, SampleRate, source::Source,
+};
 use std::{
+    collections::VecDeque,
     ffi::CStr,
     fs::File,
     io::BufReader,
     os::raw::c_char,
-    sync::mpsc::{self, Sender},
+    sync::{
+        Arc, Mutex,
+        atomic::{AtomicBool, Ordering},
+        mpsc::{self, Sender},
+    },
     thread,
+    time::Duration,
 };
 
-static AUDIO_TX: OnceCell<Sender<String>> = OnceCell::new();
+/// How many sounds can play at once. Triggering another one stops the oldest.
+const MAX_VOICES: usize = 32;
+
+/// A sound decoded once at registration and shared by every voice playing it.
+struct SoundData {
+    samples: Arc<[Sample]>,
+    channels: ChannelCount,
+    sample_rate: SampleRate,
+    // Interleaved samples per frame, for stopping voices on frame boundaries
+    frame_len: usize,
+}
+
+/// Shared between a voice, which the mixer owns, and the audio thread.
+struct VoiceState {
+    stopped: AtomicBool,
+    finished: AtomicBool,
+}
+
+/// One playback of a registered sound, reading straight from the decoded samples.
+struct Voice {
+    sound: Arc<SoundData>,
+    pos: usize,
+    volume: f32,
+    state: Arc<VoiceState>,
+}
+
+impl Iterator for Voice {
+    type Item = Sample;
+
+    fn next(&mut self) -> Option<Sample> {
+        let at_frame_start = self.pos % self.sound.frame_len == 0;
+        if self.pos >= self.sound.samples.len()
+            || (at_frame_start && self.state.stopped.load(Ordering::Relaxed))
+        {
+            self.state.finished.store(true, Ordering::Relaxed);
+            return None;
+        }
+        let sample = self.sound.samples[self.pos] * self.volume;
+        self.pos += 1;
+        Some(sample)
+    }
+}
+
+impl Source for Voice {
+    fn current_span_len(&self) -> Option<usize> {
+        // Unknown, since the voice can be stopped early
+        None
+    }
+
+    fn channels(&self) -> ChannelCount {
+        self.sound.channels
+    }
+
+    fn sample_rate(&self) -> SampleRate {
+        self.sound.sample_rate
+    }
+
+    fn total_duration(&self) -> Option<Duration> {
+        None
+    }
+}
+
+enum AudioCommand {
+    PlayFile(String),
+    PlaySound(Arc<SoundData>, f32),
+}
+
+static AUDIO_TX: OnceCell<Sender<AudioCommand>> = OnceCell::new();
+// Slots of unregistered sounds are None, and reused by the next registered sound
+static SOUNDS: Mutex<Vec<Option<Arc<SoundData>>>> = Mutex::new(Vec::new());
 
-fn spawn_audio_thread() -> Sender<String> {
-    let (tx, rx) = mpsc::channel::<String>();
+fn lock_sounds() -> std::sync::MutexGuard<'static, Vec<Option<Arc<SoundData>>>> {
+    match SOUNDS.lock() {
+        Ok(s) => s,
+        Err(poisoned) => poisoned.into_inner(),
+    }
+}
+
+fn spawn_audio_thread() -> Sender<AudioCommand> {
+    let (tx, rx) = mpsc::channel::<AudioCommand>();
 
-    // Spawn a dedicated thread that owns the device sink and decodes/plays files.
+    // Spawn a dedicated thread that owns the device sink and the playing voices.
     thread::spawn(move || {
         // Try to open the default device sink once.
         let mixer_sink: MixerDeviceSink = match DeviceSinkBuilder::open_default_sink() {
@@ -25,26 +109,35 @@ fn spawn_audio_thread() -> Sender<String> {
             }
         };
 
-        // Loop and handle file requests.
-        for path in rx {
-            // open file
-            match File::open(&path) {
-                Ok(f) => {
-                    let reader = BufReader::new(f);
-
-                    // Decode using rodio's Decoder (Symphonia backend).
-                    match Decoder::try_from(reader) {
-                        Ok(source) => {
-                            // Add to the mixer; this is non-blocking.
-                            mixer_sink.mixer().add(source);
-                        }
-                        Err(e) => {
-                            eprintln!("audio: decode error for '{}': {}", path, e);
+        // Oldest first, so the front is the voice to steal
+        let mut voices: VecDeque<Arc<VoiceState>> = VecDeque::new();
+
+        for command in rx {
+            match command {
+                AudioCommand::PlayFile(path) => match open_file(&path) {
+                    // Add to the mixer; this is non-blocking.
+                    Ok(source) => mixer_sink.mixer().add(source),
+                    Err(e) => eprintln!("audio: {}", e),
+                },
+                AudioCommand::PlaySound(sound, volume) => {
+                    voices.retain(|v| !v.finished.load(Ordering::Relaxed));
+                    while voices.len() >= MAX_VOICES {
+                        if let Some(oldest) = voices.pop_front() {
+                            oldest.stopped.store(true, Ordering::Relaxed);
                         }
                     }
-                }
-                Err(e) => {
-                    eprintln!("audio: failed to open '{}': {}", path, e);
+
+                    let state = Arc::new(VoiceState {
+                        stopped: AtomicBool::new(false),
+                        finished: AtomicBool::new(false),
+                    });
+                    voices.push_back(state.clone());
+                    mixer_sink.mixer().add(Voice {
+                        sound,
+                        pos: 0,
+                        volume,
+                        state,
+                    });
                 }
             }
         }
@@ -55,34 +148,137 @@ fn spawn_audio_thread() -> Sender<String> {
     tx
 }
 
-fn get_audio_sender() -> &'static Sender<String> {
-    AUDIO_TX.get_or_init(spawn_audio_thread)
+fn send_audio_command(command: AudioCommand) -> bool {
+    AUDIO_TX
+        .get_or_init(spawn_audio_thread)
+        .send(command)
+        .is_ok()
+}
+
+fn open_file(path: &str) -> Result<Decoder<BufReader<File>>, String> {
+    let file = File::open(path).map_err(|e| format!("failed to open '{}': {}", path, e))?;
+    // Decode using rodio's Decoder (Symphonia backend).
+    Decoder::try_from(BufReader::new(file))
+        .map_err(|e| format!("decode error for '{}': {}", path, e))
+}
+
+/// Converts a C string argument, or returns None if it is null or not UTF-8.
+///
+/// Safety: `ptr` must be null or a valid, null-terminated C string.
+unsafe fn path_arg(ptr: *const c_char) -> Option<String> {
+    if ptr.is_null() {
+        return None;
+    }
+    let cstr = unsafe { CStr::from_ptr(ptr) };
+    match cstr.to_str() {
+        Ok(s) => Some(s.to_owned()),
+        Err(_) => {
+            eprintln!("audio: invalid UTF-8 path passed");
+            None
+        }
+    }
 }
 
 /// Exported FFI function: enqueue the path and return immediately.
 ///
+/// The file is opened and decoded on every call. Sounds played repeatedly should be
+/// registered with `register_sound` instead.
+///
 /// Returns 0 on success, 1 on invalid path, 2 on audio thread failure.
 ///
 /// Safety: `path` must be a valid, null-terminated C string.
 #[unsafe(no_mangle)]
 pub unsafe extern "C" fn play_audio(path: *const c_char) -> i32 {
-    if path.is_null() {
+    let Some(path_str) = (unsafe { path_arg(path) }) else {
         return 1;
+    };
+
+    // Send to audio thread; ignore send failure (means thread exited).
+    if !send_audio_command(AudioCommand::PlayFile(path_str)) {
+        eprintln!("audio: audio thread not available");
+        return 2;
     }
 
-    // Convert C string -> Rust String. If conversion fails, just return.
-    let cstr = unsafe { CStr::from_ptr(path) };
-    let path_str = match cstr.to_str() {
-        Ok(s) => s.to_owned(),
-        Err(_) => {
-            eprintln!("audio: invalid UTF-8 path passed");
-            return 1;
+    0
+}
+
+/// Exported FFI function: decode a sound file into memory so it can be played by id.
+///
+/// Returns the id of the sound (0 or more), -1 on invalid path, -2 if the file can't be
+/// opened or decoded.
+///
+/// Safety: `path` must be a valid, null-terminated C string.
+#[unsafe(no_mangle)]
+pub unsafe extern "C" fn register_sound(path: *const c_char) -> i32 {
+    let Some(path_str) = (unsafe { path_arg(path) }) else {
+        return -1;
+    };
+
+    let decoder = match open_file(&path_str) {
+        Ok(d) => d,
+        Err(e) => {
+            eprintln!("audio: {}", e);
+            return -2;
         }
     };
+    let channels = decoder.channels();
+    let sample_rate = decoder.sample_rate();
+    let samples: Arc<[Sample]> = decoder.collect();
+    let frame_len = usize::from(u16::from(channels)).max(1);
 
-    // Send to audio thread; ignore send failure (means thread exited).
-    let sender = get_audio_sender();
-    if sender.send(path_str).is_err() {
+    let sound = Some(Arc::new(SoundData {
+        samples,
+        channels,
+        sample_rate,
+        frame_len,
+    }));
+    let mut sounds = lock_sounds();
+    match sounds.iter().position(Option::is_none) {
+        Some(free) => {
+            sounds[free] = sound;
+            free as i32
+        }
+        None => {
+            sounds.push(sound);
+            (sounds.len() - 1) as i32
+        }
+    }
+}
+
+/// Exported FFI function: free the samples of a registered sound. Voices still playing
+/// it finish, and its id may be given to a sound registered later.
+///
+/// Returns 0 on success, 1 on unknown id.
+#[unsafe(no_mangle)]
+pub extern "C" fn unregister_sound(id: i32) -> i32 {
+    let mut sounds = lock_sounds();
+    match usize::try_from(id).ok().and_then(|i| sounds.get_mut(i)) {
+        Some(slot) if slot.is_some() => {
+            *slot = None;
+            0
+        }
+        _ => 1,
+    }
+}
+
+/// Exported FFI function: play a registered sound at `volume` (1.0 is unchanged) and
+/// return immediately. When `MAX_VOICES` sounds are already playing, the oldest stops.
+///
+/// Returns 0 on success, 1 on unknown id, 2 on audio thread failure.
+#[unsafe(no_mangle)]
+pub extern "C" fn play_sound(id: i32, volume: f32) -> i32 {
+    let sound = {
+        let sounds = lock_sounds();
+        match usize::try_from(id)
+            .ok()
+            .and_then(|i| sounds.get(i)?.as_ref())
+        {
+            Some(sound) => sound.clone(),
+            None => return 1,
+        }
+    };
+
+    if !send_audio_command(AudioCommand::PlaySound(sound, volume)) {
         eprintln!("audio: audio thread not available");
         return 2;
     }
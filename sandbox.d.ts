@@ -35,8 +35,13 @@ declare global {
     document: Document;
     resizeCanvas: (width: number, height: number) => void;
     addSound: (props: SoundProps) => Promise<number>;
-    playSound: (sound: number) => void;
-    run: (onUpdate: () => void) => Promise<void>;
+    addSounds: (props: SoundProps[]) => Promise<number[]>;
+    playSound: (sound: number, volume?: number) => void;
+    run: (onUpdate: () => void | Promise<void>) => Promise<void>;
+    /** The JSON object the run was given with `--params`, or `{}`. */
+    params: Readonly<Record<string, any>>;
+    isRenderFrame: () => boolean;
+    reportCulling: (drawn: number, culled: number) => void;
     addFetchAsset: (path: string, fetchAddr: string) => Promise<void>;
     __PROFILE_ENTER: (name: string) => void;
     __PROFILE_EXIT: () => void;
@@ -45,6 +50,7 @@ declare global {
     createShader: (program: ShaderProgram, config?: ShaderConfig) => Shader;
     setShaderUniforms: (shader: Shader, uniforms: Record<string, UniformDefinition>) => void;
     applyShader: (shader: Shader) => void;
+    applyShaders: (shaders: readonly Shader[]) => void;
     clear: (color: string) => void;
   };
 }
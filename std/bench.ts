@@ -0,0 +1,124 @@
+/**
+ * Benchmark library for the physim benchmark scenarios in bench/.
+ * Every measured case is logged as a line of JSON, which `physim bench` collects.
+ */
+
+// Time from the start of the page to the scenario running, which covers loading the
+// runtime and the bundle
+const startupMs = performance.now();
+
+/**
+ * Parameters of a benchmark case, such as the number of bodies.
+ */
+export type BenchParams = Record<string, number | string>;
+
+/**
+ * Options for a benchmark case.
+ */
+export interface BenchOptions {
+  /** Measured frames. Defaults to 30. */
+  frames?: number;
+  /** Frames run before measuring, so caches and the JIT are warm. Defaults to 1. */
+  warmup?: number;
+}
+
+// Chromium only, and null elsewhere
+function heapBytes(): number | null {
+  const memory = (performance as { memory?: { usedJSHeapSize: number } }).memory;
+  return memory ? memory.usedJSHeapSize : null;
+}
+
+function percentile(sorted: number[], p: number): number {
+  const rank = Math.ceil((p / 100) * sorted.length) - 1;
+  return sorted[Math.min(sorted.length - 1, Math.max(0, rank))] ?? 0;
+}
+
+function round(ms: number): number {
+  return Math.round(ms * 1000) / 1000;
+}
+
+function report(name: string, params: BenchParams, times: number[]): void {
+  const sorted = [...times].sort((a, b) => a - b);
+  const mean = times.reduce((sum, t) => sum + t, 0) / Math.max(1, times.length);
+  sim.log(
+    JSON.stringify({
+      type: "bench",
+      name,
+      params,
+      frames: times.length,
+      frame_ms: {
+        mean: round(mean),
+        p50: round(percentile(sorted, 50)),
+        p95: round(percentile(sorted, 95)),
+        p99: round(percentile(sorted, 99)),
+        max: round(sorted[sorted.length - 1] ?? 0),
+      },
+      heap_bytes: heapBytes(),
+      startup_ms: round(startupMs),
+    }),
+  );
+}
+
+/**
+ * Times `frame` once per frame and logs the frame time percentiles, the heap size and
+ * the startup time of the simulation.
+ * @param name The name of the case, such as "gravity/barnes-hut".
+ * @param params What the case was run with, such as `{ bodies: 1000 }`.
+ * @param frame Runs one frame of the case.
+ * @param options How many frames to run.
+ */
+export async function bench(
+  name: string,
+  params: BenchParams,
+  frame: () => void | Promise<void>,
+  options: BenchOptions = {},
+): Promise<void> {
+  const frames = options.frames ?? 30;
+  for (let i = 0; i < (options.warmup ?? 1); i++) {
+    await frame();
+  }
+  const times: number[] = [];
+  for (let i = 0; i < frames; i++) {
+    const start = performance.now();
+    await frame();
+    times.push(performance.now() - start);
+  }
+  report(name, params, times);
+}
+
+/**
+ * Runs `update` through `sim.run` for a number of frames, and logs like `bench` with
+ * the time between consecutive frames. Unlike `bench`, this includes the work the
+ * runtime does per frame, such as presenting and recording it. The run is finished
+ * afterwards, so this must be the last case of a scenario.
+ * @param name The name of the case, such as "record/draw".
+ * @param params What the case was run with, such as `{ shapes: 1000 }`.
+ * @param update Runs one frame of the case.
+ * @param options How many frames to run.
+ */
+export async function benchRun(
+  name: string,
+  params: BenchParams,
+  update: () => void,
+  options: BenchOptions = {},
+): Promise<void> {
+  const frames = options.frames ?? 30;
+  const warmup = options.warmup ?? 1;
+  const times: number[] = [];
+  let frame = 0;
+  let last = 0;
+  await sim.run(() => {
+    const now = performance.now();
+    if (frame > warmup) {
+      times.push(now - last);
+    }
+    last = now;
+    if (frame === warmup + frames) {
+      sim.finish();
+      return;
+    }
+    update();
+    frame++;
+  });
+  report(name, params, times);
+}
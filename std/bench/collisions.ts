@@ -0,0 +1,51 @@
+// Measures the collision world as the number of colliding bodies grows, using the
+// container and falling balls of `examples/collisions.ts`.
+// Run with `physim bench --only collisions`.
+import { Entity, Physics, Vec2 } from "physim/base";
+import { Body, createCircle, createRectangle, initBodyComponent } from "physim/bodies";
+import { initCollisionForce } from "physim/forces/collision";
+import { bench } from "../bench.ts";
+
+const FRAMES = 30;
+const SIZE = 4_000;
+const WALL = 40;
+
+let seed = 1;
+const random = (): number => (seed = (seed * 1103515245 + 12345) % 2147483648) / 2147483648;
+
+async function benchCollisions(count: number): Promise<void> {
+  seed = 1;
+  const physics = new Physics();
+  physics.constantPull = new Vec2(0, 10);
+  const bodyComp = initBodyComponent(physics);
+  const { staticComponent } = await initCollisionForce(physics, bodyComp, {
+    restitution: 0.8,
+  });
+
+  const walls: [Vec2, number, number][] = [
+    [new Vec2(0, SIZE / 2), SIZE, WALL],
+    [new Vec2(0, -SIZE / 2), SIZE, WALL],
+    [new Vec2(SIZE / 2, 0), WALL, SIZE],
+    [new Vec2(-SIZE / 2, 0), WALL, SIZE],
+  ];
+  for (const [pos, width, height] of walls) {
+    Entity.create(pos, [
+      [bodyComp, Body.fromShape(createRectangle(width, height))],
+      [staticComponent, true],
+    ]);
+  }
+
+  for (let i = 0; i < count; i++) {
+    const pos = new Vec2((random() - 0.5) * SIZE * 0.9, (random() - 0.5) * SIZE * 0.9);
+    Entity.create(pos, [
+      [bodyComp, Body.fromShape(createCircle(4 + random() * 8))],
+      [physics.velocity, new Vec2((random() - 0.5) * 200, (random() - 0.5) * 200)],
+    ]);
+  }
+
+  await bench("collisions", { bodies: count }, () => physics.update(), { frames: FRAMES });
+}
+
+for (const count of [100, 1_000, 5_000]) {
+  await benchCollisions(count);
+}
@@ -0,0 +1,79 @@
+// Compares drawing primitives one by one with drawing them from a `Display`, where
+// consecutive shapes of the same color are batched into a single path.
+// Run with `physim bench --only draw`.
+import { Camera, Color, Component, Display, Draw, Entity, Vec2 } from "physim/base";
+import { log } from "physim/logging";
+import { bench } from "../bench.ts";
+
+const FRAMES = 10;
+const COLORS = [
+  Color.fromRGB(255, 80, 80),
+  Color.fromRGB(80, 255, 80),
+  Color.fromRGB(80, 80, 255),
+];
+
+let seed = 1;
+const random = (): number => (seed = (seed * 1103515245 + 12345) % 2147483648) / 2147483648;
+
+// Counts the fills and strokes reaching the canvas in one call of `draw`
+function countDraws(draw: () => void): number {
+  const ctx = sim.ctx;
+  const fill = ctx.fill;
+  const stroke = ctx.stroke;
+  const fillRect = ctx.fillRect;
+  let calls = 0;
+  ctx.fill = function (...args: any[]) {
+    calls++;
+    return (fill as any).apply(this, args);
+  };
+  ctx.stroke = function (...args: any[]) {
+    calls++;
+    return (stroke as any).apply(this, args);
+  };
+  ctx.fillRect = function (...args: [number, number, number, number]) {
+    calls++;
+    return fillRect.apply(this, args);
+  };
+
+  draw();
+
+  ctx.fill = fill;
+  ctx.stroke = stroke;
+  ctx.fillRect = fillRect;
+  return calls;
+}
+
+for (const count of [10_000, 50_000, 100_000]) {
+  seed = 1;
+  const display = new Display();
+  const shape = new Component<number>();
+  const { width, height } = sim.ctx.canvas;
+  for (let i = 0; i < count; i++) {
+    const pos = new Vec2((random() - 0.5) * width, (random() - 0.5) * height);
+    // Entities are created in color runs, like most scenes add similar objects together
+    Entity.create(pos, [[shape, Math.floor((i / count) * COLORS.length)]]);
+  }
+  const drawShape = (entity: Entity, color: number): void => {
+    if (color === 1) {
+      Draw.rect(entity.pos, 3, 3, COLORS[color]);
+    } else {
+      Draw.circle(entity.pos, 2, COLORS[color]);
+    }
+  };
+  display.registerDrawComponent(shape, drawShape);
+
+  const direct = (): void => {
+    Draw.clear();
+    for (const [entity, color] of shape) {
+      drawShape(entity, color);
+    }
+  };
+  const batched = (): void => display.draw(new Camera());
+
+  log(
+    `primitives=${count} ` +
+      `direct=${countDraws(direct)} draws batched=${countDraws(batched)} draws`,
+  );
+  await bench("draw/direct", { primitives: count }, direct, { frames: FRAMES });
+  await bench("draw/batched", { primitives: count }, batched, { frames: FRAMES });
+}
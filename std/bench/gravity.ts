@@ -0,0 +1,33 @@
+// Compares exact and Barnes-Hut gravity as the number of bodies grows.
+// Run with `physim bench --only gravity`.
+import { Entity, Physics, Vec2 } from "physim/base";
+import { initGravityForce } from "physim/forces/gravity";
+import { bench } from "../bench.ts";
+
+const FRAMES = 10;
+const EXACT_LIMIT = 2_000;
+
+let seed = 1;
+const random = (): number => (seed = (seed * 1103515245 + 12345) % 2147483648) / 2147483648;
+
+async function benchGravity(count: number, approximate: boolean): Promise<void> {
+  seed = 1;
+  const physics = new Physics({ denseStorage: true });
+  for (let i = 0; i < count; i++) {
+    Entity.create(new Vec2(random() * 10_000, random() * 10_000), [
+      [physics.mass, 1 + random() * 9],
+      [physics.velocity, new Vec2(0, 0)],
+    ]);
+  }
+  initGravityForce(physics, 1, approximate ? { theta: 0.7, softening: 1 } : undefined);
+
+  const name = approximate ? "gravity/barnes-hut" : "gravity/exact";
+  await bench(name, { bodies: count }, () => physics.update(), { frames: FRAMES });
+}
+
+for (const count of [100, 1_000, 10_000, 100_000]) {
+  if (count <= EXACT_LIMIT) {
+    await benchGravity(count, false);
+  }
+  await benchGravity(count, true);
+}
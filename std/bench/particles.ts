@@ -0,0 +1,34 @@
+// Measures the particle system with a large number of live particles.
+// Run with `physim bench --only particles`.
+import { Color, Display, Vec2 } from "physim/base";
+import { Body, createCircle, createRectangle } from "physim/bodies";
+import { ParticleSystem } from "physim/particles";
+import { bench } from "../bench.ts";
+
+const FRAMES = 30;
+
+async function benchParticles(count: number): Promise<void> {
+  const display = new Display();
+  const particles = new ParticleSystem(display);
+  const bodies = [Body.fromShape(createCircle(2)), Body.fromShape(createRectangle(3, 3))];
+  for (const body of bodies) {
+    particles.emit({
+      numParticles: count / bodies.length,
+      position: new Vec2(400, 300),
+      positionJitter: 400,
+      particleLifetime: { min: 100, max: 100 },
+      initialVelocity: { min: 10, max: 60 },
+      acceleration: new Vec2(0, 20),
+      body,
+      color: { start: new Color(255, 200, 0, 1), end: new Color(255, 0, 0, 0) },
+      scale: { start: 1, end: 0.2 },
+      rotationSpeed: { min: -1, max: 1 },
+    });
+  }
+
+  await bench("particles", { particles: count }, () => display.draw(), { frames: FRAMES });
+}
+
+for (const count of [1_000, 10_000, 100_000]) {
+  await benchParticles(count);
+}
@@ -0,0 +1,33 @@
+// Measures recording throughput, with every frame drawn, captured and encoded.
+// Run with `physim bench --only record`, which records it to a temporary file.
+import { Color, Draw, Vec2 } from "physim/base";
+import { benchRun } from "../bench.ts";
+
+const FRAMES = 120;
+const SHAPES = 1_000;
+const COLOR = Color.fromRGB(80, 160, 255);
+
+let seed = 1;
+const random = (): number => (seed = (seed * 1103515245 + 12345) % 2147483648) / 2147483648;
+
+const { width, height } = sim.ctx.canvas;
+const positions: Vec2[] = [];
+for (let i = 0; i < SHAPES; i++) {
+  positions.push(new Vec2((random() - 0.5) * width, (random() - 0.5) * height));
+}
+
+let t = 0;
+await benchRun(
+  "record",
+  { shapes: SHAPES },
+  () => {
+    t++;
+    Draw.clear();
+    // Everything moves, so no two frames encode alike
+    const offset = new Vec2(Math.sin(t / 10) * 20, Math.cos(t / 10) * 20);
+    for (const pos of positions) {
+      Draw.circle(pos.add(offset), 3, COLOR);
+    }
+  },
+  { frames: FRAMES },
+);
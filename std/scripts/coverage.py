@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
+import hashlib
+import json
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # --- Configuration ---
@@ -10,6 +13,20 @@ TESTS_DIR = Path("tests")
 IGNORE_TEST_FILES = {"tests/exampleTest.test.ts"}
 IGNORE_SRC_TEST_CHECK = {"src/public/base.ts"}
 
+# Parsed exports of every file and the last results, keyed by content hash
+CACHE_FILE = Path(".coverage_cache.json")
+CACHE_VERSION = 1
+
+# --- Patterns ---
+# export keyword followed by type and name, e.g. export class MyClass
+DIRECT_PATTERN = re.compile(r'^export\s+(?:async\s+)?(?:function|class|const|let|var|interface|type|enum)\s+([a-zA-Z0-9_]+)', re.MULTILINE)
+# export { name1, name2 as alias }
+NAMED_PATTERN = re.compile(r'^export\s*\{([^}]+)\}(?!\s*from)', re.MULTILINE)
+# export * from "..." and export { ... } from "..."
+REEXPORT_PATTERN = re.compile(r'^export\s+(?:\*|\{([^}]+)\})\s+from\s+["\']([^"\']+)["\']', re.MULTILINE)
+# A name is mentioned where it is a whole word, so 'Body' in 'BodyPart' doesn't count
+WORD_PATTERN = re.compile(r'\w+')
+
 # --- Colors ---
 RED = "\033[0;31m"
 GREEN = "\033[0;32m"
@@ -22,75 +39,163 @@ def print_error(msg):
 def print_success(msg):
     print(f"{GREEN}{msg}{NC}")
 
-def get_exports(file_path: Path):
+def file_key(path: Path) -> str:
+    return os.path.relpath(path).replace("\\", "/")
+
+def hash_file(path: Path):
+    """Returns the SHA-256 of a file and its text, or None for both if it doesn't exist."""
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None, None
+    return hashlib.sha256(data).hexdigest(), data.decode()
+
+def split_names(items_str: str):
+    names = []
+    for item in items_str.split(','):
+        item = item.strip()
+        if not item: continue
+        # Handle "name as alias"
+        names.append(item.split(' as ')[-1].strip())
+    return names
+
+def parse_exports(content: str):
     """
-    Extracts exported entities from a TypeScript file.
+    Extracts the exports of a TypeScript file, without following re-exports.
     Handles:
     - export function/class/const/let/var/interface/type/enum
     - export { a, b as c }
-    - Resolves re-exports: export * from "..." and export { ... } from "..."
+    - export * from "..." and export { ... } from "...", returned as
+      [module path, names] pairs, with None as the names of export *
     """
-    exports = set()
-    if not file_path.exists():
-        return exports
+    names = [match.group(1) for match in DIRECT_PATTERN.finditer(content)]
+    for match in NAMED_PATTERN.finditer(content):
+        names.extend(split_names(match.group(1)))
 
-    content = file_path.read_text()
-
-    # 1. Simple direct exports: export keyword followed by type and name
-    # e.g., export class MyClass, export function myFunc, export const myConst
-    # We want to catch the name.
-    direct_pattern = re.compile(r'^export\s+(?:async\s+)?(?:function|class|const|let|var|interface|type|enum)\s+([a-zA-Z0-9_]+)', re.MULTILINE)
-    for match in direct_pattern.finditer(content):
-        exports.add(match.group(1))
-
-    # 2. Named exports: export { name1, name2 as alias }
-    named_pattern = re.compile(r'^export\s*\{([^}]+)\}(?!\s*from)', re.MULTILINE)
-    for match in named_pattern.finditer(content):
-        items = match.group(1).split(',')
-        for item in items:
-            item = item.strip()
-            if not item: continue
-            # Handle "name as alias"
-            name = item.split(' as ')[-1].strip()
-            exports.add(name)
-
-    # 3. Re-exports: export * from "..." and export { ... } from "..."
-    # This is crucial for the public API files.
-    reexport_pattern = re.compile(r'^export\s+(?:\*|\{([^}]+)\})\s+from\s+["\']([^"\']+)["\']', re.MULTILINE)
-    for match in reexport_pattern.finditer(content):
+    reexports = []
+    for match in REEXPORT_PATTERN.finditer(content):
         named_items_str = match.group(1)
-        module_path_str = match.group(2)
-
-        # Resolve the module path relative to the current file
-        # Standard library paths are likely relative: "../base/display.ts"
-        # We need to handle both with and without extension.
-        resolved_path = (file_path.parent / module_path_str).resolve()
-        if not resolved_path.suffix:
-            # Try .ts then /index.ts if needed, but project seems to use explicit .ts usually
-            if resolved_path.with_suffix(".ts").exists():
-                resolved_path = resolved_path.with_suffix(".ts")
-            elif (resolved_path / "index.ts").exists():
-                resolved_path = resolved_path / "index.ts"
-        
-        if resolved_path.exists():
-            if named_items_str:
-                # export { a, b as c } from "..."
-                items = named_items_str.split(',')
-                for item in items:
-                    item = item.strip()
-                    if not item: continue
-                    name = item.split(' as ')[-1].strip()
-                    exports.add(name)
+        reexports.append([match.group(2), split_names(named_items_str) if named_items_str else None])
+
+    return {"names": names, "reexports": reexports}
+
+def resolve_module(file_path: Path, module_path_str: str):
+    """Resolves a relative import, or returns None if there is no such file."""
+    # Standard library paths are likely relative: "../base/display.ts"
+    resolved_path = (file_path.parent / module_path_str).resolve()
+    if not resolved_path.suffix:
+        # Try .ts then /index.ts if needed, but project seems to use explicit .ts usually
+        if resolved_path.with_suffix(".ts").exists():
+            resolved_path = resolved_path.with_suffix(".ts")
+        elif (resolved_path / "index.ts").exists():
+            resolved_path = resolved_path / "index.ts"
+    # Package imports (no leading dot) are skipped as per library rules
+    return Path(file_key(resolved_path)) if resolved_path.exists() else None
+
+class ExportGraph:
+    """
+    The exports and re-exports of every file reached from the sources. Files are parsed
+    in parallel, and only if their content hash isn't in the cache.
+    """
+
+    def __init__(self, cache: dict):
+        self.cached = cache.get("files", {})
+        self.files = {}
+        self.hashes = {}
+        self.edges = {}
+        self.memo = {}
+
+    def add(self, paths):
+        pending = [Path(file_key(p)) for p in paths]
+        with ThreadPoolExecutor() as pool:
+            while pending:
+                pending = [p for p in dict.fromkeys(pending) if file_key(p) not in self.hashes]
+                parsed = list(pool.map(self.parse, pending))
+                reached = []
+                for path, (file_hash, info) in zip(pending, parsed):
+                    key = file_key(path)
+                    self.hashes[key] = file_hash
+                    if info is None:
+                        continue
+                    self.files[key] = {"hash": file_hash, **info}
+                    self.edges[key] = [
+                        (resolve_module(path, module), names) for module, names in info["reexports"]
+                    ]
+                    reached.extend(target for target, _ in self.edges[key] if target is not None)
+                pending = reached
+
+    def parse(self, path: Path):
+        file_hash, content = hash_file(path)
+        if file_hash is None:
+            return None, None
+        cached = self.cached.get(file_key(path))
+        if cached and cached["hash"] == file_hash:
+            return file_hash, {"names": cached["names"], "reexports": cached["reexports"]}
+        return file_hash, parse_exports(content)
+
+    def exports(self, path: Path):
+        """The names exported by a file, following re-exports."""
+        key = file_key(path)
+        if key in self.memo:
+            return self.memo[key]
+        # Guards against cycles, which export nothing more the second time around
+        self.memo[key] = set()
+        exports = set(self.files[key]["names"]) if key in self.files else set()
+        for target, names in self.edges.get(key, []):
+            if target is None:
+                continue
+            if names is not None:
+                exports.update(names)
             else:
-                # export * from "..."
-                exports.update(get_exports(resolved_path))
-        else:
-            # If it's a package import (no leading dot), we skip for now as per library rules
-            pass
+                exports.update(self.exports(target))
+        self.memo[key] = exports
+        return exports
+
+    def closure(self, path: Path):
+        """The file and every file it re-exports from, directly or not."""
+        seen = set()
+        stack = [file_key(path)]
+        while stack:
+            key = stack.pop()
+            if key in seen: continue
+            seen.add(key)
+            stack.extend(file_key(target) for target, _ in self.edges.get(key, []) if target)
+        return seen
+
+def load_cache():
+    try:
+        cache = json.loads(CACHE_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+    return cache if cache.get("version") == CACHE_VERSION else {}
+
+def save_cache(graph: ExportGraph, words: dict, results: dict):
+    cache = {"version": CACHE_VERSION, "files": graph.files, "tests": words, "results": results}
+    tmp = CACHE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(cache))
+    tmp.replace(CACHE_FILE)
+
+def test_words(tests, cache: dict):
+    """The words of every test file, read in one pass, keyed by path with their hash."""
+    cached = cache.get("tests", {})
 
-    return exports
+    def read(test_file: Path):
+        test_hash, content = hash_file(test_file)
+        entry = cached.get(file_key(test_file))
+        if entry and entry["hash"] == test_hash:
+            return entry
+        return {"hash": test_hash, "words": sorted(set(WORD_PATTERN.findall(content)))}
 
-def check_coverage():
+    with ThreadPoolExecutor() as pool:
+        return dict(zip((file_key(t) for t in tests), pool.map(read, tests)))
+
+def result_key(graph: ExportGraph, src_file: Path, relevant_tests, words: dict) -> str:
+    """Changes whenever the exports of `src_file` or its tests may have changed."""
+    sources = sorted((key, graph.hashes[key]) for key in graph.closure(src_file))
+    tests = sorted((file_key(t), words[file_key(t)]["hash"]) for t in relevant_tests)
+    return hashlib.sha256(json.dumps([sources, tests]).encode()).hexdigest()
+
+def check_coverage(changed: bool = False):
     print("Checking test coverage...")
     errors_found = False
 
@@ -166,6 +271,13 @@ def check_coverage():
 
     # --- 3. Export Coverage Check ---
     print("Checking export coverage...")
+    cache = load_cache()
+    graph = ExportGraph(cache)
+    graph.add(src_files)
+    words = test_words(sorted(TESTS_DIR.glob("**/*.test.ts")), cache)
+    cached_results = cache.get("results", {}) if changed else {}
+    results = {}
+
     for src_file in src_files:
         # Find which root it belongs to
         root = None
@@ -195,22 +307,25 @@ def check_coverage():
             
         if not relevant_tests:
             continue # Should have been caught by structure check
-            
-        exports = get_exports(src_file)
-        if not exports:
-            continue
-            
-        # Optimization: read all test contents once per source file
-        test_contents = "\n".join(t.read_text() for t in relevant_tests)
-        
-        for export_name in sorted(exports):
-            # Check if the export name appears as a word in any test file
-            # Using word boundaries to avoid false positives (e.g. 'Body' in 'BodyPart')
-            pattern = re.compile(rf'\b{re.escape(export_name)}\b')
-            if not pattern.search(test_contents):
-                relevant_test_strs = ", ".join(str(t) for t in relevant_tests)
-                print_error(f"Export '{export_name}' in {src_file} is not mentioned in any of its corresponding test files ({relevant_test_strs}).")
-                errors_found = True
+
+        # With --changed, sources whose exports and tests are unchanged keep their last result
+        key = result_key(graph, src_file, relevant_tests, words)
+        cached = cached_results.get(file_key(src_file))
+        if cached and cached["key"] == key:
+            missing = cached["missing"]
+        else:
+            mentioned = set()
+            for test_file in relevant_tests:
+                mentioned.update(words[file_key(test_file)]["words"])
+            missing = sorted(graph.exports(src_file) - mentioned)
+        results[file_key(src_file)] = {"key": key, "missing": missing}
+
+        for export_name in missing:
+            relevant_test_strs = ", ".join(str(t) for t in relevant_tests)
+            print_error(f"Export '{export_name}' in {src_file} is not mentioned in any of its corresponding test files ({relevant_test_strs}).")
+            errors_found = True
+
+    save_cache(graph, words, results)
 
     if errors_found:
         print(f"{RED}Not all exports are covered by tests! Get to work!{NC}")
@@ -222,4 +337,5 @@ def check_coverage():
 if __name__ == "__main__":
     # Ensure we are in the 'std' directory or adjust paths if needed
     # For simplicity, assuming the user runs this from 'std/' as per instructions
-    check_coverage()
+    # --changed only rechecks the exports of sources whose files or tests changed since the last run
+    check_coverage(changed="--changed" in sys.argv[1:])
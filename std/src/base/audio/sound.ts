@@ -3,6 +3,39 @@ import * as Notes from "./notes";
 import * as Synthesize from "./synthesize";
 import { Asset, resolveAssetPath } from "./../assets";
 
+/**
+ * Describes a sound for {@linkcode Sound.createAll}, with the same sources as the
+ * `Sound.from*` functions.
+ */
+export type SoundDefinition = (
+  | { src: Asset }
+  | { midi: Asset | Notes.NoteEvent[]; soundfont: Asset }
+  | { note: string; font: Asset }
+  | { synth: Synthesize.Synth }
+  | { args: string[] }
+) & { effects?: SoundInterface.SoundProps["effects"] };
+
+async function toSoundProps(definition: SoundDefinition): Promise<SoundInterface.SoundProps> {
+  const effects = definition.effects;
+  if ("src" in definition) {
+    return { src: await resolveAssetPath(definition.src), effects };
+  }
+  if ("args" in definition) {
+    return { src: { args: definition.args }, effects };
+  }
+  if ("synth" in definition) {
+    return { src: { args: Synthesize.synthToSoxArgs(definition.synth) }, effects };
+  }
+
+  const midi = "note" in definition ? [{ note: definition.note }] : definition.midi;
+  const soundfont = "note" in definition ? definition.font : definition.soundfont;
+  const fontPath = await resolveAssetPath(soundfont);
+  const midiSrc = Array.isArray(midi)
+    ? midi.map((e) => Notes.noteEventToMidi(e))
+    : await resolveAssetPath(midi);
+  return { src: { midi: midiSrc, soundfont: fontPath }, effects };
+}
+
 /**
  * A sound that can be played.
  */
@@ -20,6 +53,34 @@ export class Sound {
     this.id = id;
   }
 
+  /**
+   * Creates several sounds at once.
+   *
+   * Sounds that have to be synthesized are rendered in parallel, so declaring every sound
+   * of a simulation here is faster than creating them one by one. Synthesized sounds are
+   * also cached between runs.
+   *
+   * @param definitions The sounds to create.
+   * @returns A promise that resolves to the new sounds, in the order of `definitions`.
+   *
+   * @example
+   * ```ts
+   * import { Sound } from "physim/base";
+   * import { Instruments, SFX } from "physim/sounds";
+   *
+   * const [hit, boom, note] = await Sound.createAll([
+   *   { synth: SFX.collision(0.5, 0.8) },
+   *   { synth: SFX.explosion(1) },
+   *   { note: "C4", font: Instruments.PIANO },
+   * ]);
+   * ```
+   */
+  static async createAll(definitions: SoundDefinition[]): Promise<Sound[]> {
+    const props = await Promise.all(definitions.map(toSoundProps));
+    const ids = await sim.addSounds(props);
+    return ids.map((id) => new Sound(id));
+  }
+
   /**
    * Creates a new sound from a source.
    *
@@ -131,8 +192,10 @@ export class Sound {
 
   /**
    * Plays the sound.
+   *
+   * @param volume The volume to play the sound at, where `1` is unchanged. Defaults to `1`.
    */
-  play(): void {
-    sim.playSound(this.id);
+  play(volume: number = 1): void {
+    sim.playSound(this.id, volume);
   }
 }
@@ -100,6 +100,32 @@ export class Camera {
     this.target = entity;
   }
 
+  /**
+   * Returns the smallest axis-aligned box in world space that contains everything
+   * the camera shows, accounting for its position, rotation, zoom level, and any
+   * active screen shake.
+   *
+   * @param width The width of the viewport. Defaults to the simulation canvas width.
+   * @param height The height of the viewport. Defaults to the simulation canvas height.
+   * @returns The corners of the visible area.
+   */
+  visibleBounds(width?: number, height?: number): { min: Vec2; max: Vec2 } {
+    const w = width ?? sim.ctx.canvas.width;
+    const h = height ?? sim.ctx.canvas.height;
+
+    const halfWidth = w / 2 / this.zoom;
+    const halfHeight = h / 2 / this.zoom;
+    const cos = Math.abs(Math.cos(this.rotation));
+    const sin = Math.abs(Math.sin(this.rotation));
+    const extent = new Vec2(
+      cos * halfWidth + sin * halfHeight,
+      sin * halfWidth + cos * halfHeight,
+    );
+
+    const pos = this.position.add(this.shakeOffset);
+    return { min: pos.sub(extent), max: pos.add(extent) };
+  }
+
   /**
    * Checks if a point in world space is within the camera's viewport.
    *
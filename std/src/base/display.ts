@@ -1,9 +1,23 @@
 import { Camera } from "./camera.ts";
 import { Color } from "./draw/color.ts";
 import { Draw } from "./draw/shapes.ts";
+import { beginBatch, endBatch, flushBatch } from "./draw/batch.ts";
 import { Component, Entity } from "./entity.ts";
+import { Query, query } from "./query.ts";
 import { Vec2 } from "./vec.ts";
 
+/**
+ * Options for a draw function registered with `Display.registerDrawComponent`.
+ */
+export interface DrawOptions<T> {
+  /**
+   * Enables culling: entities outside the camera's view are not drawn. Called every frame
+   * with the entity and the data passed to the draw function, it returns the radius of a
+   * circle around `entity.pos` that contains everything drawn for the entity.
+   */
+  cullRadius?: (entity: Entity, data: T) => number;
+}
+
 /**
  * The `Display` class is responsible for drawing entities on the canvas.
  *
@@ -37,36 +51,79 @@ export class Display {
 
   private drawComponents: Map<
     Component<any>[] | Component<any>,
-    (entity: Entity, data: any) => void
+    [
+      entities: Component<any> | Query<any[]> | undefined,
+      drawFunc: (entity: Entity, data: any) => void,
+    ]
   > = new Map();
 
   private statics: ((camera: Camera) => void)[] = [];
+  private culling = false;
+  private view = { minX: 0, minY: 0, maxX: 0, maxY: 0 };
+  private drawnCount = 0;
+  private culledCount = 0;
   private shaders: Shader[] = [];
 
   /**
    * Registers a draw function for a component or multiple components.
    *
+   * With multiple components, the function is called for every entity that has all of
+   * them, with an array of their values. The array is reused between calls.
+   *
+   * Shapes drawn with `Draw` in the function may be batched with those of other entities,
+   * so call `Draw.flush()` before drawing on `sim.ctx` directly.
+   *
    * @param comps The component or array of components to register.
    * @param drawFunc The function to call to draw the component(s).
+   * @param options Options such as culling.
    */
   registerDrawComponent<T extends any[]>(
     comps: Component<T[number]>[],
     drawFunc: (entity: Entity, data: T) => void,
+    options?: DrawOptions<T>,
   ): void;
   /**
    * Registers a draw function for a single component.
    * @param comp The component to register.
    * @param drawFunc The function to call to draw the component.
+   * @param options Options such as culling.
    */
   registerDrawComponent<T>(
     comp: Component<T>,
     drawFunc: (entity: Entity, data: T) => void,
+    options?: DrawOptions<T>,
   ): void;
   registerDrawComponent<T>(
     comps: Component<T>[] | Component<T>,
     drawFunc: (entity: Entity, data: T | T[]) => void,
+    options: DrawOptions<any> = {},
   ): void {
-    this.drawComponents.set(comps, drawFunc);
+    let entities: Component<any> | Query<any[]> | undefined;
+    if (!Array.isArray(comps)) {
+      entities = comps;
+    } else if (comps.length === 1) {
+      entities = comps[0];
+    } else if (comps.length > 1) {
+      entities = query(...comps);
+    }
+
+    const cullRadius = options.cullRadius;
+    if (cullRadius) {
+      this.culling = true;
+      const view = this.view;
+      const draw = drawFunc;
+      drawFunc = (entity, data) => {
+        const r = cullRadius(entity, data);
+        const { x, y } = entity.pos;
+        if (x + r < view.minX || x - r > view.maxX || y + r < view.minY || y - r > view.maxY) {
+          this.culledCount++;
+          return;
+        }
+        this.drawnCount++;
+        draw(entity, data);
+      };
+    }
+    this.drawComponents.set(comps, [entities, drawFunc]);
   }
 
   /**
@@ -132,34 +189,38 @@ export class Display {
     effectiveCamera._applyTransforms(sim.ctx);
     // @profile-end
 
-    // @profile-start "Display.draw.components"
-    for (const [comps, drawFunc] of this.drawComponents) {
-      const componentsArray = Array.isArray(comps) ? comps : [comps];
-
-      let entitiesWithAllComps: Set<Entity> | undefined;
-
-      for (const comp of componentsArray) {
-        if (!entitiesWithAllComps) {
-          entitiesWithAllComps = new Set(comp.keys());
-        } else {
-          entitiesWithAllComps = new Set(
-            [...entitiesWithAllComps].filter((entity) => comp.has(entity)),
-          );
-        }
-      }
+    if (this.culling) {
+      const { min, max } = effectiveCamera.visibleBounds();
+      this.view.minX = min.x;
+      this.view.minY = min.y;
+      this.view.maxX = max.x;
+      this.view.maxY = max.y;
+      this.drawnCount = 0;
+      this.culledCount = 0;
+    }
 
-      if (entitiesWithAllComps) {
-        for (const entity of entitiesWithAllComps) {
-          const data =
-            componentsArray.length === 1
-              ? componentsArray[0].get(entity)
-              : componentsArray.map((c) => c.get(entity));
-          drawFunc(entity, data);
+    // @profile-start "Display.draw.components"
+    beginBatch();
+    try {
+      for (const [entities, drawFunc] of this.drawComponents.values()) {
+        if (entities instanceof Query) {
+          entities.forEach(drawFunc);
+        } else if (entities) {
+          for (const [entity, data] of entities) {
+            drawFunc(entity, data);
+          }
         }
+        flushBatch();
       }
+    } finally {
+      endBatch();
     }
     // @profile-end
 
+    if (this.culling) {
+      sim.reportCulling(this.drawnCount, this.culledCount);
+    }
+
     // @profile-start "Display.draw.removeCamera"
     effectiveCamera._removeTransforms(sim.ctx);
     // @profile-end
@@ -172,8 +233,8 @@ export class Display {
     // @profile-end
 
     // Apply post-processing shaders
-    for (const shader of this.shaders) {
-      Draw.applyShader(shader);
+    if (this.shaders.length > 0) {
+      Draw.applyShaders(this.shaders);
     }
   }
 }
@@ -0,0 +1,81 @@
+// Consecutive shapes drawn with the same opaque style are collected into one path and
+// filled or stroked together, which saves a canvas state change and draw per shape.
+// Batching only happens between `beginBatch` and `endBatch`, so shapes drawn anywhere
+// else still reach the canvas immediately. Translucent shapes are never merged, since
+// overlapping parts of one path are only painted once.
+
+type Mode = "fill" | "stroke";
+
+let depth = 0;
+let pending = false;
+let pendingMode: Mode = "fill";
+let pendingStyle = "";
+let pendingLineWidth = 0;
+
+const OPAQUE_CSS = /^(#[0-9a-f]{3}|#[0-9a-f]{6}|(rgb|hsl)\([^/]*\)|[a-z]+)$/i;
+const opaqueCache = new Map<string, boolean>();
+
+function isOpaque(css: string): boolean {
+  let opaque = opaqueCache.get(css);
+  if (opaque === undefined) {
+    opaque = OPAQUE_CSS.test(css) && css.toLowerCase() !== "transparent";
+    if (opaqueCache.size > 1024) {
+      opaqueCache.clear();
+    }
+    opaqueCache.set(css, opaque);
+  }
+  return opaque;
+}
+
+export function beginBatch(): void {
+  depth++;
+}
+
+export function endBatch(): void {
+  flushBatch();
+  depth = Math.max(0, depth - 1);
+}
+
+export function flushBatch(): void {
+  if (!pending) return;
+  pending = false;
+
+  const ctx = sim.ctx;
+  if (pendingMode === "fill") {
+    ctx.fillStyle = pendingStyle;
+    ctx.fill();
+  } else {
+    ctx.strokeStyle = pendingStyle;
+    ctx.lineWidth = pendingLineWidth;
+    ctx.stroke();
+  }
+}
+
+// Returns the context to add the shape's subpaths to, or undefined when the shape has
+// to be drawn on its own, in which case anything batched before it is drawn first
+export function batchPath(
+  mode: Mode,
+  style: string,
+  lineWidth: number = 0,
+): CanvasRenderingContext2D | undefined {
+  if (
+    pending &&
+    pendingMode === mode &&
+    pendingStyle === style &&
+    pendingLineWidth === lineWidth
+  ) {
+    return sim.ctx;
+  }
+
+  flushBatch();
+  if (depth === 0 || !isOpaque(style)) {
+    return undefined;
+  }
+
+  pending = true;
+  pendingMode = mode;
+  pendingStyle = style;
+  pendingLineWidth = lineWidth;
+  sim.ctx.beginPath();
+  return sim.ctx;
+}
@@ -1,12 +1,22 @@
 import { Vec2 } from "../vec.ts";
 import { Color } from "./color.ts";
 import { text as _text } from "./text.ts";
+import { batchPath, flushBatch } from "./batch.ts";
 
 function _colorToCss(c: Color | string): string {
   if (c instanceof Color) return c.toCSS();
   return c;
 }
 
+// Twice the area of a polygon, positive when its vertices wind one way and negative the other
+function signedArea(vertices: Vec2[]): number {
+  let area = 0;
+  for (let i = 0, j = vertices.length - 1; i < vertices.length; j = i++) {
+    area += vertices[j].x * vertices[i].y - vertices[i].x * vertices[j].y;
+  }
+  return area;
+}
+
 /**
  * A collection of drawing functions.
  *
@@ -18,6 +28,10 @@ function _colorToCss(c: Color | string): string {
  * Draw.rect(new Vec2(200, 200), 50, 50, 'blue');
  * Draw.text(new Vec2(300, 300), 'Hello', '20px Arial', 'white');
  * ```
+ *
+ * Inside draw functions registered with `Display.registerDrawComponent`, consecutive
+ * opaque shapes of the same color and kind are collected and drawn together. Call
+ * {@linkcode Draw.flush} before drawing on `sim.ctx` directly in such a function.
  */
 export namespace Draw {
   /**
@@ -27,6 +41,7 @@ export namespace Draw {
    */
   // @profile 'Draw.clear'
   export function clear(color: Color | string = Color.fromRGB(0, 0, 0)): void {
+    flushBatch();
     const ctx = sim.ctx;
     const canvas = ctx.canvas;
     const colorStr = _colorToCss(color);
@@ -48,10 +63,18 @@ export namespace Draw {
     radius: number,
     color: Color | string = Color.fromRGB(255, 255, 255),
   ): void {
+    const style = _colorToCss(color);
+    const batch = batchPath("fill", style);
+    if (batch) {
+      batch.moveTo(pos.x + radius, pos.y);
+      batch.arc(pos.x, pos.y, radius, 0, Math.PI * 2);
+      return;
+    }
+
     const ctx = sim.ctx;
     ctx.beginPath();
     ctx.arc(pos.x, pos.y, radius, 0, Math.PI * 2);
-    ctx.fillStyle = _colorToCss(color);
+    ctx.fillStyle = style;
     ctx.fill();
   }
 
@@ -72,8 +95,21 @@ export namespace Draw {
     color: Color | string = Color.fromRGB(255, 255, 255),
     borderRadius?: number,
   ): void {
+    const style = _colorToCss(color);
+    const batch = batchPath("fill", style);
+    if (batch) {
+      const x = pos.x - width / 2;
+      const y = pos.y - height / 2;
+      if (borderRadius !== undefined) {
+        batch.roundRect(x, y, width, height, borderRadius);
+      } else {
+        batch.rect(x, y, width, height);
+      }
+      return;
+    }
+
     const ctx = sim.ctx;
-    ctx.fillStyle = _colorToCss(color);
+    ctx.fillStyle = style;
     if (borderRadius !== undefined) {
       ctx.beginPath();
       ctx.roundRect(
@@ -104,11 +140,19 @@ export namespace Draw {
     color: Color | string = Color.fromRGB(255, 255, 255),
     lineWidth: number = 1,
   ): void {
+    const style = _colorToCss(color);
+    const batch = batchPath("stroke", style, lineWidth);
+    if (batch) {
+      batch.moveTo(start.x, start.y);
+      batch.lineTo(end.x, end.y);
+      return;
+    }
+
     const ctx = sim.ctx;
     ctx.beginPath();
     ctx.moveTo(start.x, start.y);
     ctx.lineTo(end.x, end.y);
-    ctx.strokeStyle = _colorToCss(color);
+    ctx.strokeStyle = style;
     ctx.lineWidth = lineWidth;
     ctx.stroke();
   }
@@ -145,11 +189,30 @@ export namespace Draw {
     radius: number = 2,
     color: Color | string = Color.fromRGB(255, 255, 255),
   ): void {
+    const style = _colorToCss(color);
+    const batch = batchPath("fill", style);
+    if (!batch) {
+      for (const p of points) {
+        Draw.circle(p, radius, style);
+      }
+      return;
+    }
     for (const p of points) {
-      Draw.circle(p, radius, color);
+      batch.moveTo(p.x + radius, p.y);
+      batch.arc(p.x, p.y, radius, 0, Math.PI * 2);
     }
   }
 
+  /**
+   * Draws any shapes that are still being collected into a batch. Shapes drawn from
+   * functions registered with `Display.registerDrawComponent` may be held back to be
+   * drawn together with the next shapes of the same color, so call this before drawing
+   * on `sim.ctx` directly from such a function.
+   */
+  export function flush(): void {
+    flushBatch();
+  }
+
   let width = 1920;
   let height = 1080;
 
@@ -191,6 +254,26 @@ export namespace Draw {
       return;
     }
 
+    const style = _colorToCss(color);
+    const batch = fill ? batchPath("fill", style) : batchPath("stroke", style, lineWidth);
+    if (batch) {
+      // Subpaths of one path cancel out where they overlap with opposite windings
+      // under the nonzero rule, so filled polygons are all traced the same way
+      if (fill && signedArea(vertices) < 0) {
+        batch.moveTo(vertices[vertices.length - 1].x, vertices[vertices.length - 1].y);
+        for (let i = vertices.length - 2; i >= 0; i--) {
+          batch.lineTo(vertices[i].x, vertices[i].y);
+        }
+      } else {
+        batch.moveTo(vertices[0].x, vertices[0].y);
+        for (let i = 1; i < vertices.length; i++) {
+          batch.lineTo(vertices[i].x, vertices[i].y);
+        }
+      }
+      batch.closePath();
+      return;
+    }
+
     const ctx = sim.ctx;
     ctx.beginPath();
     ctx.moveTo(vertices[0].x, vertices[0].y);
@@ -200,10 +283,10 @@ export namespace Draw {
     ctx.closePath();
 
     if (fill) {
-      ctx.fillStyle = _colorToCss(color);
+      ctx.fillStyle = style;
       ctx.fill();
     } else {
-      ctx.strokeStyle = _colorToCss(color);
+      ctx.strokeStyle = style;
       ctx.lineWidth = lineWidth;
       ctx.stroke();
     }
@@ -228,9 +311,24 @@ export namespace Draw {
    * @param shader The shader to apply.
    */
   export function applyShader(shader: Shader): void {
+    flushBatch();
     sim.applyShader(shader);
   }
 
+  /**
+   * Applies several shaders to the current canvas content, one after another, and renders
+   * the result to the main canvas. Each shader works on the output of the one before it.
+   *
+   * This gives the same result as calling {@linkcode applyShader} for each shader, but the
+   * passes run together on the GPU without handing the frame back in between.
+   *
+   * @param shaders The shaders to apply, in order.
+   */
+  export function applyShaders(shaders: readonly Shader[]): void {
+    flushBatch();
+    sim.applyShaders(shaders);
+  }
+
   /**
    * Creates a shader program from fragment shader source.
    *
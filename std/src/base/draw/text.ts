@@ -1,5 +1,6 @@
 import { Vec2 } from "../vec.ts";
 import { Color } from "./color.ts";
+import { flushBatch } from "./batch.ts";
 
 function _colorToCss(c: Color | string): string {
   if (c instanceof Color) return c.toCSS();
@@ -25,6 +26,7 @@ export function text(
   textAlign: CanvasTextAlign = "center",
   textBaseline: CanvasTextBaseline = "middle",
 ): void {
+  flushBatch();
   const ctx = sim.ctx;
   ctx.font = font;
   ctx.fillStyle = _colorToCss(color);
@@ -1,7 +1,5 @@
 import { Vec2 } from "./vec.ts";
-
-// A registry of all created components.
-const ALL_COMPONENTS: Set<Component<any>> = new Set();
+import { Query } from "./query.ts";
 
 /**
  * An entity in the world.
@@ -25,11 +23,25 @@ const ALL_COMPONENTS: Set<Component<any>> = new Set();
  * ```
  */
 export class Entity {
+  private static nextId = 0;
+
+  /**
+   * An integer identifying the entity, unique among all entities created. Dense component
+   * storages use it to find the row of an entity in their columns without hashing.
+   */
+  readonly id: number = Entity.nextId++;
+
   /**
    * The position of the entity.
    */
   pos: Vec2;
 
+  /** @internal */
+  readonly _components: Set<Component<any>> = new Set();
+
+  // The position vector `_moveTo` created for this entity, and updates in place since
+  private ownPos?: Vec2;
+
   /**
    * Creates a new entity.
    *
@@ -83,6 +95,19 @@ export class Entity {
     component.delete(this);
   }
 
+  // Moves the entity without creating a vector, once its position is one created here. A
+  // vector set from outside may be shared with other entities, so it is replaced first.
+  /** @internal */
+  _moveTo(x: number, y: number): void {
+    const pos = this.pos;
+    if (pos === this.ownPos) {
+      pos.x = x;
+      pos.y = y;
+    } else {
+      this.ownPos = this.pos = new Vec2(x, y);
+    }
+  }
+
   /**
    * Destroys the entity by removing it from all simulation systems.
    *
@@ -91,7 +116,7 @@ export class Entity {
    * display, and any other systems tracking it via components.
    */
   destroy(): void {
-    for (const component of ALL_COMPONENTS) {
+    for (const component of [...this._components]) {
       component.delete(this);
     }
   }
@@ -104,8 +129,49 @@ export class Entity {
  * @see {@link Entity}
  */
 export class Component<T> extends Map<Entity, T> {
-  constructor() {
-    super();
-    ALL_COMPONENTS.add(this);
+  /** @internal */
+  readonly _queries: Query<any>[] = [];
+
+  override set(entity: Entity, value: T): this {
+    const size = this.size;
+    super.set(entity, value);
+    if (this.size !== size) {
+      this._added(entity);
+    }
+    return this;
+  }
+
+  override delete(entity: Entity): boolean {
+    if (!super.delete(entity)) {
+      return false;
+    }
+    this._removed(entity);
+    return true;
+  }
+
+  override clear(): void {
+    for (const entity of this.keys()) {
+      this._removed(entity);
+    }
+    super.clear();
+  }
+
+  /** @internal */
+  protected _added(entity: Entity): void {
+    entity._components?.add(this);
+    // Map's constructor adds initial entries before fields are initialized
+    if (!this._queries) return;
+    for (const query of this._queries) {
+      query._update(entity);
+    }
+  }
+
+  /** @internal */
+  protected _removed(entity: Entity): void {
+    entity._components?.delete(this);
+    if (!this._queries) return;
+    for (const query of this._queries) {
+      query._remove(entity);
+    }
   }
 }
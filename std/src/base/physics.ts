@@ -1,6 +1,30 @@
 import { Component, Entity } from "./entity.ts";
+import {
+  accelerateKernel,
+  moveKernel,
+  pullKernel,
+  WorkerKernel,
+} from "./physics_worker.ts";
+import { Query, query } from "./query.ts";
+import { DenseNumberComponent, DenseVec2Component } from "./storage.ts";
 import { Vec2 } from "./vec.ts";
 
+/**
+ * Options for creating a `Physics` instance.
+ */
+export interface PhysicsOptions {
+  /**
+   * Whether `velocity`, `acceleration` and `mass` are stored in typed array columns
+   * (`DenseVec2Component` and `DenseNumberComponent`) instead of one object per entity.
+   * The built-in forces then update all entities in place without creating vectors,
+   * which keeps large simulations free of garbage collection pauses. Values read with
+   * `get` are copies, so changes to them are written back with `set`. The `pos` of a
+   * moving entity is also updated in place after its first move, so code keeping an
+   * earlier position keeps a `clone()` of it. Defaults to `false`.
+   */
+  denseStorage?: boolean;
+}
+
 /**
  * The `Physics` class is responsible for updating entities based on forces.
  * It applies forces like velocity and acceleration to entities that possess
@@ -37,7 +61,7 @@ import { Vec2 } from "./vec.ts";
 export class Physics {
   private forces: Array<
     [
-      comps: Component<any>[] | Component<any>,
+      entities: Component<any> | Query<any[]> | undefined,
       force: (entity: Entity, data: any) => void,
       priority: number,
     ]
@@ -49,6 +73,8 @@ export class Physics {
     ]
   > = [];
   private forcesSorted = true;
+  private workerKernels = new Map<(...args: any[]) => void, WorkerKernel>();
+  private plan?: WorkerKernel[] | null;
 
   /**
    * The velocity component.
@@ -82,8 +108,14 @@ export class Physics {
 
   /**
    * Creates a new `Physics` instance.
+   * @param options Options for how components are stored.
    */
-  constructor() {
+  constructor(options: PhysicsOptions = {}) {
+    if (options.denseStorage) {
+      this.initDenseStorage();
+      return;
+    }
+
     this.registerForce(
       this.velocity,
       (entity: Entity, vel: Vec2): void => {
@@ -112,6 +144,58 @@ export class Physics {
     );
   }
 
+  private initDenseStorage(): void {
+    const velocity = new DenseVec2Component();
+    const acceleration = new DenseVec2Component();
+    this.velocity = velocity;
+    this.acceleration = acceleration;
+    this.mass = new DenseNumberComponent();
+
+    const accelerate = (): void => {
+      for (let i = 0; i < acceleration.size; i++) {
+        const ax = acceleration.x[i];
+        const ay = acceleration.y[i];
+        // An array read by entity id, not a hash lookup
+        const v = velocity.indexOf(acceleration.entityAt(i));
+        if (v === -1) {
+          velocity.set(acceleration.entityAt(i), new Vec2(ax, ay));
+        } else {
+          velocity.x[v] += ax;
+          velocity.y[v] += ay;
+        }
+        acceleration.x[i] = 0;
+        acceleration.y[i] = 0;
+      }
+    };
+    this.registerStaticForce(accelerate, 1);
+    this.setWorkerKernel(accelerate, { factory: accelerateKernel, args: [] });
+
+    const move = (): void => {
+      const dt = 1 / 60;
+      const vx = velocity.x;
+      const vy = velocity.y;
+      for (let i = 0; i < velocity.size; i++) {
+        const entity = velocity.entityAt(i);
+        entity._moveTo(entity.pos.x + vx[i] * dt, entity.pos.y + vy[i] * dt);
+      }
+    };
+    this.registerStaticForce(move, 2);
+    this.setWorkerKernel(move, { factory: moveKernel, args: [] });
+
+    const pull = (): void => {
+      const { x, y } = this.constantPull;
+      if (x === 0 && y === 0) return;
+      const vx = velocity.x;
+      const vy = velocity.y;
+      for (let i = 0; i < velocity.size; i++) {
+        vx[i] += x;
+        vy[i] += y;
+      }
+    };
+    this.registerStaticForce(pull, 3);
+    this.setWorkerKernel(pull, { factory: pullKernel, args: [] });
+  }
+
   /**
    * Registers a force to be applied to entities.
    * @param comp The component that the force is associated with.
@@ -128,8 +212,17 @@ export class Physics {
     force: (entity: Entity, data: T | T[]) => void,
     priority = 0,
   ): void {
-    this.forces.push([comps, force, priority]);
+    let entities: Component<any> | Query<any[]> | undefined;
+    if (!Array.isArray(comps)) {
+      entities = comps;
+    } else if (comps.length === 1) {
+      entities = comps[0];
+    } else if (comps.length > 1) {
+      entities = query(...comps);
+    }
+    this.forces.push([entities, force, priority]);
     this.forcesSorted = false;
+    this.plan = undefined;
   }
 
   /**
@@ -143,6 +236,40 @@ export class Physics {
   ): void {
     this.staticForces.push([force, priority]);
     this.forcesSorted = false;
+    this.plan = undefined;
+  }
+
+  // Lets a registered force run in the physics worker, as `kernel`
+  /** @internal */
+  setWorkerKernel(force: (...args: any[]) => void, kernel: WorkerKernel): void {
+    this.workerKernels.set(force, kernel);
+    this.plan = undefined;
+  }
+
+  // The kernels of all forces in the order `update` runs them, or null if a force has none.
+  // The same array is returned until forces change.
+  /** @internal */
+  workerPlan(): WorkerKernel[] | null {
+    if (this.plan !== undefined) {
+      return this.plan;
+    }
+    // Ties between a force and a static force go to the force, as in `update`
+    const forces = [
+      ...this.forces.map(([, force, priority]) => ({ force, priority, isStatic: 0 })),
+      ...this.staticForces.map(([force, priority]) => ({ force, priority, isStatic: 1 })),
+    ].sort((a, b) => a.priority - b.priority || a.isStatic - b.isStatic);
+
+    const plan: WorkerKernel[] = [];
+    for (const { force } of forces) {
+      const kernel = this.workerKernels.get(force);
+      if (!kernel) {
+        this.plan = null;
+        return null;
+      }
+      plan.push(kernel);
+    }
+    this.plan = plan;
+    return plan;
   }
 
   /**
@@ -169,41 +296,15 @@ export class Physics {
         : Infinity;
 
       if (forcePriority <= staticPriority && forceIndex < this.forces.length) {
-        const [comps, forceFunc] = this.forces[forceIndex]!;
+        const [entities, forceFunc] = this.forces[forceIndex]!;
         forceIndex++;
 
-        const componentsArray = Array.isArray(comps) ? comps : [comps];
-
-        if (componentsArray.length === 1) {
-          const comp = componentsArray[0];
-          for (const [entity, data] of comp) {
+        if (entities instanceof Query) {
+          entities.forEach(forceFunc);
+        } else if (entities) {
+          for (const [entity, data] of entities) {
             forceFunc(entity, data);
           }
-        } else {
-          let smallestComp = componentsArray[0];
-          for (let i = 1; i < componentsArray.length; i++) {
-            if (componentsArray[i].size < smallestComp.size) {
-              smallestComp = componentsArray[i];
-            }
-          }
-
-          for (const [entity, data] of smallestComp) {
-            let hasAll = true;
-            for (const comp of componentsArray) {
-              if (comp === smallestComp) continue;
-              if (!comp.has(entity)) {
-                hasAll = false;
-                break;
-              }
-            }
-
-            if (hasAll) {
-              const allData = componentsArray.map((c) =>
-                c === smallestComp ? data : c.get(entity),
-              );
-              forceFunc(entity, allData);
-            }
-          }
         }
       } else if (staticIndex < this.staticForces.length) {
         const [forceFn] = this.staticForces[staticIndex]!;
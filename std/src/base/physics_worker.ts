@@ -0,0 +1,495 @@
+import { Entity } from "./entity.ts";
+import type { Physics } from "./physics.ts";
+import { DenseNumberComponent, DenseVec2Component } from "./storage.ts";
+import { Vec2 } from "./vec.ts";
+
+// The physics of a simulation in columns, one row per entity. Rows below `massCount` are the
+// rows of `Physics.mass`, in the same order.
+/** @internal */
+export interface PhysicsBodies {
+  count: number;
+  massCount: number;
+  posX: Float64Array;
+  posY: Float64Array;
+  velX: Float64Array;
+  velY: Float64Array;
+  accX: Float64Array;
+  accY: Float64Array;
+  mass: Float64Array;
+  // HAS_VELOCITY | HAS_ACCELERATION
+  flags: Uint8Array;
+  pullX: number;
+  pullY: number;
+}
+
+const HAS_VELOCITY = 1;
+const HAS_ACCELERATION = 2;
+
+// Kernels are sent to the worker as source, so a factory may only use its arguments and
+// globals, and the flags are written as literals inside them.
+/** @internal */
+export type KernelFactory = (...args: any[]) => (bodies: PhysicsBodies) => void;
+
+// How a force of `Physics` is computed on `PhysicsBodies`, with the same arithmetic as the
+// force itself. Arguments must be structured-cloneable.
+/** @internal */
+export interface WorkerKernel {
+  factory: KernelFactory;
+  args: unknown[];
+}
+
+const COLUMNS = 7;
+
+function bodiesView(buffer: ArrayBufferLike, capacity: number): PhysicsBodies {
+  const column = (i: number): Float64Array => new Float64Array(buffer, i * capacity * 8, capacity);
+  return {
+    count: 0,
+    massCount: 0,
+    posX: column(0),
+    posY: column(1),
+    velX: column(2),
+    velY: column(3),
+    accX: column(4),
+    accY: column(5),
+    mass: column(6),
+    flags: new Uint8Array(buffer, 7 * capacity * 8, capacity),
+    pullX: 0,
+    pullY: 0,
+  };
+}
+
+/** @internal */
+export function createBodies(capacity: number): PhysicsBodies {
+  return bodiesView(new ArrayBuffer(capacity * (COLUMNS * 8 + 1)), capacity);
+}
+
+function copyBodies(from: PhysicsBodies, to: PhysicsBodies): void {
+  const n = from.count;
+  to.count = n;
+  to.massCount = from.massCount;
+  to.pullX = from.pullX;
+  to.pullY = from.pullY;
+  to.posX.set(from.posX.subarray(0, n));
+  to.posY.set(from.posY.subarray(0, n));
+  to.velX.set(from.velX.subarray(0, n));
+  to.velY.set(from.velY.subarray(0, n));
+  to.accX.set(from.accX.subarray(0, n));
+  to.accY.set(from.accY.subarray(0, n));
+  to.mass.set(from.mass.subarray(0, n));
+  to.flags.set(from.flags.subarray(0, n));
+}
+
+/** @internal */
+export function accelerateKernel(): (bodies: PhysicsBodies) => void {
+  return (bodies: PhysicsBodies): void => {
+    const { flags, velX, velY, accX, accY } = bodies;
+    for (let i = 0; i < bodies.count; i++) {
+      if (!(flags[i] & 2)) continue;
+      if (flags[i] & 1) {
+        velX[i] += accX[i];
+        velY[i] += accY[i];
+      } else {
+        velX[i] = accX[i];
+        velY[i] = accY[i];
+        flags[i] |= 1;
+      }
+      accX[i] = 0;
+      accY[i] = 0;
+    }
+  };
+}
+
+/** @internal */
+export function moveKernel(): (bodies: PhysicsBodies) => void {
+  return (bodies: PhysicsBodies): void => {
+    const dt = 1 / 60;
+    const { flags, posX, posY, velX, velY } = bodies;
+    for (let i = 0; i < bodies.count; i++) {
+      if (!(flags[i] & 1)) continue;
+      posX[i] = posX[i] + velX[i] * dt;
+      posY[i] = posY[i] + velY[i] * dt;
+    }
+  };
+}
+
+/** @internal */
+export function pullKernel(): (bodies: PhysicsBodies) => void {
+  return (bodies: PhysicsBodies): void => {
+    const x = bodies.pullX;
+    const y = bodies.pullY;
+    if (x === 0 && y === 0) return;
+    const { flags, velX, velY } = bodies;
+    for (let i = 0; i < bodies.count; i++) {
+      if (!(flags[i] & 1)) continue;
+      velX[i] += x;
+      velY[i] += y;
+    }
+  };
+}
+
+type StepMessage = {
+  input: number;
+  count: number;
+  massCount: number;
+  pullX: number;
+  pullY: number;
+  buffers?: [SharedArrayBuffer, SharedArrayBuffer];
+  capacity?: number;
+  kernels?: [source: string, args: unknown[]][];
+};
+
+// Runs in the worker, with the helpers it needs passed in
+function workerMain(
+  scope: { onmessage: unknown; postMessage: (message: unknown) => void },
+  view: typeof bodiesView,
+  copy: typeof copyBodies,
+): void {
+  let views: PhysicsBodies[] = [];
+  let steps: ((bodies: PhysicsBodies) => void)[] = [];
+
+  scope.onmessage = ({ data }: { data: StepMessage }): void => {
+    try {
+      if (data.buffers) {
+        views = data.buffers.map((buffer) => view(buffer, data.capacity!));
+      }
+      if (data.kernels) {
+        steps = data.kernels.map(([source, args]) =>
+          new Function(`return (${source});`)()(...args)
+        );
+      }
+      const input = views[data.input];
+      const output = views[1 - data.input];
+      input.count = data.count;
+      input.massCount = data.massCount;
+      input.pullX = data.pullX;
+      input.pullY = data.pullY;
+      copy(input, output);
+      for (const step of steps) {
+        step(output);
+      }
+      scope.postMessage({});
+    } catch (err) {
+      scope.postMessage({ error: err instanceof Error ? err.stack ?? err.message : String(err) });
+    }
+  };
+}
+
+const workerSource = `(${workerMain})(self, ${bodiesView}, ${copyBodies});`;
+
+type DensePhysics = Physics & {
+  velocity: DenseVec2Component;
+  acceleration: DenseVec2Component;
+  mass: DenseNumberComponent;
+};
+
+function isDense(physics: Physics): physics is DensePhysics {
+  return physics.velocity instanceof DenseVec2Component &&
+    physics.acceleration instanceof DenseVec2Component &&
+    physics.mass instanceof DenseNumberComponent;
+}
+
+// Maps the rows of the dense components of a `Physics` to the rows of `PhysicsBodies`
+/** @internal */
+export class BodyTable {
+  entities: Entity[] = [];
+  massCount = 0;
+  // The body of every row of `velocity` and `acceleration`
+  private velocityRows = new Int32Array(0);
+  private accelerationRows = new Int32Array(0);
+  // The row in `velocity` and `acceleration` of every body, or -1
+  private bodyVelocity = new Int32Array(0);
+  private bodyAcceleration = new Int32Array(0);
+
+  get count(): number {
+    return this.entities.length;
+  }
+
+  index(physics: DensePhysics): void {
+    const { mass, velocity, acceleration } = physics;
+    const bodies = new Map<Entity, number>();
+    this.entities = [];
+    const add = (entity: Entity): number => {
+      let body = bodies.get(entity);
+      if (body === undefined) {
+        body = this.entities.length;
+        bodies.set(entity, body);
+        this.entities.push(entity);
+      }
+      return body;
+    };
+
+    for (let r = 0; r < mass.size; r++) {
+      add(mass.entityAt(r));
+    }
+    this.massCount = mass.size;
+    this.velocityRows = new Int32Array(velocity.size);
+    for (let r = 0; r < velocity.size; r++) {
+      this.velocityRows[r] = add(velocity.entityAt(r));
+    }
+    this.accelerationRows = new Int32Array(acceleration.size);
+    for (let r = 0; r < acceleration.size; r++) {
+      this.accelerationRows[r] = add(acceleration.entityAt(r));
+    }
+
+    this.bodyVelocity = new Int32Array(this.count).fill(-1);
+    this.velocityRows.forEach((body, r) => (this.bodyVelocity[body] = r));
+    this.bodyAcceleration = new Int32Array(this.count).fill(-1);
+    this.accelerationRows.forEach((body, r) => (this.bodyAcceleration[body] = r));
+  }
+
+  write(physics: DensePhysics, bodies: PhysicsBodies): void {
+    const { mass, velocity, acceleration } = physics;
+    bodies.count = this.count;
+    bodies.massCount = this.massCount;
+    bodies.pullX = physics.constantPull.x;
+    bodies.pullY = physics.constantPull.y;
+    for (let b = 0; b < this.count; b++) {
+      const pos = this.entities[b].pos;
+      bodies.posX[b] = pos.x;
+      bodies.posY[b] = pos.y;
+      bodies.mass[b] = b < this.massCount ? mass.data[b] : 0;
+    }
+    bodies.velX.fill(0, 0, this.count);
+    bodies.velY.fill(0, 0, this.count);
+    bodies.accX.fill(0, 0, this.count);
+    bodies.accY.fill(0, 0, this.count);
+    bodies.flags.fill(0, 0, this.count);
+    for (let r = 0; r < this.velocityRows.length; r++) {
+      const b = this.velocityRows[r];
+      bodies.velX[b] = velocity.x[r];
+      bodies.velY[b] = velocity.y[r];
+      bodies.flags[b] |= HAS_VELOCITY;
+    }
+    for (let r = 0; r < this.accelerationRows.length; r++) {
+      const b = this.accelerationRows[r];
+      bodies.accX[b] = acceleration.x[r];
+      bodies.accY[b] = acceleration.y[r];
+      bodies.flags[b] |= HAS_ACCELERATION;
+    }
+  }
+
+  // Whether `write` would write exactly `bodies`
+  matches(physics: DensePhysics, bodies: PhysicsBodies): boolean {
+    const { mass, velocity, acceleration } = physics;
+    if (
+      bodies.count !== this.count ||
+      physics.constantPull.x !== bodies.pullX ||
+      physics.constantPull.y !== bodies.pullY ||
+      mass.size !== this.massCount ||
+      velocity.size !== this.velocityRows.length ||
+      acceleration.size !== this.accelerationRows.length
+    ) {
+      return false;
+    }
+    for (let b = 0; b < this.count; b++) {
+      const pos = this.entities[b].pos;
+      if (pos.x !== bodies.posX[b] || pos.y !== bodies.posY[b]) return false;
+    }
+    for (let r = 0; r < this.massCount; r++) {
+      if (mass.entityAt(r) !== this.entities[r] || mass.data[r] !== bodies.mass[r]) return false;
+    }
+    for (let r = 0; r < this.velocityRows.length; r++) {
+      const b = this.velocityRows[r];
+      if (
+        velocity.entityAt(r) !== this.entities[b] ||
+        velocity.x[r] !== bodies.velX[b] ||
+        velocity.y[r] !== bodies.velY[b]
+      ) {
+        return false;
+      }
+    }
+    for (let r = 0; r < this.accelerationRows.length; r++) {
+      const b = this.accelerationRows[r];
+      if (
+        acceleration.entityAt(r) !== this.entities[b] ||
+        acceleration.x[r] !== bodies.accX[b] ||
+        acceleration.y[r] !== bodies.accY[b]
+      ) {
+        return false;
+      }
+    }
+    return true;
+  }
+
+  // Writes the stepped `bodies` back, adding rows in the order `Physics.update` would.
+  // Returns whether rows were added, which invalidates the table.
+  apply(physics: DensePhysics, bodies: PhysicsBodies): boolean {
+    const { velocity, acceleration } = physics;
+    const { flags } = bodies;
+
+    for (let r = 0; r < this.accelerationRows.length; r++) {
+      const b = this.accelerationRows[r];
+      acceleration.x[r] = bodies.accX[b];
+      acceleration.y[r] = bodies.accY[b];
+    }
+    for (let r = 0; r < this.velocityRows.length; r++) {
+      const b = this.velocityRows[r];
+      velocity.x[r] = bodies.velX[b];
+      velocity.y[r] = bodies.velY[b];
+    }
+
+    const addedAcceleration: number[] = [];
+    for (let b = 0; b < this.count; b++) {
+      if (flags[b] & HAS_ACCELERATION && this.bodyAcceleration[b] === -1) {
+        acceleration.set(this.entities[b], new Vec2(bodies.accX[b], bodies.accY[b]));
+        addedAcceleration.push(b);
+      }
+    }
+    let added = addedAcceleration.length > 0;
+    const addVelocity = (b: number): void => {
+      if (flags[b] & HAS_VELOCITY && this.bodyVelocity[b] === -1) {
+        velocity.set(this.entities[b], new Vec2(bodies.velX[b], bodies.velY[b]));
+        added = true;
+      }
+    };
+    this.accelerationRows.forEach(addVelocity);
+    addedAcceleration.forEach(addVelocity);
+
+    for (let b = 0; b < this.count; b++) {
+      if (flags[b] & HAS_VELOCITY) {
+        this.entities[b]._moveTo(bodies.posX[b], bodies.posY[b]);
+      }
+    }
+
+    if (added) {
+      this.index(physics);
+    }
+    return added;
+  }
+}
+
+// Steps physics in a worker, one frame ahead of the page. After a frame is written back to
+// the entities, the next one is computed from it while the page draws and runs the frame
+// callback. If the callback changed anything physics reads, that frame is thrown away and
+// computed again from the current state, so results are the same as `Physics.update`.
+/** @internal */
+export class PhysicsWorker {
+  private table = new BodyTable();
+  private capacity = 0;
+  private buffers?: [SharedArrayBuffer, SharedArrayBuffer];
+  private views: PhysicsBodies[] = [];
+  private buffersSent = false;
+  // The view holding the latest state
+  private current = 0;
+  private pending?: Promise<void>;
+  private sentPlan?: WorkerKernel[];
+  private settle?: { resolve: () => void; reject: (err: Error) => void };
+  private warned = false;
+
+  private constructor(private worker: Worker) {
+    worker.onmessage = ({ data }: MessageEvent<{ error?: string }>): void => {
+      const settle = this.settle;
+      this.settle = undefined;
+      if (data.error !== undefined) {
+        settle?.reject(new Error(`Physics worker failed: ${data.error}`));
+      } else {
+        settle?.resolve();
+      }
+    };
+    worker.onerror = (event: ErrorEvent): void => {
+      event.preventDefault();
+      const settle = this.settle;
+      this.settle = undefined;
+      settle?.reject(new Error(`Physics worker failed: ${event.message}`));
+    };
+  }
+
+  // Undefined when the page can't share memory with a worker
+  static create(): PhysicsWorker | undefined {
+    if (!globalThis.crossOriginIsolated || typeof Worker === "undefined") {
+      console.warn("The page is not cross-origin isolated, so physics runs on the main thread.");
+      return undefined;
+    }
+    const url = URL.createObjectURL(new Blob([workerSource], { type: "text/javascript" }));
+    return new PhysicsWorker(new Worker(url));
+  }
+
+  // Steps `physics` by one frame. Returns false, without stepping, when it has forces the
+  // worker can't run.
+  async update(physics: Physics): Promise<boolean> {
+    const plan = physics.workerPlan();
+    if (plan === null || !isDense(physics)) {
+      if (!this.warned) {
+        this.warned = true;
+        console.warn(
+          "Physics has forces that can't run in a worker, so it runs on the main thread.",
+        );
+      }
+      await this.drop();
+      return false;
+    }
+
+    const speculated = this.pending;
+    this.pending = undefined;
+    if (
+      speculated && plan === this.sentPlan &&
+      this.table.matches(physics, this.views[this.current])
+    ) {
+      await speculated;
+    } else {
+      await speculated;
+      this.table.index(physics);
+      this.reserve(this.table.count);
+      this.table.write(physics, this.views[this.current]);
+      await this.step(plan);
+    }
+
+    this.current = 1 - this.current;
+    if (!this.table.apply(physics, this.views[this.current])) {
+      this.pending = this.step(plan);
+      this.pending.catch(() => {});
+    }
+    return true;
+  }
+
+  terminate(): void {
+    this.worker.terminate();
+    this.settle?.reject(new Error("Physics worker terminated"));
+    this.settle = undefined;
+  }
+
+  private async drop(): Promise<void> {
+    const pending = this.pending;
+    this.pending = undefined;
+    await pending;
+  }
+
+  private reserve(count: number): void {
+    if (count <= this.capacity && this.buffers) return;
+    this.capacity = Math.max(64, count * 2);
+    const bytes = this.capacity * (COLUMNS * 8 + 1);
+    this.buffers = [new SharedArrayBuffer(bytes), new SharedArrayBuffer(bytes)];
+    this.views = this.buffers.map((buffer) => bodiesView(buffer, this.capacity));
+    this.buffersSent = false;
+  }
+
+  private step(plan: WorkerKernel[]): Promise<void> {
+    const input = this.views[this.current];
+    const output = this.views[1 - this.current];
+    output.count = input.count;
+    output.massCount = input.massCount;
+    output.pullX = input.pullX;
+    output.pullY = input.pullY;
+
+    const message: StepMessage = {
+      input: this.current,
+      count: input.count,
+      massCount: input.massCount,
+      pullX: input.pullX,
+      pullY: input.pullY,
+    };
+    if (!this.buffersSent) {
+      message.buffers = this.buffers;
+      message.capacity = this.capacity;
+      this.buffersSent = true;
+    }
+    if (plan !== this.sentPlan) {
+      message.kernels = plan.map((kernel) => [String(kernel.factory), kernel.args]);
+      this.sentPlan = plan;
+    }
+    return new Promise((resolve, reject) => {
+      this.settle = { resolve, reject };
+      this.worker.postMessage(message);
+    });
+  }
+}
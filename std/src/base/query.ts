@@ -0,0 +1,156 @@
+import { Component, Entity } from "./entity.ts";
+
+/**
+ * The entities that have all of a set of components, kept up to date as components are
+ * added and removed instead of being searched for every time.
+ *
+ * Queries are created with {@linkcode query}. Iterating one only visits matching
+ * entities, so its cost depends on how many entities match rather than on the size of
+ * the components.
+ *
+ * @example
+ * ```ts
+ * import { Entity, Physics, Vec2, query } from "physim/base";
+ *
+ * const physics = new Physics();
+ * const drag = query(physics.velocity, physics.mass);
+ *
+ * Entity.create(new Vec2(0, 0), [
+ *   [physics.velocity, new Vec2(10, 0)],
+ *   [physics.mass, 2],
+ * ]);
+ *
+ * drag.forEach((entity, [velocity, mass]) => {
+ *   physics.velocity.set(entity, velocity.scale(1 - 0.01 / mass));
+ * });
+ * ```
+ */
+export class Query<T extends unknown[]> {
+  /**
+   * The components an entity needs to match the query.
+   */
+  readonly components: readonly Component<any>[];
+
+  private entities: Set<Entity> = new Set();
+  private values: unknown[];
+
+  /** @internal */
+  constructor(components: Component<any>[]) {
+    this.components = components;
+    this.values = new Array(components.length);
+
+    let smallest = components[0];
+    for (const component of components) {
+      if (component.size < smallest.size) {
+        smallest = component;
+      }
+    }
+    for (const entity of smallest.keys()) {
+      this._update(entity);
+    }
+    for (const component of components) {
+      component._queries.push(this);
+    }
+  }
+
+  /**
+   * The number of entities that match the query.
+   */
+  get size(): number {
+    return this.entities.size;
+  }
+
+  /**
+   * Checks whether an entity matches the query.
+   *
+   * @param entity The entity to check.
+   * @returns `true` if the entity has all of the components.
+   */
+  has(entity: Entity): boolean {
+    return this.entities.has(entity);
+  }
+
+  /**
+   * Calls a function for every matching entity with the values of its components, in the
+   * order the components were given to {@linkcode query}.
+   *
+   * The values array is reused between calls, so copy it if it has to outlive the call.
+   * Entities that stop matching during iteration are not visited after that, and entities
+   * that start matching are visited before the iteration ends.
+   *
+   * @param callback The function to call for every matching entity.
+   */
+  forEach(callback: (entity: Entity, values: T) => void): void {
+    const components = this.components;
+    const values = this.values;
+    for (const entity of this.entities) {
+      for (let i = 0; i < components.length; i++) {
+        values[i] = components[i].get(entity);
+      }
+      callback(entity, values as T);
+    }
+  }
+
+  /**
+   * Iterates over the matching entities.
+   */
+  [Symbol.iterator](): SetIterator<Entity> {
+    return this.entities.values();
+  }
+
+  /** @internal */
+  _update(entity: Entity): void {
+    for (const component of this.components) {
+      if (!component.has(entity)) {
+        this.entities.delete(entity);
+        return;
+      }
+    }
+    this.entities.add(entity);
+  }
+
+  /** @internal */
+  _remove(entity: Entity): void {
+    this.entities.delete(entity);
+  }
+}
+
+/**
+ * Returns the query for the entities that have all of the given components.
+ *
+ * Asking again for the same components, in the same order, returns the same query, so
+ * it is cheap to call this where the query is used instead of keeping it around.
+ *
+ * @param components The components an entity needs to match.
+ * @returns The query, whose values are in the order of `components`.
+ *
+ * @example
+ * ```ts
+ * import { Simulation, query } from "physim/base";
+ * import { initBodyComponent } from "physim/bodies";
+ *
+ * const sim = new Simulation();
+ * const bodyComp = initBodyComponent(sim.physics);
+ *
+ * for (const entity of query(bodyComp, sim.physics.velocity)) {
+ *   entity.pos = entity.pos.add(sim.physics.velocity.get(entity)!);
+ * }
+ * ```
+ */
+export function query<T extends unknown[]>(
+  ...components: { [K in keyof T]: Component<T[K]> }
+): Query<T> {
+  if (components.length === 0) {
+    throw new Error("A query needs at least one component.");
+  }
+
+  for (const existing of components[0]._queries) {
+    if (
+      existing.components.length === components.length &&
+      existing.components.every((component, i) => component === components[i])
+    ) {
+      return existing as Query<T>;
+    }
+  }
+  return new Query<T>(components);
+}
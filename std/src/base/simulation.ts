@@ -1,6 +1,24 @@
 import { Camera } from "./camera.ts";
 import { Display } from "./display.ts";
 import { Physics } from "./physics.ts";
+import { PhysicsWorker } from "./physics_worker.ts";
+
+/**
+ * Options for creating a `Simulation`.
+ */
+export interface SimulationOptions {
+  /**
+   * Whether physics is stepped in a Web Worker, one frame ahead of drawing, so that the two
+   * run at the same time. `physics` then uses dense storage (see `PhysicsOptions`).
+   *
+   * The results are the same as stepping on the page. Only the forces of `Physics` and of
+   * `initGravityForce` run in the worker: with any other force registered, and on pages that
+   * are not cross-origin isolated, physics is stepped on the page instead. A frame computed
+   * ahead is computed again when the `onUpdate` callback of `run` changes positions, physics
+   * components or `constantPull`, so such simulations gain less. Defaults to `false`.
+   */
+  physicsWorker?: boolean;
+}
 
 /**
 
@@ -52,6 +70,7 @@ export class Simulation {
    */
   frame = 0;
   private autoStopTime?: number;
+  private physicsWorker: boolean;
 
   /**
    * The current simulation time in seconds.
@@ -63,15 +82,21 @@ export class Simulation {
   /**
    * Creates a new Simulation instance.
    * @param autoStopTime The number of seconds after which the simulation should automatically stop.
+   * @param options Options such as stepping physics in a worker.
    */
-  constructor(autoStopTime?: number) {
+  constructor(autoStopTime?: number, options: SimulationOptions = {}) {
     this.autoStopTime = autoStopTime;
+    this.physicsWorker = options.physicsWorker ?? false;
+    if (this.physicsWorker) {
+      this.physics = new Physics({ denseStorage: true });
+    }
   }
 
   /**
    * Runs the simulation loop.
    * Sets up a continuous update cycle at 60 fps that calls the provided
    * `onUpdate` callback on each frame, after physics updates and display rendering.
+   * In compute-only runs the display is only drawn on the frames that are rendered.
    *
    * This function resolves when the simulation is finished.
    *
@@ -80,25 +105,50 @@ export class Simulation {
    */
   // @profile "Simulation.run"
   async run(onUpdate: () => void = () => { }): Promise<void> {
-    await sim.run(() => {
-      this.frame++;
-      if (this.autoStopTime && this.time >= this.autoStopTime) {
-        this.finish();
-        return;
-      }
+    const worker = this.physicsWorker ? PhysicsWorker.create() : undefined;
+    try {
+      await sim.run(() => {
+        this.frame++;
+        if (this.autoStopTime && this.time >= this.autoStopTime) {
+          this.finish();
+          return;
+        }
+
+        if (worker) {
+          return this.stepInWorker(worker, onUpdate);
+        }
 
-      // @profile-start "Simulation.physics.update"
+        // @profile-start "Simulation.physics.update"
+        this.physics.update();
+        // @profile-end
+
+        this.drawAndUpdate(onUpdate);
+      });
+    } finally {
+      worker?.terminate();
+    }
+  }
+
+  private async stepInWorker(worker: PhysicsWorker, onUpdate: () => void): Promise<void> {
+    // @profile-start "Simulation.physics.update"
+    if (!(await worker.update(this.physics))) {
       this.physics.update();
-      // @profile-end
+    }
+    // @profile-end
 
+    this.drawAndUpdate(onUpdate);
+  }
+
+  private drawAndUpdate(onUpdate: () => void): void {
+    if (sim.isRenderFrame()) {
       // @profile-start "Simulation.display.draw"
       this.display.draw(this.camera);
       // @profile-end
+    }
 
-      // @profile-start "Simulation.onUpdate"
-      onUpdate();
-      // @profile-end
-    });
+    // @profile-start "Simulation.onUpdate"
+    onUpdate();
+    // @profile-end
   }
 
   /**
@@ -0,0 +1,240 @@
+import { Component, Entity } from "./entity.ts";
+import { Vec2 } from "./vec.ts";
+
+const INITIAL_CAPACITY = 64;
+
+function grow<A extends Float64Array | Int32Array>(column: A, capacity: number): A {
+  const grown = new (column.constructor as new (length: number) => A)(capacity);
+  grown.set(column);
+  return grown;
+}
+
+abstract class DenseComponent<T> extends Component<T> {
+  // The row of every entity plus one by entity id, so a row is found with an array read and
+  // 0, which new entries are filled with, means the entity does not have the component
+  /** @internal */
+  protected rows: Int32Array = new Int32Array(0);
+  /** @internal */
+  protected entityList: Entity[] = [];
+
+  protected abstract read(index: number): T;
+  protected abstract write(index: number, value: T): void;
+  protected abstract move(from: number, to: number): void;
+  protected abstract reserve(capacity: number): void;
+  protected abstract capacity(): number;
+
+  /**
+   * The number of entities that have this component.
+   */
+  override get size(): number {
+    return this.entityList.length;
+  }
+
+  /**
+   * Returns the row of the entity in the columns of this component, or -1 if it does not
+   * have the component. Rows change when entities are removed.
+   *
+   * @param entity The entity to look up.
+   * @returns The row of the entity, or -1.
+   */
+  indexOf(entity: Entity): number {
+    return (this.rows[entity.id] ?? 0) - 1;
+  }
+
+  /**
+   * Returns the entity stored in a row of the columns of this component.
+   *
+   * @param index A row between 0 and `size - 1`.
+   * @returns The entity in that row.
+   */
+  entityAt(index: number): Entity {
+    return this.entityList[index];
+  }
+
+  override has(entity: Entity): boolean {
+    return this.indexOf(entity) !== -1;
+  }
+
+  override get(entity: Entity): T | undefined {
+    const index = this.indexOf(entity);
+    return index === -1 ? undefined : this.read(index);
+  }
+
+  override set(entity: Entity, value: T): this {
+    let index = this.indexOf(entity);
+    if (index === -1) {
+      index = this.entityList.length;
+      if (index >= this.capacity()) {
+        this.reserve(Math.max(INITIAL_CAPACITY, this.capacity() * 2));
+      }
+      if (entity.id >= this.rows.length) {
+        const capacity = Math.max(INITIAL_CAPACITY, entity.id + 1, this.rows.length * 2);
+        this.rows = grow(this.rows, capacity);
+      }
+      this.rows[entity.id] = index + 1;
+      this.entityList.push(entity);
+      this._added(entity);
+    }
+    this.write(index, value);
+    return this;
+  }
+
+  override delete(entity: Entity): boolean {
+    const index = this.indexOf(entity);
+    if (index === -1) {
+      return false;
+    }
+
+    const last = this.entityList.length - 1;
+    if (index !== last) {
+      const moved = this.entityList[last];
+      this.move(last, index);
+      this.entityList[index] = moved;
+      this.rows[moved.id] = index + 1;
+    }
+    this.entityList.pop();
+    this.rows[entity.id] = 0;
+    this._removed(entity);
+    return true;
+  }
+
+  override clear(): void {
+    for (const entity of this.entityList) {
+      this.rows[entity.id] = 0;
+      this._removed(entity);
+    }
+    this.entityList = [];
+  }
+
+  override *entries(): MapIterator<[Entity, T]> {
+    for (let i = 0; i < this.entityList.length; i++) {
+      yield [this.entityList[i], this.read(i)];
+    }
+  }
+
+  override *keys(): MapIterator<Entity> {
+    yield* this.entityList;
+  }
+
+  override *values(): MapIterator<T> {
+    for (let i = 0; i < this.entityList.length; i++) {
+      yield this.read(i);
+    }
+  }
+
+  override forEach(
+    callback: (value: T, key: Entity, map: Map<Entity, T>) => void,
+    thisArg?: unknown,
+  ): void {
+    for (let i = 0; i < this.entityList.length; i++) {
+      callback.call(thisArg, this.read(i), this.entityList[i], this);
+    }
+  }
+
+  override [Symbol.iterator](): MapIterator<[Entity, T]> {
+    return this.entries();
+  }
+}
+
+/**
+ * A `Component<Vec2>` that stores its values in two `Float64Array` columns, one for `x`
+ * and one for `y`, instead of a vector object per entity.
+ *
+ * It works anywhere a `Component<Vec2>` does. `get` returns a new `Vec2` holding a copy of
+ * the stored value, so changes are written back with `set`. Systems that process every
+ * entity can read and write the `x` and `y` columns directly: row `i` belongs to
+ * `entityAt(i)`, for rows below `size`. Removing an entity moves the last row into its
+ * place, and the columns are replaced by larger arrays as entities are added.
+ *
+ * @example
+ * ```ts
+ * import { DenseVec2Component, Entity, Vec2 } from "physim/base";
+ *
+ * const wind = new DenseVec2Component();
+ * Entity.create(new Vec2(0, 0), [[wind, new Vec2(1, 0)]]);
+ *
+ * // Double every value without creating vectors
+ * for (let i = 0; i < wind.size; i++) {
+ *   wind.x[i] *= 2;
+ *   wind.y[i] *= 2;
+ * }
+ * ```
+ */
+export class DenseVec2Component extends DenseComponent<Vec2> {
+  /**
+   * The x values of the component, row `i` belonging to `entityAt(i)`.
+   */
+  x: Float64Array = new Float64Array(0);
+  /**
+   * The y values of the component, row `i` belonging to `entityAt(i)`.
+   */
+  y: Float64Array = new Float64Array(0);
+
+  /** @internal */
+  protected read(index: number): Vec2 {
+    return new Vec2(this.x[index], this.y[index]);
+  }
+
+  /** @internal */
+  protected write(index: number, value: Vec2): void {
+    this.x[index] = value.x;
+    this.y[index] = value.y;
+  }
+
+  /** @internal */
+  protected move(from: number, to: number): void {
+    this.x[to] = this.x[from];
+    this.y[to] = this.y[from];
+  }
+
+  /** @internal */
+  protected reserve(capacity: number): void {
+    this.x = grow(this.x, capacity);
+    this.y = grow(this.y, capacity);
+  }
+
+  /** @internal */
+  protected capacity(): number {
+    return this.x.length;
+  }
+}
+
+/**
+ * A `Component<number>` that stores its values in a single `Float64Array` column.
+ *
+ * It works anywhere a `Component<number>` does. Systems that process every entity can
+ * read and write the `data` column directly: row `i` belongs to `entityAt(i)`, for rows
+ * below `size`. Removing an entity moves the last row into its place, and the column is
+ * replaced by a larger array as entities are added.
+ */
+export class DenseNumberComponent extends DenseComponent<number> {
+  /**
+   * The values of the component, row `i` belonging to `entityAt(i)`.
+   */
+  data: Float64Array = new Float64Array(0);
+
+  /** @internal */
+  protected read(index: number): number {
+    return this.data[index];
+  }
+
+  /** @internal */
+  protected write(index: number, value: number): void {
+    this.data[index] = value;
+  }
+
+  /** @internal */
+  protected move(from: number, to: number): void {
+    this.data[to] = this.data[from];
+  }
+
+  /** @internal */
+  protected reserve(capacity: number): void {
+    this.data = grow(this.data, capacity);
+  }
+
+  /** @internal */
+  protected capacity(): number {
+    return this.data.length;
+  }
+}
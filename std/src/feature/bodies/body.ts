@@ -62,6 +62,37 @@ export class Body {
     return Body.calculateAABB((this.vertices as Vec2[][]).flat());
   }
 
+  /**
+   * The radius of the smallest circle around the body's origin that contains the
+   * body at any rotation. Derived freshly from the current parts on each access.
+   */
+  get boundingRadius(): number {
+    let radius = 0;
+    for (const part of this.parts) {
+      const { shape } = part;
+      let extent = 0;
+      if (shape.type === "circle") {
+        extent = part.position.length() + shape.radius;
+      } else if (shape.type === "ring") {
+        extent = part.position.length() + shape.outerRadius;
+      } else if (shape.type === "polygon") {
+        for (const v of shape.vertices) {
+          extent = Math.max(extent, v.length());
+        }
+        extent += part.position.length();
+      } else {
+        // Mitered corners of hollow polygons reach past half the width
+        for (const poly of Body.calculatePartVertices(part)) {
+          for (const v of poly) {
+            extent = Math.max(extent, v.length());
+          }
+        }
+      }
+      radius = Math.max(radius, extent);
+    }
+    return radius;
+  }
+
   /**
    * The overall rotation of the body in radians.
    */
@@ -9,11 +9,23 @@ type BodyDisplayData = {
   lineWidth?: number;
 };
 
+/**
+ * Options for {@linkcode initBodyDisplayComponent}.
+ */
+export interface BodyDisplayOptions {
+  /**
+   * Whether bodies outside the camera's view are skipped instead of drawn. Worth enabling
+   * when the world is much larger than the view. Defaults to `false`.
+   */
+  cull?: boolean;
+}
+
 /**
  * Initializes a component that draws bodies.
  *
  * @param display The display to register the component with.
  * @param bodyComponent The body component.
+ * @param options Options for drawing the bodies.
  * @returns The new component.
  *
  * @example
@@ -40,6 +52,7 @@ type BodyDisplayData = {
 export function initBodyDisplayComponent(
   display: Display,
   bodyComponent: Component<Body>,
+  options: BodyDisplayOptions = {},
 ): Component<BodyDisplayData> {
   const bodyDisplay = new Component<BodyDisplayData>();
 
@@ -49,6 +62,12 @@ export function initBodyDisplayComponent(
       const { color, fill = true, lineWidth = 1 } = data;
       body.draw(entity.pos, color, fill, lineWidth);
     },
+    {
+      cullRadius: options.cull
+        ? (_entity, [data, body]) =>
+          body.boundingRadius + (data.fill === false ? (data.lineWidth ?? 1) / 2 : 0)
+        : undefined,
+    },
   );
 
   return bodyDisplay;
@@ -0,0 +1,279 @@
+import { Vec2 } from "../../base/vec.ts";
+import { Color } from "../../base/draw/color.ts";
+import { Body } from "../bodies/body.ts";
+import { ColorStage, Particle } from "./particle.ts";
+
+const SCALE_CURVES = [undefined, "easeIn", "easeOut", "easeInOut"] as const;
+type ScaleCurve = (typeof SCALE_CURVES)[number];
+
+const FLOAT_COLUMNS = [
+  "posX", "posY", "velX", "velY", "accX", "accY",
+  "age", "lifetime",
+  "scale", "startScale", "endScale",
+  "rotation", "rotationSpeed", "angle",
+  "r", "g", "b", "a",
+  "startR", "startG", "startB", "startA",
+  "endR", "endG", "endB", "endA",
+  "turbulenceFrequency", "turbulenceAmplitude",
+] as const;
+
+type FloatColumn = (typeof FLOAT_COLUMNS)[number];
+
+// Particle state stored as one typed array per property, indexed by particle.
+// Removing a particle moves the last one into its slot, so live particles are
+// always the first `count` entries.
+export class ParticleStore {
+  count = 0;
+  capacity = 0;
+
+  posX = new Float64Array(0);
+  posY = new Float64Array(0);
+  velX = new Float64Array(0);
+  velY = new Float64Array(0);
+  accX = new Float64Array(0);
+  accY = new Float64Array(0);
+  age = new Float64Array(0);
+  lifetime = new Float64Array(0);
+  scale = new Float64Array(0);
+  startScale = new Float64Array(0);
+  endScale = new Float64Array(0);
+  rotation = new Float64Array(0);
+  rotationSpeed = new Float64Array(0);
+  angle = new Float64Array(0);
+  r = new Float64Array(0);
+  g = new Float64Array(0);
+  b = new Float64Array(0);
+  a = new Float64Array(0);
+  startR = new Float64Array(0);
+  startG = new Float64Array(0);
+  startB = new Float64Array(0);
+  startA = new Float64Array(0);
+  endR = new Float64Array(0);
+  endG = new Float64Array(0);
+  endB = new Float64Array(0);
+  endA = new Float64Array(0);
+  turbulenceFrequency = new Float64Array(0);
+  turbulenceAmplitude = new Float64Array(0);
+
+  scaleCurve = new Uint8Array(0);
+  template = new Int32Array(0);
+  colorStages: (ColorStage[] | undefined)[] = [];
+  customUpdate: (((particle: Particle, lifeRatio: number) => void) | undefined)[] = [];
+
+  // Distinct particle bodies, drawn with the rotation stored per particle
+  templates: Body[] = [];
+  private templateIds = new Map<Body, number>();
+
+  templateFor(body: Body): number {
+    let id = this.templateIds.get(body);
+    if (id === undefined) {
+      id = this.templates.length;
+      this.templates.push(body);
+      this.templateIds.set(body, id);
+    }
+    return id;
+  }
+
+  add(): number {
+    if (this.count === this.capacity) {
+      this.grow(Math.max(256, this.capacity * 2));
+    }
+    return this.count++;
+  }
+
+  remove(i: number): void {
+    const last = --this.count;
+    if (i !== last) {
+      for (const column of FLOAT_COLUMNS) {
+        this[column][i] = this[column][last];
+      }
+      this.scaleCurve[i] = this.scaleCurve[last];
+      this.template[i] = this.template[last];
+      this.colorStages[i] = this.colorStages[last];
+      this.customUpdate[i] = this.customUpdate[last];
+    }
+    this.colorStages[last] = undefined;
+    this.customUpdate[last] = undefined;
+  }
+
+  setScaleCurve(i: number, curve: ScaleCurve | "linear"): void {
+    const code = SCALE_CURVES.indexOf(curve as ScaleCurve);
+    this.scaleCurve[i] = code === -1 ? 0 : code;
+  }
+
+  getScaleCurve(i: number): ScaleCurve {
+    return SCALE_CURVES[this.scaleCurve[i]];
+  }
+
+  private grow(capacity: number): void {
+    for (const column of FLOAT_COLUMNS) {
+      const grown = new Float64Array(capacity);
+      grown.set(this[column]);
+      (this as Record<FloatColumn, Float64Array>)[column] = grown;
+    }
+    const scaleCurve = new Uint8Array(capacity);
+    scaleCurve.set(this.scaleCurve);
+    this.scaleCurve = scaleCurve;
+    const template = new Int32Array(capacity);
+    template.set(this.template);
+    this.template = template;
+    this.capacity = capacity;
+  }
+}
+
+// A `Particle` backed by a slot of the store, handed to custom update functions
+// so they can keep reading and assigning particle properties
+export class ParticleView implements Particle {
+  index = 0;
+
+  constructor(private store: ParticleStore) {}
+
+  get position(): Vec2 {
+    return new Vec2(this.store.posX[this.index], this.store.posY[this.index]);
+  }
+  set position(v: Vec2) {
+    this.store.posX[this.index] = v.x;
+    this.store.posY[this.index] = v.y;
+  }
+
+  get velocity(): Vec2 {
+    return new Vec2(this.store.velX[this.index], this.store.velY[this.index]);
+  }
+  set velocity(v: Vec2) {
+    this.store.velX[this.index] = v.x;
+    this.store.velY[this.index] = v.y;
+  }
+
+  get acceleration(): Vec2 {
+    return new Vec2(this.store.accX[this.index], this.store.accY[this.index]);
+  }
+  set acceleration(v: Vec2) {
+    this.store.accX[this.index] = v.x;
+    this.store.accY[this.index] = v.y;
+  }
+
+  get color(): Color {
+    const s = this.store, i = this.index;
+    return new Color(s.r[i], s.g[i], s.b[i], s.a[i]);
+  }
+  set color(c: Color) {
+    const s = this.store, i = this.index;
+    s.r[i] = c.r;
+    s.g[i] = c.g;
+    s.b[i] = c.b;
+    s.a[i] = c.a;
+  }
+
+  get startColor(): Color {
+    const s = this.store, i = this.index;
+    return new Color(s.startR[i], s.startG[i], s.startB[i], s.startA[i]);
+  }
+  set startColor(c: Color) {
+    const s = this.store, i = this.index;
+    s.startR[i] = c.r;
+    s.startG[i] = c.g;
+    s.startB[i] = c.b;
+    s.startA[i] = c.a;
+  }
+
+  get endColor(): Color {
+    const s = this.store, i = this.index;
+    return new Color(s.endR[i], s.endG[i], s.endB[i], s.endA[i]);
+  }
+  set endColor(c: Color) {
+    const s = this.store, i = this.index;
+    s.endR[i] = c.r;
+    s.endG[i] = c.g;
+    s.endB[i] = c.b;
+    s.endA[i] = c.a;
+  }
+
+  get colorStages(): ColorStage[] | undefined {
+    return this.store.colorStages[this.index];
+  }
+  set colorStages(stages: ColorStage[] | undefined) {
+    this.store.colorStages[this.index] = stages;
+  }
+
+  get body(): Body {
+    const template = this.store.templates[this.store.template[this.index]];
+    return new Body([...template.parts], this.store.angle[this.index]);
+  }
+  set body(body: Body) {
+    this.store.template[this.index] = this.store.templateFor(body);
+    this.store.angle[this.index] = body.rotation;
+  }
+
+  get scale(): number {
+    return this.store.scale[this.index];
+  }
+  set scale(v: number) {
+    this.store.scale[this.index] = v;
+  }
+
+  get startScale(): number {
+    return this.store.startScale[this.index];
+  }
+  set startScale(v: number) {
+    this.store.startScale[this.index] = v;
+  }
+
+  get endScale(): number {
+    return this.store.endScale[this.index];
+  }
+  set endScale(v: number) {
+    this.store.endScale[this.index] = v;
+  }
+
+  get scaleCurve(): ScaleCurve {
+    return this.store.getScaleCurve(this.index);
+  }
+  set scaleCurve(curve: ScaleCurve | "linear") {
+    this.store.setScaleCurve(this.index, curve);
+  }
+
+  get rotation(): number {
+    return this.store.rotation[this.index];
+  }
+  set rotation(v: number) {
+    this.store.rotation[this.index] = v;
+  }
+
+  get rotationSpeed(): number {
+    return this.store.rotationSpeed[this.index];
+  }
+  set rotationSpeed(v: number) {
+    this.store.rotationSpeed[this.index] = v;
+  }
+
+  get lifetime(): number {
+    return this.store.lifetime[this.index];
+  }
+  set lifetime(v: number) {
+    this.store.lifetime[this.index] = v;
+  }
+
+  get age(): number {
+    return this.store.age[this.index];
+  }
+  set age(v: number) {
+    this.store.age[this.index] = v;
+  }
+
+  get turbulence(): { frequency: number; amplitude: number } | undefined {
+    const amplitude = this.store.turbulenceAmplitude[this.index];
+    if (amplitude === 0) return undefined;
+    return { frequency: this.store.turbulenceFrequency[this.index], amplitude };
+  }
+  set turbulence(t: { frequency: number; amplitude: number } | undefined) {
+    this.store.turbulenceFrequency[this.index] = t?.frequency ?? 0;
+    this.store.turbulenceAmplitude[this.index] = t?.amplitude ?? 0;
+  }
+
+  get customUpdate(): ((particle: Particle, lifeRatio: number) => void) | undefined {
+    return this.store.customUpdate[this.index];
+  }
+  set customUpdate(fn: ((particle: Particle, lifeRatio: number) => void) | undefined) {
+    this.store.customUpdate[this.index] = fn;
+  }
+}
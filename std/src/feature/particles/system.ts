@@ -1,18 +1,35 @@
 import { Vec2 } from "../../base/vec.ts";
 import { Color } from "../../base/draw/color.ts";
-import { Particle, ParticleEmissionOptions, ColorStage } from "./particle.ts";
+import { ParticleEmissionOptions, ColorStage } from "./particle.ts";
 import { Camera } from "../../base/camera.ts";
 import { Body } from "../bodies/body.ts";
-import { Component, Entity } from "../../base/entity.ts";
+import { Component } from "../../base/entity.ts";
 import { TrailOptions } from "./trail.ts";
 import { Display } from "../../base/display.ts";
+import { ParticleStore, ParticleView } from "./store.ts";
+
+const SCALE_EASE_IN = 1;
+const SCALE_EASE_OUT = 2;
+const SCALE_EASE_IN_OUT = 3;
+
+// Style strings are cached per quantized color, up to this many
+const MAX_CACHED_STYLES = 4096;
+// Marks translucent particles in the batch chains, which are drawn on their own
+const TRANSLUCENT = -2;
 
 /**
  * A system for creating and managing particles.
  */
 export class ParticleSystem {
-  private activeParticles: Particle[] = [];
-  private particlePool: Particle[] = [];
+  private particles = new ParticleStore();
+  private view = new ParticleView(this.particles);
+  private styles = new Map<number, string>();
+  private batchHeads = new Map<number, number>();
+  private batchNext = new Int32Array(0);
+  // The shape of every template for the current draw, as a circle radius or, for other
+  // bodies, their vertices, so they are derived once per template instead of per particle
+  private templateRadius: (number | undefined)[] = [];
+  private templateVertices: (readonly (readonly Vec2[])[] | undefined)[] = [];
 
   /**
    * A component that can be added to entities to create a particle trail.
@@ -89,57 +106,65 @@ export class ParticleSystem {
   // @profile "ParticleSystem.update"
   private update(): void {
     const dt = 1 / 60;
+    const ps = this.particles;
 
     // @profile-start "ParticleSystem.update.particles"
-    for (let i = this.activeParticles.length - 1; i >= 0; i--) {
-      const p = this.activeParticles[i];
-      p.age += dt;
-
-      p.velocity = p.velocity.add(p.acceleration.scale(dt));
-
-      if (p.turbulence) {
-        const noiseX = Math.sin(p.age * p.turbulence.frequency) * p.turbulence.amplitude;
-        const noiseY = Math.cos(p.age * p.turbulence.frequency * 0.7) * p.turbulence.amplitude;
-        p.velocity = p.velocity.add(new Vec2(noiseX * dt, noiseY * dt));
+    let i = 0;
+    while (i < ps.count) {
+      const age = (ps.age[i] += dt);
+
+      ps.velX[i] += ps.accX[i] * dt;
+      ps.velY[i] += ps.accY[i] * dt;
+
+      const amplitude = ps.turbulenceAmplitude[i];
+      if (amplitude !== 0) {
+        const frequency = ps.turbulenceFrequency[i];
+        ps.velX[i] += Math.sin(age * frequency) * amplitude * dt;
+        ps.velY[i] += Math.cos(age * frequency * 0.7) * amplitude * dt;
       }
 
-      p.position = p.position.add(p.velocity.scale(dt));
+      ps.posX[i] += ps.velX[i] * dt;
+      ps.posY[i] += ps.velY[i] * dt;
 
-      const lifeRatio = p.age / p.lifetime;
+      const lifeRatio = age / ps.lifetime[i];
 
       let scaleRatio = lifeRatio;
-      if (p.scaleCurve === "easeIn") {
+      const curve = ps.scaleCurve[i];
+      if (curve === SCALE_EASE_IN) {
         scaleRatio = lifeRatio * lifeRatio;
-      } else if (p.scaleCurve === "easeOut") {
+      } else if (curve === SCALE_EASE_OUT) {
         scaleRatio = 1 - (1 - lifeRatio) * (1 - lifeRatio);
-      } else if (p.scaleCurve === "easeInOut") {
+      } else if (curve === SCALE_EASE_IN_OUT) {
         scaleRatio = lifeRatio < 0.5
           ? 2 * lifeRatio * lifeRatio
           : 1 - Math.pow(-2 * lifeRatio + 2, 2) / 2;
       }
-      p.scale = p.startScale + (p.endScale - p.startScale) * scaleRatio;
+      ps.scale[i] = ps.startScale[i] + (ps.endScale[i] - ps.startScale[i]) * scaleRatio;
 
-      if (p.colorStages && p.colorStages.length > 0) {
-        p.color = this.interpolateColorStages(p.colorStages, lifeRatio);
+      const stages = ps.colorStages[i];
+      if (stages && stages.length > 0) {
+        this.interpolateColorStages(stages, lifeRatio, i);
       } else {
-        const r = p.startColor.r + (p.endColor.r - p.startColor.r) * lifeRatio;
-        const g = p.startColor.g + (p.endColor.g - p.startColor.g) * lifeRatio;
-        const b = p.startColor.b + (p.endColor.b - p.startColor.b) * lifeRatio;
-        const a = p.startColor.a + (p.endColor.a - p.startColor.a) * lifeRatio;
-        p.color = new Color(r, g, b, a);
+        ps.r[i] = ps.startR[i] + (ps.endR[i] - ps.startR[i]) * lifeRatio;
+        ps.g[i] = ps.startG[i] + (ps.endG[i] - ps.startG[i]) * lifeRatio;
+        ps.b[i] = ps.startB[i] + (ps.endB[i] - ps.startB[i]) * lifeRatio;
+        ps.a[i] = ps.startA[i] + (ps.endA[i] - ps.startA[i]) * lifeRatio;
       }
 
-      p.rotation += p.rotationSpeed * dt;
+      ps.rotation[i] += ps.rotationSpeed[i] * dt;
 
-      if (p.customUpdate) {
-        p.customUpdate(p, lifeRatio);
+      const customUpdate = ps.customUpdate[i];
+      if (customUpdate) {
+        this.view.index = i;
+        customUpdate(this.view, lifeRatio);
       }
 
-      if (p.age >= p.lifetime) {
-        this.particlePool.push(p);
-        this.activeParticles.splice(i, 1);
+      if (ps.age[i] >= ps.lifetime[i]) {
+        // The last particle moves into this slot and is updated next
+        ps.remove(i);
         continue;
       }
+      i++;
     }
     // @profile-end
 
@@ -175,34 +200,156 @@ export class ParticleSystem {
 
   // @profile "ParticleSystem.draw"
   private draw(camera: Camera): void {
+    const ps = this.particles;
+    if (ps.count === 0) return;
+
     camera._applyTransforms(sim.ctx);
+    // @profile-start "ParticleSystem.draw.batch"
+    // Shapes are mutable, so they are read again every draw
+    this.templateRadius.length = 0;
+    this.templateVertices.length = 0;
+    for (const template of ps.templates) {
+      const radius = circleRadius(template);
+      this.templateRadius.push(radius);
+      this.templateVertices.push(radius === undefined ? template.vertices : undefined);
+    }
+    // Opaque particles sharing a body and an on-screen color are chained into one batch.
+    // Translucent ones are left out, since overlapping parts of one path are only painted
+    // once and they would no longer blend with each other.
+    if (this.batchNext.length < ps.count) {
+      this.batchNext = new Int32Array(ps.capacity);
+    }
+    const heads = this.batchHeads;
+    const next = this.batchNext;
+    heads.clear();
+    let translucent = false;
+    for (let i = 0; i < ps.count; i++) {
+      const color = this.colorKey(i);
+      if (color % 256 !== 255) {
+        next[i] = TRANSLUCENT;
+        translucent = true;
+        continue;
+      }
+      const key = color * ps.templates.length + ps.template[i];
+      next[i] = heads.get(key) ?? -1;
+      heads.set(key, i);
+    }
+    // @profile-end
+
     // @profile-start "ParticleSystem.draw.particles"
-    for (const p of this.activeParticles) {
-      p.body.draw(p.position, p.color, true, 1, p.scale);
+    const ctx = sim.ctx;
+    for (const [key, head] of heads) {
+      ctx.beginPath();
+      for (let i = head; i !== -1; i = next[i]) {
+        this.traceParticle(i);
+      }
+      ctx.fillStyle = this.styleFor(Math.floor(key / ps.templates.length));
+      ctx.fill();
+    }
+    // Translucent particles are filled one at a time, in the order they were emitted
+    if (translucent) {
+      for (let i = 0; i < ps.count; i++) {
+        if (next[i] !== TRANSLUCENT) continue;
+        ctx.beginPath();
+        this.traceParticle(i);
+        ctx.fillStyle = this.styleFor(this.colorKey(i));
+        ctx.fill();
+      }
     }
     // @profile-end
     camera._removeTransforms(sim.ctx);
   }
 
-  // @profile "ParticleSystem.interpolateColorStages"
-  private interpolateColorStages(stages: ColorStage[], lifeRatio: number): Color {
-    if (lifeRatio <= 0) return stages[0].color;
-    if (lifeRatio >= 1) return stages[stages.length - 1].color;
-
-    for (let i = 0; i < stages.length - 1; i++) {
-      const current = stages[i];
-      const next = stages[i + 1];
-      if (lifeRatio >= current.position && lifeRatio <= next.position) {
-        const segmentRatio = (lifeRatio - current.position) / (next.position - current.position);
-        const r = current.color.r + (next.color.r - current.color.r) * segmentRatio;
-        const g = current.color.g + (next.color.g - current.color.g) * segmentRatio;
-        const b = current.color.b + (next.color.b - current.color.b) * segmentRatio;
-        const a = current.color.a + (next.color.a - current.color.a) * segmentRatio;
-        return new Color(r, g, b, a);
+  private traceParticle(i: number): void {
+    const ps = this.particles;
+    const template = ps.template[i];
+    const circle = this.templateRadius[template];
+    if (circle !== undefined) {
+      const radius = Math.abs(circle * ps.scale[i]);
+      sim.ctx.moveTo(ps.posX[i] + radius, ps.posY[i]);
+      sim.ctx.arc(ps.posX[i], ps.posY[i], radius, 0, Math.PI * 2);
+    } else {
+      this.tracePolygons(this.templateVertices[template]!, i);
+    }
+  }
+
+  private tracePolygons(polygons: readonly (readonly Vec2[])[], i: number): void {
+    const ps = this.particles;
+    const ctx = sim.ctx;
+    const scale = ps.scale[i];
+    const cos = Math.cos(ps.angle[i]);
+    const sin = Math.sin(ps.angle[i]);
+    const x = ps.posX[i];
+    const y = ps.posY[i];
+
+    for (const poly of polygons) {
+      if (poly.length < 2) continue;
+      for (let v = 0; v < poly.length; v++) {
+        const vx = poly[v].x * scale;
+        const vy = poly[v].y * scale;
+        const px = vx * cos - vy * sin + x;
+        const py = vx * sin + vy * cos + y;
+        if (v === 0) {
+          ctx.moveTo(px, py);
+        } else {
+          ctx.lineTo(px, py);
+        }
+      }
+      ctx.closePath();
+    }
+  }
+
+  // Canvas colors have 8 bits per channel, so particles that round to the same
+  // color are drawn with the same fill
+  private colorKey(i: number): number {
+    const ps = this.particles;
+    const r = clampByte(ps.r[i]);
+    const g = clampByte(ps.g[i]);
+    const b = clampByte(ps.b[i]);
+    const a = clampByte(ps.a[i] * 255);
+    return ((r * 256 + g) * 256 + b) * 256 + a;
+  }
+
+  private styleFor(colorKey: number): string {
+    let style = this.styles.get(colorKey);
+    if (style === undefined) {
+      if (this.styles.size >= MAX_CACHED_STYLES) {
+        this.styles.clear();
       }
+      const a = colorKey % 256;
+      const b = Math.floor(colorKey / 256) % 256;
+      const g = Math.floor(colorKey / 65536) % 256;
+      const r = Math.floor(colorKey / 16777216);
+      style = `rgba(${r}, ${g}, ${b}, ${a / 255})`;
+      this.styles.set(colorKey, style);
     }
+    return style;
+  }
 
-    return stages[stages.length - 1].color;
+  // @profile "ParticleSystem.interpolateColorStages"
+  private interpolateColorStages(stages: ColorStage[], lifeRatio: number, i: number): void {
+    const ps = this.particles;
+    let color = stages[stages.length - 1].color;
+    if (lifeRatio <= 0) {
+      color = stages[0].color;
+    } else if (lifeRatio < 1) {
+      for (let s = 0; s < stages.length - 1; s++) {
+        const current = stages[s];
+        const next = stages[s + 1];
+        if (lifeRatio >= current.position && lifeRatio <= next.position) {
+          const t = (lifeRatio - current.position) / (next.position - current.position);
+          ps.r[i] = current.color.r + (next.color.r - current.color.r) * t;
+          ps.g[i] = current.color.g + (next.color.g - current.color.g) * t;
+          ps.b[i] = current.color.b + (next.color.b - current.color.b) * t;
+          ps.a[i] = current.color.a + (next.color.a - current.color.a) * t;
+          return;
+        }
+      }
+    }
+    ps.r[i] = color.r;
+    ps.g[i] = color.g;
+    ps.b[i] = color.b;
+    ps.a[i] = color.a;
   }
 
   /**
@@ -211,19 +358,42 @@ export class ParticleSystem {
    */
   // @profile "ParticleSystem.emit"
   public emit(options: ParticleEmissionOptions): void {
+    const ps = this.particles;
+    const template = ps.templateFor(options.body);
+
+    let startScale: number;
+    let endScale: number;
+    const scale = options.scale ?? 1;
+    if (typeof scale === "number") {
+      startScale = scale;
+      endScale = scale;
+    } else {
+      startScale = scale.start;
+      endScale = scale.end;
+    }
+
+    let startColor: Color | undefined;
+    let endColor: Color | undefined;
+    if (options.colorStages) {
+      startColor = options.colorStages[0].color;
+      endColor = options.colorStages[options.colorStages.length - 1].color;
+    } else if (options.color) {
+      startColor = options.color.start;
+      endColor = options.color.end;
+    }
+
     // @profile-start "ParticleSystem.emit.loop"
-    for (let i = 0; i < options.numParticles; i++) {
-      const p = this.particlePool.pop() || {} as Particle;
+    for (let n = 0; n < options.numParticles; n++) {
+      const i = ps.add();
 
-      p.age = 0;
-      p.lifetime =
+      ps.age[i] = 0;
+      ps.lifetime[i] =
         options.particleLifetime.min +
         Math.random() * (options.particleLifetime.max - options.particleLifetime.min);
 
       const jitter = options.positionJitter || 0;
-      const jitterX = (Math.random() - 0.5) * jitter;
-      const jitterY = (Math.random() - 0.5) * jitter;
-      p.position = options.position.add(new Vec2(jitterX, jitterY));
+      ps.posX[i] = options.position.x + (Math.random() - 0.5) * jitter;
+      ps.posY[i] = options.position.y + (Math.random() - 0.5) * jitter;
 
       let randomAngle: number;
       if (options.directionBias) {
@@ -236,54 +406,61 @@ export class ParticleSystem {
       const randomMagnitude =
         options.initialVelocity.min +
         Math.random() * (options.initialVelocity.max - options.initialVelocity.min);
-      p.velocity = new Vec2(
-        Math.cos(randomAngle) * randomMagnitude,
-        Math.sin(randomAngle) * randomMagnitude
-      );
-
-      p.acceleration = options.acceleration || new Vec2(0, 0);
-
-      const scale = options.scale ?? 1;
-      if (typeof scale === "number") {
-        p.startScale = scale;
-        p.endScale = scale;
-      } else {
-        p.startScale = scale.start;
-        p.endScale = scale.end;
-      }
-      p.scale = p.startScale;
-      p.scaleCurve = options.scaleCurve;
-
-      if (options.orientToDirection) {
-        p.body = new Body([...options.body.parts], p.velocity.angle());
-      } else {
-        p.body = new Body([...options.body.parts], options.body.rotation);
-      }
-
-      if (options.colorStages) {
-        p.colorStages = options.colorStages;
-        p.color = options.colorStages[0].color;
-        p.startColor = options.colorStages[0].color;
-        p.endColor = options.colorStages[options.colorStages.length - 1].color;
-      } else if (options.color) {
-        p.startColor = options.color.start;
-        p.endColor = options.color.end;
-        p.color = p.startColor;
+      ps.velX[i] = Math.cos(randomAngle) * randomMagnitude;
+      ps.velY[i] = Math.sin(randomAngle) * randomMagnitude;
+
+      ps.accX[i] = options.acceleration?.x ?? 0;
+      ps.accY[i] = options.acceleration?.y ?? 0;
+
+      ps.startScale[i] = startScale;
+      ps.endScale[i] = endScale;
+      ps.scale[i] = startScale;
+      ps.setScaleCurve(i, options.scaleCurve);
+
+      ps.template[i] = template;
+      ps.angle[i] = options.orientToDirection
+        ? Math.atan2(ps.velY[i], ps.velX[i])
+        : options.body.rotation;
+
+      ps.colorStages[i] = options.colorStages;
+      if (startColor && endColor) {
+        ps.r[i] = ps.startR[i] = startColor.r;
+        ps.g[i] = ps.startG[i] = startColor.g;
+        ps.b[i] = ps.startB[i] = startColor.b;
+        ps.a[i] = ps.startA[i] = startColor.a;
+        ps.endR[i] = endColor.r;
+        ps.endG[i] = endColor.g;
+        ps.endB[i] = endColor.b;
+        ps.endA[i] = endColor.a;
       }
 
       const rot = options.rotation;
-      p.rotation = rot ? rot.min + Math.random() * (rot.max - rot.min) : 0;
+      ps.rotation[i] = rot ? rot.min + Math.random() * (rot.max - rot.min) : 0;
       const rotSpeed = options.rotationSpeed;
-      p.rotationSpeed = rotSpeed ? rotSpeed.min + Math.random() * (rotSpeed.max - rotSpeed.min) : 0;
-
-      p.turbulence = options.turbulence;
-      p.customUpdate = options.customUpdate;
+      ps.rotationSpeed[i] = rotSpeed
+        ? rotSpeed.min + Math.random() * (rotSpeed.max - rotSpeed.min)
+        : 0;
 
-      this.activeParticles.push(p);
+      ps.turbulenceFrequency[i] = options.turbulence?.frequency ?? 0;
+      ps.turbulenceAmplitude[i] = options.turbulence?.amplitude ?? 0;
+      ps.customUpdate[i] = options.customUpdate;
     }
     // @profile-end
   }
 }
 
-declare const sim: any;
+function clampByte(v: number): number {
+  return v <= 0 ? 0 : v >= 255 ? 255 : Math.round(v);
+}
+
+// Single circle bodies are drawn as arcs instead of their polygon outline
+function circleRadius(body: Body): number | undefined {
+  if (body.parts.length !== 1) return undefined;
+  const part = body.parts[0];
+  if (part.shape.type !== "circle" || part.position.x !== 0 || part.position.y !== 0) {
+    return undefined;
+  }
+  return part.shape.radius;
+}
 
+declare const sim: any;
@@ -42,3 +42,23 @@ export function warning(...args: unknown[]): void {
 export function error(...args: unknown[]): void {
   sim.log("[error]", ...args);
 }
+
+/**
+ * Reports named results of the simulation, such as the final energy or the time it took
+ * a body to settle, as a line of JSON. `physim.sweep` in the Python package collects them
+ * into the row of the run, later reports of a name replacing earlier ones.
+ *
+ * @example
+ * ```ts
+ * import { report } from "physim/logging";
+ *
+ * const G = sim.params.G ?? 1;
+ * // ... run the simulation
+ * report({ energy: 12.5, settled: true });
+ * ```
+ *
+ * @param values The results by name.
+ */
+export function report(values: Record<string, number | string | boolean | null>): void {
+  sim.log(JSON.stringify({ type: "report", values }));
+}
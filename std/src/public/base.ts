@@ -13,5 +13,7 @@ export * from "../base/draw/color.ts";
 export * from "../base/draw/shapes.ts";
 export * from "../base/entity.ts";
 export * from "../base/physics.ts";
+export * from "../base/query.ts";
 export * from "../base/simulation.ts";
+export * from "../base/storage.ts";
 export * from "../base/vec.ts";
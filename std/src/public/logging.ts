@@ -10,6 +10,7 @@
  * log.debug("Debugging...");
  * log.warning("Something seems off");
  * log.error("An error occurred");
+ * log.report({ energy: 12.5 });
  * ```
  *
  * @module
@@ -12,9 +12,67 @@ const SCALE = 50;
 
 interface EntityData {
   body: planck.Body;
-  bodySignature: string;
+  bodyFingerprint: number;
   defaultProps: DefaultCollisionProperties;
   restitution: number;
+  // The position and rotation last exchanged with planck, so bodies that were not
+  // moved from outside the collision world can skip the expensive transform update
+  x: number;
+  y: number;
+  angle: number;
+}
+
+const SHAPE_TYPES = ["circle", "polygon", "ring", "hollow_polygon"];
+
+const fingerprintScratch = new Float64Array(1);
+const fingerprintBits = new Uint32Array(fingerprintScratch.buffer);
+
+// FNV-1a over the bits of a float
+function mix(hash: number, value: number): number {
+  fingerprintScratch[0] = value;
+  hash = Math.imul(hash ^ fingerprintBits[0], 0x01000193);
+  return Math.imul(hash ^ fingerprintBits[1], 0x01000193);
+}
+
+function mixVertices(hash: number, vertices: Vec2[]): number {
+  hash = mix(hash, vertices.length);
+  for (const v of vertices) {
+    hash = mix(mix(hash, v.x), v.y);
+  }
+  return hash;
+}
+
+/**
+ * Hashes everything about a body that its fixtures are built from. Shapes are mutated
+ * in place by user code, so this is compared every frame and must stay cheap.
+ */
+function computeBodyFingerprint(body: Body): number {
+  let hash = mix(0x811c9dc5, body.parts.length);
+  for (const part of body.parts) {
+    const shape = part.shape;
+    hash = mix(hash, SHAPE_TYPES.indexOf(shape.type));
+    hash = mix(mix(hash, part.position.x), part.position.y);
+    hash = mix(hash, part.rotation);
+    switch (shape.type) {
+      case "circle":
+        hash = mix(hash, shape.radius);
+        break;
+      case "polygon":
+        hash = mixVertices(hash, shape.vertices);
+        break;
+      case "ring":
+        hash = mix(mix(hash, shape.innerRadius), shape.outerRadius);
+        hash = mix(hash, shape.gaps.length);
+        for (const gap of shape.gaps) {
+          hash = mix(mix(hash, gap.startAngle), gap.size);
+        }
+        break;
+      case "hollow_polygon":
+        hash = mix(mixVertices(hash, shape.vertices), shape.width);
+        break;
+    }
+  }
+  return hash;
 }
 
 export class PlanckWorldManager implements WorldPort {
@@ -130,6 +188,7 @@ export class PlanckWorldManager implements WorldPort {
     }
 
     const planckBody = this._world.createBody(bodyDef);
+    planckBody.setUserData(entity);
 
     const fixtureDef: any = {
       friction: defaultProps.friction ?? 0.0,
@@ -165,9 +224,12 @@ export class PlanckWorldManager implements WorldPort {
 
     this._entityToData.set(entity, {
       body: planckBody,
-      bodySignature: this.computeBodySignature(body),
+      bodyFingerprint: computeBodyFingerprint(body),
       defaultProps,
       restitution,
+      x: entity.pos.x,
+      y: entity.pos.y,
+      angle: body.rotation,
     });
     this._entities.push(entity);
   }
@@ -196,66 +258,65 @@ export class PlanckWorldManager implements WorldPort {
 
     this._pendingCollisions = [];
 
-    // Rebuild fixtures for any entities whose shapes have changed
+    // @profile-start "PlanckWorldManager.step.syncIn"
     for (const [entity, data] of this._entityToData) {
       const bodyComp = entity.getComp(this._bodyComponent);
       if (!bodyComp) continue;
 
-      const currentSignature = this.computeBodySignature(bodyComp);
-      if (currentSignature !== data.bodySignature) {
+      // Rebuild fixtures if the shapes changed
+      const fingerprint = computeBodyFingerprint(bodyComp);
+      if (fingerprint !== data.bodyFingerprint) {
         this.rebuildFixtures(entity, bodyComp, data);
+        data.bodyFingerprint = fingerprint;
       }
-    }
+      this.updateRestitution(entity, data);
 
-    for (const [entity, data] of this._entityToData) {
-      const bodyComp = entity.getComp(this._bodyComponent);
-      if (!bodyComp) continue;
+      const body = data.body;
+      if (
+        entity.pos.x !== data.x ||
+        entity.pos.y !== data.y ||
+        bodyComp.rotation !== data.angle
+      ) {
+        body.setTransform(
+          { x: entity.pos.x / SCALE, y: entity.pos.y / SCALE },
+          bodyComp.rotation,
+        );
+        data.x = entity.pos.x;
+        data.y = entity.pos.y;
+        data.angle = bodyComp.rotation;
+      }
 
-      if (data.body.isStatic()) {
-        data.body.setPosition({
-          x: entity.pos.x / SCALE,
-          y: entity.pos.y / SCALE,
-        });
-        data.body.setAngle(bodyComp.rotation);
-      } else {
-        const velocity = this._physics.velocity.get(entity);
-        const vel = velocity ?? { x: 0, y: 0 };
-        data.body.setLinearVelocity({ x: vel.x / SCALE, y: vel.y / SCALE });
-        data.body.setAngularVelocity(bodyComp.angularVelocity);
-        data.body.setAngle(bodyComp.rotation);
+      if (!body.isStatic()) {
+        const vel = this._physics.velocity.get(entity) ?? { x: 0, y: 0 };
+        body.setLinearVelocity({ x: vel.x / SCALE, y: vel.y / SCALE });
+        body.setAngularVelocity(bodyComp.angularVelocity);
       }
     }
+    // @profile-end
 
     this._world.step(1 / 60);
 
+    // @profile-start "PlanckWorldManager.step.syncOut"
     for (const [entity, data] of this._entityToData) {
-      if (data.body.isStatic()) continue;
-      const vel = data.body.getLinearVelocity();
-    }
-
-    for (const [entity, data] of this._entityToData) {
-      this.updateRestitution(entity, data);
+      const body = data.body;
+      if (body.isStatic() || !body.isAwake()) continue;
       const bodyComp = entity.getComp(this._bodyComponent);
       if (!bodyComp) continue;
 
-      if (data.body.isStatic()) {
-        continue;
-      }
-
-      const pos = data.body.getPosition();
-      entity.pos.x = pos.x * SCALE;
-      entity.pos.y = pos.y * SCALE;
+      const pos = body.getPosition();
+      entity.pos.x = data.x = pos.x * SCALE;
+      entity.pos.y = data.y = pos.y * SCALE;
 
-      const linvel = data.body.getLinearVelocity();
+      const linvel = body.getLinearVelocity();
       (this._physics.velocity as Component<Vec2>).set(
         entity,
         new Vec2(linvel.x * SCALE, linvel.y * SCALE),
       );
-      const syncedVel = this._physics.velocity.get(entity);
 
-      bodyComp.angularVelocity = data.body.getAngularVelocity();
-      bodyComp.rotation = data.body.getAngle();
+      bodyComp.angularVelocity = body.getAngularVelocity();
+      bodyComp.rotation = data.angle = body.getAngle();
     }
+    // @profile-end
   }
 
   getCollisionEvents(): CollisionEvent[] {
@@ -287,7 +348,7 @@ export class PlanckWorldManager implements WorldPort {
 
   /**
    * Rebuilds all fixtures on the Planck body from the current visual shape.
-   * Called automatically when the body's shape signature changes.
+   * Called automatically when the body's shape fingerprint changes.
    */
   private rebuildFixtures(
     entity: Entity,
@@ -326,9 +387,6 @@ export class PlanckWorldManager implements WorldPort {
         }
       }
     }
-
-    // Update stored signature so we don't rebuild again next frame
-    data.bodySignature = this.computeBodySignature(body);
   }
 
   syncRigidBodyToEntity(entity: Entity): void {}
@@ -486,38 +544,6 @@ export class PlanckWorldManager implements WorldPort {
     return shapes;
   }
 
-  private computeBodySignature(body: Body): string {
-    return JSON.stringify(
-      body.parts.map((part) => ({
-        position: { x: part.position.x, y: part.position.y },
-        rotation: part.rotation,
-        shape: this.serializeShape(part.shape),
-      })),
-    );
-  }
-
-  private serializeShape(shape: Body["parts"][0]["shape"]): unknown {
-    switch (shape.type) {
-      case "circle":
-        return { type: shape.type, radius: shape.radius };
-      case "polygon":
-        return {
-          type: shape.type,
-          vertices: shape.vertices.map((v: Vec2) => [v.x, v.y]),
-        };
-      case "ring":
-        return {
-          type: shape.type,
-          innerRadius: shape.innerRadius,
-          outerRadius: shape.outerRadius,
-        };
-      case "hollow_polygon":
-        return { type: shape.type, width: shape.width };
-      default:
-        return shape;
-    }
-  }
-
   private computeArea(shape: Body["parts"][0]["shape"]): number {
     switch (shape.type) {
       case "circle":
@@ -546,17 +572,7 @@ export class PlanckWorldManager implements WorldPort {
     }
   }
 
-  private getEntityFromBody(body: planck.Body): Entity | undefined {
-    for (const [entity, data] of this._entityToData) {
-      if (data.body === body) {
-        return entity;
-      }
-    }
-    return undefined;
-  }
-
   private getEntityFromFixture(fixture: planck.Fixture): Entity | undefined {
-    const body = fixture.getBody();
-    return this.getEntityFromBody(body);
+    return fixture.getBody().getUserData() as Entity | undefined;
   }
 }
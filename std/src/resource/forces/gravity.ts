@@ -1,14 +1,371 @@
 import { Physics } from "../../base/physics.ts";
 import { Vec2 } from "../../base/vec.ts";
 import { Entity } from "../../base/entity.ts";
+import { DenseVec2Component } from "../../base/storage.ts";
+import { createBodies, PhysicsBodies } from "../../base/physics_worker.ts";
+
+/**
+ * Options for approximating gravity with a Barnes–Hut tree.
+ */
+export interface GravityOptions {
+  /**
+   * How coarse the approximation is. A group of entities is treated as a single mass at its
+   * center of mass when the size of the region it occupies divided by its distance is below
+   * `theta`. `0` computes every pair exactly, around `0.5` is a common balance between
+   * accuracy and speed, and larger values are faster and less accurate. Defaults to `0.5`.
+   */
+  theta?: number;
+  /**
+   * A length added to every distance, as `sqrt(d² + softening²)`, which keeps the pull
+   * between entities that get very close finite. Defaults to `0`.
+   */
+  softening?: number;
+}
+
+// Barnes–Hut gravity on the rows below `massCount`. Self-contained, since the physics worker
+// runs it from its source.
+function barnesHutGravity(
+  G: number,
+  theta: number,
+  softening: number,
+): (bodies: PhysicsBodies) => void {
+  const EMPTY = -1;
+  const INTERNAL = -2;
+  // Coincident entities end up in the same leaf instead of splitting forever
+  const MAX_DEPTH = 48;
+
+  class BarnesHutTree {
+    count = 0;
+    posX = new Float64Array(0);
+    posY = new Float64Array(0);
+    masses = new Float64Array(0);
+    accX = new Float64Array(0);
+    accY = new Float64Array(0);
+    next = new Int32Array(0);
+
+    nodeCount = 0;
+    children = new Int32Array(0);
+    body = new Int32Array(0);
+    centerX = new Float64Array(0);
+    centerY = new Float64Array(0);
+    halfSize = new Float64Array(0);
+    nodeMass = new Float64Array(0);
+    comX = new Float64Array(0);
+    comY = new Float64Array(0);
+
+    stack = new Int32Array(0);
+
+    reserveBodies(count: number): void {
+      this.count = count;
+      if (count <= this.posX.length) return;
+      const capacity = Math.max(64, count * 2);
+      this.posX = new Float64Array(capacity);
+      this.posY = new Float64Array(capacity);
+      this.masses = new Float64Array(capacity);
+      this.accX = new Float64Array(capacity);
+      this.accY = new Float64Array(capacity);
+      this.next = new Int32Array(capacity);
+    }
+
+    private growNodes(): void {
+      const capacity = Math.max(256, this.body.length * 2);
+      const children = new Int32Array(capacity * 4);
+      children.set(this.children);
+      this.children = children;
+      const body = new Int32Array(capacity);
+      body.set(this.body);
+      this.body = body;
+      for (const key of ["centerX", "centerY", "halfSize", "nodeMass", "comX", "comY"] as const) {
+        const grown = new Float64Array(capacity);
+        grown.set(this[key]);
+        this[key] = grown;
+      }
+    }
+
+    private addNode(cx: number, cy: number, half: number): number {
+      if (this.nodeCount === this.body.length) {
+        this.growNodes();
+      }
+      const node = this.nodeCount++;
+      this.children.fill(EMPTY, node * 4, node * 4 + 4);
+      this.body[node] = EMPTY;
+      this.centerX[node] = cx;
+      this.centerY[node] = cy;
+      this.halfSize[node] = half;
+      return node;
+    }
+
+    private childFor(node: number, x: number, y: number): number {
+      const quadrant = (x >= this.centerX[node] ? 1 : 0) | (y >= this.centerY[node] ? 2 : 0);
+      let child = this.children[node * 4 + quadrant];
+      if (child === EMPTY) {
+        const half = this.halfSize[node] / 2;
+        child = this.addNode(
+          this.centerX[node] + (quadrant & 1 ? half : -half),
+          this.centerY[node] + (quadrant & 2 ? half : -half),
+          half,
+        );
+        this.children[node * 4 + quadrant] = child;
+      }
+      return child;
+    }
+
+    private insert(i: number): void {
+      const x = this.posX[i];
+      const y = this.posY[i];
+      let node = 0;
+      let depth = 0;
+
+      while (true) {
+        const occupant = this.body[node];
+        if (occupant === INTERNAL) {
+          node = this.childFor(node, x, y);
+          depth++;
+        } else if (occupant === EMPTY) {
+          this.body[node] = i;
+          this.next[i] = EMPTY;
+          return;
+        } else if (depth >= MAX_DEPTH) {
+          this.next[i] = occupant;
+          this.body[node] = i;
+          return;
+        } else {
+          this.body[node] = INTERNAL;
+          const child = this.childFor(node, this.posX[occupant], this.posY[occupant]);
+          this.body[child] = occupant;
+        }
+      }
+    }
+
+    build(): void {
+      let minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity;
+      for (let i = 0; i < this.count; i++) {
+        const x = this.posX[i], y = this.posY[i];
+        if (x < minX) minX = x;
+        if (x > maxX) maxX = x;
+        if (y < minY) minY = y;
+        if (y > maxY) maxY = y;
+      }
+
+      this.nodeCount = 0;
+      const half = Math.max(maxX - minX, maxY - minY) / 2 + 1e-9;
+      this.addNode((minX + maxX) / 2, (minY + maxY) / 2, half);
+      for (let i = 0; i < this.count; i++) {
+        this.insert(i);
+      }
+
+      // Children are always created after their parent, so a reverse sweep sees them first
+      for (let node = this.nodeCount - 1; node >= 0; node--) {
+        let mass = 0, mx = 0, my = 0;
+        const occupant = this.body[node];
+        if (occupant === INTERNAL) {
+          for (let q = 0; q < 4; q++) {
+            const child = this.children[node * 4 + q];
+            if (child === EMPTY) continue;
+            const m = this.nodeMass[child];
+            mass += m;
+            mx += this.comX[child] * m;
+            my += this.comY[child] * m;
+          }
+        } else {
+          for (let i = occupant; i !== EMPTY; i = this.next[i]) {
+            const m = this.masses[i];
+            mass += m;
+            mx += this.posX[i] * m;
+            my += this.posY[i] * m;
+          }
+        }
+        this.nodeMass[node] = mass;
+        this.comX[node] = mass !== 0 ? mx / mass : this.centerX[node];
+        this.comY[node] = mass !== 0 ? my / mass : this.centerY[node];
+      }
+    }
+
+    accumulate(G: number, theta: number, softening: number): void {
+      if (this.stack.length < this.nodeCount) {
+        this.stack = new Int32Array(this.body.length);
+      }
+      const stack = this.stack;
+      const thetaSq = theta * theta;
+      const epsSq = softening * softening;
+
+      for (let i = 0; i < this.count; i++) {
+        const x = this.posX[i];
+        const y = this.posY[i];
+        let ax = 0, ay = 0;
+        let top = 0;
+        stack[top++] = 0;
+
+        while (top > 0) {
+          const node = stack[--top];
+          const occupant = this.body[node];
+
+          if (occupant === INTERNAL) {
+            const dx = this.comX[node] - x;
+            const dy = this.comY[node] - y;
+            const distSq = dx * dx + dy * dy;
+            const size = this.halfSize[node] * 2;
+            if (size * size < thetaSq * distSq) {
+              const r2 = distSq + epsSq;
+              const s = (G * this.nodeMass[node]) / (r2 * Math.sqrt(r2));
+              ax += dx * s;
+              ay += dy * s;
+            } else {
+              for (let q = 0; q < 4; q++) {
+                const child = this.children[node * 4 + q];
+                if (child !== EMPTY) stack[top++] = child;
+              }
+            }
+          } else {
+            for (let j = occupant; j !== EMPTY; j = this.next[j]) {
+              if (j === i) continue;
+              const dx = this.posX[j] - x;
+              const dy = this.posY[j] - y;
+              const r2 = dx * dx + dy * dy + epsSq;
+              if (r2 === 0) continue;
+              const s = (G * this.masses[j]) / (r2 * Math.sqrt(r2));
+              ax += dx * s;
+              ay += dy * s;
+            }
+          }
+        }
+
+        this.accX[i] = ax;
+        this.accY[i] = ay;
+      }
+    }
+  }
+
+  const tree = new BarnesHutTree();
+
+  return (bodies: PhysicsBodies): void => {
+    const n = bodies.massCount;
+    tree.reserveBodies(n);
+    for (let i = 0; i < n; i++) {
+      tree.posX[i] = bodies.posX[i];
+      tree.posY[i] = bodies.posY[i];
+      tree.masses[i] = bodies.mass[i];
+    }
+    if (n === 0) return;
+
+    tree.build();
+    tree.accumulate(G, theta, softening);
+
+    const { flags, accX, accY } = bodies;
+    for (let i = 0; i < n; i++) {
+      if (flags[i] & 2) {
+        accX[i] += tree.accX[i];
+        accY[i] += tree.accY[i];
+      } else {
+        accX[i] = tree.accX[i];
+        accY[i] = tree.accY[i];
+        flags[i] |= 2;
+      }
+    }
+  };
+}
+
+// The same arithmetic as the force of `initGravityForce` without options
+function exactGravity(G: number): (bodies: PhysicsBodies) => void {
+  return (bodies: PhysicsBodies): void => {
+    const { flags, posX, posY, accX, accY, mass } = bodies;
+    for (let i = 0; i < bodies.massCount; i++) {
+      const m = mass[i];
+      for (let j = 0; j < bodies.massCount; j++) {
+        if (i === j) continue;
+        const dx = posX[j] - posX[i];
+        const dy = posY[j] - posY[i];
+        const distSq = dx * dx + dy * dy;
+        if (distSq === 0) continue;
+
+        const forceMag = (G * (m * mass[j])) / distSq;
+        const length = Math.hypot(dx, dy);
+        const fx = (dx / length) * forceMag;
+        const fy = (dy / length) * forceMag;
+        if (!(flags[i] & 2)) {
+          accX[i] = 0;
+          accY[i] = 0;
+          flags[i] |= 2;
+        }
+        accX[i] = accX[i] + fx * (1 / m);
+        accY[i] = accY[i] + fy * (1 / m);
+      }
+    }
+  };
+}
+
+function initBarnesHutGravity(physics: Physics, G: number, options: GravityOptions): void {
+  const theta = options.theta ?? 0.5;
+  const softening = options.softening ?? 0;
+  const step = barnesHutGravity(G, theta, softening);
+  let bodies = createBodies(0);
+  const entities: Entity[] = [];
+
+  const force = (): void => {
+    entities.length = 0;
+    if (physics.mass.size > bodies.posX.length) {
+      bodies = createBodies(Math.max(64, physics.mass.size * 2));
+    }
+    let n = 0;
+    for (const [entity, mass] of physics.mass) {
+      entities.push(entity);
+      bodies.posX[n] = entity.pos.x;
+      bodies.posY[n] = entity.pos.y;
+      bodies.mass[n] = mass;
+      n++;
+    }
+    if (n === 0) return;
+    bodies.count = n;
+    bodies.massCount = n;
+    bodies.flags.fill(0, 0, n);
+
+    // @profile-start "Gravity.barnesHut"
+    step(bodies);
+
+    const acceleration = physics.acceleration;
+    if (acceleration instanceof DenseVec2Component) {
+      for (let i = 0; i < n; i++) {
+        const entity = entities[i];
+        const row = acceleration.indexOf(entity);
+        if (row === -1) {
+          acceleration.set(entity, new Vec2(bodies.accX[i], bodies.accY[i]));
+        } else {
+          acceleration.x[row] += bodies.accX[i];
+          acceleration.y[row] += bodies.accY[i];
+        }
+      }
+    } else {
+      for (let i = 0; i < n; i++) {
+        const entity = entities[i];
+        const current = acceleration.get(entity);
+        acceleration.set(
+          entity,
+          current
+            ? new Vec2(current.x + bodies.accX[i], current.y + bodies.accY[i])
+            : new Vec2(bodies.accX[i], bodies.accY[i]),
+        );
+      }
+    }
+    // @profile-end
+  };
+
+  physics.registerStaticForce(force, 0);
+  physics.setWorkerKernel(force, { factory: barnesHutGravity, args: [G, theta, softening] });
+}
 
 /**
  * Initializes the gravitational force for the physics engine.
  * This function creates and registers a force that simulates mutual gravitational
  * attraction between all entities that have a `mass` component.
  *
+ * Without `options`, the pull between every pair of entities is computed exactly, which
+ * takes time proportional to the square of the number of entities. With `options`, the
+ * pull of distant groups of entities is approximated by their combined mass (Barnes–Hut),
+ * which scales to many thousands of entities.
+ *
  * @param physics The physics engine instance.
  * @param G The gravitational constant.
+ * @param options Enables the approximation and configures it.
  *
  * @example
  * ```ts
@@ -19,7 +376,16 @@ import { Entity } from "../../base/entity.ts";
  * initGravityForce(sim.physics, 1.0);
  * ```
  */
-export function initGravityForce(physics: Physics, G: number): void {
+export function initGravityForce(
+  physics: Physics,
+  G: number,
+  options?: GravityOptions,
+): void {
+  if (options) {
+    initBarnesHutGravity(physics, G, options);
+    return;
+  }
+
   const gravityForce = (entity: Entity, mass: number): void => {
     // @profile-start "Gravity.forceCalculation"
     for (const otherEntity of physics.mass.keys()) {
@@ -46,4 +412,5 @@ export function initGravityForce(physics: Physics, G: number): void {
   };
 
   physics.registerForce(physics.mass, gravityForce, 0);
+  physics.setWorkerKernel(gravityForce, { factory: exactGravity, args: [G] });
 }
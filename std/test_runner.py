@@ -2,14 +2,13 @@
 import json
 import sys
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Optional
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from physim import PhysimResult, run_script
+from physim import PhysimResult, run_many
 
 # ANSI color codes
 RESET = "\033[0m"
@@ -70,9 +69,9 @@ def parse_test_messages(stdout: str) -> List[TestMessage]:
     return messages
 
 
-def run_test_file(filepath: str) -> TestResult:
-    result = run_script(filepath, raw=True)
-
+def make_test_result(
+    filepath: str, result: PhysimResult, tests: Optional[List[TestMessage]] = None
+) -> TestResult:
     if result.is_system_failure:
         return TestResult(
             filepath=filepath,
@@ -81,7 +80,8 @@ def run_test_file(filepath: str) -> TestResult:
             system_error=result.stderr or "System failure",
         )
 
-    tests = parse_test_messages(result.stdout)
+    if tests is None:
+        tests = parse_test_messages(result.stdout)
 
     return TestResult(
         filepath=filepath,
@@ -95,6 +95,8 @@ class TestDisplay:
     def __init__(self, test_files: List[str]):
         self.test_files = test_files
         self.results: dict[str, TestResult] = {}
+        # Tests reported so far by the files still running
+        self.running: dict[str, List[TestMessage]] = {}
         self.lines_printed = 0
         self.lock = threading.Lock()
 
@@ -120,7 +122,16 @@ class TestDisplay:
             result = self.results.get(filepath)
 
             if not result:
-                print(f"{WAITING} {filepath}")
+                tests = self.running.get(filepath)
+                if tests:
+                    passed = sum(1 for t in tests if t.type == "test_pass")
+                    failed = len(tests) - passed
+                    counts = f"{GREEN}{passed} passed{RESET}"
+                    if failed:
+                        counts += f", {RED}{failed} failed{RESET}"
+                    print(f"{WAITING} {filepath} {GRAY}({RESET}{counts}{GRAY}){RESET}")
+                else:
+                    print(f"{WAITING} {filepath}")
                 new_lines_printed += 1
                 continue
 
@@ -142,6 +153,11 @@ class TestDisplay:
         self.lines_printed = new_lines_printed
         sys.stdout.flush()
 
+    def add_test(self, filepath: str, message: TestMessage):
+        with self.lock:
+            self.running.setdefault(filepath, []).append(message)
+            self.redraw()
+
     def update_test(self, filepath: str, result: TestResult):
         with self.lock:
             self.results[filepath] = result
@@ -200,18 +216,26 @@ def main():
     display = TestDisplay(test_files)
     display.print_initial()
 
-    with ThreadPoolExecutor() as executor:
-        futures = {
-            executor.submit(run_test_file, filepath): filepath
-            for filepath in test_files
-        }
-
-        for future in as_completed(futures):
-            filepath = futures[future]
-            try:
-                result = future.result()
-                display.update_test(filepath, result)
-            except Exception as e:
+    def on_event(filepath: str, event: dict):
+        if event["event"] in ("test_pass", "test_fail"):
+            display.add_test(
+                filepath,
+                TestMessage(
+                    type=event["event"],
+                    name=event.get("name", "unknown"),
+                    error=event.get("error"),
+                ),
+            )
+
+    try:
+        for result in run_many(test_files, on_event=on_event):
+            tests = display.running.pop(result.filepath, [])
+            display.update_test(
+                result.filepath, make_test_result(result.filepath, result, tests)
+            )
+    except Exception as e:
+        for filepath in test_files:
+            if filepath not in display.results:
                 error_result = TestResult(
                     filepath=filepath,
                     tests=[],
@@ -1,5 +1,5 @@
 import { test, expect } from "../../test.ts";
-import { Sound } from "physim/base";
+import { Sound, SoundDefinition } from "physim/base";
 
 await test("Sound.fromSrc and Sound.play", async () => {
   let addedProps: any = null;
@@ -20,3 +20,36 @@ await test("Sound.fromSrc and Sound.play", async () => {
   sound.play();
   expect(playedId).toBe(123);
 });
+
+await test("Sound.createAll registers every sound in one batch", async () => {
+  const batches: any[][] = [];
+  (globalThis as any).sim.addSounds = async (props: any[]) => {
+    batches.push(props);
+    return props.map((_, i) => 10 + i);
+  };
+
+  const definitions: SoundDefinition[] = [
+    { src: "hit.wav" },
+    { args: ["synth", "0.1", "sine", "440"] },
+    { synth: { duration: 0.2, oscillators: [{ type: "sine", freq: 220 }] } },
+  ];
+  const sounds = await Sound.createAll(definitions);
+
+  expect(batches.length).toBe(1);
+  expect(batches[0][0].src).toBe("hit.wav");
+  expect(batches[0][1].src).toEqual({ args: ["synth", "0.1", "sine", "440"] });
+  expect(Array.isArray(batches[0][2].src.args)).toBe(true);
+  expect(sounds.map((s) => s.id)).toEqual([10, 11, 12]);
+});
+
+await test("Sound.play passes the volume", () => {
+  const played: [number, number | undefined][] = [];
+  (globalThis as any).sim.playSound = (id: number, volume?: number) => {
+    played.push([id, volume]);
+  };
+
+  const sound = new Sound(7);
+  sound.play();
+  sound.play(0.25);
+  expect(played).toEqual([[7, 1], [7, 0.25]]);
+});
@@ -173,3 +173,14 @@ await test("Angular velocity integration - multiple frames", () => {
   
   expect(body.rotation).toBeCloseTo(Math.PI * 2, 4);
 });
+
+await test("Body.boundingRadius", () => {
+  expect(Body.fromShape(createCircle(10)).boundingRadius).toBeCloseTo(10);
+  expect(Body.fromShape(createRectangle(6, 8)).boundingRadius).toBeCloseTo(5);
+
+  const offset = new Body([
+    { shape: createCircle(2), position: new Vec2(3, 4), rotation: 0 },
+    { shape: createCircle(1), position: new Vec2(0, 0), rotation: 0 },
+  ]);
+  expect(offset.boundingRadius).toBeCloseTo(7);
+});
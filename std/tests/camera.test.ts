@@ -97,3 +97,22 @@ await test("Camera - contains with rotation", () => {
   expect(camera.contains(new Vec2(0, 40), width, height)).toBeTruthy();
   expect(camera.contains(new Vec2(40, 0), width, height)).toBeFalsy();
 });
+
+await test("Camera - visibleBounds", () => {
+  const camera = new Camera();
+  camera.position = new Vec2(100, 0);
+  camera.zoom = 2;
+
+  const bounds = camera.visibleBounds(100, 40);
+  expect(bounds.min.x).toBeCloseTo(75);
+  expect(bounds.max.x).toBeCloseTo(125);
+  expect(bounds.min.y).toBeCloseTo(-10);
+  expect(bounds.max.y).toBeCloseTo(10);
+
+  camera.rotation = Math.PI / 2;
+  const rotated = camera.visibleBounds(100, 40);
+  expect(rotated.min.x).toBeCloseTo(90);
+  expect(rotated.max.x).toBeCloseTo(110);
+  expect(rotated.min.y).toBeCloseTo(-25);
+  expect(rotated.max.y).toBeCloseTo(25);
+});
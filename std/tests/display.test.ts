@@ -1 +1,17 @@
-// Tests for Display class will be implemented here later.
+import { test, expect } from "../test.ts";
+import { Camera, Component, Display, DrawOptions, Entity, Vec2 } from "physim/base";
+
+await test("Display.registerDrawComponent culls entities outside the camera", () => {
+  const display = new Display();
+  const comp = new Component<number>();
+  const near = Entity.create(new Vec2(0, 0), [[comp, 5]]);
+  const edge = Entity.create(new Vec2(sim.ctx.canvas.width / 2 + 4, 0), [[comp, 5]]);
+  Entity.create(new Vec2(sim.ctx.canvas.width * 4, 0), [[comp, 5]]);
+
+  const drawn: Entity[] = [];
+  const options: DrawOptions<number> = { cullRadius: (_entity, radius) => radius };
+  display.registerDrawComponent(comp, (entity) => drawn.push(entity), options);
+  display.draw(new Camera());
+
+  expect(drawn).toEqual([near, edge]);
+});
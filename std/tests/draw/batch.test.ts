@@ -0,0 +1,107 @@
+import { test, expect } from "../../test.ts";
+import { batchPath, beginBatch, endBatch, flushBatch } from "../../src/base/draw/batch.ts";
+
+// Records the paths started and the fills and strokes drawn, in order
+function setupMockCanvas() {
+  const calls: string[] = [];
+  const mockCtx = {
+    fillStyle: "",
+    strokeStyle: "",
+    lineWidth: 1,
+    beginPath: () => calls.push("beginPath"),
+    fill() {
+      calls.push(`fill ${this.fillStyle}`);
+    },
+    stroke() {
+      calls.push(`stroke ${this.strokeStyle} ${this.lineWidth}`);
+    },
+  };
+
+  const originalSim = (globalThis as any).sim;
+  (globalThis as any).sim = { ctx: mockCtx };
+  return {
+    calls,
+    restore: () => {
+      (globalThis as any).sim = originalSim;
+    },
+  };
+}
+
+await test("batchPath groups consecutive shapes of one opaque style into one path", () => {
+  const { calls, restore } = setupMockCanvas();
+
+  beginBatch();
+  expect(batchPath("fill", "red")).toBeTruthy();
+  expect(batchPath("fill", "red")).toBeTruthy();
+  expect(batchPath("fill", "red")).toBeTruthy();
+  endBatch();
+  restore();
+
+  expect(calls).toEqual(["beginPath", "fill red"]);
+});
+
+await test("batchPath keeps the draw order of different styles", () => {
+  const { calls, restore } = setupMockCanvas();
+
+  beginBatch();
+  batchPath("fill", "red");
+  batchPath("fill", "blue");
+  batchPath("stroke", "blue", 2);
+  batchPath("stroke", "blue", 3);
+  batchPath("fill", "red");
+  endBatch();
+  restore();
+
+  expect(calls).toEqual([
+    "beginPath",
+    "fill red",
+    "beginPath",
+    "fill blue",
+    "beginPath",
+    "stroke blue 2",
+    "beginPath",
+    "stroke blue 3",
+    "beginPath",
+    "fill red",
+  ]);
+});
+
+await test("batchPath draws translucent shapes on their own", () => {
+  const { calls, restore } = setupMockCanvas();
+
+  beginBatch();
+  batchPath("fill", "red");
+  // The batched shapes are drawn first, so the translucent one ends up on top of them
+  expect(batchPath("fill", "rgba(0, 0, 0, 0.5)")).toBe(undefined);
+  expect(calls).toEqual(["beginPath", "fill red"]);
+  expect(batchPath("fill", "#ff000080")).toBe(undefined);
+  expect(batchPath("fill", "transparent")).toBe(undefined);
+  endBatch();
+  restore();
+
+  expect(calls).toEqual(["beginPath", "fill red"]);
+});
+
+await test("batchPath does not batch outside beginBatch and endBatch", () => {
+  const { calls, restore } = setupMockCanvas();
+
+  expect(batchPath("fill", "red")).toBe(undefined);
+  restore();
+
+  expect(calls).toEqual([]);
+});
+
+await test("flushBatch draws the pending shapes", () => {
+  const { calls, restore } = setupMockCanvas();
+
+  beginBatch();
+  batchPath("fill", "red");
+  flushBatch();
+  expect(calls).toEqual(["beginPath", "fill red"]);
+  // A new path is started after a flush, even for the same style
+  batchPath("fill", "red");
+  endBatch();
+  restore();
+
+  expect(calls).toEqual(["beginPath", "fill red", "beginPath", "fill red"]);
+});
@@ -1,5 +1,5 @@
 import { test, expect } from "../../test.ts";
-import { Draw, Vec2, Color } from "physim/base";
+import { Draw, Vec2, Color, Display, Component, Entity, Camera } from "physim/base";
 
 // Mock canvas context
 function setupMockCanvas() {
@@ -217,3 +217,76 @@ await test("Draw.polygon - less than 2 vertices", () => {
   const vertices = [new Vec2(0, 0)];
   expect(() => Draw.polygon(vertices)).not.toThrow();
 });
+
+function setupMockDisplay() {
+  const ctx = setupMockCanvas() as any;
+  const calls: string[] = [];
+  for (const name of ["save", "restore", "translate", "scale", "rotate"]) {
+    ctx[name] = () => {};
+  }
+  ctx.fill = () => calls.push(`fill ${ctx.fillStyle}`);
+  ctx.stroke = () => calls.push(`stroke ${ctx.strokeStyle}`);
+  ctx.fillText = () => calls.push("text");
+  ctx.fillRect = () => {};
+  (globalThis as any).sim.clear = () => {};
+  return calls;
+}
+
+await test("Draw shapes of the same color are batched in a Display", () => {
+  const calls = setupMockDisplay();
+  const display = new Display();
+  const comp = new Component<string>();
+  for (const color of ["red", "red", "rgba(0, 0, 255, 0.5)", "rgba(0, 0, 255, 0.5)", "red"]) {
+    Entity.create(new Vec2(0, 0), [[comp, color]]);
+  }
+  display.registerDrawComponent(comp, (entity, color) => {
+    Draw.circle(entity.pos, 5, color);
+  });
+
+  display.draw(new Camera());
+  expect(calls).toEqual([
+    "fill red",
+    "fill rgba(0, 0, 255, 0.5)",
+    "fill rgba(0, 0, 255, 0.5)",
+    "fill red",
+  ]);
+});
+
+await test("Draw.flush - draws batched shapes before direct drawing", () => {
+  const calls = setupMockDisplay();
+  const display = new Display();
+  const comp = new Component<number>();
+  Entity.create(new Vec2(0, 0), [[comp, 1]]);
+  Entity.create(new Vec2(0, 0), [[comp, 2]]);
+  display.registerDrawComponent(comp, (entity) => {
+    Draw.line(entity.pos, entity.pos.add(new Vec2(1, 0)), "white");
+    Draw.flush();
+    sim.ctx.fillText("label", entity.pos.x, entity.pos.y);
+  });
+
+  display.draw(new Camera());
+  expect(calls).toEqual(["stroke white", "text", "stroke white", "text"]);
+
+  calls.length = 0;
+  Draw.circle(new Vec2(0, 0), 1, "red");
+  Draw.circle(new Vec2(0, 0), 1, "red");
+  expect(calls).toEqual(["fill red", "fill red"]);
+});
+
+await test("Display applies its shaders as one chain", () => {
+  const calls = setupMockDisplay();
+  const chains: number[][] = [];
+  (globalThis as any).sim.applyShaders = (shaders: number[]) => chains.push([...shaders]);
+  const display = new Display();
+  const comp = new Component<string>();
+  Entity.create(new Vec2(0, 0), [[comp, "red"]]);
+  display.registerDrawComponent(comp, (entity, color) => {
+    Draw.circle(entity.pos, 5, color);
+  });
+  display.addShader(1 as Shader);
+  display.addShader(2 as Shader);
+
+  display.draw(new Camera());
+  expect(calls).toEqual(["fill red"]);
+  expect(chains).toEqual([[1, 2]]);
+});
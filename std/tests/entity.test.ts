@@ -100,3 +100,10 @@ await test("Entity.destroy removes entity from all components", () => {
   expect(entity.getComp(c2)).toBeUndefined();
   expect(entity.getComp(c3)).toBeUndefined();
 });
+
+await test("Entity.id is a unique integer", () => {
+  const a = new Entity(new Vec2(0, 0));
+  const b = new Entity(new Vec2(0, 0));
+  expect(Number.isInteger(a.id)).toBe(true);
+  expect(b.id).not.toBe(a.id);
+});
@@ -1,5 +1,5 @@
 import { test, expect } from "../../test.ts";
-import { initGravityForce } from "physim/forces/gravity";
+import { GravityOptions, initGravityForce } from "physim/forces/gravity";
 import { Physics, Entity, Vec2 } from "physim/base";
 
 await test("initGravityForce - applies gravitational acceleration", () => {
@@ -44,3 +44,60 @@ await test("initGravityForce - applies gravitational acceleration", () => {
   expect(acc2!.x).toBeCloseTo(expectedAcc2.x);
   expect(acc2!.y).toBeCloseTo(expectedAcc2.y);
 });
+
+function createBodies(physics: Physics, count: number): Entity[] {
+  let seed = 1;
+  const random = (): number => (seed = (seed * 1103515245 + 12345) % 2147483648) / 2147483648;
+  const entities: Entity[] = [];
+  for (let i = 0; i < count; i++) {
+    const entity = new Entity(new Vec2(random() * 1000, random() * 1000));
+    physics.mass.set(entity, 1 + random() * 9);
+    physics.velocity.set(entity, new Vec2(0, 0));
+    entities.push(entity);
+  }
+  return entities;
+}
+
+// With zero velocity and no other forces, the velocity after one update is the acceleration
+function accelerations(options?: GravityOptions): Vec2[] {
+  const physics = new Physics();
+  const entities = createBodies(physics, 300);
+  initGravityForce(physics, 10, options);
+  physics.update();
+  return entities.map((entity) => physics.velocity.get(entity)!);
+}
+
+await test("initGravityForce - Barnes-Hut approximates exact gravity", () => {
+  const exact = accelerations();
+  const approx = accelerations({ theta: 0.5 });
+
+  const errors = exact
+    .map((e, i) => e.sub(approx[i]!).length() / e.length())
+    .sort((a, b) => a - b);
+  expect(errors[Math.floor(errors.length / 2)]!).toBeLessThan(0.02);
+});
+
+await test("initGravityForce - Barnes-Hut with theta 0 is exact", () => {
+  const exact = accelerations();
+  const approx = accelerations({ theta: 0 });
+
+  for (let i = 0; i < exact.length; i++) {
+    expect(approx[i]!.x).toBeCloseTo(exact[i]!.x);
+    expect(approx[i]!.y).toBeCloseTo(exact[i]!.y);
+  }
+});
+
+await test("initGravityForce - Barnes-Hut works with dense storage and overlapping entities", () => {
+  const physics = new Physics({ denseStorage: true });
+  for (let i = 0; i < 5; i++) {
+    physics.mass.set(new Entity(new Vec2(5, 5)), 1);
+  }
+  const probe = new Entity(new Vec2(10, 5));
+  physics.mass.set(probe, 1);
+
+  initGravityForce(physics, 1, { theta: 0.5, softening: 0 });
+  physics.update();
+
+  expect(physics.velocity.get(probe)!.x).toBeCloseTo(-0.2);
+  expect(physics.velocity.get(probe)!.y).toBeCloseTo(0);
+});
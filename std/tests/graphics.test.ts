@@ -1,7 +1,11 @@
 import { test, expect } from "../test.ts";
-import { Simulation, Component } from "physim/base";
-import { initPointDisplayComponent, initBodyDisplayComponent } from "physim/graphics";
-import { initBodyComponent } from "physim/bodies";
+import { Simulation, Component, Display, DrawOptions, Entity, Vec2, Color } from "physim/base";
+import {
+  BodyDisplayOptions,
+  initPointDisplayComponent,
+  initBodyDisplayComponent,
+} from "physim/graphics";
+import { Body, createCircle, initBodyComponent } from "physim/bodies";
 
 await test("initPointDisplayComponent", () => {
   const sim = new Simulation();
@@ -15,3 +19,39 @@ await test("initBodyDisplayComponent", () => {
   const bodyDisplay = initBodyDisplayComponent(sim.display, bodyComponent);
   expect(bodyDisplay instanceof Component).toBe(true);
 });
+
+await test("initBodyDisplayComponent culls by the bounding radius of the body", () => {
+  const sim = new Simulation();
+  const bodyComponent = initBodyComponent(sim.physics);
+  let registered: DrawOptions<any> | undefined;
+  const display = {
+    registerDrawComponent: (_comps: unknown, _draw: unknown, options?: DrawOptions<any>) => {
+      registered = options;
+    },
+  } as unknown as Display;
+
+  const options: BodyDisplayOptions = { cull: true };
+  initBodyDisplayComponent(display, bodyComponent, options);
+
+  const entity = new Entity(new Vec2(0, 0));
+  const body = Body.fromShape(createCircle(10));
+  const color = new Color(255, 255, 255);
+  const cullRadius = registered!.cullRadius!;
+  expect(cullRadius(entity, [{ color }, body])).toBe(body.boundingRadius);
+  expect(cullRadius(entity, [{ color, fill: false, lineWidth: 4 }, body]))
+    .toBe(body.boundingRadius + 2);
+});
+
+await test("initBodyDisplayComponent does not cull by default", () => {
+  const sim = new Simulation();
+  const bodyComponent = initBodyComponent(sim.physics);
+  let registered: DrawOptions<any> | undefined;
+  const display = {
+    registerDrawComponent: (_comps: unknown, _draw: unknown, options?: DrawOptions<any>) => {
+      registered = options;
+    },
+  } as unknown as Display;
+
+  initBodyDisplayComponent(display, bodyComponent);
+  expect(registered?.cullRadius).toBe(undefined);
+});
@@ -1,5 +1,5 @@
 import { test, expect } from "../test.ts";
-import { log, info, debug, warning, error } from "physim/logging";
+import { log, info, debug, warning, error, report } from "physim/logging";
 
 await test("log calls sim.log without prefix", () => {
   const logMessages: any[] = [];
@@ -78,3 +78,20 @@ await test("error layer logs with [error] prefix", () => {
 
   (globalThis as any).sim.log = originalLog;
 });
+
+await test("report logs its values as a line of JSON", () => {
+  const logMessages: any[] = [];
+  const originalLog = (globalThis as any).sim.log;
+  (globalThis as any).sim.log = (...args: any[]) => {
+    logMessages.push(args);
+  };
+
+  report({ energy: 12.5, settled: true });
+  expect(logMessages.length).toBe(1);
+  const data = JSON.parse(logMessages[0][0]);
+  expect(data.type).toBe("report");
+  expect(data.values.energy).toBe(12.5);
+  expect(data.values.settled).toBe(true);
+
+  (globalThis as any).sim.log = originalLog;
+});
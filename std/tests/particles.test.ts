@@ -2,11 +2,11 @@ import { test, expect } from "../test.ts";
 import { ParticleSystem } from "physim/particles";
 import { Vec2, Color, Entity } from "physim/base";
 import { Display } from "physim/base";
-import { Body, createCircle } from "physim/bodies";
+import { Body, createCircle, createRectangle } from "physim/bodies";
 
 await test("ParticleSystem - constructor", () => {
   const ps = new ParticleSystem(new Display());
-  expect((ps as any).activeParticles.length).toBe(0);
+  expect((ps as any).particles.count).toBe(0);
   expect(ps.trailComponent).toBeTruthy();
 });
 
@@ -21,11 +21,11 @@ await test("ParticleSystem - emit", () => {
     color: { start: new Color(255, 255, 255), end: new Color(0, 0, 0) },
   });
 
-  const particles = (ps as any).activeParticles;
-  expect(particles.length).toBe(10);
-  const p = particles[0];
-  expect(p.lifetime >= 0.167 && p.lifetime <= 0.333).toBe(true);
-  expect(p.velocity.length()).toBeGreaterThan(0);
+  const particles = (ps as any).particles;
+  expect(particles.count).toBe(10);
+  const lifetime = particles.lifetime[0];
+  expect(lifetime >= 0.167 && lifetime <= 0.333).toBe(true);
+  expect(Math.hypot(particles.velX[0], particles.velY[0])).toBeGreaterThan(0);
 });
 
 await test("ParticleSystem - update physics", () => {
@@ -41,17 +41,17 @@ await test("ParticleSystem - update physics", () => {
     color: { start: new Color(255, 255, 255), end: new Color(0, 0, 0) },
   });
 
-  const particle = (ps as any).activeParticles[0];
-  const initialPos = particle.position.clone();
+  const particles = (ps as any).particles;
+  const initialX = particles.posX[0];
 
   (ps as any).update();
 
-  expect(particle.age).toBeCloseTo(dt);
-  expect(particle.position.x).toBeCloseTo(initialPos.x + 1 * dt);
-  expect(particle.velocity.x).toBeCloseTo(1);
+  expect(particles.age[0]).toBeCloseTo(dt);
+  expect(particles.posX[0]).toBeCloseTo(initialX + 1 * dt);
+  expect(particles.velX[0]).toBeCloseTo(1);
 
   (ps as any).update();
-  expect(particle.position.x).toBeCloseTo(initialPos.x + 3 * dt);
+  expect(particles.posX[0]).toBeCloseTo(initialX + 3 * dt);
 });
 
 await test("ParticleSystem - particle lifetime", () => {
@@ -66,11 +66,10 @@ await test("ParticleSystem - particle lifetime", () => {
     color: { start: new Color(255, 255, 255), end: new Color(0, 0, 0) },
   });
 
-  expect((ps as any).activeParticles.length).toBe(1);
+  expect((ps as any).particles.count).toBe(1);
   (ps as any).update();
   (ps as any).update();
-  expect((ps as any).activeParticles.length).toBe(0);
-  expect((ps as any).particlePool.length).toBe(1);
+  expect((ps as any).particles.count).toBe(0);
 });
 
 await test("ParticleSystem - color interpolation", () => {
@@ -78,6 +77,8 @@ await test("ParticleSystem - color interpolation", () => {
   const startColor = new Color(255, 0, 0, 1);
   const endColor = new Color(0, 0, 255, 0);
   const lifetime = 10 / 60;
+  let lastColor: Color | undefined;
+  let alive = 0;
 
   ps.emit({
     numParticles: 1,
@@ -86,23 +87,165 @@ await test("ParticleSystem - color interpolation", () => {
     initialVelocity: { min: 0, max: 0 },
     body: Body.fromShape(createCircle(5)),
     color: { start: startColor, end: endColor },
+    // Runs after the color is updated, while the particle is still alive
+    customUpdate: (particle) => {
+      lastColor = particle.color;
+      alive = (ps as any).particles.count;
+    },
   });
 
-  const particle = (ps as any).activeParticles[0];
+  const particles = (ps as any).particles;
+  const color = (): Color =>
+    new Color(particles.r[0], particles.g[0], particles.b[0], particles.a[0]);
 
-  expect(particle.color).toEqual(startColor);
+  expect(color()).toEqual(startColor);
 
   for (let i = 0; i < 5; i++) {
     (ps as any).update();
   }
   const expectedMidColor = new Color(127.5, 0, 127.5, 0.5);
-  expect(particle.color.r).toBeCloseTo(expectedMidColor.r);
-  expect(particle.color.g).toBeCloseTo(expectedMidColor.g);
-  expect(particle.color.b).toBeCloseTo(expectedMidColor.b);
-  expect(particle.color.a).toBeCloseTo(expectedMidColor.a);
+  expect(color().r).toBeCloseTo(expectedMidColor.r);
+  expect(color().g).toBeCloseTo(expectedMidColor.g);
+  expect(color().b).toBeCloseTo(expectedMidColor.b);
+  expect(color().a).toBeCloseTo(expectedMidColor.a);
 
   for (let i = 0; i < 5; i++) {
     (ps as any).update();
   }
-  expect(particle.color).toEqual(endColor);
+  expect(alive).toBe(1);
+  expect(lastColor).toEqual(endColor);
+  expect(particles.count).toBe(0);
+});
+
+await test("ParticleSystem - expired particles are replaced by the last one", () => {
+  const ps = new ParticleSystem(new Display());
+  const emit = (lifetime: number, x: number): void =>
+    ps.emit({
+      numParticles: 1,
+      position: new Vec2(x, 0),
+      particleLifetime: { min: lifetime, max: lifetime },
+      initialVelocity: { min: 0, max: 0 },
+      body: Body.fromShape(createCircle(5)),
+      color: { start: new Color(255, 255, 255), end: new Color(0, 0, 0) },
+    });
+  emit(1 / 120, 0);
+  emit(1, 10);
+  emit(1, 20);
+
+  (ps as any).update();
+
+  const particles = (ps as any).particles;
+  expect(particles.count).toBe(2);
+  expect([particles.posX[0], particles.posX[1]].sort((a, b) => a - b)).toEqual([10, 20]);
+  expect(particles.age[0]).toBeCloseTo(1 / 60);
+  expect(particles.age[1]).toBeCloseTo(1 / 60);
+});
+
+await test("ParticleSystem - customUpdate can modify the particle", () => {
+  const ps = new ParticleSystem(new Display());
+  ps.emit({
+    numParticles: 2,
+    position: Vec2.zero(),
+    particleLifetime: { min: 1, max: 1 },
+    initialVelocity: { min: 0, max: 0 },
+    body: Body.fromShape(createCircle(5)),
+    color: { start: new Color(255, 255, 255), end: new Color(0, 0, 0) },
+    customUpdate: (particle, lifeRatio) => {
+      particle.position = new Vec2(lifeRatio, particle.position.y + 1);
+      particle.scale = 3;
+    },
+  });
+
+  (ps as any).update();
+
+  const particles = (ps as any).particles;
+  for (let i = 0; i < 2; i++) {
+    expect(particles.posX[i]).toBeCloseTo(1 / 60);
+    expect(particles.posY[i]).toBe(1);
+    expect(particles.scale[i]).toBe(3);
+  }
+});
+
+await test("ParticleSystem - batches opaque particles and fills translucent ones alone", () => {
+  const fills: { style: string; arcs: number }[] = [];
+  let arcs = 0;
+  const ctx = {
+    fillStyle: "",
+    beginPath: () => {
+      arcs = 0;
+    },
+    moveTo: () => {},
+    arc: () => {
+      arcs++;
+    },
+    fill() {
+      fills.push({ style: this.fillStyle, arcs });
+    },
+  };
+  const originalCtx = (globalThis as any).sim.ctx;
+  (globalThis as any).sim.ctx = ctx;
+
+  const ps = new ParticleSystem(new Display());
+  const emit = (numParticles: number, color: Color) =>
+    ps.emit({
+      numParticles,
+      position: Vec2.zero(),
+      particleLifetime: { min: 1, max: 1 },
+      initialVelocity: { min: 0, max: 0 },
+      body: Body.fromShape(createCircle(5)),
+      color: { start: color, end: color },
+    });
+  emit(3, new Color(255, 0, 0));
+  emit(2, new Color(0, 0, 255, 0.5));
+
+  const camera = { _applyTransforms: () => {}, _removeTransforms: () => {} };
+  (ps as any).draw(camera);
+  (globalThis as any).sim.ctx = originalCtx;
+
+  expect(fills.length).toBe(3);
+  expect(fills[0].style).toBe("rgba(255, 0, 0, 1)");
+  expect(fills[0].arcs).toBe(3);
+  expect(fills[1].style).toBe("rgba(0, 0, 255, 0.5019607843137255)");
+  expect(fills[1].arcs).toBe(1);
+  expect(fills[2].arcs).toBe(1);
+});
+
+await test("ParticleSystem - reads the vertices of a body once per draw", () => {
+  const ctx = {
+    fillStyle: "",
+    beginPath: () => {},
+    moveTo: () => {},
+    lineTo: () => {},
+    closePath: () => {},
+    fill: () => {},
+  };
+  const originalCtx = (globalThis as any).sim.ctx;
+  (globalThis as any).sim.ctx = ctx;
+
+  const body = Body.fromShape(createRectangle(4, 2));
+  let reads = 0;
+  const vertices = Object.getOwnPropertyDescriptor(Body.prototype, "vertices")!.get!;
+  Object.defineProperty(body, "vertices", {
+    get() {
+      reads++;
+      return vertices.call(this);
+    },
+  });
+
+  const ps = new ParticleSystem(new Display());
+  ps.emit({
+    numParticles: 5,
+    position: Vec2.zero(),
+    particleLifetime: { min: 1, max: 1 },
+    initialVelocity: { min: 0, max: 0 },
+    body,
+    color: { start: new Color(255, 0, 0), end: new Color(255, 0, 0) },
+  });
+
+  const camera = { _applyTransforms: () => {}, _removeTransforms: () => {} };
+  (ps as any).draw(camera);
+  (ps as any).draw(camera);
+  (globalThis as any).sim.ctx = originalCtx;
+
+  expect(reads).toBe(2);
 });
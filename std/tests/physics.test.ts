@@ -1,5 +1,5 @@
 import { test, expect } from "../test.ts";
-import { Physics, Entity, Vec2 } from "physim/base";
+import { Physics, PhysicsOptions, Entity, Vec2 } from "physim/base";
 
 await test("Physics - basic movement (velocity)", () => {
   const physics = new Physics();
@@ -59,3 +59,55 @@ await test("Physics - registerForce", () => {
   physics.update();
   expect(customForceApplied).toBe(true);
 });
+
+await test("Physics - denseStorage matches the default storage", () => {
+  const options: PhysicsOptions = { denseStorage: true };
+  const dense = new Physics(options);
+  const plain = new Physics();
+  dense.constantPull = new Vec2(0, 1);
+  plain.constantPull = new Vec2(0, 1);
+
+  const a = new Entity(new Vec2(0, 0));
+  const b = new Entity(new Vec2(0, 0));
+  dense.velocity.set(a, new Vec2(60, 0));
+  dense.acceleration.set(a, new Vec2(0, 6));
+  plain.velocity.set(b, new Vec2(60, 0));
+  plain.acceleration.set(b, new Vec2(0, 6));
+
+  for (let i = 0; i < 10; i++) {
+    dense.update();
+    plain.update();
+  }
+
+  expect(a.pos.x).toBeCloseTo(b.pos.x);
+  expect(a.pos.y).toBeCloseTo(b.pos.y);
+  expect(dense.velocity.get(a)?.y).toBe(plain.velocity.get(b)?.y);
+  expect(dense.acceleration.get(a)?.y).toBe(0);
+});
+
+await test("Physics - denseStorage acceleration adds a velocity", () => {
+  const physics = new Physics({ denseStorage: true });
+  const entity = new Entity(new Vec2(0, 0));
+
+  physics.acceleration.set(entity, new Vec2(6, 0));
+  physics.update();
+
+  expect(physics.velocity.get(entity)?.x).toBe(6);
+});
+
+await test("Physics - denseStorage moves a shared position vector only once", () => {
+  const physics = new Physics({ denseStorage: true });
+  const shared = new Vec2(0, 0);
+  const moving = new Entity(shared);
+  const still = new Entity(shared);
+
+  physics.velocity.set(moving, new Vec2(60, 0));
+  physics.update();
+  const pos = moving.pos;
+  physics.update();
+
+  // The shared vector is replaced on the first move and updated in place after it
+  expect(still.pos.x).toBe(0);
+  expect(moving.pos).toBe(pos);
+  expect(moving.pos.x).toBeCloseTo(2);
+});
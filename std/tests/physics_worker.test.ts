@@ -0,0 +1,199 @@
+import { test, expect } from "../test.ts";
+import { Entity, Physics, Vec2 } from "physim/base";
+import {
+  accelerateKernel,
+  BodyTable,
+  createBodies,
+  KernelFactory,
+  moveKernel,
+  PhysicsBodies,
+  PhysicsWorker,
+  pullKernel,
+  WorkerKernel,
+} from "../src/base/physics_worker.ts";
+
+// Runs a kernel from its source, as the worker does
+function fromSource(kernel: WorkerKernel): (bodies: PhysicsBodies) => void {
+  const factory: KernelFactory = new Function(`return (${String(kernel.factory)});`)();
+  return factory(...kernel.args);
+}
+
+function body(bodies: PhysicsBodies, flags: number, vel: [number, number], acc: [number, number]) {
+  const i = bodies.count++;
+  bodies.posX[i] = 0;
+  bodies.posY[i] = 0;
+  bodies.velX[i] = vel[0];
+  bodies.velY[i] = vel[1];
+  bodies.accX[i] = acc[0];
+  bodies.accY[i] = acc[1];
+  bodies.flags[i] = flags;
+  return i;
+}
+
+await test("createBodies lays the columns out one after another in one buffer", () => {
+  const bodies = createBodies(4);
+  const columns = [
+    bodies.posX,
+    bodies.posY,
+    bodies.velX,
+    bodies.velY,
+    bodies.accX,
+    bodies.accY,
+    bodies.mass,
+  ];
+
+  columns.forEach((column, i) => {
+    expect(column.buffer).toBe(bodies.posX.buffer);
+    expect(column.length).toBe(4);
+    expect(column.byteOffset).toBe(i * 4 * 8);
+  });
+  expect(bodies.flags.buffer).toBe(bodies.posX.buffer);
+  expect(bodies.flags.byteOffset).toBe(7 * 4 * 8);
+  expect(bodies.posX.buffer.byteLength).toBe(4 * (7 * 8 + 1));
+  expect(bodies.count).toBe(0);
+  expect(bodies.massCount).toBe(0);
+});
+
+await test("accelerateKernel adds and clears accelerations", () => {
+  const bodies = createBodies(3);
+  const moving = body(bodies, 3, [1, 2], [3, 4]);
+  const starting = body(bodies, 2, [9, 9], [5, 6]);
+  const still = body(bodies, 1, [1, 1], [7, 7]);
+
+  accelerateKernel()(bodies);
+
+  expect([bodies.velX[moving], bodies.velY[moving]]).toEqual([4, 6]);
+  expect([bodies.accX[moving], bodies.accY[moving]]).toEqual([0, 0]);
+  // A body without a velocity gets its acceleration as its velocity
+  expect([bodies.velX[starting], bodies.velY[starting]]).toEqual([5, 6]);
+  expect(bodies.flags[starting]).toBe(3);
+  expect([bodies.velX[still], bodies.accX[still]]).toEqual([1, 7]);
+});
+
+await test("moveKernel moves bodies with a velocity by a frame", () => {
+  const bodies = createBodies(2);
+  const moving = body(bodies, 1, [60, -120], [0, 0]);
+  const still = body(bodies, 2, [60, 60], [0, 0]);
+
+  moveKernel()(bodies);
+
+  expect(bodies.posX[moving]).toBeCloseTo(1);
+  expect(bodies.posY[moving]).toBeCloseTo(-2);
+  expect([bodies.posX[still], bodies.posY[still]]).toEqual([0, 0]);
+});
+
+await test("pullKernel adds the constant pull to bodies with a velocity", () => {
+  const bodies = createBodies(2);
+  const moving = body(bodies, 1, [1, 1], [0, 0]);
+  const still = body(bodies, 0, [1, 1], [0, 0]);
+  bodies.pullX = 0.5;
+  bodies.pullY = -1;
+
+  pullKernel()(bodies);
+
+  expect([bodies.velX[moving], bodies.velY[moving]]).toEqual([1.5, 0]);
+  expect([bodies.velX[still], bodies.velY[still]]).toEqual([1, 1]);
+});
+
+await test("BodyTable steps bodies like Physics.update", () => {
+  const create = () => {
+    const physics = new Physics({ denseStorage: true });
+    physics.constantPull = new Vec2(0, 2);
+    const heavy = new Entity(new Vec2(0, 0));
+    const moving = new Entity(new Vec2(10, 0));
+    const pushed = new Entity(new Vec2(0, 10));
+    physics.mass.set(heavy, 5);
+    physics.velocity.set(moving, new Vec2(60, 0));
+    physics.acceleration.set(pushed, new Vec2(6, 0));
+    return { physics, entities: [heavy, moving, pushed] };
+  };
+  const serial = create();
+  const stepped = create();
+  const physics = stepped.physics as any;
+  const plan = physics.workerPlan() as WorkerKernel[];
+  const steps = plan.map(fromSource);
+
+  const table = new BodyTable();
+  table.index(physics);
+  expect(table.entities).toEqual(stepped.entities);
+  expect(table.massCount).toBe(1);
+
+  const bodies = createBodies(table.count);
+  table.write(physics, bodies);
+  expect(Array.from(bodies.flags.subarray(0, 3))).toEqual([0, 1, 2]);
+  expect(table.matches(physics, bodies)).toBe(true);
+
+  for (const step of steps) {
+    step(bodies);
+  }
+  // The pushed entity gained a velocity, so the table is indexed again
+  expect(table.apply(physics, bodies)).toBe(true);
+  serial.physics.update();
+
+  for (let i = 0; i < 3; i++) {
+    expect(stepped.entities[i]!.pos.x).toBe(serial.entities[i]!.pos.x);
+    expect(stepped.entities[i]!.pos.y).toBe(serial.entities[i]!.pos.y);
+  }
+  expect(physics.velocity.get(stepped.entities[2])).toEqual(
+    serial.physics.velocity.get(serial.entities[2]!),
+  );
+  // The stepped bodies are the state written back, until the page changes it
+  expect(table.matches(physics, bodies)).toBe(true);
+  physics.velocity.set(stepped.entities[1], new Vec2(0, 0));
+  expect(table.matches(physics, bodies)).toBe(false);
+});
+
+await test("PhysicsWorker.create needs a cross-origin isolated page", () => {
+  const globals = globalThis as any;
+  const originalIsolated = globals.crossOriginIsolated;
+  const originalWarn = console.warn;
+  let warned = false;
+  globals.crossOriginIsolated = false;
+  console.warn = () => (warned = true);
+
+  try {
+    expect(PhysicsWorker.create()).toBe(undefined);
+    expect(warned).toBe(true);
+  } finally {
+    globals.crossOriginIsolated = originalIsolated;
+    console.warn = originalWarn;
+  }
+});
+
+await test("PhysicsWorker.update leaves forces without a kernel to the page", async () => {
+  const globals = globalThis as any;
+  const originalBlob = globals.Blob;
+  const originalCreateObjectURL = URL.createObjectURL;
+  const originalWorker = globals.Worker;
+  const originalIsolated = globals.crossOriginIsolated;
+  const originalWarn = console.warn;
+  const messages: unknown[] = [];
+  globals.Blob = class {
+    constructor(public parts: string[]) {}
+  };
+  URL.createObjectURL = (blob: any) => blob.parts.join("");
+  globals.Worker = class {
+    postMessage(message: unknown): void {
+      messages.push(message);
+    }
+    terminate(): void {}
+  };
+  globals.crossOriginIsolated = true;
+  console.warn = () => {};
+
+  try {
+    const worker = PhysicsWorker.create()!;
+    const physics = new Physics({ denseStorage: true });
+    physics.registerStaticForce(() => {});
+
+    expect(await worker.update(physics)).toBe(false);
+    expect(messages).toEqual([]);
+    worker.terminate();
+  } finally {
+    globals.Blob = originalBlob;
+    URL.createObjectURL = originalCreateObjectURL;
+    globals.Worker = originalWorker;
+    globals.crossOriginIsolated = originalIsolated;
+    console.warn = originalWarn;
+  }
+});
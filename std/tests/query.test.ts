@@ -0,0 +1,82 @@
+import { test, expect } from "../test.ts";
+import { Component, DenseVec2Component, Entity, Query, Vec2, query } from "physim/base";
+
+await test("query includes entities that already have all components", () => {
+  const a = new Component<number>();
+  const b = new Component<string>();
+  const both = new Entity(new Vec2(0, 0));
+  const onlyA = new Entity(new Vec2(0, 0));
+  a.set(both, 1);
+  b.set(both, "x");
+  a.set(onlyA, 2);
+
+  const q = query(a, b);
+  expect(q instanceof Query).toBe(true);
+  expect(q.size).toBe(1);
+  expect(q.has(both)).toBe(true);
+  expect(q.has(onlyA)).toBe(false);
+  expect([...q]).toEqual([both]);
+});
+
+await test("query membership follows set, delete, clear and destroy", () => {
+  const a = new Component<number>();
+  const b = new DenseVec2Component();
+  const q = query(a, b);
+  const entity = new Entity(new Vec2(0, 0));
+
+  a.set(entity, 1);
+  expect(q.has(entity)).toBe(false);
+  b.set(entity, new Vec2(1, 2));
+  expect(q.has(entity)).toBe(true);
+  a.set(entity, 5);
+  expect(q.size).toBe(1);
+
+  b.delete(entity);
+  expect(q.has(entity)).toBe(false);
+  b.set(entity, new Vec2(1, 2));
+  a.clear();
+  expect(q.size).toBe(0);
+
+  a.set(entity, 1);
+  expect(q.size).toBe(1);
+  entity.destroy();
+  expect(q.size).toBe(0);
+});
+
+await test("query returns the same query for the same components", () => {
+  const a = new Component<number>();
+  const b = new Component<number>();
+  expect(query(a, b)).toBe(query(a, b));
+  expect(query(b, a) === query(a, b)).toBe(false);
+});
+
+await test("Query forEach passes component values in order", () => {
+  const a = new Component<number>();
+  const b = new Component<string>();
+  const entity = Entity.create(new Vec2(0, 0), [
+    [a, 3],
+    [b, "three"],
+  ]);
+
+  const seen: [Entity, number, string][] = [];
+  query(a, b).forEach((e, [n, s]) => {
+    seen.push([e, n, s]);
+  });
+  expect(seen).toEqual([[entity, 3, "three"]]);
+});
+
+await test("Query forEach skips entities removed during iteration", () => {
+  const a = new Component<number>();
+  const b = new Component<number>();
+  const first = Entity.create(new Vec2(0, 0), [[a, 1], [b, 1]]);
+  const second = Entity.create(new Vec2(0, 0), [[a, 2], [b, 2]]);
+
+  const visited: Entity[] = [];
+  query(a, b).forEach((entity) => {
+    visited.push(entity);
+    if (entity === first) {
+      second.destroy();
+    }
+  });
+  expect(visited).toEqual([first]);
+});
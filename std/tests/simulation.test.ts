@@ -1,5 +1,6 @@
 import { test, expect } from "../test.ts";
-import { Simulation } from "physim/base";
+import { Entity, Simulation, SimulationOptions, Vec2 } from "physim/base";
+import { GravityOptions, initGravityForce } from "physim/forces/gravity";
 
 await test("Simulation initial state", () => {
   const simInstance = new Simulation();
@@ -34,6 +35,28 @@ await test("Simulation.run uses sim.run", async () => {
   expect(updated).toBe(true);
 });
 
+await test("Simulation.run only draws on render frames", async () => {
+  const simInstance = new Simulation();
+  let draws = 0;
+  simInstance.display.draw = () => {
+    draws++;
+  };
+
+  const originalIsRenderFrame = (globalThis as any).sim.isRenderFrame;
+  (globalThis as any).sim.isRenderFrame = () => simInstance.frame % 2 === 0;
+  (globalThis as any).sim.run = async (onUpdate: () => void) => {
+    for (let i = 0; i < 4; i++) {
+      onUpdate();
+    }
+  };
+
+  await simInstance.run();
+  (globalThis as any).sim.isRenderFrame = originalIsRenderFrame;
+
+  expect(simInstance.frame).toBe(4);
+  expect(draws).toBe(2);
+});
+
 await test("Simulation autoStopTime", async () => {
   let finished = false;
   (globalThis as any).sim.finish = () => {
@@ -55,3 +78,97 @@ await test("Simulation autoStopTime", async () => {
 
   expect(finished).toBe(true);
 });
+
+// Runs the source of a worker on the page, answering messages asynchronously like a worker
+class InlineWorker {
+  onmessage: ((event: { data: unknown }) => void) | null = null;
+  onerror: unknown = null;
+  private scope: { onmessage: ((event: { data: unknown }) => void) | null; postMessage: unknown };
+
+  constructor(source: string) {
+    this.scope = {
+      onmessage: null,
+      postMessage: (data: unknown) => setTimeout(() => this.onmessage?.({ data })),
+    };
+    new Function("self", source)(this.scope);
+  }
+
+  postMessage(data: unknown): void {
+    setTimeout(() => this.scope.onmessage?.({ data }));
+  }
+
+  terminate(): void {}
+}
+
+async function runGravityScene(
+  simulation: Simulation,
+  options: GravityOptions | undefined,
+): Promise<number[][]> {
+  const { physics } = simulation;
+  physics.constantPull = new Vec2(0, 0.5);
+  initGravityForce(physics, 50, options);
+
+  let seed = 7;
+  const random = (): number => (seed = (seed * 1103515245 + 12345) % 2147483648) / 2147483648;
+  const entities: Entity[] = [];
+  for (let i = 0; i < 40; i++) {
+    const entity = new Entity(new Vec2(random() * 500, random() * 500));
+    physics.mass.set(entity, 1 + random() * 9);
+    if (i % 10 !== 0) {
+      physics.velocity.set(entity, new Vec2(random() * 10, random() * 10));
+    }
+    entities.push(entity);
+  }
+  const pushed = new Entity(new Vec2(250, 250));
+  physics.acceleration.set(pushed, new Vec2(1, -2));
+  entities.push(pushed);
+
+  (globalThis as any).sim.run = async (onUpdate: () => void | Promise<void>) => {
+    for (let i = 0; i < 30; i++) {
+      await onUpdate();
+    }
+  };
+  await simulation.run(() => {
+    if (simulation.frame === 10) {
+      physics.velocity.set(entities[1]!, new Vec2(30, 0));
+    }
+    if (simulation.frame === 20) {
+      const added = new Entity(new Vec2(100, 400));
+      physics.mass.set(added, 5);
+      physics.velocity.set(added, new Vec2(0, -10));
+      entities.push(added);
+    }
+  });
+  return entities.map((entity) => [entity.pos.x, entity.pos.y]);
+}
+
+await test("Simulation physicsWorker matches serial physics", async () => {
+  const globals = globalThis as any;
+  const originalBlob = globals.Blob;
+  const originalCreateObjectURL = URL.createObjectURL;
+  const originalWorker = globals.Worker;
+  const originalIsolated = globals.crossOriginIsolated;
+  const originalIsRenderFrame = globals.sim.isRenderFrame;
+  globals.sim.isRenderFrame = () => false;
+  globals.Blob = class {
+    constructor(public parts: string[]) {}
+  };
+  URL.createObjectURL = (blob: any) => blob.parts.join("");
+  globals.Worker = InlineWorker;
+  globals.crossOriginIsolated = true;
+
+  try {
+    const simulationOptions: SimulationOptions = { physicsWorker: true };
+    for (const options of [undefined, { theta: 0.5 }]) {
+      const serial = await runGravityScene(new Simulation(), options);
+      const worker = await runGravityScene(new Simulation(undefined, simulationOptions), options);
+      expect(worker).toEqual(serial);
+    }
+  } finally {
+    globals.Blob = originalBlob;
+    URL.createObjectURL = originalCreateObjectURL;
+    globals.Worker = originalWorker;
+    globals.crossOriginIsolated = originalIsolated;
+    globals.sim.isRenderFrame = originalIsRenderFrame;
+  }
+});
@@ -0,0 +1,83 @@
+import { test, expect } from "../test.ts";
+import { DenseNumberComponent, DenseVec2Component, Entity, Vec2 } from "physim/base";
+
+await test("DenseVec2Component set, get and has", () => {
+  const comp = new DenseVec2Component();
+  const entity = new Entity(new Vec2(0, 0));
+
+  comp.set(entity, new Vec2(1, 2));
+  expect(comp.has(entity)).toBe(true);
+  expect(comp.size).toBe(1);
+  expect(comp.get(entity)?.x).toBe(1);
+  expect(comp.get(entity)?.y).toBe(2);
+
+  comp.set(entity, new Vec2(3, 4));
+  expect(comp.size).toBe(1);
+  expect(comp.x[comp.indexOf(entity)]).toBe(3);
+  expect(comp.y[comp.indexOf(entity)]).toBe(4);
+});
+
+await test("DenseVec2Component delete moves the last row into the gap", () => {
+  const comp = new DenseVec2Component();
+  const a = new Entity(new Vec2(0, 0));
+  const b = new Entity(new Vec2(0, 0));
+  const c = new Entity(new Vec2(0, 0));
+  comp.set(a, new Vec2(1, 1));
+  comp.set(b, new Vec2(2, 2));
+  comp.set(c, new Vec2(3, 3));
+
+  expect(comp.delete(a)).toBe(true);
+  expect(comp.delete(a)).toBe(false);
+  expect(comp.size).toBe(2);
+  expect(comp.indexOf(a)).toBe(-1);
+  expect(comp.entityAt(0)).toBe(c);
+  expect(comp.get(c)?.x).toBe(3);
+  expect(comp.get(b)?.x).toBe(2);
+});
+
+await test("DenseVec2Component grows and iterates like a map", () => {
+  const comp = new DenseVec2Component();
+  const entities: Entity[] = [];
+  for (let i = 0; i < 200; i++) {
+    const entity = new Entity(new Vec2(0, 0));
+    comp.set(entity, new Vec2(i, -i));
+    entities.push(entity);
+  }
+
+  let sum = 0;
+  for (const [entity, value] of comp) {
+    expect(entities.includes(entity)).toBe(true);
+    sum += value.x;
+  }
+  expect(sum).toBe((199 * 200) / 2);
+  expect([...comp.keys()].length).toBe(200);
+  expect(comp.get(entities[150]!)?.y).toBe(-150);
+});
+
+await test("DenseNumberComponent stores values in a column", () => {
+  const comp = new DenseNumberComponent();
+  const a = new Entity(new Vec2(0, 0));
+  const b = new Entity(new Vec2(0, 0));
+  a.addComp(comp, 5);
+  b.addComp(comp, 7);
+
+  expect(a.getComp(comp)).toBe(5);
+  expect(comp.data[comp.indexOf(b)]).toBe(7);
+
+  comp.clear();
+  expect(comp.size).toBe(0);
+  expect(a.getComp(comp)).toBeUndefined();
+});
+
+await test("Entity.destroy removes the entity from dense components", () => {
+  const vec = new DenseVec2Component();
+  const num = new DenseNumberComponent();
+  const entity = Entity.create(new Vec2(0, 0), [
+    [vec, new Vec2(1, 1)],
+    [num, 1],
+  ]);
+
+  entity.destroy();
+  expect(vec.has(entity)).toBe(false);
+  expect(num.has(entity)).toBe(false);
+});